@@ -0,0 +1,199 @@
+"""Búsqueda y contenido relacionado de la Academia.
+
+Búsqueda: cada ``ContenidoAcademia`` se indexa al guardarse (señal
+``post_save``) con el texto sin tildes y ponderado por campo: título (A),
+código, etiquetas y resumen (B), cuerpo principal (C) y el resto (D).
+
+* PostgreSQL: ``IndiceBusquedaAcademia.vector`` con la configuración
+  ``spanish`` (raíces en español) e índice GIN; se ordena con ``ts_rank``. Las
+  tildes se quitan en Python porque la extensión ``unaccent`` no siempre está
+  disponible.
+* SQLite: tabla FTS5 ``asistente_tecnico_academia_fts`` con un recorte de
+  sufijos en español (``raiz``) y orden por ``bm25``.
+* Otros motores: ``icontains`` sin orden de relevancia.
+
+Relacionados: ``RelacionAcademiaDiagnostico`` guarda, para cada combinación de
+temas de un diagnóstico (turbidez, pH, cloro, filtración), los contenidos que
+antes se buscaban con ``icontains`` en cada diagnóstico. Se recalcula al
+aprobar o cambiar contenido aprobado y el diagnóstico lo lee con una consulta.
+"""
+import re
+import unicodedata
+from itertools import combinations
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from .models import ContenidoAcademia, IndiceBusquedaAcademia, RelacionAcademiaDiagnostico
+
+TABLA_FTS = "asistente_tecnico_academia_fts"
+CONFIG_BUSQUEDA = "spanish"
+CAMPOS_CLAVE = ("codigo", "etiquetas", "resumen")
+CAMPOS_CUERPO = ("introduccion", "contenido", "procedimiento", "fallas_frecuentes")
+CAMPOS_RESTO = (
+    "herramientas_materiales", "funcionamiento", "componentes", "mantenimiento", "buenas_practicas",
+    "errores_comunes", "recomendaciones_jvaqua", "referencias_tecnicas",
+)
+LIMITE_BUSQUEDA = 500
+STOPWORDS = frozenset(
+    "a al con de del el en es la las lo los no o para por que se sin su sus un una uno y".split()
+)
+# Sufijos más largos primero; la raíz conserva al menos tres letras.
+SUFIJOS = (
+    "amientos", "imientos", "amiento", "imiento", "aciones", "uciones", "adoras", "adores", "ancias", "encias",
+    "mente", "acion", "ucion", "adora", "ador", "ancia", "encia", "antes", "entes", "ables", "ibles", "istas",
+    "ante", "ente", "able", "ible", "ista", "osos", "osas", "ivos", "ivas", "ando", "iendo", "ados", "idos",
+    "adas", "idas", "oso", "osa", "ivo", "iva", "ado", "ido", "ada", "ida", "ar", "er", "ir", "es", "os", "as",
+    "s", "o", "a", "e",
+)
+
+# tema: (indicios en el diagnóstico, módulos del curso, términos de título/etiquetas/resumen)
+TEMAS_DIAGNOSTICO = {
+    "turbidez": (("floc", "verde", "turb"), {"problemas", "productos", "mantenimiento"}, ("floc", "sulfato", "verde", "turb")),
+    "ph": (("ph",), {"quimica"}, ("ph", "metasilicato", "reductor")),
+    "cloro": (("cloro", "desinf"), {"quimica", "productos"}, ("cloro", "tricloro")),
+    "filtracion": (("filtr", "circul"), {"equipos", "preventivo"}, ("filtro", "bomba", "circul")),
+}
+MODULOS_BASE = {"fundamentos"}
+LIMITE_RELACIONADOS = 12
+
+
+def plegar(texto):
+    """Minúsculas y sin tildes ni diéresis (la ñ queda como n)."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def raiz(palabra):
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= 3:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def _terminos(texto):
+    return [raiz(p) for p in re.findall(r"\w+", plegar(texto)) if p not in STOPWORDS]
+
+
+def _textos(contenido):
+    """``(titulo, claves, cuerpo, resto)`` sin tildes, en el orden de peso A–D."""
+    unir = lambda campos: plegar(" ".join(getattr(contenido, campo) or "" for campo in campos))
+    return plegar(contenido.titulo), unir(CAMPOS_CLAVE), unir(CAMPOS_CUERPO), unir(CAMPOS_RESTO)
+
+
+def actualizar_indice_busqueda(contenidos):
+    """Indexa (o reindexa) ``contenidos``. Devuelve cuántos."""
+    filas = [(c.pk, *_textos(c)) for c in contenidos]
+    if not filas:
+        return 0
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            vector = " || ".join(
+                f"setweight(to_tsvector('{CONFIG_BUSQUEDA}', %s), '{peso}')" for peso in "ABCD"
+            )
+            cursor.executemany(
+                f"INSERT INTO {IndiceBusquedaAcademia._meta.db_table} (contenido_id, vector) VALUES (%s, {vector}) "
+                "ON CONFLICT (contenido_id) DO UPDATE SET vector = EXCLUDED.vector",
+                filas,
+            )
+        elif connection.vendor == "sqlite":
+            cursor.executemany(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [(fila[0],) for fila in filas])
+            cursor.executemany(
+                f"INSERT INTO {TABLA_FTS} (rowid, titulo, claves, cuerpo, resto) VALUES (%s, %s, %s, %s, %s)",
+                [(pk, *(" ".join(_terminos(texto)) for texto in textos)) for pk, *textos in filas],
+            )
+    return len(filas)
+
+
+def quitar_de_indice(pk):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [pk])
+
+
+def contenidos_indexados():
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {TABLA_FTS}")
+            return cursor.fetchone()[0]
+    return IndiceBusquedaAcademia.objects.count()
+
+
+def reconstruir_indice_busqueda(contenidos=None):
+    contenidos = ContenidoAcademia.objects.all() if contenidos is None else contenidos
+    return actualizar_indice_busqueda(contenidos.iterator())
+
+
+def buscar_contenidos(qs, texto):
+    """``qs`` filtrado por ``texto`` y ordenado por relevancia (anotada como ``relevancia``)."""
+    if connection.vendor == "postgresql":
+        consulta = SearchQuery(plegar(texto), config=CONFIG_BUSQUEDA, search_type="websearch")
+        return (
+            qs.filter(indice_busqueda__vector=consulta)
+            .annotate(relevancia=SearchRank(F("indice_busqueda__vector"), consulta))
+            .order_by("-relevancia", "titulo")
+        )
+    if connection.vendor == "sqlite":
+        terminos = _terminos(texto)
+        if not terminos:
+            return qs.none()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, -bm25({TABLA_FTS}, 10.0, 4.0, 2.0, 1.0) FROM {TABLA_FTS} "
+                f"WHERE {TABLA_FTS} MATCH %s ORDER BY 2 DESC LIMIT %s",
+                [" ".join(f'"{t}"*' for t in terminos), LIMITE_BUSQUEDA],
+            )
+            puntajes = dict(cursor.fetchall())
+        if not puntajes:
+            return qs.none()
+        relevancia = Case(*(When(pk=pk, then=Value(p)) for pk, p in puntajes.items()), output_field=FloatField())
+        return qs.filter(pk__in=puntajes).annotate(relevancia=relevancia).order_by("-relevancia", "titulo")
+    return qs.filter(
+        Q(titulo__icontains=texto) | Q(resumen__icontains=texto) | Q(etiquetas__icontains=texto)
+        | Q(contenido__icontains=texto) | Q(procedimiento__icontains=texto) | Q(fallas_frecuentes__icontains=texto)
+    ).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+def temas_diagnostico(resultado):
+    texto = " ".join((resultado.get(campo) or "").lower() for campo in ("tipo_tratamiento", "diagnostico", "resumen"))
+    return [tema for tema, (indicios, _m, _t) in TEMAS_DIAGNOSTICO.items() if any(i in texto for i in indicios)]
+
+
+def clave_relacion(temas):
+    return "+".join(sorted(temas)) or "general"
+
+
+def refrescar_relacionados():
+    """Recalcula ``RelacionAcademiaDiagnostico`` para todas las combinaciones de temas."""
+    contenidos = list(
+        ContenidoAcademia.objects.filter(estado="aprobado").exclude(acceso="suscriptor")
+        .order_by("orden_curso", "orden", "titulo").values_list("pk", "modulo_curso", "titulo", "etiquetas", "resumen")
+    )
+    contenidos = [(pk, modulo, f"{titulo}\n{etiquetas}\n{resumen}".lower()) for pk, modulo, titulo, etiquetas, resumen in contenidos]
+    filas = []
+    for n in range(len(TEMAS_DIAGNOSTICO) + 1):
+        for temas in combinations(TEMAS_DIAGNOSTICO, n):
+            modulos = set(MODULOS_BASE).union(*(TEMAS_DIAGNOSTICO[t][1] for t in temas))
+            terminos = [termino for t in temas for termino in TEMAS_DIAGNOSTICO[t][2]]
+            elegidos = [
+                pk for pk, modulo, texto in contenidos
+                if modulo in modulos or any(termino in texto for termino in terminos)
+            ][:LIMITE_RELACIONADOS]
+            clave = clave_relacion(temas)
+            filas.extend(RelacionAcademiaDiagnostico(clave=clave, contenido_id=pk, orden=i) for i, pk in enumerate(elegidos))
+    with transaction.atomic():
+        RelacionAcademiaDiagnostico.objects.all().delete()
+        RelacionAcademiaDiagnostico.objects.bulk_create(filas, batch_size=500)
+    return len(filas)
+
+
+def relacionados_para_diagnostico(resultado, limite=6):
+    """Contenidos oficiales para ``resultado`` del motor o del diagnóstico técnico (una consulta)."""
+    if not resultado:
+        return []
+    relaciones = (
+        RelacionAcademiaDiagnostico.objects.filter(clave=clave_relacion(temas_diagnostico(resultado)))
+        .select_related("contenido").order_by("orden")[:min(limite, LIMITE_RELACIONADOS)]
+    )
+    return [relacion.contenido for relacion in relaciones]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MotorRecomendacion, CasoAsistenteTecnico, ContenidoAcademia, ImagenContenidoAcademia, VersionContenidoAcademia, ExperienciaConocimiento, PerfilSuscriptor, PiscinaSuscriptor, PlanMantenimientoPiscina, RegistroMantenimientoPiscina
+from .models import MotorRecomendacion, CasoAsistenteTecnico, ContadorResultadoTratamiento, ContenidoAcademia, ImagenContenidoAcademia, VersionContenidoAcademia, ExperienciaConocimiento, PerfilSuscriptor, PiscinaSuscriptor, PlanMantenimientoPiscina, RegistroMantenimientoPiscina
 
 
 @admin.register(MotorRecomendacion)
@@ -16,6 +16,12 @@ class CasoAsistenteTecnicoAdmin(admin.ModelAdmin):
     search_fields = ("user__username", "user__first_name", "user__last_name", "diagnostico")
 
 
+@admin.register(ContadorResultadoTratamiento)
+class ContadorResultadoTratamientoAdmin(admin.ModelAdmin):
+    list_display = ("tipo_tratamiento", "banda_volumen", "estado_agua", "exitosos", "parciales", "fallidos", "actualizado_en")
+    list_filter = ("tipo_tratamiento", "banda_volumen", "estado_agua")
+
+
 @admin.register(ContenidoAcademia)
 class ContenidoAcademiaAdmin(admin.ModelAdmin):
     list_display=("codigo","titulo","tipo","estado","version","actualizado_en")
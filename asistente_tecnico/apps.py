@@ -5,3 +5,10 @@ class AsistenteTecnicoConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "asistente_tecnico"
     verbose_name = "Asistente Técnico Inteligente"
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals
+
+        post_migrate.connect(signals.indexar_despues_de_migrar, sender=self, dispatch_uid="asistente_tecnico_indexar_academia")
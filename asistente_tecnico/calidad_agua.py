@@ -0,0 +1,176 @@
+"""Series de pH y cloro de las piscinas de JVAQUA Digital.
+
+Las lecturas se guardan en ``RegistroMantenimientoPiscina``; además
+``ResumenCalidadAgua`` mantiene, por piscina y parámetro, el mínimo, máximo,
+suma, cantidad y última lectura de cada día y de cada semana (de lunes a
+domingo). Al guardar o borrar un registro solo se recalcula su semana (y sus
+días), leyendo las pocas lecturas de esa semana.
+
+``serie_calidad_agua`` arma la serie para un gráfico eligiendo la fuente según
+el rango: lecturas sueltas en rangos cortos, resúmenes diarios en rangos
+medios y semanales en los largos. Así cualquier rango lee como mucho unos
+cientos de filas por el índice de la piscina. Después reduce la serie con
+LTTB (*Largest-Triangle-Three-Buckets*) a ``puntos``, conservando los picos.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import RegistroMantenimientoPiscina, ResumenCalidadAgua
+
+PARAMETROS = ("ph", "cloro")
+PUNTOS_SERIE = 200
+# Hasta ``puntos`` días se usan lecturas; hasta ``puntos * DIAS_POR_PUNTO_DIARIO``, resúmenes diarios.
+DIAS_POR_PUNTO_DIARIO = 10
+CAMPOS_LECTURA = ("piscina_id", "fecha", "ph", "cloro")
+
+
+def inicio_semana(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def _lecturas(qs):
+    return qs.order_by("piscina_id", "fecha", "creado_en", "pk").values_list(*CAMPOS_LECTURA)
+
+
+def calcular_resumenes(lecturas):
+    """``{(piscina_id, periodo, parametro, inicio): ResumenCalidadAgua}`` sin guardar.
+
+    ``lecturas`` son tuplas ``(piscina_id, fecha, ph, cloro)`` en orden
+    cronológico; la última de cada periodo queda como ``ultimo``.
+    """
+    resumenes = {}
+    for piscina_id, fecha, *valores in lecturas:
+        for parametro, valor in zip(PARAMETROS, valores):
+            if valor is None:
+                continue
+            for periodo, inicio in (("dia", fecha), ("semana", inicio_semana(fecha))):
+                clave = (piscina_id, periodo, parametro, inicio)
+                resumen = resumenes.get(clave)
+                if resumen is None:
+                    resumenes[clave] = ResumenCalidadAgua(
+                        piscina_id=piscina_id, periodo=periodo, parametro=parametro, inicio=inicio,
+                        minimo=valor, maximo=valor, suma=valor, cantidad=1, ultimo=valor,
+                    )
+                else:
+                    resumen.minimo = min(resumen.minimo, valor)
+                    resumen.maximo = max(resumen.maximo, valor)
+                    resumen.suma += valor
+                    resumen.cantidad += 1
+                    resumen.ultimo = valor
+    return resumenes
+
+
+def _guardar(resumenes):
+    ResumenCalidadAgua.objects.bulk_create(
+        resumenes, batch_size=500, update_conflicts=True, unique_fields=["piscina", "periodo", "parametro", "inicio"],
+        update_fields=["minimo", "maximo", "suma", "cantidad", "ultimo"],
+    )
+
+
+def actualizar_resumenes_calidad(piscina_id, fechas):
+    """Recalcula las semanas (y sus días) de ``fechas`` para la piscina."""
+    semanas = {inicio_semana(fecha) for fecha in fechas if fecha}
+    if not semanas:
+        return
+    en_semanas = Q()
+    for semana in semanas:
+        en_semanas |= Q(fecha__range=(semana, semana + timedelta(days=6)))
+    resumenes = calcular_resumenes(_lecturas(RegistroMantenimientoPiscina.objects.filter(en_semanas, piscina_id=piscina_id)))
+    with transaction.atomic():
+        existentes = ResumenCalidadAgua.objects.filter(piscina_id=piscina_id).filter(
+            Q(periodo="semana", inicio__in=semanas)
+            | Q(periodo="dia", inicio__in=[semana + timedelta(days=n) for semana in semanas for n in range(7)])
+        )
+        sobrantes = [
+            pk for pk, *clave in existentes.values_list("pk", "piscina_id", "periodo", "parametro", "inicio")
+            if tuple(clave) not in resumenes
+        ]
+        if sobrantes:
+            ResumenCalidadAgua.objects.filter(pk__in=sobrantes).delete()
+        _guardar(resumenes.values())
+
+
+def reconstruir_resumenes_calidad(piscinas=None):
+    """Vuelve a calcular los resúmenes desde las lecturas; sin ``piscinas``, de todas. Devuelve cuántos guardó."""
+    registros = RegistroMantenimientoPiscina.objects.all()
+    resumenes = ResumenCalidadAgua.objects.all()
+    if piscinas is not None:
+        registros = registros.filter(piscina__in=piscinas)
+        resumenes = resumenes.filter(piscina__in=piscinas)
+    guardados = 0
+    with transaction.atomic():
+        resumenes.delete()
+        # Las lecturas llegan ordenadas por piscina: se guarda piscina por piscina.
+        for _piscina_id, lecturas in groupby(_lecturas(registros).iterator(chunk_size=2000), key=itemgetter(0)):
+            calculados = calcular_resumenes(lecturas)
+            _guardar(calculados.values())
+            guardados += len(calculados)
+    return guardados
+
+
+def lttb(datos, umbral, x=itemgetter(0), y=itemgetter(1)):
+    """Reduce ``datos`` (ordenados por ``x``) a ``umbral`` puntos con Largest-Triangle-Three-Buckets.
+
+    Conserva el primero y el último, y de cada tramo intermedio el punto que
+    forma el triángulo de mayor área con el elegido antes y el promedio del
+    tramo siguiente.
+    """
+    datos = list(datos)
+    if umbral >= len(datos) or umbral < 3:
+        return datos
+    elegidos = [datos[0]]
+    tamano = (len(datos) - 2) / (umbral - 2)
+    anterior = 0
+    for i in range(umbral - 2):
+        siguiente = datos[int((i + 1) * tamano) + 1:min(int((i + 2) * tamano) + 1, len(datos))]
+        x_promedio = sum(x(p) for p in siguiente) / len(siguiente)
+        y_promedio = sum(y(p) for p in siguiente) / len(siguiente)
+        ax, ay = x(datos[anterior]), y(datos[anterior])
+        mejor, area_mayor = None, -1
+        for j in range(int(i * tamano) + 1, int((i + 1) * tamano) + 1):
+            area = abs((ax - x_promedio) * (y(datos[j]) - ay) - (ax - x(datos[j])) * (y_promedio - ay))
+            if area > area_mayor:
+                mejor, area_mayor = j, area
+        elegidos.append(datos[mejor])
+        anterior = mejor
+    elegidos.append(datos[-1])
+    return elegidos
+
+
+def serie_calidad_agua(piscina, parametro, desde, hasta, puntos=PUNTOS_SERIE):
+    """Serie lista para graficar entre ``desde`` y ``hasta`` (una consulta).
+
+    Devuelve ``{"parametro", "resolucion", "desde", "hasta", "puntos"}``; cada
+    punto tiene ``fecha`` y ``valor`` (el promedio en los resúmenes, que
+    además traen ``minimo``, ``maximo``, ``ultimo`` y ``lecturas``).
+    """
+    if parametro not in PARAMETROS:
+        raise ValueError(f"Parámetro desconocido: {parametro}")
+    dias = (hasta - desde).days + 1
+    if dias <= puntos:
+        resolucion = "lectura"
+        filas = RegistroMantenimientoPiscina.objects.filter(
+            piscina=piscina, fecha__range=(desde, hasta), **{f"{parametro}__isnull": False},
+        ).order_by("fecha", "creado_en", "pk").values_list("fecha", parametro)
+        serie = [{"fecha": fecha.isoformat(), "valor": float(valor), "_x": fecha.toordinal()} for fecha, valor in filas]
+    else:
+        resolucion = "dia" if dias <= puntos * DIAS_POR_PUNTO_DIARIO else "semana"
+        filas = ResumenCalidadAgua.objects.filter(
+            piscina=piscina, periodo=resolucion, parametro=parametro,
+            inicio__range=(desde if resolucion == "dia" else inicio_semana(desde), hasta),
+        ).order_by("inicio")
+        serie = [
+            {
+                "fecha": r.inicio.isoformat(), "valor": round(float(r.promedio), 2), "minimo": float(r.minimo),
+                "maximo": float(r.maximo), "ultimo": float(r.ultimo), "lecturas": r.cantidad, "_x": r.inicio.toordinal(),
+            }
+            for r in filas
+        ]
+    serie = lttb(serie, puntos, x=itemgetter("_x"), y=itemgetter("valor"))
+    for punto in serie:
+        del punto["_x"]
+    return {"parametro": parametro, "resolucion": resolucion, "desde": desde.isoformat(), "hasta": hasta.isoformat(), "puntos": serie}
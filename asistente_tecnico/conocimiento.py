@@ -0,0 +1,177 @@
+"""Evidencia del Motor de Conocimiento a partir de los seguimientos.
+
+``registrar_resultado`` ajusta ``ContadorResultadoTratamiento`` cada vez que se
+responde (o se corrige) un seguimiento, por tipo de tratamiento, rango de
+volumen y estado del agua. ``analizar_motor_conocimiento`` solo lee esos
+contadores, unas pocas filas por protocolo sin importar cuántos casos haya, y
+guarda las propuestas con un único ``bulk_create``.
+
+Las tasas de éxito se acompañan del intervalo de Wilson al 95 %: un protocolo
+se marca de alta efectividad o para revisión solo cuando el intervalo completo
+queda de un lado del umbral, así pocos casos no parecen concluyentes.
+"""
+from collections import defaultdict
+from math import sqrt
+
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import CasoAsistenteTecnico, ContadorResultadoTratamiento, PropuestaConocimiento
+
+CAMPO_RESULTADO = {"exitoso": "exitosos", "parcial": "parciales", "fallido": "fallidos"}
+MINIMO_CASOS = 5
+Z_95 = 1.96
+# Alta efectividad si el límite inferior del intervalo alcanza UMBRAL_ALTA;
+# revisión si el límite superior queda por debajo de UMBRAL_REVISION.
+UMBRAL_ALTA = 0.80
+UMBRAL_REVISION = 0.70
+LIMITES_BANDA = ((25, "hasta_25"), (50, "25_50"), (100, "50_100"))
+
+
+def banda_volumen(volumen):
+    volumen = float(volumen)
+    for limite, banda in LIMITES_BANDA:
+        if volumen <= limite:
+            return banda
+    return "mas_100"
+
+
+def intervalo_wilson(exitos, total, z=Z_95):
+    """Intervalo de confianza de Wilson ``(inferior, superior)`` para ``exitos / total``."""
+    if not total:
+        return 0.0, 1.0
+    p = exitos / total
+    denominador = 1 + z * z / total
+    centro = (p + z * z / (2 * total)) / denominador
+    margen = z * sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominador
+    return max(0.0, centro - margen), min(1.0, centro + margen)
+
+
+def _clave(caso):
+    return {
+        "tipo_tratamiento": caso.tipo_tratamiento or "sin_tipo",
+        "banda_volumen": banda_volumen(caso.volumen_m3),
+        "estado_agua": caso.estado_agua,
+    }
+
+
+def registrar_resultado(caso, anterior="pendiente"):
+    """Pasa el caso del contador de ``anterior`` al de ``caso.resultado`` (dos consultas)."""
+    if anterior == caso.resultado:
+        return
+    cambios = {}
+    if anterior in CAMPO_RESULTADO:
+        campo = CAMPO_RESULTADO[anterior]
+        cambios[campo] = Greatest(F(campo) - 1, 0)
+    if caso.resultado in CAMPO_RESULTADO:
+        campo = CAMPO_RESULTADO[caso.resultado]
+        cambios[campo] = F(campo) + 1
+    clave = _clave(caso)
+    ContadorResultadoTratamiento.objects.bulk_create([ContadorResultadoTratamiento(**clave)], ignore_conflicts=True)
+    ContadorResultadoTratamiento.objects.filter(**clave).update(**cambios, actualizado_en=timezone.now())
+
+
+def reconstruir_contadores():
+    """Vuelve a contar todos los seguimientos respondidos; corrige contadores desfasados."""
+    banda = Case(
+        *(When(volumen_m3__lte=limite, then=Value(nombre)) for limite, nombre in LIMITES_BANDA),
+        default=Value("mas_100"), output_field=CharField(),
+    )
+    filas = (
+        CasoAsistenteTecnico.objects.exclude(resultado="pendiente").annotate(banda=banda)
+        .values("tipo_tratamiento", "banda", "estado_agua")
+        .annotate(**{campo: Count("pk", filter=Q(resultado=resultado)) for resultado, campo in CAMPO_RESULTADO.items()})
+        .order_by()
+    )
+    contadores = {}
+    for fila in filas:
+        clave = (fila["tipo_tratamiento"] or "sin_tipo", fila["banda"], fila["estado_agua"])
+        contador = contadores.setdefault(clave, ContadorResultadoTratamiento(
+            tipo_tratamiento=clave[0], banda_volumen=clave[1], estado_agua=clave[2],
+        ))
+        for campo in CAMPO_RESULTADO.values():
+            setattr(contador, campo, getattr(contador, campo) + fila[campo])
+    ContadorResultadoTratamiento.objects.all().delete()
+    ContadorResultadoTratamiento.objects.bulk_create(contadores.values(), batch_size=500)
+    return len(contadores)
+
+
+def _evidencia(exitosos, parciales, fallidos):
+    total = exitosos + parciales + fallidos
+    inferior, superior = intervalo_wilson(exitosos, total)
+    return {
+        "total": total, "exitosos": exitosos, "parciales": parciales, "fallidos": fallidos,
+        "tasa_exito": round(exitosos / total * 100, 1) if total else 0,
+        "intervalo_inferior": round(inferior * 100, 1), "intervalo_superior": round(superior * 100, 1),
+    }
+
+
+def _texto_intervalo(evidencia):
+    return (
+        f"{evidencia['tasa_exito']}% de éxito (intervalo de confianza del 95 %: "
+        f"{evidencia['intervalo_inferior']}–{evidencia['intervalo_superior']} %)"
+    )
+
+
+def _propuesta_protocolo(tipo, evidencia):
+    total, tasa = evidencia["total"], _texto_intervalo(evidencia)
+    if evidencia["intervalo_inferior"] >= UMBRAL_ALTA * 100:
+        titulo = f"Protocolo {tipo}: patrón de alta efectividad"
+        descripcion = f"En {total} seguimientos respondidos, el protocolo obtuvo {tasa}. Conviene conservar esta referencia y revisar qué condiciones se repiten en los casos exitosos."
+    elif evidencia["intervalo_superior"] < UMBRAL_REVISION * 100:
+        titulo = f"Revisar protocolo {tipo}"
+        descripcion = f"En {total} seguimientos respondidos, el protocolo obtuvo {tasa}. Conviene revisar los casos parciales y fallidos antes de modificar el protocolo oficial."
+    else:
+        titulo = f"Protocolo {tipo}: evidencia en evaluación"
+        descripcion = f"Hay {total} casos respondidos con {tasa}. Aún conviene acumular y revisar más evidencia antes de cambiar reglas oficiales."
+    return PropuestaConocimiento(fuente_clave=f"protocolo:{tipo}", titulo=titulo, descripcion=descripcion, evidencia=evidencia)
+
+
+def _propuesta_segmento(tipo, contador, evidencia):
+    condicion = f"{contador.get_estado_agua_display().lower()}, {contador.get_banda_volumen_display()}"
+    return PropuestaConocimiento(
+        fuente_clave=f"protocolo:{tipo}:{contador.estado_agua}:{contador.banda_volumen}",
+        titulo=f"Revisar protocolo {tipo} con agua {condicion}",
+        descripcion=(
+            f"En {evidencia['total']} seguimientos de piscinas con agua {condicion}, el protocolo obtuvo "
+            f"{_texto_intervalo(evidencia)}. Conviene revisar si estas condiciones necesitan una regla propia."
+        ),
+        evidencia=evidencia,
+    )
+
+
+def analizar_motor_conocimiento():
+    """Propuestas por protocolo y por condiciones con bajo éxito; devuelve las analizadas.
+
+    Solo se actualizan las propuestas nuevas o en evaluación: las aprobadas y
+    descartadas conservan el texto que se revisó.
+    """
+    por_tipo = defaultdict(list)
+    for contador in ContadorResultadoTratamiento.objects.all():
+        por_tipo[contador.tipo_tratamiento].append(contador)
+
+    propuestas = []
+    for tipo, contadores in sorted(por_tipo.items()):
+        segmentos = []
+        for contador in contadores:
+            if not contador.total:
+                continue
+            evidencia = _evidencia(contador.exitosos, contador.parciales, contador.fallidos)
+            segmentos.append({"banda_volumen": contador.banda_volumen, "estado_agua": contador.estado_agua, **evidencia})
+            if evidencia["total"] >= MINIMO_CASOS and evidencia["intervalo_superior"] < UMBRAL_REVISION * 100:
+                propuestas.append(_propuesta_segmento(tipo, contador, {"tipo_tratamiento": tipo, **segmentos[-1]}))
+        evidencia = _evidencia(*(sum(getattr(c, campo) for c in contadores) for campo in CAMPO_RESULTADO.values()))
+        if evidencia["total"] < MINIMO_CASOS:
+            continue
+        propuestas.append(_propuesta_protocolo(tipo, {"tipo_tratamiento": tipo, **evidencia, "segmentos": segmentos}))
+
+    revisadas = set(
+        PropuestaConocimiento.objects.filter(fuente_clave__in=[p.fuente_clave for p in propuestas])
+        .exclude(estado="evaluacion").values_list("fuente_clave", flat=True)
+    )
+    PropuestaConocimiento.objects.bulk_create(
+        [p for p in propuestas if p.fuente_clave not in revisadas], batch_size=500,
+        update_conflicts=True, unique_fields=["fuente_clave"], update_fields=["titulo", "descripcion", "evidencia", "actualizado_en"],
+    )
+    return propuestas
@@ -0,0 +1,123 @@
+"""Estructura del curso de la Academia y progreso de cada usuario.
+
+``estructura_curso`` guarda en caché, por audiencia (``interno``,
+``suscriptor`` y ``admin``), los ids del curso en el orden de los módulos;
+``estructura_lecciones`` hace lo mismo con las lecciones publicadas. Las
+señales del CMS las invalidan al guardar o borrar contenido, lecciones o
+categorías. Como la caché por defecto es local a cada proceso, los demás
+procesos toman los cambios al vencer ``SEGUNDOS_ESTRUCTURA``.
+
+``ResumenProgresoAcademia`` guarda los ids que completó cada usuario y se
+actualiza cuando cambia su progreso, así las páginas de la Academia muestran
+el avance con una sola consulta (el resumen) cruzándolo con la estructura.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import (
+    ContenidoAcademia, LeccionAcademia, ProgresoContenidoAcademia, ProgresoLeccion, ResumenProgresoAcademia,
+)
+
+AUDIENCIAS = ("interno", "suscriptor", "admin")
+CLAVE_ESTRUCTURA = "asistente_tecnico:curso:{}"
+CLAVE_LECCIONES = "asistente_tecnico:curso:lecciones"
+SEGUNDOS_ESTRUCTURA = 300
+RANGO_MODULO = {codigo: i for i, (codigo, _nombre) in enumerate(ContenidoAcademia.MODULOS_CURSO)}
+
+
+def contenidos_visibles(audiencia):
+    """Contenido aprobado que ve ``audiencia`` (la Academia completa, no solo el curso)."""
+    visibles = ContenidoAcademia.objects.filter(estado="aprobado")
+    if audiencia == "suscriptor":
+        return visibles.exclude(acceso="interno")
+    if audiencia == "interno":
+        return visibles.exclude(acceso="suscriptor")
+    return visibles
+
+
+def estructura_curso(audiencia):
+    """``[(pk, modulo_curso), ...]`` del curso de ``audiencia`` en orden de estudio."""
+    clave = CLAVE_ESTRUCTURA.format(audiencia)
+    estructura = cache.get(clave)
+    if estructura is None:
+        filas = contenidos_visibles(audiencia).exclude(modulo_curso="").values_list(
+            "pk", "modulo_curso", "orden_curso", "orden", "titulo",
+        )
+        filas = sorted(filas, key=lambda x: (RANGO_MODULO.get(x[1], 999), x[2], x[3], x[4].lower()))
+        estructura = [(pk, modulo) for pk, modulo, *_resto in filas]
+        cache.set(clave, estructura, SEGUNDOS_ESTRUCTURA)
+    return estructura
+
+
+def estructura_lecciones():
+    """``[(pk, categoria_id), ...]`` de las lecciones publicadas en categorías activas."""
+    estructura = cache.get(CLAVE_LECCIONES)
+    if estructura is None:
+        estructura = list(
+            LeccionAcademia.objects.filter(publicada=True, categoria__activa=True).values_list("pk", "categoria_id")
+        )
+        cache.set(CLAVE_LECCIONES, estructura, SEGUNDOS_ESTRUCTURA)
+    return estructura
+
+
+def invalidar_estructura():
+    cache.delete_many([*(CLAVE_ESTRUCTURA.format(a) for a in AUDIENCIAS), CLAVE_LECCIONES])
+
+
+def resumen_progreso(user):
+    """Resumen de ``user`` (una consulta); sin progreso devuelve uno vacío sin guardarlo."""
+    return ResumenProgresoAcademia.objects.filter(user=user).first() or ResumenProgresoAcademia(user=user)
+
+
+def actualizar_resumen_progreso(user_id, crear=True):
+    """Vuelve a leer el progreso de ``user_id`` y guarda su resumen.
+
+    Con ``crear=False`` solo actualiza un resumen existente (al borrar progreso,
+    por ejemplo en cascada al eliminar el usuario).
+    """
+    ids = {
+        "contenidos": list(
+            ProgresoContenidoAcademia.objects.filter(user_id=user_id, completado=True)
+            .order_by("contenido_id").values_list("contenido_id", flat=True)
+        ),
+        "lecciones": list(
+            ProgresoLeccion.objects.filter(user_id=user_id, completada=True)
+            .order_by("leccion_id").values_list("leccion_id", flat=True)
+        ),
+    }
+    if crear:
+        ResumenProgresoAcademia.objects.update_or_create(user_id=user_id, defaults=ids)
+    else:
+        ResumenProgresoAcademia.objects.filter(user_id=user_id).update(**ids, actualizado_en=timezone.now())
+
+
+def _porcentaje(hechos, total):
+    return round((hechos / total) * 100) if total else 0
+
+
+def progreso_curso(audiencia, resumen):
+    """Avance del curso de ``audiencia``.
+
+    Devuelve ``{"total", "completadas", "porcentaje", "completadas_ids", "continuar_id"}``;
+    ``continuar_id`` es el primer contenido pendiente en orden de estudio.
+    """
+    completadas_ids = set(resumen.contenidos)
+    estructura = estructura_curso(audiencia)
+    completadas = sum(1 for pk, _modulo in estructura if pk in completadas_ids)
+    return {
+        "total": len(estructura), "completadas": completadas,
+        "porcentaje": _porcentaje(completadas, len(estructura)), "completadas_ids": completadas_ids,
+        "continuar_id": next((pk for pk, _modulo in estructura if pk not in completadas_ids), None),
+    }
+
+
+def progreso_lecciones(resumen):
+    """``(total, completadas, porcentaje, {categoria_id: (total, completadas)})`` de las lecciones."""
+    completadas_ids = set(resumen.lecciones)
+    por_categoria = {}
+    for pk, categoria_id in estructura_lecciones():
+        total, hechas = por_categoria.get(categoria_id, (0, 0))
+        por_categoria[categoria_id] = (total + 1, hechas + (pk in completadas_ids))
+    total = sum(t for t, _h in por_categoria.values())
+    completadas = sum(h for _t, h in por_categoria.values())
+    return total, completadas, _porcentaje(completadas, total), por_categoria
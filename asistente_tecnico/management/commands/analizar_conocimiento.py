@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from asistente_tecnico.conocimiento import analizar_motor_conocimiento, reconstruir_contadores
+
+
+class Command(BaseCommand):
+    help = "Actualiza las propuestas del Motor de Conocimiento con los contadores de seguimientos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reconstruir", action="store_true", help="Vuelve a contar todos los casos antes de analizar.")
+
+    def handle(self, *args, **options):
+        if options["reconstruir"]:
+            filas = reconstruir_contadores()
+            self.stdout.write(f"Contadores reconstruidos: {filas} combinaciones.")
+        propuestas = analizar_motor_conocimiento()
+        self.stdout.write(self.style.SUCCESS(f"Propuestas analizadas: {len(propuestas)}."))
@@ -0,0 +1,85 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from asistente_tecnico.engine import compilar_reglas
+from asistente_tecnico.models import CasoAsistenteTecnico, MotorRecomendacion
+from asistente_tecnico.rendimiento import (
+    REFERENCIA_RENDIMIENTO, TOLERANCIA_RENDIMIENTO, cargar_referencia, comparar_rendimiento, guardar_referencia, medir_rendimiento,
+)
+from asistente_tecnico.services import invalidar_motor_activo, motor_activo, reglas_motor
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia por diagnóstico del motor de recomendación (sin caché y compilado), el ritmo por lote "
+        "y el ritmo de cada ruta frente a una calibración, comparándolo con la referencia guardada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iteraciones", type=int, default=2000, help="Diagnósticos por medición.")
+        parser.add_argument("--lote", type=int, default=10000, help="Lecturas del lote a medir (0 para omitirlo).")
+        parser.add_argument("--semilla", type=int, default=1, help="Semilla de las lecturas aleatorias.")
+        parser.add_argument("--referencia", default=str(REFERENCIA_RENDIMIENTO), help="Archivo JSON con el ritmo relativo de referencia.")
+        parser.add_argument("--actualizar-referencia", action="store_true", help="Guarda esta medición como nueva referencia.")
+
+    def handle(self, *args, **options):
+        if options["iteraciones"] < 1:
+            raise CommandError("--iteraciones debe ser mayor que cero.")
+        if options["lote"] < 0:
+            raise CommandError("--lote no puede ser negativo.")
+        azar = random.Random(options["semilla"])
+        estados = [x[0] for x in CasoAsistenteTecnico.ESTADO_AGUA_CHOICES]
+        tipos = [x[0] for x in CasoAsistenteTecnico.TIPO_PISCINA_CHOICES]
+        lecturas = [
+            (round(azar.uniform(5, 400), 2), round(azar.uniform(6.0, 9.0), 2), round(azar.uniform(0, 6), 2), azar.choice(estados), azar.choice(tipos))
+            for _ in range(max(options["iteraciones"], options["lote"]))
+        ]
+        motor_activo()
+
+        def sin_cache(lectura):
+            # Lo que hacía cada diagnóstico: leer el motor activo y evaluar sus reglas desde el JSON.
+            motor = MotorRecomendacion.objects.filter(activo=True).order_by("-creado_en").first()
+            return compilar_reglas(motor.reglas).recomendar(*lectura)
+
+        def con_cache(lectura):
+            return reglas_motor(motor_activo()).recomendar(*lectura)
+
+        invalidar_motor_activo()
+        resultados = {}
+        for nombre, funcion in (("sin caché", sin_cache), ("compilado en caché", con_cache)):
+            inicio = time.perf_counter()
+            for lectura in lecturas[:options["iteraciones"]]:
+                funcion(lectura)
+            resultados[nombre] = (time.perf_counter() - inicio) / options["iteraciones"] * 1_000_000
+            self.stdout.write(f"{nombre}: {resultados[nombre]:.1f} µs por diagnóstico")
+        if options["lote"]:
+            columnas = [list(columna) for columna in zip(*lecturas[:options["lote"]])]
+            compiladas = reglas_motor(motor_activo())
+            inicio = time.perf_counter()
+            compiladas.recomendar_lote(*columnas)
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(f"lote de {options['lote']}: {options['lote'] / segundos:,.0f} lecturas/s")
+        self.stdout.write(self.style.SUCCESS(
+            f"Motor {motor_activo().version}: {resultados['sin caché'] / resultados['compilado en caché']:.1f}x más rápido con caché."
+        ))
+
+        medicion = medir_rendimiento(semilla=options["semilla"])
+        referencia = cargar_referencia(options["referencia"])
+        self.stdout.write("Ritmo por ruta en proporción a la calibración:")
+        for ruta, ritmo in medicion.items():
+            antes = f" (referencia {referencia[ruta]:.2f})" if referencia and ruta in referencia else ""
+            self.stdout.write(f"  {ruta}: {ritmo:.2f}{antes}")
+        if options["actualizar_referencia"]:
+            guardar_referencia(medicion, options["referencia"])
+            self.stdout.write(self.style.SUCCESS(f"Referencia guardada en {options['referencia']}"))
+            return
+        if referencia is None:
+            self.stdout.write(self.style.WARNING("No hay referencia guardada; usa --actualizar-referencia para crearla."))
+            return
+        regresiones = comparar_rendimiento(medicion, referencia)
+        if regresiones:
+            detalle = "; ".join(f"{ruta} {antes:.2f} -> {ahora:.2f} (-{caida:.0%})" for ruta, antes, ahora, caida in regresiones)
+            raise CommandError(f"Rutas más lentas que la referencia (tolerancia {TOLERANCIA_RENDIMIENTO:.0%}): {detalle}")
+        self.stdout.write(self.style.SUCCESS("Sin regresiones de rendimiento frente a la referencia."))
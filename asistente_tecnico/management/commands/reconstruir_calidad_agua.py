@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from asistente_tecnico.calidad_agua import reconstruir_resumenes_calidad
+from asistente_tecnico.models import PiscinaSuscriptor
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes diarios y semanales de pH y cloro desde los registros de mantenimiento."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--piscina", type=int, action="append", help="Solo esta piscina (se puede repetir).")
+
+    def handle(self, *args, **options):
+        piscinas = PiscinaSuscriptor.objects.filter(pk__in=options["piscina"]) if options["piscina"] else None
+        guardados = reconstruir_resumenes_calidad(piscinas)
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes de calidad del agua guardados: {guardados}."))
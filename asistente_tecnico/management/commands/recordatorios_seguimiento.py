@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from asistente_tecnico.services import LOTE_RECORDATORIOS, generar_recordatorios_seguimiento
+
+
+class Command(BaseCommand):
+    help = "Crea los recordatorios de seguimiento vencidos del Asistente Técnico y deja sus push en cola."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=LOTE_RECORDATORIOS, help="Casos por transacción.")
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser mayor que cero.")
+        creados = generar_recordatorios_seguimiento(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"Recordatorios creados: {creados}"))
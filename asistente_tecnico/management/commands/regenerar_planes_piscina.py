@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from asistente_tecnico.planes import LOTE_PLANES, regenerar_planes
+
+
+class Command(BaseCommand):
+    help = "Regenera los planes de mantenimiento de todas las piscinas activas de JVAQUA Digital."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Calcula y muestra los cambios sin guardarlos.")
+        parser.add_argument("--lote", type=int, default=LOTE_PLANES, help="Piscinas por lote.")
+        parser.add_argument("--piscina", type=int, action="append", help="Solo esta piscina (se puede repetir).")
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("--lote debe ser mayor que cero.")
+        inicio = time.perf_counter()
+        resultado = regenerar_planes(options["piscina"], dry_run=options["dry_run"], lote=options["lote"])
+        total = time.perf_counter() - inicio
+        prefijo = "Simulación: " if options["dry_run"] else ""
+        self.stdout.write(
+            f"{prefijo}{resultado['piscinas']} piscinas · {resultado['creados']} planes nuevos · "
+            f"{resultado['actualizados']} actualizados · {resultado['sin_cambios']} sin cambios."
+        )
+        self.stdout.write(
+            f"Tiempo: cálculo {resultado['segundos_calculo']:.2f} s · escritura {resultado['segundos_escritura']:.2f} s · "
+            f"total {total:.2f} s ({resultado['piscinas'] / total if total else 0:.0f} piscinas/s)."
+        )
+        self.stdout.write(self.style.SUCCESS("Planes simulados." if options["dry_run"] else "Planes regenerados."))
@@ -0,0 +1,151 @@
+"""PDF oficiales de la Academia (artículo, tipo y manual completo).
+
+Cada PDF se identifica por una huella de la versión de su contenido: el id,
+la última edición y la versión de cada artículo incluido, en orden. El
+archivo se genera una sola vez por huella, se guarda en el almacenamiento de
+reportes y se descarga desde ahí con esa huella como ``ETag``; un navegador
+que ya tiene la versión vigente recibe ``304`` sin leer el archivo. Al
+guardarse una versión nueva se borran las anteriores del mismo documento.
+
+El manual y los PDF por tipo incluyen un índice con la página de cada
+artículo, que se vuelve a calcular cada vez que se genera el documento.
+"""
+import hashlib
+import html
+import logging
+import re
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+
+from dashboard.models import almacenamiento_reportes
+
+logger = logging.getLogger(__name__)
+
+CARPETA_PDF = "academia/pdf"
+# Cambiarlo obliga a regenerar todos los PDF (por ejemplo al modificar el diseño).
+FORMATO_PDF = "2"
+
+
+def huella_pdf(nombre, contenidos):
+    """SHA-256 del documento ``nombre`` con la versión de cada contenido (una consulta)."""
+    partes = [FORMATO_PDF, nombre]
+    partes += [f"{pk}:{actualizado.isoformat()}:{version}" for pk, actualizado, version in contenidos.values_list("pk", "actualizado_en", "version")]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+def _estilos():
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name="JTitle", parent=styles["Title"], alignment=TA_CENTER, textColor="#0A5AA8", spaceAfter=12))
+    styles.add(ParagraphStyle(name="JH", parent=styles["Heading2"], textColor="#0A5AA8", spaceBefore=10, spaceAfter=6))
+    styles.add(ParagraphStyle(name="JIndice", parent=styles["Normal"], fontSize=10, leading=14, leftIndent=10))
+    return styles
+
+
+def _texto(texto):
+    return html.escape(texto or "").replace("\n", "<br/>")
+
+
+def _contenido_story(obj, styles):
+    from reportlab.platypus import Paragraph, Spacer
+    story = [Paragraph("JVAQUA · Manual Técnico Oficial", styles["JTitle"]), Paragraph(_texto(obj.titulo), styles["Heading1"])]
+    story += [Paragraph(f"{obj.get_tipo_display()} · Nivel {obj.get_nivel_display()} · Versión {obj.version}", styles["Normal"]), Spacer(1, 10)]
+    if obj.resumen:
+        story += [Paragraph(_texto(obj.resumen), styles["Italic"]), Spacer(1, 8)]
+    secciones = [
+        ("Introducción", obj.introduccion), ("Contenido", obj.contenido), ("Procedimiento", obj.procedimiento),
+        ("Herramientas / materiales", obj.herramientas_materiales), ("Funcionamiento", obj.funcionamiento),
+        ("Componentes", obj.componentes), ("Mantenimiento", obj.mantenimiento), ("Fallas frecuentes", obj.fallas_frecuentes),
+        ("Buenas prácticas", obj.buenas_practicas), ("Errores comunes", obj.errores_comunes),
+        ("Recomendaciones JVAQUA", obj.recomendaciones_jvaqua), ("Referencias técnicas", obj.referencias_tecnicas),
+    ]
+    for titulo, texto in secciones:
+        if texto:
+            story += [Paragraph(titulo, styles["JH"]), Paragraph(_texto(texto), styles["BodyText"]), Spacer(1, 6)]
+    return story
+
+
+def generar_pdf(contenidos):
+    """Bytes del PDF con ``contenidos``; con más de uno agrega portada e índice."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate
+    from reportlab.platypus.tableofcontents import TableOfContents
+
+    class Documento(SimpleDocTemplate):
+        def afterFlowable(self, flowable):
+            # Cada artículo abre con un Heading1: esa es la entrada del índice.
+            if isinstance(flowable, Paragraph) and flowable.style.name == "Heading1":
+                self.notify("TOCEntry", (0, flowable.getPlainText(), self.page))
+
+    objs = list(contenidos)
+    buf = BytesIO()
+    doc = Documento(buf, pagesize=A4, rightMargin=16 * mm, leftMargin=16 * mm, topMargin=16 * mm, bottomMargin=16 * mm)
+    styles = _estilos()
+    story = []
+    if len(objs) > 1:
+        edicion = max(obj.actualizado_en for obj in objs)
+        indice = TableOfContents(levelStyles=[styles["JIndice"]], dotsMinLevel=0)
+        story += [
+            Paragraph("JVAQUA", styles["JTitle"]), Paragraph("Manual Técnico Oficial", styles["Title"]),
+            Paragraph(f"Contenido aprobado · {edicion:%d/%m/%Y}", styles["Normal"]), PageBreak(),
+            Paragraph("Índice", styles["JTitle"]), indice, PageBreak(),
+        ]
+    for i, obj in enumerate(objs):
+        if i:
+            story.append(PageBreak())
+        story.extend(_contenido_story(obj, styles))
+    if len(objs) > 1:
+        doc.multiBuild(story)
+    else:
+        doc.build(story)
+    return buf.getvalue()
+
+
+def _ruta(nombre, huella):
+    return f"{CARPETA_PDF}/{PurePosixPath(nombre).stem}_{huella[:20]}.pdf"
+
+
+def _borrar_versiones_anteriores(almacenamiento, nombre, vigente):
+    version = re.compile(rf"{re.escape(PurePosixPath(nombre).stem)}_[0-9a-f]{{20}}\.pdf")
+    try:
+        _carpetas, archivos = almacenamiento.listdir(CARPETA_PDF)
+    except (NotImplementedError, OSError):
+        return
+    for archivo in archivos:
+        ruta = f"{CARPETA_PDF}/{archivo}"
+        if ruta != vigente and version.fullmatch(archivo):
+            try:
+                almacenamiento.delete(ruta)
+            except Exception:
+                logger.exception("No se pudo borrar el PDF anterior %s", ruta)
+
+
+def obtener_pdf(nombre, contenidos, huella=None):
+    """``(huella, ruta)`` del PDF guardado; lo genera si esa versión todavía no existe."""
+    huella = huella or huella_pdf(nombre, contenidos)
+    almacenamiento = almacenamiento_reportes()
+    ruta = _ruta(nombre, huella)
+    if not almacenamiento.exists(ruta):
+        ruta = almacenamiento.save(ruta, ContentFile(generar_pdf(contenidos)))
+        _borrar_versiones_anteriores(almacenamiento, nombre, ruta)
+    return huella, ruta
+
+
+def responder_pdf(request, nombre, contenidos):
+    """Descarga ``nombre`` con ``ETag``; ``304`` si el navegador ya tiene esta versión."""
+    huella = huella_pdf(nombre, contenidos)
+    etag = f'"{huella}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+    _huella, ruta = obtener_pdf(nombre, contenidos, huella)
+    response = FileResponse(almacenamiento_reportes().open(ruta, "rb"), as_attachment=True, filename=nombre, content_type="application/pdf")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
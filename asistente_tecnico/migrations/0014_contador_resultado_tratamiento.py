@@ -0,0 +1,50 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:49
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def cargar_contadores(apps, schema_editor):
+    Caso = apps.get_model('asistente_tecnico', 'CasoAsistenteTecnico')
+    Contador = apps.get_model('asistente_tecnico', 'ContadorResultadoTratamiento')
+    conteo = Counter()
+    for tipo, volumen, estado, resultado in Caso.objects.exclude(resultado='pendiente').values_list('tipo_tratamiento', 'volumen_m3', 'estado_agua', 'resultado').iterator():
+        v = float(volumen)
+        banda = 'hasta_25' if v <= 25 else '25_50' if v <= 50 else '50_100' if v <= 100 else 'mas_100'
+        conteo[(tipo or 'sin_tipo', banda, estado, resultado)] += 1
+    filas = {}
+    for (tipo, banda, estado, resultado), n in conteo.items():
+        fila = filas.setdefault((tipo, banda, estado), Contador(tipo_tratamiento=tipo, banda_volumen=banda, estado_agua=estado))
+        setattr(fila, {'exitoso': 'exitosos', 'parcial': 'parciales', 'fallido': 'fallidos'}[resultado], n)
+    Contador.objects.bulk_create(filas.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistente_tecnico', '0013_jvaqua_digital_planes_mantenimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorResultadoTratamiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_tratamiento', models.CharField(max_length=40)),
+                ('banda_volumen', models.CharField(choices=[('hasta_25', '0–25 m³'), ('25_50', '25–50 m³'), ('50_100', '50–100 m³'), ('mas_100', '>100 m³')], max_length=20)),
+                ('estado_agua', models.CharField(choices=[('transparente', 'Transparente'), ('ligeramente_turbia', 'Ligeramente turbia'), ('muy_turbia', 'Muy turbia'), ('verde', 'Verde')], max_length=30)),
+                ('exitosos', models.PositiveIntegerField(default=0)),
+                ('parciales', models.PositiveIntegerField(default=0)),
+                ('fallidos', models.PositiveIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Contador de resultados',
+                'verbose_name_plural': 'Contadores de resultados',
+                'ordering': ['tipo_tratamiento', 'banda_volumen', 'estado_agua'],
+                'constraints': [models.UniqueConstraint(fields=('tipo_tratamiento', 'banda_volumen', 'estado_agua'), name='ati_contador_resultado_uniq')],
+            },
+        ),
+        migrations.RunPython(cargar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:56
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_indice(apps, schema_editor):
+    # La tabla de vectores solo se usa en PostgreSQL; en SQLite la búsqueda va por FTS5.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX ati_busqueda_vector_gin ON asistente_tecnico_indicebusquedaacademia USING gin (vector)')
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE asistente_tecnico_academia_fts USING fts5("
+            "titulo, claves, cuerpo, resto, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS ati_busqueda_vector_gin')
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS asistente_tecnico_academia_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistente_tecnico', '0014_contador_resultado_tratamiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusquedaAcademia',
+            fields=[
+                ('contenido', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indice_busqueda', serialize=False, to='asistente_tecnico.contenidoacademia')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+            options={
+                'verbose_name': 'Índice de búsqueda de Academia',
+                'verbose_name_plural': 'Índice de búsqueda de Academia',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelacionAcademiaDiagnostico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=60)),
+                ('orden', models.PositiveSmallIntegerField(default=0)),
+                ('contenido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relaciones_diagnostico', to='asistente_tecnico.contenidoacademia')),
+            ],
+            options={
+                'verbose_name': 'Contenido relacionado con diagnóstico',
+                'verbose_name_plural': 'Contenidos relacionados con diagnósticos',
+                'ordering': ['clave', 'orden'],
+                'indexes': [models.Index(fields=['clave', 'orden'], name='ati_relacion_diag_clave_idx')],
+                'constraints': [models.UniqueConstraint(fields=('clave', 'contenido'), name='ati_relacion_diag_uniq')],
+            },
+        ),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:01
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cargar_resumenes(apps, schema_editor):
+    ProgresoContenido = apps.get_model('asistente_tecnico', 'ProgresoContenidoAcademia')
+    ProgresoLeccion = apps.get_model('asistente_tecnico', 'ProgresoLeccion')
+    Resumen = apps.get_model('asistente_tecnico', 'ResumenProgresoAcademia')
+    resumenes = defaultdict(lambda: {'contenidos': [], 'lecciones': []})
+    for user_id, contenido_id in ProgresoContenido.objects.filter(completado=True).order_by('contenido_id').values_list('user_id', 'contenido_id').iterator():
+        resumenes[user_id]['contenidos'].append(contenido_id)
+    for user_id, leccion_id in ProgresoLeccion.objects.filter(completada=True).order_by('leccion_id').values_list('user_id', 'leccion_id').iterator():
+        resumenes[user_id]['lecciones'].append(leccion_id)
+    Resumen.objects.bulk_create([Resumen(user_id=user_id, **ids) for user_id, ids in resumenes.items()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistente_tecnico', '0015_academia_busqueda_relacionados'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenProgresoAcademia',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen_academia', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('contenidos', models.JSONField(blank=True, default=list)),
+                ('lecciones', models.JSONField(blank=True, default=list)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de progreso de academia',
+                'verbose_name_plural': 'Resúmenes de progreso de academia',
+            },
+        ),
+        migrations.RunPython(cargar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:07
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def cargar_resumenes(apps, schema_editor):
+    Registro = apps.get_model('asistente_tecnico', 'RegistroMantenimientoPiscina')
+    Resumen = apps.get_model('asistente_tecnico', 'ResumenCalidadAgua')
+    resumenes = {}
+    lecturas = Registro.objects.order_by('piscina_id', 'fecha', 'creado_en', 'pk').values_list('piscina_id', 'fecha', 'ph', 'cloro')
+    for piscina_id, fecha, ph, cloro in lecturas.iterator():
+        for parametro, valor in (('ph', ph), ('cloro', cloro)):
+            if valor is None:
+                continue
+            for periodo, inicio in (('dia', fecha), ('semana', fecha - timedelta(days=fecha.weekday()))):
+                resumen = resumenes.get((piscina_id, periodo, parametro, inicio))
+                if resumen is None:
+                    resumenes[(piscina_id, periodo, parametro, inicio)] = Resumen(
+                        piscina_id=piscina_id, periodo=periodo, parametro=parametro, inicio=inicio,
+                        minimo=valor, maximo=valor, suma=valor, cantidad=1, ultimo=valor,
+                    )
+                else:
+                    resumen.minimo, resumen.maximo = min(resumen.minimo, valor), max(resumen.maximo, valor)
+                    resumen.suma += valor
+                    resumen.cantidad += 1
+                    resumen.ultimo = valor
+    Resumen.objects.bulk_create(resumenes.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistente_tecnico', '0016_resumen_progreso_academia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCalidadAgua',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('dia', 'Día'), ('semana', 'Semana')], max_length=10)),
+                ('parametro', models.CharField(choices=[('ph', 'pH'), ('cloro', 'Cloro libre')], max_length=10)),
+                ('inicio', models.DateField()),
+                ('minimo', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('maximo', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('suma', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('ultimo', models.DecimalField(decimal_places=2, max_digits=5)),
+            ],
+            options={
+                'verbose_name': 'Resumen de calidad del agua',
+                'verbose_name_plural': 'Resúmenes de calidad del agua',
+                'ordering': ['piscina', 'parametro', 'periodo', 'inicio'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='registromantenimientopiscina',
+            index=models.Index(fields=['piscina', 'fecha'], name='ati_registro_piscina_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='resumencalidadagua',
+            name='piscina',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_calidad', to='asistente_tecnico.piscinasuscriptor'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumencalidadagua',
+            constraint=models.UniqueConstraint(fields=('piscina', 'periodo', 'parametro', 'inicio'), name='ati_resumen_calidad_uniq'),
+        ),
+        migrations.RunPython(cargar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asistente_tecnico', '0017_calidad_agua'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planmantenimientopiscina',
+            name='frecuencia_recomendada',
+            field=models.PositiveSmallIntegerField(choices=[(1, '1 vez por semana'), (2, '2 veces por semana')], default=1),
+        ),
+        migrations.AddField(
+            model_name='planmantenimientopiscina',
+            name='generado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='planmantenimientopiscina',
+            name='rutinas',
+            field=models.JSONField(blank=True, default=list, help_text='Tareas de cada visita de la semana, generadas por el plan.'),
+        ),
+        migrations.AddField(
+            model_name='planmantenimientopiscina',
+            name='version_plantilla',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 
@@ -259,6 +260,43 @@ class PropuestaConocimiento(models.Model):
         return self.titulo
 
 
+class ContadorResultadoTratamiento(models.Model):
+    """Seguimientos respondidos por tipo de tratamiento, rango de volumen y estado del agua.
+
+    Se actualiza al responder cada seguimiento, así el Motor de Conocimiento
+    no recorre los casos al analizar.
+    """
+
+    BANDAS_VOLUMEN = [
+        ("hasta_25", "0–25 m³"),
+        ("25_50", "25–50 m³"),
+        ("50_100", "50–100 m³"),
+        ("mas_100", ">100 m³"),
+    ]
+    tipo_tratamiento = models.CharField(max_length=40)
+    banda_volumen = models.CharField(max_length=20, choices=BANDAS_VOLUMEN)
+    estado_agua = models.CharField(max_length=30, choices=CasoAsistenteTecnico.ESTADO_AGUA_CHOICES)
+    exitosos = models.PositiveIntegerField(default=0)
+    parciales = models.PositiveIntegerField(default=0)
+    fallidos = models.PositiveIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["tipo_tratamiento", "banda_volumen", "estado_agua"]
+        constraints = [
+            models.UniqueConstraint(fields=["tipo_tratamiento", "banda_volumen", "estado_agua"], name="ati_contador_resultado_uniq"),
+        ]
+        verbose_name = "Contador de resultados"
+        verbose_name_plural = "Contadores de resultados"
+
+    @property
+    def total(self):
+        return self.exitosos + self.parciales + self.fallidos
+
+    def __str__(self):
+        return f"{self.tipo_tratamiento} · {self.get_banda_volumen_display()} · {self.get_estado_agua_display()}"
+
+
 # ============================================================
 # Academia JVAQUA CMS (Sprint 3.1)
 # ============================================================
@@ -362,6 +400,42 @@ class ContenidoAcademia(models.Model):
         return "asistente_tecnico/academia/pool-flow.svg"
 
 
+class IndiceBusquedaAcademia(models.Model):
+    """Vector de búsqueda (PostgreSQL) de cada contenido; lo mantiene ``academia.actualizar_indice_busqueda``.
+
+    En SQLite el índice es la tabla FTS5 ``asistente_tecnico_academia_fts``.
+    """
+
+    contenido = models.OneToOneField(ContenidoAcademia, on_delete=models.CASCADE, primary_key=True, related_name="indice_busqueda")
+    vector = SearchVectorField(null=True)
+
+    class Meta:
+        verbose_name = "Índice de búsqueda de Academia"
+        verbose_name_plural = "Índice de búsqueda de Academia"
+
+
+class RelacionAcademiaDiagnostico(models.Model):
+    """Contenidos oficiales sugeridos para cada combinación de temas de un diagnóstico.
+
+    La tabla se recalcula completa (``academia.refrescar_relacionados``) al
+    aprobar, editar o retirar contenido aprobado.
+    """
+
+    clave = models.CharField(max_length=60)
+    contenido = models.ForeignKey(ContenidoAcademia, on_delete=models.CASCADE, related_name="relaciones_diagnostico")
+    orden = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["clave", "orden"]
+        constraints = [models.UniqueConstraint(fields=["clave", "contenido"], name="ati_relacion_diag_uniq")]
+        indexes = [models.Index(fields=["clave", "orden"], name="ati_relacion_diag_clave_idx")]
+        verbose_name = "Contenido relacionado con diagnóstico"
+        verbose_name_plural = "Contenidos relacionados con diagnósticos"
+
+    def __str__(self):
+        return f"{self.clave} · {self.contenido_id}"
+
+
 class ImagenContenidoAcademia(models.Model):
     contenido = models.ForeignKey(ContenidoAcademia, on_delete=models.CASCADE, related_name="galeria")
     imagen = models.ImageField(upload_to="academia/galeria/")
@@ -437,6 +511,18 @@ class ProgresoContenidoAcademia(models.Model):
         ordering = ["-completado_en"]
 
 
+class ResumenProgresoAcademia(models.Model):
+    """Ids completados por el usuario, para mostrar el progreso sin contar filas."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="resumen_academia")
+    contenidos = models.JSONField(default=list, blank=True)
+    lecciones = models.JSONField(default=list, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Resumen de progreso de academia"
+        verbose_name_plural = "Resúmenes de progreso de academia"
+
+
 class FavoritoContenidoAcademia(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="favoritos_academia")
     contenido = models.ForeignKey(ContenidoAcademia, on_delete=models.CASCADE, related_name="favoritos")
@@ -530,6 +616,26 @@ class PlanMantenimientoPiscina(models.Model):
         (1, "1 vez por semana"),
         (2, "2 veces por semana"),
     ]
+    # Rutinas base JVAQUA. Al modificarlas se sube VERSION_PLANTILLA: la vista
+    # del plan y la tarea diaria regenerar_planes_piscina rehacen los planes viejos.
+    VERSION_PLANTILLA = 1
+    RUTINA_LIGERA = [
+        "Medir pH y cloro",
+        "Aspirar en desagüe o filtración solo si es necesario",
+        "Cepillar paredes y piso",
+        "Recoger basura superficial",
+        "Aplicar tratamiento químico solo si las mediciones lo requieren",
+        "Finalizar mantenimiento",
+    ]
+    RUTINA_COMPLETA = [
+        "Medir pH y cloro",
+        "Aspirar en desagüe o filtración obligatoriamente, según convenga",
+        "Cepillar paredes y piso",
+        "Recoger basura superficial",
+        "Limpiar canastilla de skimmer y bomba",
+        "Aplicar tratamiento químico según las mediciones de pH y cloro",
+        "Finalizar mantenimiento",
+    ]
 
     piscina = models.OneToOneField(
         PiscinaSuscriptor,
@@ -540,8 +646,12 @@ class PlanMantenimientoPiscina(models.Model):
         choices=FRECUENCIAS,
         default=1,
     )
+    frecuencia_recomendada = models.PositiveSmallIntegerField(choices=FRECUENCIAS, default=1)
     retrolavado_dias = models.PositiveSmallIntegerField(default=15)
     arena_deteriorada = models.BooleanField(default=False)
+    rutinas = models.JSONField(default=list, blank=True, help_text="Tareas de cada visita de la semana, generadas por el plan.")
+    version_plantilla = models.PositiveSmallIntegerField(default=0)
+    generado_en = models.DateTimeField(null=True, blank=True)
     activo = models.BooleanField(default=True)
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
@@ -558,7 +668,7 @@ class PlanMantenimientoPiscina(models.Model):
         return 7 if self.arena_deteriorada else self.retrolavado_dias
 
     def rutina_visita(self, visita_numero=1):
-        """Devuelve la rutina base JVAQUA para una piscina residencial normal.
+        """Tareas de la visita: las generadas para esta piscina o la rutina base JVAQUA.
 
         No fija dosis químicas: el tratamiento depende de las mediciones reales de
         pH/CL y del estado del agua evaluado por AQUO.
@@ -568,26 +678,12 @@ class PlanMantenimientoPiscina(models.Model):
         except (TypeError, ValueError):
             visita_numero = 1
 
+        if len(self.rutinas) == self.frecuencia_semanal and 1 <= visita_numero <= len(self.rutinas):
+            return list(self.rutinas[visita_numero - 1])
         if self.frecuencia_semanal == 2 and visita_numero == 1:
-            return [
-                "Medir pH y cloro",
-                "Aspirar en desagüe o filtración solo si es necesario",
-                "Cepillar paredes y piso",
-                "Recoger basura superficial",
-                "Aplicar tratamiento químico solo si las mediciones lo requieren",
-                "Finalizar mantenimiento",
-            ]
-
+            return list(self.RUTINA_LIGERA)
         # Visita única semanal o segunda visita de un plan de dos visitas.
-        return [
-            "Medir pH y cloro",
-            "Aspirar en desagüe o filtración obligatoriamente, según convenga",
-            "Cepillar paredes y piso",
-            "Recoger basura superficial",
-            "Limpiar canastilla de skimmer y bomba",
-            "Aplicar tratamiento químico según las mediciones de pH y cloro",
-            "Finalizar mantenimiento",
-        ]
+        return list(self.RUTINA_COMPLETA)
 
 
 class RegistroMantenimientoPiscina(models.Model):
@@ -609,6 +705,37 @@ class RegistroMantenimientoPiscina(models.Model):
         ordering = ["-fecha", "-creado_en"]
         verbose_name = "Mantenimiento JVAQUA Digital"
         verbose_name_plural = "Mantenimientos JVAQUA Digital"
+        indexes = [models.Index(fields=["piscina", "fecha"], name="ati_registro_piscina_fecha_idx")]
 
     def __str__(self):
         return f"{self.piscina} · {self.fecha} · visita {self.visita_numero}"
+
+
+class ResumenCalidadAgua(models.Model):
+    """Mínimo, máximo, promedio y última lectura de pH o cloro por día o semana (lunes a domingo)."""
+    PERIODOS = [("dia", "Día"), ("semana", "Semana")]
+    PARAMETROS = [("ph", "pH"), ("cloro", "Cloro libre")]
+    piscina = models.ForeignKey(PiscinaSuscriptor, on_delete=models.CASCADE, related_name="resumenes_calidad")
+    periodo = models.CharField(max_length=10, choices=PERIODOS)
+    parametro = models.CharField(max_length=10, choices=PARAMETROS)
+    inicio = models.DateField()
+    minimo = models.DecimalField(max_digits=5, decimal_places=2)
+    maximo = models.DecimalField(max_digits=5, decimal_places=2)
+    suma = models.DecimalField(max_digits=12, decimal_places=2)
+    cantidad = models.PositiveIntegerField()
+    ultimo = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        ordering = ["piscina", "parametro", "periodo", "inicio"]
+        verbose_name = "Resumen de calidad del agua"
+        verbose_name_plural = "Resúmenes de calidad del agua"
+        constraints = [
+            models.UniqueConstraint(fields=["piscina", "periodo", "parametro", "inicio"], name="ati_resumen_calidad_uniq"),
+        ]
+
+    @property
+    def promedio(self):
+        return self.suma / self.cantidad if self.cantidad else None
+
+    def __str__(self):
+        return f"{self.piscina} · {self.parametro} · {self.get_periodo_display()} {self.inicio}"
@@ -0,0 +1,149 @@
+"""Generación de los planes de mantenimiento de JVAQUA Digital.
+
+``regenerar_planes`` calcula en una pasada el plan de cada piscina activa a
+partir de su volumen, su tipo y las lecturas de las últimas semanas (los
+resúmenes semanales de ``ResumenCalidadAgua``), y lo guarda con
+``bulk_create``/``bulk_update`` por lotes de piscinas: tres consultas de
+lectura por lote y solo se escriben los planes que cambiaron.
+
+Lo que eligió el suscriptor (visitas por semana y arena deteriorada) se
+conserva; a los planes nuevos se les asigna la frecuencia recomendada. Al
+cambiar las rutinas base se sube ``PlanMantenimientoPiscina.VERSION_PLANTILLA``;
+la vista rehace al abrirlo el plan con una versión anterior.
+
+Los avisos y la frecuencia recomendada dependen de las lecturas: al guardar o
+borrar un registro se regenera el plan de su piscina al confirmar la
+transacción (señales), y la tarea
+diaria ``regenerar_planes_piscina`` actualiza los planes cuyas semanas malas
+salieron de la ventana de ``SEMANAS_LECTURAS`` sin lecturas nuevas.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .engine import DEFAULT_RULES
+from .models import PiscinaSuscriptor, PlanMantenimientoPiscina, ResumenCalidadAgua
+
+LOTE_PLANES = 1000
+SEMANAS_LECTURAS = 4
+# Semanas con el promedio fuera de rango a partir de las cuales se recomiendan dos visitas.
+SEMANAS_INESTABLES = 2
+VOLUMEN_DOS_VISITAS = Decimal("80")
+TIPOS_ALTO_USO = {"condominio", "hotel", "publica"}
+RETROLAVADO_DIAS = 15
+RETROLAVADO_ALTO_USO_DIAS = 10
+CAMPOS_GENERADOS = ("frecuencia_recomendada", "retrolavado_dias", "rutinas", "version_plantilla")
+
+
+def _semanas_fuera_de_rango(promedios):
+    ph_min, ph_max = Decimal(str(DEFAULT_RULES["ph_min"])), Decimal(str(DEFAULT_RULES["ph_max"]))
+    cloro_min = Decimal(str(DEFAULT_RULES["cloro_min"]))
+    ph = sum(1 for valor in promedios["ph"] if not ph_min <= valor <= ph_max)
+    cloro = sum(1 for valor in promedios["cloro"] if valor < cloro_min)
+    return ph, cloro
+
+
+def calcular_plan(volumen_m3, tipo_piscina, promedios, frecuencia_semanal=None):
+    """Campos generados del plan: ``{campo: valor}`` para ``CAMPOS_GENERADOS`` y la frecuencia.
+
+    ``promedios`` son los promedios semanales recientes ``{"ph": [...], "cloro": [...]}``;
+    ``frecuencia_semanal`` es la que eligió el suscriptor (``None`` en planes nuevos).
+    """
+    alto_uso = tipo_piscina in TIPOS_ALTO_USO
+    ph_fuera, cloro_bajo = _semanas_fuera_de_rango(promedios)
+    inestable = max(ph_fuera, cloro_bajo) >= SEMANAS_INESTABLES
+    recomendada = 2 if alto_uso or volumen_m3 > VOLUMEN_DOS_VISITAS or inestable else 1
+    frecuencia = frecuencia_semanal or recomendada
+
+    avisos = []
+    if ph_fuera:
+        avisos.append(f"Revisar el pH con más atención: estuvo fuera de {DEFAULT_RULES['ph_min']}–{DEFAULT_RULES['ph_max']} en {ph_fuera} de las últimas semanas")
+    if cloro_bajo:
+        avisos.append(f"Revisar el cloro libre con más atención: estuvo por debajo de {DEFAULT_RULES['cloro_min']} ppm en {cloro_bajo} de las últimas semanas")
+    rutinas = []
+    for visita in range(1, frecuencia + 1):
+        base = PlanMantenimientoPiscina.RUTINA_LIGERA if frecuencia == 2 and visita == 1 else PlanMantenimientoPiscina.RUTINA_COMPLETA
+        # Los avisos van antes de "Finalizar mantenimiento".
+        rutinas.append([*base[:-1], *avisos, base[-1]])
+    return {
+        "frecuencia_semanal": frecuencia,
+        "frecuencia_recomendada": recomendada,
+        "retrolavado_dias": RETROLAVADO_ALTO_USO_DIAS if alto_uso else RETROLAVADO_DIAS,
+        "rutinas": rutinas,
+        "version_plantilla": PlanMantenimientoPiscina.VERSION_PLANTILLA,
+    }
+
+
+def _promedios_recientes(piscina_ids, desde):
+    promedios = defaultdict(lambda: {"ph": [], "cloro": []})
+    filas = ResumenCalidadAgua.objects.filter(piscina_id__in=piscina_ids, periodo="semana", inicio__gte=desde)
+    for piscina_id, parametro, suma, cantidad in filas.values_list("piscina_id", "parametro", "suma", "cantidad"):
+        promedios[piscina_id][parametro].append(suma / cantidad)
+    return promedios
+
+
+def _lotes(piscinas, lote):
+    # Paginación por clave: cada lote continúa desde el último id del anterior.
+    ultimo = 0
+    while True:
+        filas = list(
+            piscinas.filter(pk__gt=ultimo).order_by("pk").values_list("pk", "volumen_m3", "tipo_piscina")[:lote]
+        )
+        if not filas:
+            return
+        yield filas
+        ultimo = filas[-1][0]
+
+
+def regenerar_planes(piscinas=None, dry_run=False, lote=LOTE_PLANES, crear=True):
+    """Regenera los planes de las piscinas activas (o solo de ``piscinas``).
+
+    Devuelve ``{"piscinas", "creados", "actualizados", "sin_cambios", "segundos_calculo",
+    "segundos_escritura"}``; con ``dry_run`` calcula y cuenta sin guardar. Con
+    ``crear=False`` solo actualiza los planes existentes (al cambiar las lecturas).
+    """
+    qs = PiscinaSuscriptor.objects.filter(activa=True)
+    if piscinas is not None:
+        qs = qs.filter(pk__in=[getattr(p, "pk", p) for p in piscinas])
+    if not crear:
+        qs = qs.filter(plan_mantenimiento__isnull=False)
+    ahora = timezone.now()
+    desde = timezone.localdate() - timedelta(weeks=SEMANAS_LECTURAS)
+    resultado = dict.fromkeys(("piscinas", "creados", "actualizados", "sin_cambios"), 0)
+    resultado.update(segundos_calculo=0.0, segundos_escritura=0.0)
+    for filas in _lotes(qs, lote):
+        inicio = time.perf_counter()
+        ids = [pk for pk, _volumen, _tipo in filas]
+        existentes = {plan.piscina_id: plan for plan in PlanMantenimientoPiscina.objects.filter(piscina_id__in=ids)}
+        promedios = _promedios_recientes(ids, desde)
+        nuevos, cambiados = [], []
+        for pk, volumen, tipo in filas:
+            plan = existentes.get(pk)
+            campos = calcular_plan(volumen, tipo, promedios[pk], plan.frecuencia_semanal if plan else None)
+            if plan is None:
+                nuevos.append(PlanMantenimientoPiscina(piscina_id=pk, generado_en=ahora, **campos))
+            elif any(getattr(plan, campo) != campos[campo] for campo in CAMPOS_GENERADOS):
+                for campo in CAMPOS_GENERADOS:
+                    setattr(plan, campo, campos[campo])
+                plan.generado_en = plan.actualizado_en = ahora
+                cambiados.append(plan)
+        resultado["piscinas"] += len(filas)
+        resultado["creados"] += len(nuevos)
+        resultado["actualizados"] += len(cambiados)
+        resultado["sin_cambios"] += len(filas) - len(nuevos) - len(cambiados)
+        escritura = time.perf_counter()
+        resultado["segundos_calculo"] += escritura - inicio
+        if dry_run:
+            continue
+        with transaction.atomic():
+            # Si una vista creó el plan mientras tanto, se completa en la próxima regeneración.
+            PlanMantenimientoPiscina.objects.bulk_create(nuevos, batch_size=500, ignore_conflicts=True)
+            PlanMantenimientoPiscina.objects.bulk_update(
+                cambiados, [*CAMPOS_GENERADOS, "generado_en", "actualizado_en"], batch_size=500,
+            )
+        resultado["segundos_escritura"] += time.perf_counter() - escritura
+    return resultado
@@ -0,0 +1,156 @@
+"""Lecturas aleatorias y medición de rendimiento del motor técnico.
+
+``lecturas_aleatorias`` y ``reglas_aleatorias`` recorren todo el dominio que
+aceptan los formularios (volumen hasta 5000 m³, pH 0–14, cloro 0–20 ppm, cada
+estado del agua y tipo de piscina) e incluyen los bordes exactos de cada
+umbral; las usan las pruebas de invariantes y la medición.
+
+``medir_rendimiento`` devuelve el ritmo de cada ruta del motor en proporción
+a una carga de calibración medida en las mismas rondas, y
+``comparar_rendimiento`` lo contrasta con la referencia guardada en JSON
+(``REFERENCIA_RENDIMIENTO``), marcando las rutas que bajan más del 20 %. La
+proporción reduce el efecto de la máquina, pero conviene regenerar la
+referencia (``manage.py benchmark_motor --actualizar-referencia``) al cambiar
+de equipo o de versión de Python.
+"""
+import json
+import random
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from .engine import (
+    DEFAULT_RULES, PROBLEMAS_TECNICOS, _alguicida_gramos, _cloro_operativo_gramos, _p24_gramos, _sulfato_kg,
+    compilar_reglas, diagnosticar_problema_tecnico,
+)
+from .models import CasoAsistenteTecnico
+
+ESTADOS_AGUA = [x[0] for x in CasoAsistenteTecnico.ESTADO_AGUA_CHOICES]
+TIPOS_PISCINA = [x[0] for x in CasoAsistenteTecnico.TIPO_PISCINA_CHOICES]
+BORDES_PH = (0, 6.8, 7.0, 7.2, 7.4, 7.6, 7.8, 14)
+BORDES_CLORO = (0, 1.0, 1.5, 2.0, 3.0, 3.5, 20)
+BORDES_VOLUMEN = (0.01, 1, 10, 20, 25, 30, 31, 55, 5000)
+REFERENCIA_RENDIMIENTO = Path(__file__).resolve().parent / "rendimiento_motor.json"
+TOLERANCIA_RENDIMIENTO = 0.20
+
+
+def lectura_aleatoria(azar):
+    """``(volumen, ph, cloro, estado_agua, tipo_piscina)`` dentro del dominio de los formularios."""
+    volumen = azar.choice([round(azar.uniform(0.01, 5000), 2), round(azar.uniform(1, 120), 2), azar.choice(BORDES_VOLUMEN)])
+    ph = azar.choice([round(azar.uniform(0, 14), 2), azar.choice(BORDES_PH)])
+    cloro = azar.choice([round(azar.uniform(0, 20), 2), azar.choice(BORDES_CLORO)])
+    if azar.random() < 0.2:
+        volumen, ph, cloro = Decimal(str(volumen)), Decimal(str(ph)), Decimal(str(cloro))
+    return volumen, ph, cloro, azar.choice(ESTADOS_AGUA), azar.choice(TIPOS_PISCINA)
+
+
+def lecturas_aleatorias(azar, cantidad):
+    return [lectura_aleatoria(azar) for _ in range(cantidad)]
+
+
+def reglas_aleatorias(azar):
+    """Reglas válidas de un motor personalizado: rangos ordenados y coeficientes positivos."""
+    ph_min = round(azar.uniform(6.8, 7.4), 1)
+    cloro_min = round(azar.uniform(0.5, 2.0), 1)
+    return {
+        **DEFAULT_RULES,
+        "ph_min": ph_min,
+        "ph_max": round(ph_min + azar.uniform(0, 0.8), 1),
+        "cloro_min": cloro_min,
+        "cloro_max": round(cloro_min + azar.uniform(0, 3), 1),
+        "cloro_objetivo_normal": round(azar.uniform(1, 2.5), 1),
+        "cloro_objetivo_alto_uso": round(azar.uniform(1.5, 3), 1),
+        "cloro_objetivo_turbidez": round(azar.uniform(2, 4), 1),
+        "cloro_objetivo_floculacion": azar.choice([3, 3.5, 4, 4.5]),
+        "cloro_granulado_g_por_m3": round(azar.uniform(4, 10), 1),
+        "sulfato_tramo_m3": round(azar.uniform(15, 35), 1),
+        "sulfato_tolerancia_m3": round(azar.uniform(0, 8), 1),
+        "seguimiento_horas": azar.choice([12, 24, 48]),
+    }
+
+
+def _rutas(azar):
+    compiladas = compilar_reglas()
+    por_estado = {
+        estado: [lectura[:3] + (estado, lectura[4]) for lectura in lecturas_aleatorias(azar, 500)]
+        for estado in ("muy_turbia", "ligeramente_turbia", "transparente")
+    }
+    volumenes = [float(lectura[0]) for lectura in lecturas_aleatorias(azar, 500)]
+    lote = list(zip(*lecturas_aleatorias(azar, 500)))
+    categorias = list(PROBLEMAS_TECNICOS)
+    return {
+        "recomendar_floculacion": (compiladas.recomendar, por_estado["muy_turbia"]),
+        "recomendar_correctivo": (compiladas.recomendar, por_estado["ligeramente_turbia"]),
+        "recomendar_normal": (compiladas.recomendar, por_estado["transparente"]),
+        "recomendar_lote_500": (compiladas.recomendar_lote, [lote]),
+        "compilar_reglas": (compilar_reglas, [(reglas_aleatorias(azar),) for _ in range(100)]),
+        "cloro_operativo_gramos": (_cloro_operativo_gramos, [(v, 0.5, 3.0, 7.0) for v in volumenes]),
+        "sulfato_kg": (_sulfato_kg, [(v,) for v in volumenes]),
+        "p24_gramos": (_p24_gramos, [(v, 6.9) for v in volumenes]),
+        "alguicida_gramos": (_alguicida_gramos, [(v,) for v in volumenes]),
+        "diagnosticar_problema_tecnico": (diagnosticar_problema_tecnico, [(azar.choice(categorias), "Detalle del caso") for _ in range(200)]),
+    }
+
+
+def _calibracion(n):
+    # Trabajo fijo parecido al del motor (floats, Decimal, f-strings y dicts) que
+    # sirve de unidad: las rutas se comparan en proporción a este ritmo, así la
+    # referencia tolera máquinas más lentas o cargadas.
+    total = 0
+    for i in range(n):
+        valor = Decimal(str(i * 0.37)).quantize(Decimal("1"))
+        total += len({"clave": f"{i:.1f}", "valor": int(valor)})
+    return total
+
+
+def _mejor_ritmo(funcion, argumentos):
+    inicio = time.perf_counter()
+    for args in argumentos:
+        funcion(*args)
+    return len(argumentos) / (time.perf_counter() - inicio)
+
+
+def medir_rendimiento(rondas=15, semilla=1):
+    """Ritmo de cada ruta relativo a ``_calibracion`` (1.0 = mismo ritmo).
+
+    Las rutas se miden intercaladas con la calibración en varias rondas y se
+    toma la mejor de cada una, para que la carga pasajera de la máquina afecte
+    a todas por igual.
+    """
+    rutas = _rutas(random.Random(semilla))
+    calibracion = (_calibracion, [(50,)] * 100)
+    mejores = dict.fromkeys(rutas, 0.0)
+    base = 0.0
+    for _ in range(rondas):
+        for nombre, (funcion, argumentos) in rutas.items():
+            base = max(base, _mejor_ritmo(*calibracion))
+            mejores[nombre] = max(mejores[nombre], _mejor_ritmo(funcion, argumentos))
+    mejores = {nombre: ritmo / base for nombre, ritmo in mejores.items()}
+    # El lote se expresa en lecturas procesadas, no en llamadas.
+    mejores["recomendar_lote_500"] *= 500
+    return {nombre: round(valor, 3) for nombre, valor in mejores.items()}
+
+
+def comparar_rendimiento(actual, referencia, tolerancia=TOLERANCIA_RENDIMIENTO):
+    """Rutas cuyo ritmo relativo bajó más de ``tolerancia``: ``[(ruta, antes, ahora, caída)]``."""
+    regresiones = []
+    for ruta, antes in sorted(referencia.items()):
+        ahora = actual.get(ruta)
+        if ahora is None or not antes:
+            continue
+        caida = 1 - ahora / antes
+        if caida > tolerancia:
+            regresiones.append((ruta, antes, ahora, caida))
+    return regresiones
+
+
+def cargar_referencia(ruta=REFERENCIA_RENDIMIENTO):
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return None
+    return json.loads(ruta.read_text(encoding="utf-8"))["ritmo_relativo"]
+
+
+def guardar_referencia(medicion, ruta=REFERENCIA_RENDIMIENTO):
+    contenido = {"tolerancia": TOLERANCIA_RENDIMIENTO, "ritmo_relativo": medicion}
+    Path(ruta).write_text(json.dumps(contenido, indent=2, sort_keys=True, ensure_ascii=False) + "\n", encoding="utf-8")
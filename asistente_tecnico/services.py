@@ -1,49 +1,103 @@
 from datetime import timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
-from .models import CasoAsistenteTecnico
+from .engine import DEFAULT_RULES, compilar_reglas
+from .models import CasoAsistenteTecnico, MotorRecomendacion
 
+CLAVE_MOTOR_ACTIVO = "asistente_tecnico:motor_activo"
+# La caché por defecto es local a cada proceso: activar una versión la invalida
+# en el proceso que atiende la petición y los demás la toman al vencer este plazo.
+SEGUNDOS_MOTOR_ACTIVO = 60
+_reglas_compiladas = {}
+LOTE_RECORDATORIOS = 500
+
+
+def motor_activo():
+    """Motor de recomendación activo, en caché; si no hay ninguno se crea la versión 1.0."""
+    motor = cache.get(CLAVE_MOTOR_ACTIVO)
+    if motor is None:
+        motor = MotorRecomendacion.objects.filter(activo=True).order_by("-creado_en").first()
+        if motor is None:
+            motor = MotorRecomendacion.objects.create(
+                version="1.0",
+                nombre="Motor JVAQUA",
+                descripcion="Primera versión del motor de recomendaciones basado en protocolos operativos JVAQUA.",
+                reglas=DEFAULT_RULES,
+                activo=True,
+            )
+        cache.set(CLAVE_MOTOR_ACTIVO, motor, SEGUNDOS_MOTOR_ACTIVO)
+    return motor
+
+
+def reglas_motor(motor):
+    """``ReglasCompiladas`` de ``motor``; se compilan una vez por versión en cada proceso.
+
+    Si las reglas de la versión se editan (por ejemplo desde el admin) se
+    vuelven a compilar en la siguiente llamada.
+    """
+    fuente, compiladas = _reglas_compiladas.get(motor.pk, (None, None))
+    if compiladas is None or fuente != (motor.reglas or {}):
+        compiladas = compilar_reglas(motor.reglas)
+        _reglas_compiladas[motor.pk] = (dict(motor.reglas or {}), compiladas)
+    return compiladas
+
+
+def invalidar_motor_activo():
+    """Descarta el motor activo en caché y las reglas compiladas tras cambiar de versión."""
+    cache.delete(CLAVE_MOTOR_ACTIVO)
+    _reglas_compiladas.clear()
+
+
+def generar_recordatorios_seguimiento(user=None, max_recordatorios=3, lote=LOTE_RECORDATORIOS):
+    """Crea recordatorios al vencer el seguimiento y vuelve a recordar cada 24 h, máximo 3 veces.
+
+    Procesa los casos por lotes: en cada lote bloquea los casos vencidos
+    (``skip_locked``, así dos ejecuciones simultáneas no toman el mismo caso),
+    crea las notificaciones con un ``bulk_create`` y sube los contadores con un
+    solo ``UPDATE``. Los push quedan en la cola de ``dashboard.notificaciones``.
+    Devuelve cuántos recordatorios creó.
+    """
+    from dashboard.models import Notificacion
 
-def generar_recordatorios_seguimiento(user=None, crear_notificacion=None, max_recordatorios=3):
-    """Crea recordatorios al vencer el seguimiento y vuelve a recordar cada 24 h, máximo 3 veces."""
     ahora = timezone.now()
     qs = CasoAsistenteTecnico.objects.filter(
+        Q(ultimo_recordatorio_en__isnull=True) | Q(ultimo_recordatorio_en__lte=ahora - timedelta(hours=24)),
         resultado="pendiente",
         seguimiento_programado_para__isnull=False,
         seguimiento_programado_para__lte=ahora,
         recordatorios_enviados__lt=max_recordatorios,
-    ).select_related("user")
+    )
     if user is not None:
         qs = qs.filter(user=user)
 
     creados = 0
-    for caso in qs:
-        if caso.ultimo_recordatorio_en and caso.ultimo_recordatorio_en > ahora - timedelta(hours=24):
-            continue
-
-        numero = caso.recordatorios_enviados + 1
-        titulo = "🧠 Seguimiento de tratamiento"
-        if numero == 1:
-            mensaje = "Hace aproximadamente 24 horas usaste el Asistente Técnico. ¿El tratamiento dio el resultado esperado?"
-        else:
-            mensaje = f"Seguimiento pendiente del caso #{caso.pk}. Cuéntanos cómo terminó el agua para seguir mejorando las recomendaciones."
-        url = f"/dashboard/asistente/casos/{caso.pk}/seguimiento/"
-
-        if crear_notificacion:
-            crear_notificacion(
-                user=caso.user,
-                titulo=titulo,
-                mensaje=mensaje,
-                url=url,
-                enviar_push=True,
+    while True:
+        with transaction.atomic():
+            casos = list(
+                qs.select_for_update(skip_locked=True).order_by("seguimiento_programado_para", "pk")
+                .values_list("pk", "user_id", "recordatorios_enviados")[:lote]
+            )
+            if not casos:
+                break
+            notificaciones = []
+            for pk, user_id, enviados in casos:
+                if enviados == 0:
+                    mensaje = "Hace aproximadamente 24 horas usaste el Asistente Técnico. ¿El tratamiento dio el resultado esperado?"
+                else:
+                    mensaje = f"Seguimiento pendiente del caso #{pk}. Cuéntanos cómo terminó el agua para seguir mejorando las recomendaciones."
+                # Tipo general evita colisión con unique_together usando referencia nula.
+                notificaciones.append(Notificacion(
+                    user_id=user_id, titulo="🧠 Seguimiento de tratamiento", mensaje=mensaje,
+                    url=f"/dashboard/asistente/casos/{pk}/seguimiento/", tipo="general", push_pendiente=True,
+                ))
+            Notificacion.objects.bulk_create(notificaciones, batch_size=500)
+            CasoAsistenteTecnico.objects.filter(pk__in=[pk for pk, _, _ in casos]).update(
+                recordatorios_enviados=F("recordatorios_enviados") + 1, ultimo_recordatorio_en=ahora, actualizado_en=ahora,
             )
-        else:
-            from dashboard.models import Notificacion
-            # Tipo general evita colisión con unique_together usando referencia nula.
-            Notificacion.objects.create(user=caso.user, titulo=titulo, mensaje=mensaje, url=url, tipo="general")
-
-        caso.recordatorios_enviados = numero
-        caso.ultimo_recordatorio_en = ahora
-        caso.save(update_fields=["recordatorios_enviados", "ultimo_recordatorio_en", "actualizado_en"])
-        creados += 1
+        creados += len(casos)
+        if len(casos) < lote:
+            break
     return creados
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .academia import (
+    actualizar_indice_busqueda, contenidos_indexados, quitar_de_indice, reconstruir_indice_busqueda, refrescar_relacionados,
+)
+from .calidad_agua import actualizar_resumenes_calidad
+from .curso import actualizar_resumen_progreso, invalidar_estructura
+from .models import (
+    CategoriaAcademia, ContenidoAcademia, LeccionAcademia, ProgresoContenidoAcademia, ProgresoLeccion,
+    RegistroMantenimientoPiscina, RelacionAcademiaDiagnostico,
+)
+from .planes import regenerar_planes
+
+
+@receiver(post_save, sender=ContenidoAcademia, dispatch_uid="asistente_tecnico_indexar_contenido")
+def contenido_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actualizar_indice_busqueda([instance])
+    if instance.estado == "aprobado" or RelacionAcademiaDiagnostico.objects.filter(contenido=instance).exists():
+        refrescar_relacionados()
+    transaction.on_commit(invalidar_estructura)
+
+
+@receiver(post_delete, sender=ContenidoAcademia, dispatch_uid="asistente_tecnico_desindexar_contenido")
+def contenido_eliminado(sender, instance, **kwargs):
+    quitar_de_indice(instance.pk)
+    if instance.estado == "aprobado":
+        refrescar_relacionados()
+    transaction.on_commit(invalidar_estructura)
+
+
+@receiver(post_save, sender=LeccionAcademia, dispatch_uid="asistente_tecnico_leccion_guardada")
+@receiver(post_delete, sender=LeccionAcademia, dispatch_uid="asistente_tecnico_leccion_eliminada")
+@receiver(post_save, sender=CategoriaAcademia, dispatch_uid="asistente_tecnico_categoria_guardada")
+@receiver(post_delete, sender=CategoriaAcademia, dispatch_uid="asistente_tecnico_categoria_eliminada")
+def estructura_modificada(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(invalidar_estructura)
+
+
+@receiver(post_save, sender=ProgresoContenidoAcademia, dispatch_uid="asistente_tecnico_progreso_contenido_guardado")
+@receiver(post_save, sender=ProgresoLeccion, dispatch_uid="asistente_tecnico_progreso_leccion_guardado")
+def progreso_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        actualizar_resumen_progreso(instance.user_id)
+
+
+@receiver(post_delete, sender=ProgresoContenidoAcademia, dispatch_uid="asistente_tecnico_progreso_contenido_eliminado")
+@receiver(post_delete, sender=ProgresoLeccion, dispatch_uid="asistente_tecnico_progreso_leccion_eliminado")
+def progreso_eliminado(sender, instance, **kwargs):
+    actualizar_resumen_progreso(instance.user_id, crear=False)
+
+
+def _regenerar_plan_al_confirmar(piscina_id):
+    # Fuera de la transacción del registro: si falla, la lectura queda guardada y
+    # la tarea diaria planes-piscina pone el plan al día.
+    transaction.on_commit(lambda: regenerar_planes([piscina_id], crear=False))
+
+
+@receiver(pre_save, sender=RegistroMantenimientoPiscina, dispatch_uid="asistente_tecnico_registro_fecha_anterior")
+def recordar_fecha_anterior(sender, instance, raw=False, **kwargs):
+    # Si se corrige la fecha de un registro también hay que recalcular la semana de la que salió.
+    if not raw and not instance._state.adding:
+        instance._fecha_anterior = sender.objects.filter(pk=instance.pk).values_list("fecha", flat=True).first()
+
+
+@receiver(post_save, sender=RegistroMantenimientoPiscina, dispatch_uid="asistente_tecnico_registro_guardado")
+def registro_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        actualizar_resumenes_calidad(instance.piscina_id, {instance.fecha, getattr(instance, "_fecha_anterior", None)})
+        _regenerar_plan_al_confirmar(instance.piscina_id)
+
+
+@receiver(post_delete, sender=RegistroMantenimientoPiscina, dispatch_uid="asistente_tecnico_registro_eliminado")
+def registro_eliminado(sender, instance, **kwargs):
+    actualizar_resumenes_calidad(instance.piscina_id, {instance.fecha})
+    _regenerar_plan_al_confirmar(instance.piscina_id)
+
+
+def indexar_despues_de_migrar(sender, **kwargs):
+    """Completa el índice y los relacionados del contenido que cargan las migraciones (sin señales)."""
+    if contenidos_indexados() != ContenidoAcademia.objects.count():
+        reconstruir_indice_busqueda()
+    refrescar_relacionados()
+    invalidar_estructura()
@@ -1,5 +1,41 @@
-from django.test import SimpleTestCase
-from .engine import calcular_recomendacion
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from dashboard.models import Notificacion
+from dashboard.notificaciones import procesar_push_pendientes
+
+from .academia import buscar_contenidos, relacionados_para_diagnostico
+from .calidad_agua import lttb, reconstruir_resumenes_calidad, serie_calidad_agua
+from .conocimiento import analizar_motor_conocimiento, intervalo_wilson, reconstruir_contadores, registrar_resultado
+from .curso import estructura_curso, estructura_lecciones, progreso_curso, progreso_lecciones, resumen_progreso
+from .engine import (
+    DEFAULT_RULES, PROBLEMAS_TECNICOS, _alguicida_gramos, _cloro_operativo_gramos, _p24_gramos, _sulfato_kg,
+    calcular_recomendacion, compilar_reglas, diagnosticar_problema_tecnico, recomendar_lote,
+)
+from .manual_pdf import generar_pdf
+from .models import (
+    CasoAsistenteTecnico, CategoriaAcademia, ContadorResultadoTratamiento, ContenidoAcademia, LeccionAcademia, MotorRecomendacion,
+    PerfilSuscriptor, PiscinaSuscriptor, PlanMantenimientoPiscina, ProgresoContenidoAcademia, ProgresoLeccion, PropuestaConocimiento,
+    RegistroMantenimientoPiscina, ResumenCalidadAgua, ResumenProgresoAcademia,
+)
+from .planes import regenerar_planes
+from .rendimiento import comparar_rendimiento, lectura_aleatoria, lecturas_aleatorias, reglas_aleatorias
+from .services import generar_recordatorios_seguimiento, motor_activo, reglas_motor
 
 
 class MotorJVAQUATests(SimpleTestCase):
@@ -27,3 +63,621 @@ class MotorJVAQUATests(SimpleTestCase):
         r = calcular_recomendacion(40, 7.4, 0.8, "transparente", "residencial")
         claves = {x["clave"] for x in r["productos_sugeridos"]}
         self.assertIn("tricloro", claves)
+
+
+class ReglasCompiladasTests(SimpleTestCase):
+    def test_compiladas_igual_que_calculo_directo(self):
+        reglas = {"ph_min": 7.0, "cloro_granulado_g_por_m3": 8, "cloro_objetivo_floculacion": 4}
+        compiladas = compilar_reglas(reglas)
+        for lectura in [(32, 8.0, 0.2, "verde", "hotel"), (25, 6.8, 0.5, "muy_turbia", "residencial"), (30, 7.3, 0.4, "ligeramente_turbia", "publica"), (40, 7.7, 3.5, "transparente", "residencial")]:
+            self.assertEqual(compiladas.recomendar(*lectura), calcular_recomendacion(*lectura, reglas))
+        self.assertEqual(compiladas.recomendar(32, 8.0, 0.2, "verde", "hotel")["reglas_usadas"], {**DEFAULT_RULES, **reglas})
+
+    def test_rechaza_reglas_invalidas(self):
+        for reglas in ({"ph_min": 7.8, "ph_max": 7.2}, {"sulfato_tramo_m3": 0}, {"cloro_max": "alto"}, {"cloro_min": -1}):
+            with self.subTest(reglas=reglas), self.assertRaises(ValueError):
+                compilar_reglas(reglas)
+
+
+class RecomendacionLoteTests(SimpleTestCase):
+    ESTADOS = ["transparente", "ligeramente_turbia", "muy_turbia", "verde"]
+    TIPOS = ["residencial", "condominio", "hotel", "publica"]
+
+    def _lecturas(self, azar, cantidad):
+        # Valores al azar mezclados con los bordes de cada umbral y tipos de entrada distintos.
+        volumenes = [azar.choice([azar.uniform(0.5, 900), azar.randint(1, 120), 25, 30, 10, 0.1, Decimal("32.50")]) for _ in range(cantidad)]
+        phs = [azar.choice([round(azar.uniform(5.5, 9.5), 2), 6.8, 7.0, 7.2, 7.6, 7.8, Decimal("7.21")]) for _ in range(cantidad)]
+        cloros = [azar.choice([round(azar.uniform(0, 8), 2), 1.0, 1.5, 2.0, 3.0, 3.5, Decimal("0.2")]) for _ in range(cantidad)]
+        estados = [azar.choice(self.ESTADOS) for _ in range(cantidad)]
+        tipos = [azar.choice(self.TIPOS) for _ in range(cantidad)]
+        return volumenes, phs, cloros, estados, tipos
+
+    def test_lote_identico_al_calculo_individual(self):
+        azar = random.Random(42)
+        for reglas in (None, {"ph_min": 7.0, "ph_max": 7.8, "cloro_granulado_g_por_m3": 6.5, "sulfato_tramo_m3": 20}):
+            lecturas = self._lecturas(azar, 2000)
+            with self.subTest(reglas=reglas):
+                self.assertEqual(recomendar_lote(*lecturas, reglas=reglas), [calcular_recomendacion(*lectura, reglas) for lectura in zip(*lecturas)])
+
+    def test_resultados_independientes_y_longitudes_validadas(self):
+        resultados = compilar_reglas().recomendar_lote([30, 30], [7.4, 7.4], [1.0, 1.0], ["verde", "verde"], ["hotel", "hotel"])
+        resultados[0]["productos_sugeridos"].clear()
+        resultados[0]["reglas_usadas"]["ph_min"] = 0
+        self.assertTrue(resultados[1]["productos_sugeridos"])
+        self.assertEqual(resultados[1]["reglas_usadas"]["ph_min"], DEFAULT_RULES["ph_min"])
+        with self.assertRaises(ValueError):
+            recomendar_lote([30], [7.4, 7.2], [1.0], ["verde"], ["hotel"])
+
+
+class InvariantesMotorTests(SimpleTestCase):
+    """Lecturas al azar (semilla fija) en todo el dominio de los formularios."""
+
+    def _validar(self, resultado):
+        for producto in resultado["productos_sugeridos"]:
+            self.assertIsInstance(producto["cantidad"], int, producto)
+            self.assertGreaterEqual(producto["cantidad"], 0, producto)
+        pasos = [paso["paso"] for paso in resultado.get("protocolo", [])]
+        self.assertEqual(pasos, list(range(1, len(pasos) + 1)))
+
+    def test_sin_excepciones_y_dosis_validas(self):
+        azar = random.Random(7)
+        for reglas in [None] + [reglas_aleatorias(azar) for _ in range(5)]:
+            compiladas = compilar_reglas(reglas)
+            for lectura in lecturas_aleatorias(azar, 800):
+                with self.subTest(reglas=reglas, lectura=lectura):
+                    self._validar(compiladas.recomendar(*lectura))
+
+    def test_dosis_no_disminuyen_con_el_volumen(self):
+        azar = random.Random(11)
+        for _ in range(1500):
+            reglas = azar.choice([None, reglas_aleatorias(azar)])
+            volumen, ph, cloro, estado, tipo = lectura_aleatoria(azar)
+            mayor = float(volumen) + azar.choice([0.01, 1, 5, 50, 500])
+            menor_r = calcular_recomendacion(volumen, ph, cloro, estado, tipo, reglas)
+            mayor_r = calcular_recomendacion(mayor, ph, cloro, estado, tipo, reglas)
+            cantidades = {p["clave"]: p["cantidad"] for p in mayor_r["productos_sugeridos"]}
+            for producto in menor_r["productos_sugeridos"]:
+                with self.subTest(lectura=(volumen, mayor, ph, cloro, estado, tipo), producto=producto["clave"]):
+                    self.assertIn(producto["clave"], cantidades)
+                    self.assertGreaterEqual(cantidades[producto["clave"]], producto["cantidad"])
+
+    def test_auxiliares_de_dosis(self):
+        azar = random.Random(3)
+        for _ in range(3000):
+            volumen = azar.uniform(0.01, 5000)
+            mayor = volumen + azar.uniform(0.01, 500)
+            cloro, objetivo = azar.uniform(0, 20), azar.uniform(0.5, 4.5)
+            ph = azar.uniform(0, 14)
+            gramos = _cloro_operativo_gramos(volumen, cloro, objetivo)
+            if cloro >= objetivo:
+                self.assertEqual(gramos, 0)
+            else:
+                self.assertEqual(gramos % 10, 0)
+                self.assertLessEqual(gramos, _cloro_operativo_gramos(mayor, cloro, objetivo))
+            self.assertGreaterEqual(_sulfato_kg(volumen), 1)
+            self.assertLessEqual(_sulfato_kg(volumen), _sulfato_kg(mayor))
+            self.assertLessEqual(_p24_gramos(volumen, ph), _p24_gramos(mayor, ph))
+            self.assertGreaterEqual(_p24_gramos(volumen, ph), _p24_gramos(volumen, ph + azar.uniform(0, 2)))
+            self.assertGreaterEqual(_alguicida_gramos(volumen), 0)
+            self.assertEqual(_alguicida_gramos(volumen) % 10, 0)
+            self.assertLessEqual(_alguicida_gramos(volumen), _alguicida_gramos(mayor))
+
+    def test_diagnostico_tecnico_en_todas_las_categorias(self):
+        azar = random.Random(5)
+        categorias = [*PROBLEMAS_TECNICOS, "desconocida", "", None]
+        for categoria in categorias:
+            detalle = "".join(azar.choice("abcñáé🙂 \n") for _ in range(azar.randint(0, 1200)))
+            with self.subTest(categoria=categoria):
+                resultado = diagnosticar_problema_tecnico(categoria, detalle)
+                self._validar(resultado)
+                self.assertTrue(resultado["protocolo"])
+                if detalle.strip():
+                    self.assertTrue(resultado["resumen"].endswith(f"Información reportada: {detalle.strip()[:500]}"))
+
+    def test_comparar_rendimiento_marca_caidas_sobre_la_tolerancia(self):
+        referencia = {"a": 10.0, "b": 10.0, "c": 10.0, "d": 0}
+        actual = {"a": 8.1, "b": 7.9, "d": 5.0}
+        self.assertEqual([r[0] for r in comparar_rendimiento(actual, referencia)], ["b"])
+        self.assertEqual(comparar_rendimiento(actual, referencia, tolerancia=0.1), [("a", 10.0, 8.1, 1 - 8.1 / 10.0), ("b", 10.0, 7.9, 1 - 7.9 / 10.0)])
+
+
+class MotorActivoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_motor_activo_y_reglas_quedan_en_cache(self):
+        motor = motor_activo()
+        with self.assertNumQueries(0):
+            self.assertEqual(motor_activo().pk, motor.pk)
+            self.assertIs(reglas_motor(motor), reglas_motor(motor_activo()))
+        motor.reglas = {**motor.reglas, "ph_min": 7.0}
+        self.assertEqual(reglas_motor(motor).ph_min, 7.0)
+
+    def test_activar_version_invalida_la_cache(self):
+        anterior = motor_activo()
+        nuevo = MotorRecomendacion.objects.create(version="2.0", reglas={"cloro_granulado_g_por_m3": 9.0})
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        self.client.post(reverse("asistente_tecnico:version_activar", args=[nuevo.pk]))
+        self.assertEqual(motor_activo().pk, nuevo.pk)
+        self.assertEqual(reglas_motor(motor_activo()).cloro_g_por_m3, 9.0)
+        anterior.refresh_from_db()
+        self.assertFalse(anterior.activo)
+
+
+class MotorConocimientoTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("cliente")
+        self.motor = MotorRecomendacion.objects.create(version="prueba", reglas=DEFAULT_RULES)
+
+    def _caso(self, resultado="pendiente", tipo="floculacion", volumen=30, estado="verde"):
+        caso = CasoAsistenteTecnico.objects.create(
+            user=self.user, motor=self.motor, volumen_m3=volumen, ph_inicial=7.4, cloro_inicial=1, estado_agua=estado,
+            tipo_piscina="residencial", diagnostico="Prueba", tipo_tratamiento=tipo, resultado=resultado,
+        )
+        registrar_resultado(caso)
+        return caso
+
+    def _contadores(self):
+        return sorted(ContadorResultadoTratamiento.objects.filter(Q(exitosos__gt=0) | Q(parciales__gt=0) | Q(fallidos__gt=0)).values_list(
+            "tipo_tratamiento", "banda_volumen", "estado_agua", "exitosos", "parciales", "fallidos",
+        ))
+
+    def test_intervalo_wilson(self):
+        inferior, superior = intervalo_wilson(8, 10)
+        self.assertAlmostEqual(inferior, 0.4902, places=3)
+        self.assertAlmostEqual(superior, 0.9433, places=3)
+        self.assertEqual(intervalo_wilson(0, 0), (0.0, 1.0))
+        self.assertEqual(intervalo_wilson(5, 5)[1], 1.0)
+
+    def test_seguimiento_actualiza_contadores_igual_que_la_reconstruccion(self):
+        caso = self._caso(volumen=120, estado="muy_turbia")
+        self._caso("exitoso", volumen=10)
+        self.client.force_login(self.user)
+        url = reverse("asistente_tecnico:seguimiento", args=[caso.pk])
+        self.client.post(url, {"resultado": "fallido"})
+        self.client.post(url, {"resultado": "parcial"})
+        self.assertEqual(self._contadores(), [
+            ("floculacion", "hasta_25", "verde", 1, 0, 0),
+            ("floculacion", "mas_100", "muy_turbia", 0, 1, 0),
+        ])
+        incrementales = self._contadores()
+        reconstruir_contadores()
+        self.assertEqual(self._contadores(), incrementales)
+
+    def test_analisis_no_recorre_casos_y_respeta_propuestas_revisadas(self):
+        for _ in range(30):
+            self._caso("exitoso", tipo="normal", estado="transparente")
+        for resultado in ["fallido"] * 8 + ["exitoso"] * 2:
+            self._caso(resultado, tipo="correctivo", volumen=60, estado="ligeramente_turbia")
+        for _ in range(3):
+            self._caso("fallido", tipo="floculacion")
+        with self.assertNumQueries(3):
+            propuestas = analizar_motor_conocimiento()
+        claves = {p.fuente_clave for p in propuestas}
+        self.assertEqual(claves, {"protocolo:normal", "protocolo:correctivo", "protocolo:correctivo:ligeramente_turbia:50_100"})
+        normal = PropuestaConocimiento.objects.get(fuente_clave="protocolo:normal")
+        self.assertIn("alta efectividad", normal.titulo)
+        self.assertEqual(normal.evidencia["total"], 30)
+        self.assertGreaterEqual(normal.evidencia["intervalo_inferior"], 80)
+        self.assertTrue(PropuestaConocimiento.objects.get(fuente_clave="protocolo:correctivo").titulo.startswith("Revisar"))
+
+        normal.estado = "aprobada"
+        normal.save()
+        for _ in range(10):
+            self._caso("fallido", tipo="normal", estado="transparente")
+        analizar_motor_conocimiento()
+        normal.refresh_from_db()
+        self.assertEqual(normal.evidencia["total"], 30)
+        self.assertEqual(PropuestaConocimiento.objects.count(), 3)
+
+
+class RecordatoriosSeguimientoTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("tecnico")
+        self.motor = MotorRecomendacion.objects.create(version="prueba", reglas=DEFAULT_RULES)
+        self.ahora = timezone.now()
+
+    def _caso(self, programado_hace=timedelta(hours=1), **campos):
+        return CasoAsistenteTecnico.objects.create(
+            user=self.user, motor=self.motor, volumen_m3=30, ph_inicial=7.4, cloro_inicial=1, estado_agua="verde",
+            tipo_piscina="residencial", diagnostico="Prueba", tipo_tratamiento="floculacion",
+            seguimiento_programado_para=self.ahora - programado_hace, **campos,
+        )
+
+    def test_lotes_crean_notificaciones_y_no_repiten(self):
+        vencidos = [self._caso() for _ in range(5)]
+        self._caso(programado_hace=-timedelta(hours=2))
+        self._caso(resultado="exitoso")
+        self._caso(recordatorios_enviados=1, ultimo_recordatorio_en=self.ahora - timedelta(hours=2))
+        # Un SELECT, un INSERT y un UPDATE, más el savepoint del lote.
+        with self.assertNumQueries(5):
+            self.assertEqual(generar_recordatorios_seguimiento(), 5)
+        self.assertEqual(generar_recordatorios_seguimiento(lote=2), 0)
+        notificaciones = Notificacion.objects.filter(user=self.user)
+        self.assertEqual(notificaciones.count(), 5)
+        self.assertTrue(all(n.push_pendiente for n in notificaciones))
+        self.assertEqual(
+            set(notificaciones.values_list("url", flat=True)),
+            {f"/dashboard/asistente/casos/{caso.pk}/seguimiento/" for caso in vencidos},
+        )
+        for caso in vencidos:
+            caso.refresh_from_db()
+            self.assertEqual(caso.recordatorios_enviados, 1)
+
+    def test_vuelve_a_recordar_cada_24_horas_hasta_el_maximo(self):
+        caso = self._caso()
+        for numero in range(1, 5):
+            CasoAsistenteTecnico.objects.filter(pk=caso.pk).update(ultimo_recordatorio_en=F("ultimo_recordatorio_en") - timedelta(hours=25))
+            generar_recordatorios_seguimiento(lote=1)
+        caso.refresh_from_db()
+        self.assertEqual(caso.recordatorios_enviados, 3)
+        mensajes = list(Notificacion.objects.order_by("pk").values_list("mensaje", flat=True))
+        self.assertEqual(len(mensajes), 3)
+        self.assertIn("Hace aproximadamente 24 horas", mensajes[0])
+        self.assertIn(f"caso #{caso.pk}", mensajes[2])
+
+    def test_cola_de_push_envia_una_vez(self):
+        self._caso()
+        self._caso()
+        generar_recordatorios_seguimiento()
+        with mock.patch("dashboard.views._send_push_to_user") as enviar:
+            self.assertEqual(procesar_push_pendientes(), 2)
+            self.assertEqual(procesar_push_pendientes(), 0)
+        self.assertEqual(enviar.call_count, 2)
+        self.assertEqual(enviar.call_args.kwargs["user"], self.user)
+        self.assertFalse(Notificacion.objects.filter(push_pendiente=True).exists())
+
+
+class AcademiaBusquedaTests(TestCase):
+    def _contenido(self, codigo, titulo, estado="aprobado", **campos):
+        return ContenidoAcademia.objects.create(tipo="biblioteca", codigo=codigo, slug=codigo.lower(), titulo=titulo, estado=estado, **campos)
+
+    def test_busqueda_sin_tildes_con_plurales_y_por_relevancia(self):
+        titulo = self._contenido("ZEO-1", "Zeolita en el filtro")
+        cuerpo = self._contenido("ZEO-2", "Medios filtrantes", contenido="Algunas zeolitas también retienen amonio.")
+        self._contenido("ZEO-3", "Válvula selectora", etiquetas="multiválvula, retrolavado")
+        aprobados = ContenidoAcademia.objects.filter(estado="aprobado")
+        self.assertEqual(list(buscar_contenidos(aprobados, "ZEOLITAS")), [titulo, cuerpo])
+        self.assertEqual(buscar_contenidos(aprobados, "valvula selectora").first().codigo, "ZEO-3")
+        self.assertFalse(buscar_contenidos(aprobados, "zeolita inexistentezz").exists())
+        tecnico = User.objects.create_user("tecnico")
+        tecnico.groups.create(name="trabajadores")
+        self.client.force_login(tecnico)
+        respuesta = self.client.get(reverse("asistente_tecnico:academia_cms"), {"q": "zeolitas"})
+        self.assertEqual(respuesta.context["contenidos"], [titulo, cuerpo])
+
+        cuerpo.contenido = "Sin relación."
+        cuerpo.save()
+        self.assertEqual(list(buscar_contenidos(aprobados, "zeolita")), [titulo])
+        titulo.delete()
+        self.assertFalse(buscar_contenidos(aprobados, "zeolita").exists())
+
+    def test_relacionados_iguales_al_filtro_anterior_en_una_consulta(self):
+        def anterior(resultado, limite=6):
+            texto = f"{resultado.get('tipo_tratamiento') or ''} {resultado.get('diagnostico') or ''} {resultado.get('resumen') or ''}".lower()
+            modulos, terminos = {"fundamentos"}, []
+            if "floc" in texto or "verde" in texto or "turb" in texto:
+                modulos.update({"problemas", "productos", "mantenimiento"}); terminos += ["floc", "sulfato", "verde", "turb"]
+            if "ph" in texto:
+                modulos.add("quimica"); terminos += ["ph", "metasilicato", "reductor"]
+            if "cloro" in texto or "desinf" in texto:
+                modulos.update({"quimica", "productos"}); terminos += ["cloro", "tricloro"]
+            if "filtr" in texto or "circul" in texto:
+                modulos.update({"equipos", "preventivo"}); terminos += ["filtro", "bomba", "circul"]
+            filtro = Q(modulo_curso__in=modulos)
+            for termino in terminos:
+                filtro |= Q(titulo__icontains=termino) | Q(etiquetas__icontains=termino) | Q(resumen__icontains=termino)
+            qs = ContenidoAcademia.objects.filter(estado="aprobado").exclude(acceso="suscriptor")
+            return list(qs.filter(filtro).order_by("orden_curso", "orden", "titulo").distinct()[:limite])
+
+        self.assertTrue(ContenidoAcademia.objects.filter(estado="aprobado").exists())
+        resultados = [calcular_recomendacion(*lectura) for lectura in lecturas_aleatorias(random.Random(2), 40)]
+        resultados += [diagnosticar_problema_tecnico(categoria) for categoria in PROBLEMAS_TECNICOS]
+        for resultado in resultados:
+            esperado = anterior(resultado)
+            with self.subTest(resultado=resultado["diagnostico"]), self.assertNumQueries(1):
+                self.assertEqual(relacionados_para_diagnostico(resultado), esperado)
+
+    def test_aprobar_o_archivar_actualiza_relacionados(self):
+        general = {"tipo_tratamiento": "diagnostico_tecnico", "diagnostico": "Caso", "resumen": ""}
+        nuevo = self._contenido("FUND-0", "Bienvenida", estado="borrador", modulo_curso="fundamentos", orden_curso=0, orden=0)
+        self.assertNotIn(nuevo, relacionados_para_diagnostico(general, limite=12))
+        nuevo.estado = "aprobado"
+        nuevo.save()
+        self.assertIn(nuevo, relacionados_para_diagnostico(general, limite=12))
+        nuevo.estado = "archivado"
+        nuevo.save()
+        self.assertNotIn(nuevo, relacionados_para_diagnostico(general, limite=12))
+
+
+class AcademiaProgresoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.tecnico = User.objects.create_user("tecnico")
+        self.tecnico.groups.create(name="trabajadores")
+        self.client.force_login(self.tecnico)
+
+    def _contenido(self, codigo, acceso="compartido"):
+        # Orden 0 y título con "0" para quedar al principio del módulo de fundamentos.
+        return ContenidoAcademia.objects.create(
+            tipo="biblioteca", codigo=codigo, slug=codigo.lower(), titulo=f"0 {codigo}", estado="aprobado",
+            modulo_curso="fundamentos", acceso=acceso,
+        )
+
+    def test_estructura_en_cache_por_audiencia_e_invalidada_por_el_cms(self):
+        base = estructura_curso("interno")
+        with self.assertNumQueries(0):
+            self.assertEqual(estructura_curso("interno"), base)
+        with self.captureOnCommitCallbacks(execute=True):
+            primero = self._contenido("CUR-A")
+            solo_suscriptor = self._contenido("CUR-S", acceso="suscriptor")
+        self.assertEqual(estructura_curso("interno")[0], (primero.pk, "fundamentos"))
+        self.assertNotIn((solo_suscriptor.pk, "fundamentos"), estructura_curso("interno"))
+        self.assertEqual(estructura_curso("suscriptor")[:2], [(primero.pk, "fundamentos"), (solo_suscriptor.pk, "fundamentos")])
+        primero.estado = "archivado"
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.save()
+        self.assertEqual(estructura_curso("interno"), base)
+
+    def test_progreso_del_curso_con_el_resumen_del_usuario(self):
+        primero = self._contenido("CUR-A")
+        segundo = self._contenido("CUR-B")
+        total = len(estructura_curso("interno"))
+        self.client.post(reverse("asistente_tecnico:academia_contenido_completar", args=[primero.slug]))
+        self.assertEqual(ResumenProgresoAcademia.objects.get(user=self.tecnico).contenidos, [primero.pk])
+        with self.assertNumQueries(1):
+            progreso = progreso_curso("interno", resumen_progreso(self.tecnico))
+        self.assertEqual((progreso["total"], progreso["completadas"], progreso["continuar_id"]), (total, 1, segundo.pk))
+
+        respuesta = self.client.get(reverse("asistente_tecnico:academia_cms"), {"modo": "aprender"})
+        self.assertEqual((respuesta.context["curso_total"], respuesta.context["curso_completadas"]), (total, 1))
+        self.assertEqual(respuesta.context["continuar"], segundo)
+        self.assertEqual(respuesta.context["contenidos"][:2], [primero, segundo])
+        respuesta = self.client.get(reverse("asistente_tecnico:academia_contenido_detalle", args=[primero.slug]))
+        self.assertEqual(respuesta.context["siguiente"], segundo)
+
+        ProgresoContenidoAcademia.objects.filter(user=self.tecnico, contenido=primero).delete()
+        self.assertEqual(resumen_progreso(self.tecnico).contenidos, [])
+
+    def test_lecciones_en_cache_invalidadas_al_confirmar_cambios(self):
+        base = estructura_lecciones()
+        with self.captureOnCommitCallbacks(execute=True):
+            categoria = CategoriaAcademia.objects.create(nombre="Prueba", slug="prueba")
+            leccion = LeccionAcademia.objects.create(categoria=categoria, titulo="Lección", contenido="...")
+            # Hasta confirmar la transacción se sigue sirviendo la estructura anterior.
+            self.assertEqual(estructura_lecciones(), base)
+        self.assertCountEqual(estructura_lecciones(), [*base, (leccion.pk, categoria.pk)])
+        categoria.activa = False
+        with self.captureOnCommitCallbacks(execute=True):
+            categoria.save()
+        self.assertEqual(estructura_lecciones(), base)
+
+    def test_progreso_de_lecciones_por_categoria(self):
+        categoria = CategoriaAcademia.objects.create(nombre="Prueba", slug="prueba")
+        lecciones = [LeccionAcademia.objects.create(categoria=categoria, titulo=f"Lección {i}", contenido="...") for i in range(4)]
+        ProgresoLeccion.objects.create(user=self.tecnico, leccion=lecciones[0])
+        total, completadas, _porcentaje, por_categoria = progreso_lecciones(resumen_progreso(self.tecnico))
+        self.assertEqual(por_categoria[categoria.pk], (4, 1))
+        self.assertEqual(completadas, 1)
+        lecciones[3].publicada = False
+        with self.captureOnCommitCallbacks(execute=True):
+            lecciones[3].save()
+        self.assertEqual(progreso_lecciones(resumen_progreso(self.tecnico))[0], total - 1)
+        respuesta = self.client.get(reverse("asistente_tecnico:certificacion"))
+        fila = next(f for f in respuesta.context["filas"] if f["categoria"] == categoria)
+        self.assertEqual((fila["total"], fila["completadas"]), (3, 1))
+
+        self.tecnico.delete()
+        self.assertFalse(ResumenProgresoAcademia.objects.exists())
+
+
+MEDIA_PRUEBAS = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS)
+class ManualPdfTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_PRUEBAS, ignore_errors=True)
+
+    def setUp(self):
+        self.tecnico = User.objects.create_user("tecnico")
+        self.client.force_login(self.tecnico)
+        self.url = reverse("asistente_tecnico:academia_pdf_categoria", args=["equipo"])
+
+    def test_pdf_guardado_por_version_y_servido_con_etag(self):
+        with mock.patch("asistente_tecnico.manual_pdf.generar_pdf", wraps=generar_pdf) as generar:
+            primera = self.client.get(self.url)
+            self.assertEqual(primera.status_code, 200)
+            contenido = b"".join(primera.streaming_content)
+            self.assertTrue(contenido.startswith(b"%PDF"))
+            etag = primera["ETag"]
+
+            segunda = self.client.get(self.url)
+            self.assertEqual(b"".join(segunda.streaming_content), contenido)
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(generar.call_count, 1)
+
+            equipo = ContenidoAcademia.objects.filter(estado="aprobado", tipo="equipo").first()
+            equipo.resumen = "Resumen actualizado."
+            equipo.save()
+            tercera = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(tercera.status_code, 200)
+            self.assertNotEqual(tercera["ETag"], etag)
+            self.assertEqual(generar.call_count, 2)
+        self.assertEqual(len(list((Path(MEDIA_PRUEBAS) / "academia" / "pdf").glob("JVAQUA_equipo_*.pdf"))), 1)
+
+    def test_manual_con_indice_de_articulos(self):
+        from reportlab.platypus.tableofcontents import TableOfContents
+
+        contenidos = list(ContenidoAcademia.objects.filter(estado="aprobado", tipo="equipo")[:3])
+        self.assertEqual(len(contenidos), 3)
+        entradas = []
+        original = TableOfContents.addEntry
+        with mock.patch.object(TableOfContents, "addEntry", autospec=True, side_effect=lambda toc, *a, **k: (entradas.append(a[1]), original(toc, *a, **k))):
+            self.assertTrue(generar_pdf(contenidos).startswith(b"%PDF"))
+        self.assertEqual(entradas[-3:], [c.titulo for c in contenidos])
+
+
+class CalidadAguaTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user("suscriptor")
+        perfil = PerfilSuscriptor.objects.create(user=self.usuario, estado="activo")
+        self.piscina = PiscinaSuscriptor.objects.create(suscriptor=perfil, volumen_m3=Decimal("40"))
+        self.hoy = timezone.localdate()
+
+    def _resumenes(self):
+        return sorted(
+            ResumenCalidadAgua.objects.values_list("piscina_id", "periodo", "parametro", "inicio", "minimo", "maximo", "suma", "cantidad", "ultimo")
+        )
+
+    def test_resumenes_incrementales_iguales_a_reconstruir(self):
+        azar = random.Random(3)
+        registros = [
+            RegistroMantenimientoPiscina.objects.create(
+                piscina=self.piscina, fecha=self.hoy - timedelta(days=azar.randint(0, 60)),
+                ph=Decimal(str(round(azar.uniform(6.8, 8.0), 2))), cloro=None if azar.random() < 0.2 else Decimal(str(round(azar.uniform(0, 4), 2))),
+            )
+            for _ in range(40)
+        ]
+        registros[0].fecha -= timedelta(days=30)
+        registros[0].save()
+        registros[1].delete()
+        incrementales = self._resumenes()
+        reconstruir_resumenes_calidad()
+        self.assertEqual(incrementales, self._resumenes())
+
+        dia = self.hoy - timedelta(days=200)
+        RegistroMantenimientoPiscina.objects.create(piscina=self.piscina, fecha=dia, ph=Decimal("7.00"))
+        RegistroMantenimientoPiscina.objects.create(piscina=self.piscina, fecha=dia, ph=Decimal("7.60"))
+        resumen = ResumenCalidadAgua.objects.get(piscina=self.piscina, periodo="dia", parametro="ph", inicio=dia)
+        self.assertEqual((resumen.minimo, resumen.maximo, resumen.promedio, resumen.ultimo), (Decimal("7.00"), Decimal("7.60"), Decimal("7.30"), Decimal("7.60")))
+        self.piscina.delete()
+        self.assertFalse(ResumenCalidadAgua.objects.exists())
+
+    def test_lttb_conserva_extremos_y_picos(self):
+        datos = [(x, 7.2) for x in range(1000)]
+        datos[500] = (500, 9.5)
+        reducidos = lttb(datos, 50)
+        self.assertEqual(len(reducidos), 50)
+        self.assertEqual((reducidos[0], reducidos[-1]), (datos[0], datos[-1]))
+        self.assertIn((500, 9.5), reducidos)
+        self.assertEqual([x for x, _y in reducidos], sorted(x for x, _y in reducidos))
+        self.assertEqual(lttb(datos[:10], 50), datos[:10])
+
+    def test_serie_elige_resolucion_y_limita_puntos(self):
+        RegistroMantenimientoPiscina.objects.bulk_create([
+            RegistroMantenimientoPiscina(piscina=self.piscina, fecha=self.hoy - timedelta(days=n), ph=Decimal("7.20") + Decimal(n % 7) / 10, cloro=Decimal("1.50"))
+            for n in range(0, 1500, 2)
+        ])
+        reconstruir_resumenes_calidad([self.piscina])
+        for dias, resolucion in ((30, "lectura"), (365, "dia"), (1500, "dia"), (2500, "semana")):
+            with self.subTest(dias=dias), self.assertNumQueries(1):
+                serie = serie_calidad_agua(self.piscina, "ph", self.hoy - timedelta(days=dias - 1), self.hoy, puntos=200)
+            self.assertEqual(serie["resolucion"], resolucion)
+            self.assertLessEqual(len(serie["puntos"]), 200)
+            self.assertEqual(serie["puntos"][-1]["fecha"], (self.hoy if resolucion != "semana" else self.hoy - timedelta(days=self.hoy.weekday())).isoformat())
+
+        self.client.force_login(self.usuario)
+        url = reverse("asistente_tecnico:digital_calidad_agua", args=[self.piscina.pk])
+        respuesta = self.client.get(url, {"parametro": "cloro", "desde": (self.hoy - timedelta(days=9)).isoformat()})
+        self.assertEqual(respuesta.json()["puntos"], [{"fecha": (self.hoy - timedelta(days=n)).isoformat(), "valor": 1.5} for n in (8, 6, 4, 2, 0)])
+        self.assertEqual(self.client.get(url, {"parametro": "alcalinidad"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"desde": "ayer"}).status_code, 400)
+        self.assertContains(self.client.get(reverse("asistente_tecnico:digital_plan_mantenimiento", args=[self.piscina.pk])), "grafico-calidad")
+        self.client.force_login(User.objects.create_user("otro"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class PlanesPiscinaTests(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user("suscriptor")
+        self.perfil = PerfilSuscriptor.objects.create(user=self.usuario, estado="activo", plan="plus")
+
+    def _piscina(self, volumen="30", tipo="residencial", **campos):
+        return PiscinaSuscriptor.objects.create(suscriptor=self.perfil, volumen_m3=Decimal(volumen), tipo_piscina=tipo, **campos)
+
+    def test_planes_segun_volumen_tipo_y_lecturas(self):
+        normal, hotel, grande, inestable = self._piscina(), self._piscina(tipo="hotel"), self._piscina("120"), self._piscina()
+        inactiva = self._piscina(activa=False)
+        hoy = timezone.localdate()
+        for semanas in (0, 1):
+            RegistroMantenimientoPiscina.objects.create(piscina=inestable, fecha=hoy - timedelta(weeks=semanas), ph=Decimal("7.4"), cloro=Decimal("0.3"))
+        simulado = regenerar_planes(dry_run=True)
+        self.assertEqual((simulado["piscinas"], simulado["creados"]), (4, 4))
+        self.assertFalse(PlanMantenimientoPiscina.objects.exists())
+        self.assertEqual(regenerar_planes()["creados"], 4)
+        planes = {plan.piscina_id: plan for plan in PlanMantenimientoPiscina.objects.all()}
+        self.assertNotIn(inactiva.pk, planes)
+        self.assertEqual(
+            {p.pk: (planes[p.pk].frecuencia_recomendada, planes[p.pk].retrolavado_dias) for p in (normal, hotel, grande, inestable)},
+            {normal.pk: (1, 15), hotel.pk: (2, 10), grande.pk: (2, 15), inestable.pk: (2, 15)},
+        )
+        self.assertEqual(planes[normal.pk].rutina_visita(1), PlanMantenimientoPiscina.RUTINA_COMPLETA)
+        self.assertEqual(planes[hotel.pk].rutina_visita(1), PlanMantenimientoPiscina.RUTINA_LIGERA)
+        self.assertIn("cloro libre", planes[inestable.pk].rutina_visita(2)[-2])
+
+        # La frecuencia elegida por el suscriptor se respeta al regenerar.
+        plan = planes[hotel.pk]
+        plan.frecuencia_semanal = 1
+        plan.save()
+        self.assertEqual(regenerar_planes()["actualizados"], 1)
+        plan.refresh_from_db()
+        self.assertEqual((plan.frecuencia_semanal, plan.frecuencia_recomendada, plan.rutinas), (1, 2, [PlanMantenimientoPiscina.RUTINA_COMPLETA]))
+        resultado = regenerar_planes()
+        self.assertEqual((resultado["piscinas"], resultado["sin_cambios"]), (4, 4))
+
+    def test_lecturas_nuevas_actualizan_avisos_y_recomendacion(self):
+        piscina = self._piscina()
+        regenerar_planes()
+        hoy = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            for semanas in (0, 1):
+                RegistroMantenimientoPiscina.objects.create(piscina=piscina, fecha=hoy - timedelta(weeks=semanas), ph=Decimal("7.4"), cloro=Decimal("0.3"))
+            # Hasta confirmar la transacción, el plan no se toca.
+            self.assertEqual(PlanMantenimientoPiscina.objects.get(piscina=piscina).frecuencia_recomendada, 1)
+        plan = PlanMantenimientoPiscina.objects.get(piscina=piscina)
+        self.assertEqual((plan.frecuencia_semanal, plan.frecuencia_recomendada), (1, 2))
+        self.assertTrue(any("cloro libre" in tarea for tarea in plan.rutina_visita(1)))
+
+        # Semanas después, con las lecturas nuevas en rango, el plan deja de avisar.
+        despues = timezone.now() + timedelta(weeks=5)
+        with mock.patch("django.utils.timezone.now", return_value=despues):
+            for semanas in (0, 1):
+                RegistroMantenimientoPiscina.objects.create(
+                    piscina=piscina, fecha=despues.date() - timedelta(weeks=semanas), ph=Decimal("7.4"), cloro=Decimal("1.5"),
+                )
+            call_command("regenerar_planes_piscina", stdout=mock.MagicMock())
+        plan.refresh_from_db()
+        self.assertEqual(plan.frecuencia_recomendada, 1)
+        self.assertEqual(plan.rutina_visita(1), PlanMantenimientoPiscina.RUTINA_COMPLETA)
+
+    def test_consultas_por_lote_sin_importar_cuantas_piscinas(self):
+        def consultas(cantidad):
+            PiscinaSuscriptor.objects.all().delete()
+            for _ in range(cantidad):
+                self._piscina()
+            with CaptureQueriesContext(connection) as capturadas:
+                regenerar_planes(lote=100)
+            return len(capturadas)
+
+        self.assertEqual(consultas(3), consultas(30))
+
+    def test_comando_con_simulacion_y_vista_del_plan(self):
+        piscina = self._piscina()
+        salida = mock.MagicMock()
+        call_command("regenerar_planes_piscina", "--dry-run", stdout=salida)
+        texto = "".join(llamada.args[0] for llamada in salida.write.call_args_list)
+        self.assertIn("Simulación: 1 piscinas · 1 planes nuevos", texto)
+        self.assertIn("piscinas/s", texto)
+        self.assertFalse(PlanMantenimientoPiscina.objects.exists())
+
+        self.client.force_login(self.usuario)
+        url = reverse("asistente_tecnico:digital_plan_mantenimiento", args=[piscina.pk])
+        self.assertEqual(self.client.get(url).context["rutinas"], [(1, PlanMantenimientoPiscina.RUTINA_COMPLETA)])
+        self.client.post(url, {"frecuencia_semanal": "2"})
+        plan = PlanMantenimientoPiscina.objects.get(piscina=piscina)
+        self.assertEqual(plan.rutinas, [PlanMantenimientoPiscina.RUTINA_LIGERA, PlanMantenimientoPiscina.RUTINA_COMPLETA])
@@ -11,6 +11,7 @@ urlpatterns = [
     path("digital/piscina/<int:pk>/editar/", views.digital_piscina_form_view, name="digital_piscina_editar"),
     path("digital/piscina/<int:pk>/plan/", views.digital_plan_mantenimiento_view, name="digital_plan_mantenimiento"),
     path("digital/piscina/<int:pk>/plan/registrar/", views.digital_registrar_mantenimiento_view, name="digital_registrar_mantenimiento"),
+    path("digital/piscina/<int:pk>/calidad-agua/", views.digital_calidad_agua_view, name="digital_calidad_agua"),
     path("", views.asistente_inicio_view, name="inicio"),
     path("historial/", views.asistente_historial_view, name="historial"),
     # Compatibilidad: la biblioteca antigua redirige conceptualmente a la biblioteca técnica nueva.
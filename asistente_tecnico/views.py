@@ -1,19 +1,25 @@
-from datetime import timedelta
+from datetime import date, timedelta
 from decimal import Decimal, InvalidOperation
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.db.models import Count, Q
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
 from trabajadores.models import Trabajador
-from .engine import DEFAULT_RULES, calcular_recomendacion, diagnosticar_problema_tecnico, PROBLEMAS_TECNICOS
+from .academia import buscar_contenidos, relacionados_para_diagnostico
+from .calidad_agua import PARAMETROS, PUNTOS_SERIE, serie_calidad_agua
+from .conocimiento import analizar_motor_conocimiento, registrar_resultado
+from .curso import contenidos_visibles, estructura_curso, progreso_curso, progreso_lecciones, resumen_progreso
+from .engine import DEFAULT_RULES, compilar_reglas, diagnosticar_problema_tecnico, PROBLEMAS_TECNICOS
+from .manual_pdf import responder_pdf
 from .models import CasoAsistenteTecnico, MotorRecomendacion, ContenidoAcademia, ProgresoContenidoAcademia, FavoritoContenidoAcademia, ConsultaContenidoAcademia, PerfilSuscriptor, PiscinaSuscriptor, PlanMantenimientoPiscina, RegistroMantenimientoPiscina
-from .services import generar_recordatorios_seguimiento
+from .planes import regenerar_planes
+from .services import invalidar_motor_activo, motor_activo, reglas_motor
 
 
 def _es_admin(user):
@@ -54,16 +60,13 @@ def _trabajador(user):
 
 
 def _motor_activo():
-    motor = MotorRecomendacion.objects.filter(activo=True).order_by("-creado_en").first()
-    if motor:
-        return motor
-    return MotorRecomendacion.objects.create(
-        version="1.0",
-        nombre="Motor JVAQUA",
-        descripcion="Primera versión del motor de recomendaciones basado en protocolos operativos JVAQUA.",
-        reglas=DEFAULT_RULES,
-        activo=True,
-    )
+    return motor_activo()
+
+
+def _audiencia_academia(user):
+    if _es_suscriptor(user):
+        return "suscriptor"
+    return "admin" if _es_admin(user) else "interno"
 
 
 def _base_template(user):
@@ -74,41 +77,9 @@ def _base_template(user):
     return "dashboard/base_trabajador.html"
 
 
-def _actualizar_recordatorios(user):
-    try:
-        from dashboard.views import _crear_notificacion
-        generar_recordatorios_seguimiento(user=user, crear_notificacion=_crear_notificacion)
-    except Exception:
-        # El asistente nunca debe bloquear el ingreso a la herramienta por una falla de push.
-        pass
-
-
 def _academia_relacionada_con_diagnostico(resultado, limite=6):
     """Conecta Resolver con contenido oficial sin convertir la Academia en requisito."""
-    if not resultado:
-        return []
-    tipo = (resultado.get("tipo_tratamiento") or "").lower()
-    diagnostico = (resultado.get("diagnostico") or "").lower()
-    resumen = (resultado.get("resumen") or "").lower()
-    texto = f"{tipo} {diagnostico} {resumen}"
-
-    modulos = {"fundamentos"}
-    terminos = []
-    if "floc" in texto or "verde" in texto or "turb" in texto:
-        modulos.update({"problemas", "productos", "mantenimiento"})
-        terminos += ["floc", "sulfato", "verde", "turb"]
-    if "ph" in texto:
-        modulos.add("quimica"); terminos += ["ph", "metasilicato", "reductor"]
-    if "cloro" in texto or "desinf" in texto:
-        modulos.update({"quimica", "productos"}); terminos += ["cloro", "tricloro"]
-    if "filtr" in texto or "circul" in texto:
-        modulos.update({"equipos", "preventivo"}); terminos += ["filtro", "bomba", "circul"]
-
-    qs = ContenidoAcademia.objects.filter(estado="aprobado").exclude(acceso="suscriptor")
-    filtro = Q(modulo_curso__in=modulos)
-    for termino in terminos:
-        filtro |= Q(titulo__icontains=termino) | Q(etiquetas__icontains=termino) | Q(resumen__icontains=termino)
-    return list(qs.filter(filtro).order_by("orden_curso", "orden", "titulo").distinct()[:limite])
+    return relacionados_para_diagnostico(resultado, limite)
 
 
 @login_required
@@ -121,7 +92,6 @@ def asistente_inicio_view(request):
         return redirect("asistente_tecnico:digital_resolver")
     if not (_es_trabajador(request.user) or _es_admin(request.user)):
         return HttpResponseForbidden("No autorizado")
-    _actualizar_recordatorios(request.user)
     motor = _motor_activo()
     resultado = None
     caso = None
@@ -167,7 +137,7 @@ def asistente_inicio_view(request):
                 for error in errores:
                     messages.error(request, error)
             else:
-                resultado = calcular_recomendacion(volumen, ph, cloro, estado, tipo_piscina, motor.reglas)
+                resultado = reglas_motor(motor).recomendar(volumen, ph, cloro, estado, tipo_piscina)
                 caso = CasoAsistenteTecnico.objects.create(
                     user=request.user,
                     trabajador=_trabajador(request.user),
@@ -208,7 +178,6 @@ def asistente_inicio_view(request):
 def asistente_historial_view(request):
     if not (_es_trabajador(request.user) or _es_admin(request.user)):
         return HttpResponseForbidden("No autorizado")
-    _actualizar_recordatorios(request.user)
     qs = CasoAsistenteTecnico.objects.select_related("user", "trabajador", "motor")
     if not _es_admin(request.user):
         qs = qs.filter(user=request.user)
@@ -265,7 +234,10 @@ def asistente_seguimiento_view(request, pk):
                     except InvalidOperation:
                         pass
             caso.seguimiento_respondido_en = timezone.now()
-            caso.save()
+            with transaction.atomic():
+                anterior = CasoAsistenteTecnico.objects.select_for_update().values_list("resultado", flat=True).get(pk=caso.pk)
+                caso.save()
+                registrar_resultado(caso, anterior)
             try:
                 from dashboard.models import Notificacion
                 Notificacion.objects.filter(
@@ -401,11 +373,20 @@ def asistente_version_nueva_view(request):
                     if valor:
                         reglas[campo] = int(float(valor)) if campo == "seguimiento_horas" else float(valor)
             except ValueError:
-                messages.error(request, "Hay un valor numérico inválido en las reglas.")
+                error = "Hay un valor numérico inválido en las reglas."
+            else:
+                try:
+                    compilar_reglas(reglas)
+                    error = ""
+                except ValueError as exc:
+                    error = str(exc)
+            if error:
+                messages.error(request, error)
             else:
                 with transaction.atomic():
                     MotorRecomendacion.objects.filter(activo=True).update(activo=False)
                     nuevo = MotorRecomendacion.objects.create(version=version, nombre="Motor JVAQUA", descripcion=descripcion, reglas=reglas, activo=True, publicado_por=request.user)
+                invalidar_motor_activo()
                 messages.success(request, f"Motor JVAQUA {nuevo.version} publicado. Los casos históricos conservan la versión con la que fueron calculados.")
                 return redirect("asistente_tecnico:admin")
     return render(request, "asistente_tecnico/version_form.html", {"base_template": "dashboard/base_admin.html", "actual": actual, "reglas": reglas_actuales, "es_admin": True})
@@ -422,6 +403,7 @@ def asistente_version_activar_view(request, pk):
         motor.activo = True
         motor.publicado_por = request.user
         motor.save(update_fields=["activo", "publicado_por"])
+    invalidar_motor_activo()
     messages.success(request, f"Motor {motor.version} activado. Los casos nuevos usarán esta versión.")
     return redirect("asistente_tecnico:admin")
 
@@ -458,24 +440,14 @@ def _consejo_del_dia():
     return qs[idx]
 
 
-def _progreso_usuario(user):
-    total = LeccionAcademia.objects.filter(publicada=True, categoria__activa=True).count()
-    completadas = ProgresoLeccion.objects.filter(user=user, completada=True, leccion__publicada=True, leccion__categoria__activa=True).count()
-    porcentaje = round((completadas / total) * 100) if total else 0
-    return total, completadas, porcentaje
-
-
 @login_required
 def centro_conocimiento_view(request):
     if not (_es_trabajador(request.user) or _es_admin(request.user)):
         return HttpResponseForbidden("No autorizado")
-    oficiales = ContenidoAcademia.objects.filter(estado="aprobado")
-    if not _es_admin(request.user):
-        oficiales = oficiales.exclude(acceso="suscriptor")
-    curso = oficiales.exclude(modulo_curso="")
-    total = curso.count()
-    completadas = ProgresoContenidoAcademia.objects.filter(user=request.user, completado=True, contenido__in=curso).count()
-    porcentaje = round((completadas / total) * 100) if total else 0
+    audiencia = "admin" if _es_admin(request.user) else "interno"
+    oficiales = contenidos_visibles(audiencia)
+    progreso = progreso_curso(audiencia, resumen_progreso(request.user))
+    total, completadas, porcentaje = progreso["total"], progreso["completadas"], progreso["porcentaje"]
     recientes = [x.contenido for x in ConsultaContenidoAcademia.objects.filter(user=request.user, contenido__estado="aprobado").select_related("contenido")[:4]]
     favoritos = [x.contenido for x in FavoritoContenidoAcademia.objects.filter(user=request.user, contenido__estado="aprobado").select_related("contenido")[:4]]
     return render(request, "asistente_tecnico/centro_conocimiento.html", {
@@ -490,15 +462,14 @@ def centro_conocimiento_view(request):
 def academia_view(request):
     if not (_es_trabajador(request.user) or _es_admin(request.user)):
         return HttpResponseForbidden("No autorizado")
-    completadas_ids = set(ProgresoLeccion.objects.filter(user=request.user, completada=True).values_list("leccion_id", flat=True))
+    resumen = resumen_progreso(request.user)
+    completadas_ids = set(resumen.lecciones)
+    total, completadas, porcentaje, por_categoria = progreso_lecciones(resumen)
     categorias = list(CategoriaAcademia.objects.filter(activa=True).prefetch_related("lecciones"))
     for cat in categorias:
-        publicadas = [x for x in cat.lecciones.all() if x.publicada]
-        cat.lecciones_publicadas = publicadas
-        cat.total_publicadas = len(publicadas)
-        cat.total_completadas = sum(1 for x in publicadas if x.pk in completadas_ids)
+        cat.lecciones_publicadas = [x for x in cat.lecciones.all() if x.publicada]
+        cat.total_publicadas, cat.total_completadas = por_categoria.get(cat.pk, (0, 0))
         cat.porcentaje = round((cat.total_completadas / cat.total_publicadas) * 100) if cat.total_publicadas else 0
-    total, completadas, porcentaje = _progreso_usuario(request.user)
     return render(request, "asistente_tecnico/academia.html", {
         "base_template": _base_template(request.user), "categorias": categorias,
         "completadas_ids": completadas_ids, "total_lecciones": total,
@@ -575,50 +546,18 @@ def casos_reales_view(request):
 def certificacion_view(request):
     if not (_es_trabajador(request.user) or _es_admin(request.user)):
         return HttpResponseForbidden("No autorizado")
-    completadas_ids = set(ProgresoLeccion.objects.filter(user=request.user, completada=True).values_list("leccion_id", flat=True))
-    categorias = list(CategoriaAcademia.objects.filter(activa=True).prefetch_related("lecciones"))
+    total, completadas, porcentaje, por_categoria = progreso_lecciones(resumen_progreso(request.user))
     filas = []
-    for cat in categorias:
-        lecciones = [x for x in cat.lecciones.all() if x.publicada]
-        total = len(lecciones)
-        hechas = sum(1 for x in lecciones if x.pk in completadas_ids)
-        porcentaje = round((hechas / total) * 100) if total else 0
-        filas.append({"categoria": cat, "total": total, "completadas": hechas, "porcentaje": porcentaje, "insignia": bool(total and hechas == total)})
-    total, completadas, porcentaje = _progreso_usuario(request.user)
+    for cat in CategoriaAcademia.objects.filter(activa=True):
+        total_cat, hechas = por_categoria.get(cat.pk, (0, 0))
+        porcentaje_cat = round((hechas / total_cat) * 100) if total_cat else 0
+        filas.append({"categoria": cat, "total": total_cat, "completadas": hechas, "porcentaje": porcentaje_cat, "insignia": bool(total_cat and hechas == total_cat)})
     return render(request, "asistente_tecnico/certificacion.html", {
         "base_template": _base_template(request.user), "filas": filas,
         "total": total, "completadas": completadas, "porcentaje": porcentaje, "es_admin": _es_admin(request.user),
     })
 
 
-def _analizar_motor_conocimiento():
-    propuestas = []
-    qs = CasoAsistenteTecnico.objects.exclude(resultado="pendiente")
-    tipos = qs.values("tipo_tratamiento").annotate(total=Count("id"), exitosos=Count("id", filter=Q(resultado="exitoso")), parciales=Count("id", filter=Q(resultado="parcial")), fallidos=Count("id", filter=Q(resultado="fallido")))
-    for fila in tipos:
-        total = fila["total"]
-        if total < 5:
-            continue
-        tasa = round((fila["exitosos"] / total) * 100, 1) if total else 0
-        tipo = fila["tipo_tratamiento"] or "sin_tipo"
-        if tasa >= 90:
-            titulo = f"Protocolo {tipo}: patrón de alta efectividad"
-            descripcion = f"En {total} seguimientos respondidos, el protocolo obtuvo {tasa}% de éxito. Conviene conservar esta referencia y revisar qué condiciones se repiten en los casos exitosos."
-        elif tasa < 70:
-            titulo = f"Revisar protocolo {tipo}"
-            descripcion = f"En {total} seguimientos respondidos, el protocolo obtuvo {tasa}% de éxito. Conviene revisar los casos parciales y fallidos antes de modificar el protocolo oficial."
-        else:
-            titulo = f"Protocolo {tipo}: evidencia en evaluación"
-            descripcion = f"Hay {total} casos respondidos con {tasa}% de éxito. Aún conviene acumular y revisar más evidencia antes de cambiar reglas oficiales."
-        fuente = f"protocolo:{tipo}"
-        evidencia = {"tipo_tratamiento": tipo, "total": total, "exitosos": fila["exitosos"], "parciales": fila["parciales"], "fallidos": fila["fallidos"], "tasa_exito": tasa}
-        obj, _ = PropuestaConocimiento.objects.get_or_create(fuente_clave=fuente, defaults={"titulo": titulo, "descripcion": descripcion, "evidencia": evidencia})
-        if obj.estado == "evaluacion":
-            obj.titulo = titulo; obj.descripcion = descripcion; obj.evidencia = evidencia; obj.save(update_fields=["titulo", "descripcion", "evidencia", "actualizado_en"])
-        propuestas.append(obj)
-    return propuestas
-
-
 @login_required
 def motor_conocimiento_view(request):
     if not _es_admin(request.user):
@@ -634,7 +573,7 @@ def motor_conocimiento_view(request):
 def motor_conocimiento_analizar_view(request):
     if not _es_admin(request.user):
         return HttpResponseForbidden("No autorizado")
-    propuestas = _analizar_motor_conocimiento()
+    propuestas = analizar_motor_conocimiento()
     messages.success(request, f"Análisis completado. Se actualizaron {len(propuestas)} patrones con evidencia suficiente.")
     return redirect("asistente_tecnico:motor_conocimiento")
 
@@ -838,39 +777,23 @@ def academia_publica_view(request):
     if not (_es_trabajador(request.user) or _es_admin(request.user) or _es_suscriptor(request.user)):
         return HttpResponseForbidden("No autorizado")
 
-    visibles = ContenidoAcademia.objects.filter(estado="aprobado")
-    if _es_suscriptor(request.user):
-        visibles = visibles.exclude(acceso="interno")
-    elif not _es_admin(request.user):
-        visibles = visibles.exclude(acceso="suscriptor")
+    audiencia = _audiencia_academia(request.user)
+    visibles = contenidos_visibles(audiencia)
 
     q = (request.GET.get("q") or "").strip()
     tipo = (request.GET.get("tipo") or "").strip()
     modo = (request.GET.get("modo") or "consultar").strip()
     modulo = (request.GET.get("modulo") or "").strip()
 
-    completadas_ids = set(
-        ProgresoContenidoAcademia.objects.filter(user=request.user, completado=True)
-        .values_list("contenido_id", flat=True)
-    )
-
     # El progreso siempre representa el curso completo visible para el usuario,
     # independientemente de los filtros de búsqueda que esté usando.
-    curso_base = list(visibles.exclude(modulo_curso="").order_by("orden", "titulo"))
-    rango_modulo = {codigo: i for i, (codigo, _nombre) in enumerate(ContenidoAcademia.MODULOS_CURSO)}
-    curso_base.sort(key=lambda x: (rango_modulo.get(x.modulo_curso, 999), x.orden_curso, x.orden, x.titulo.lower()))
-    curso_total = len(curso_base)
-    curso_completadas = sum(1 for c in curso_base if c.pk in completadas_ids)
-    curso_porcentaje = round((curso_completadas / curso_total) * 100) if curso_total else 0
-    continuar = next((c for c in curso_base if c.pk not in completadas_ids), None)
-
-    qs = visibles
-    if q:
-        qs = qs.filter(
-            Q(titulo__icontains=q) | Q(resumen__icontains=q) | Q(etiquetas__icontains=q) |
-            Q(contenido__icontains=q) | Q(procedimiento__icontains=q) |
-            Q(fallas_frecuentes__icontains=q)
-        )
+    progreso = progreso_curso(audiencia, resumen_progreso(request.user))
+    completadas_ids = progreso["completadas_ids"]
+    curso_total, curso_completadas = progreso["total"], progreso["completadas"]
+    curso_porcentaje = progreso["porcentaje"]
+    continuar = visibles.filter(pk=progreso["continuar_id"]).first() if progreso["continuar_id"] else None
+
+    qs = buscar_contenidos(visibles, q) if q else visibles
     if tipo:
         qs = qs.filter(tipo=tipo)
     if modulo:
@@ -885,8 +808,8 @@ def academia_publica_view(request):
     ).select_related("contenido")[:6]]
 
     if modo == "aprender":
-        lista = list(qs.exclude(modulo_curso=""))
-        lista.sort(key=lambda x: (rango_modulo.get(x.modulo_curso, 999), x.orden_curso, x.orden, x.titulo.lower()))
+        posicion = {pk: i for i, (pk, _modulo) in enumerate(estructura_curso(audiencia))}
+        lista = sorted(qs.exclude(modulo_curso=""), key=lambda x: posicion.get(x.pk, len(posicion)))
         for codigo, nombre in ContenidoAcademia.MODULOS_CURSO:
             contenidos_modulo = [c for c in lista if c.modulo_curso == codigo]
             if contenidos_modulo:
@@ -901,7 +824,7 @@ def academia_publica_view(request):
                 })
         contenidos = lista
     else:
-        contenidos = list(qs.order_by("tipo", "orden", "titulo")[:200])
+        contenidos = list((qs if q else qs.order_by("tipo", "orden", "titulo"))[:200])
 
     return render(request, "asistente_tecnico/academia_cms_publica.html", {
         "base_template": _base_template(request.user),
@@ -942,19 +865,12 @@ def academia_contenido_detalle_view(request, slug):
 
     siguiente = None
     if obj.modulo_curso:
-        visibles = ContenidoAcademia.objects.filter(estado="aprobado").exclude(modulo_curso="")
-        if _es_suscriptor(request.user):
-            visibles = visibles.exclude(acceso="interno")
-        elif not _es_admin(request.user):
-            visibles = visibles.exclude(acceso="suscriptor")
-        lista = list(visibles)
-        rango_modulo = {codigo: i for i, (codigo, _nombre) in enumerate(ContenidoAcademia.MODULOS_CURSO)}
-        lista.sort(key=lambda x: (rango_modulo.get(x.modulo_curso, 999), x.orden_curso, x.orden, x.titulo.lower()))
-        ids = [c.pk for c in lista]
+        audiencia = _audiencia_academia(request.user)
+        ids = [pk for pk, _modulo in estructura_curso(audiencia)]
         if obj.pk in ids:
             idx = ids.index(obj.pk)
-            if idx + 1 < len(lista):
-                siguiente = lista[idx + 1]
+            if idx + 1 < len(ids):
+                siguiente = contenidos_visibles(audiencia).filter(pk=ids[idx + 1]).first()
 
     return render(request, "asistente_tecnico/academia_contenido_detalle.html", {
         "base_template": _base_template(request.user), "obj": obj,
@@ -1030,67 +946,25 @@ def experiencia_convertir_view(request, pk):
     return redirect("asistente_tecnico:cms_contenido_editar",pk=contenido.pk)
 
 
-def _pdf_styles():
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER
-    styles=getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="JTitle", parent=styles["Title"], alignment=TA_CENTER, textColor="#0A5AA8", spaceAfter=12))
-    styles.add(ParagraphStyle(name="JH", parent=styles["Heading2"], textColor="#0A5AA8", spaceBefore=10, spaceAfter=6))
-    return styles
-
-
-def _texto_pdf(texto):
-    import html
-    return html.escape(texto or "").replace("\n", "<br/>")
-
-
-def _contenido_story(obj, styles):
-    from reportlab.platypus import Paragraph, Spacer
-    story=[Paragraph("JVAQUA · Manual Técnico Oficial",styles["JTitle"]),Paragraph(_texto_pdf(obj.titulo),styles["Heading1"])]
-    story += [Paragraph(f"{obj.get_tipo_display()} · Nivel {obj.get_nivel_display()} · Versión {obj.version}", styles["Normal"]), Spacer(1,10)]
-    if obj.resumen: story += [Paragraph(_texto_pdf(obj.resumen),styles["Italic"]),Spacer(1,8)]
-    secciones=[("Introducción",obj.introduccion),("Contenido",obj.contenido),("Procedimiento",obj.procedimiento),("Herramientas / materiales",obj.herramientas_materiales),("Funcionamiento",obj.funcionamiento),("Componentes",obj.componentes),("Mantenimiento",obj.mantenimiento),("Fallas frecuentes",obj.fallas_frecuentes),("Buenas prácticas",obj.buenas_practicas),("Errores comunes",obj.errores_comunes),("Recomendaciones JVAQUA",obj.recomendaciones_jvaqua),("Referencias técnicas",obj.referencias_tecnicas)]
-    for titulo,texto in secciones:
-        if texto: story += [Paragraph(titulo,styles["JH"]),Paragraph(_texto_pdf(texto),styles["BodyText"]),Spacer(1,6)]
-    return story
-
-
-def _pdf_response(nombre, objetos):
-    from io import BytesIO
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import mm
-    from reportlab.platypus import SimpleDocTemplate, PageBreak, Paragraph
-    buf=BytesIO(); doc=SimpleDocTemplate(buf,pagesize=A4,rightMargin=16*mm,leftMargin=16*mm,topMargin=16*mm,bottomMargin=16*mm)
-    styles=_pdf_styles(); story=[]
-    objs=list(objetos)
-    if len(objs)>1:
-        story += [Paragraph("JVAQUA",styles["JTitle"]),Paragraph("Manual Técnico Oficial",styles["Title"]),Paragraph(f"Contenido aprobado · {timezone.localdate().strftime('%d/%m/%Y')}",styles["Normal"]),PageBreak()]
-    for i,obj in enumerate(objs):
-        if i: story.append(PageBreak())
-        story.extend(_contenido_story(obj,styles))
-    doc.build(story); data=buf.getvalue(); buf.close()
-    resp=HttpResponse(data,content_type="application/pdf"); resp["Content-Disposition"]=f'attachment; filename="{nombre}"'; return resp
-
-
 @login_required
 def academia_pdf_articulo_view(request, slug):
     filtros={"slug":slug};
     if not _es_admin(request.user): filtros["estado"]="aprobado"
     obj=get_object_or_404(ContenidoAcademia,**filtros)
-    return _pdf_response(f"JVAQUA_{slug}.pdf",[obj])
+    return responder_pdf(request, f"JVAQUA_{slug}.pdf", ContenidoAcademia.objects.filter(pk=obj.pk))
 
 
 @login_required
 def academia_pdf_categoria_view(request, tipo):
     if tipo not in {x[0] for x in ContenidoAcademia.TIPOS}: return HttpResponse("Tipo inválido",status=400)
     qs=ContenidoAcademia.objects.filter(estado="aprobado",tipo=tipo)
-    return _pdf_response(f"JVAQUA_{tipo}.pdf",qs)
+    return responder_pdf(request, f"JVAQUA_{tipo}.pdf", qs)
 
 
 @login_required
 def academia_pdf_manual_view(request):
     qs=ContenidoAcademia.objects.filter(estado="aprobado")
-    return _pdf_response("Manual_Tecnico_Oficial_JVAQUA.pdf",qs)
+    return responder_pdf(request, "Manual_Tecnico_Oficial_JVAQUA.pdf", qs)
 
 @login_required
 def digital_inicio_view(request):
@@ -1100,9 +974,7 @@ def digital_inicio_view(request):
     piscinas = perfil.piscinas.filter(activa=True)
     principal = piscinas.filter(principal=True).first() or piscinas.first()
     recientes = CasoAsistenteTecnico.objects.filter(user=request.user)[:4]
-    progreso_total = ContenidoAcademia.objects.filter(estado="aprobado").exclude(acceso="interno").exclude(modulo_curso="").count()
-    completados = ProgresoContenidoAcademia.objects.filter(user=request.user, completado=True, contenido__estado="aprobado").exclude(contenido__acceso="interno").count()
-    porcentaje = round(completados * 100 / progreso_total) if progreso_total else 0
+    porcentaje = progreso_curso("suscriptor", resumen_progreso(request.user))["porcentaje"]
     plan = PlanMantenimientoPiscina.objects.filter(piscina=principal, activo=True).first() if principal else None
     return render(request, "asistente_tecnico/digital_inicio.html", {"perfil":perfil,"piscinas":piscinas,"principal":principal,"recientes":recientes,"curso_porcentaje":porcentaje,"plan_mantenimiento":plan,"base_template":"asistente_tecnico/base_suscriptor.html"})
 
@@ -1143,19 +1015,22 @@ def digital_plan_mantenimiento_view(request, pk):
     perfil = _suscriptor(request.user)
     if not perfil: return HttpResponseForbidden("No autorizado")
     piscina = get_object_or_404(PiscinaSuscriptor, pk=pk, suscriptor=perfil, activa=True)
-    plan, _ = PlanMantenimientoPiscina.objects.get_or_create(piscina=piscina)
+    plan = PlanMantenimientoPiscina.objects.filter(piscina=piscina).first()
+    if plan is None or plan.version_plantilla != PlanMantenimientoPiscina.VERSION_PLANTILLA:
+        regenerar_planes([piscina])
+        plan = PlanMantenimientoPiscina.objects.get(piscina=piscina)
     if request.method == "POST":
         try: frecuencia = int(request.POST.get("frecuencia_semanal") or 1)
         except ValueError: frecuencia = 1
         plan.frecuencia_semanal = frecuencia if frecuencia in (1,2) else 1
         plan.arena_deteriorada = request.POST.get("arena_deteriorada") == "on"
-        plan.retrolavado_dias = 15
-        plan.save()
+        plan.save(update_fields=["frecuencia_semanal", "arena_deteriorada", "actualizado_en"])
+        regenerar_planes([piscina])
         messages.success(request, "AQUO actualizó el plan semanal de esta piscina.")
         return redirect("asistente_tecnico:digital_plan_mantenimiento", pk=piscina.pk)
     rutinas = [(i, plan.rutina_visita(i)) for i in range(1, plan.frecuencia_semanal + 1)]
     historial = piscina.mantenimientos_digitales.all()[:8]
-    return render(request, "asistente_tecnico/digital_plan_mantenimiento.html", {"perfil":perfil,"piscina":piscina,"plan":plan,"rutinas":rutinas,"historial":historial})
+    return render(request, "asistente_tecnico/digital_plan_mantenimiento.html", {"perfil":perfil,"piscina":piscina,"plan":plan,"rutinas":rutinas,"historial":historial,"rangos_calidad":RANGOS_CALIDAD})
 
 
 @login_required
@@ -1175,6 +1050,31 @@ def digital_registrar_mantenimiento_view(request, pk):
     return redirect("asistente_tecnico:digital_plan_mantenimiento", pk=piscina.pk)
 
 
+RANGOS_CALIDAD = [(90, "3 meses"), (365, "1 año"), (1825, "5 años")]
+
+
+@login_required
+def digital_calidad_agua_view(request, pk):
+    """Serie de pH o cloro de la piscina para el gráfico (JSON)."""
+    perfil = _suscriptor(request.user)
+    if _es_admin(request.user):
+        piscina = get_object_or_404(PiscinaSuscriptor, pk=pk)
+    elif perfil:
+        piscina = get_object_or_404(PiscinaSuscriptor, pk=pk, suscriptor=perfil)
+    else:
+        return HttpResponseForbidden("No autorizado")
+    parametro = request.GET.get("parametro") or "ph"
+    try:
+        hasta = date.fromisoformat(request.GET["hasta"]) if request.GET.get("hasta") else timezone.localdate()
+        desde = date.fromisoformat(request.GET["desde"]) if request.GET.get("desde") else hasta - timedelta(days=89)
+        puntos = min(max(int(request.GET.get("puntos") or PUNTOS_SERIE), 3), 1000)
+    except ValueError:
+        return JsonResponse({"error": "Fechas o cantidad de puntos inválidas."}, status=400)
+    if parametro not in PARAMETROS or desde > hasta:
+        return JsonResponse({"error": "Parámetro o rango inválido."}, status=400)
+    return JsonResponse({"piscina": piscina.pk, **serie_calidad_agua(piscina, parametro, desde, hasta, puntos)})
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def digital_resolver_view(request):
@@ -1202,7 +1102,7 @@ def digital_resolver_view(request):
                 if estado not in {x[0] for x in CasoAsistenteTecnico.ESTADO_AGUA_CHOICES}:
                     messages.error(request,"Selecciona cómo se ve el agua.")
                 else:
-                    motor=_motor_activo(); resultado=calcular_recomendacion(piscina.volumen_m3,ph,cloro,estado,piscina.tipo_piscina,motor.reglas)
+                    motor=_motor_activo(); resultado=reglas_motor(motor).recomendar(piscina.volumen_m3,ph,cloro,estado,piscina.tipo_piscina)
                     caso=CasoAsistenteTecnico.objects.create(user=request.user,motor=motor,volumen_m3=piscina.volumen_m3,ph_inicial=ph,cloro_inicial=cloro,estado_agua=estado,tipo_piscina=piscina.tipo_piscina,diagnostico=resultado["diagnostico"],tipo_tratamiento=resultado["tipo_tratamiento"],prioridad=resultado["prioridad"],resumen=resultado["resumen"],protocolo=resultado["protocolo"],productos_sugeridos=resultado["productos_sugeridos"],explicaciones=resultado["explicaciones"],advertencias=resultado["advertencias"],seguimiento_programado_para=timezone.now()+timedelta(hours=resultado["seguimiento_horas"]))
     return render(request,"asistente_tecnico/digital_resolver.html",{
         "piscinas":piscinas,"piscina":piscina,"resultado":resultado,"caso":caso,
@@ -268,6 +268,23 @@ if CLOUDINARY_URL:
         },
     }
 
+# =========================
+# REPORTES EN SEGUNDO PLANO
+# =========================
+# Los PDF/Excel pesados se encolan como ReporteJob y los genera
+# `python manage.py procesar_reportes --continuo`. Sin ese proceso (desarrollo
+# local) REPORTES_EN_LINEA=true los genera en la misma petición.
+REPORTES_EN_LINEA = os.environ.get("REPORTES_EN_LINEA", "true" if DEBUG else "false").strip().lower() == "true"
+# Minutos que un archivo generado se reutiliza mientras los datos no cambien.
+REPORTES_CACHE_MINUTOS = int(os.environ.get("REPORTES_CACHE_MINUTOS", "60"))
+
+# Los guardados de contratos se encolan en ContratoSyncPendiente y los procesa
+# `python manage.py procesar_sincronizaciones --continuo`. Sin ese proceso
+# (desarrollo local) SINCRONIZACION_CONTRATOS_EN_LINEA=true sincroniza al confirmar.
+SINCRONIZACION_CONTRATOS_EN_LINEA = os.environ.get(
+    "SINCRONIZACION_CONTRATOS_EN_LINEA", "true" if DEBUG else "false"
+).strip().lower() == "true"
+
 # =========================
 # LOGIN
 # =========================
@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from dashboard.reportes import responder_reporte
 from .models import Cliente, Ciudad
 
 
@@ -12,8 +14,15 @@ class ClienteAdmin(admin.ModelAdmin):
         ("GPS preciso para rutas", {"fields": ("latitud", "longitud"), "description": "Opcional. Si se ingresan coordenadas manuales, tienen prioridad sobre el enlace y la dirección."}),
     )
 
+    actions = ("generar_estados_cuenta",)
+
     @admin.display(description="GPS")
     def gps_estado(self, obj):
         return "✓ Verificado" if obj.latitud is not None and obj.longitud is not None else "⚠ Pendiente"
 
+    @admin.action(description="Generar estados de cuenta (zip)")
+    def generar_estados_cuenta(self, request, queryset):
+        # Se genera en la cola de reportes: con muchos clientes no bloquea la petición.
+        return responder_reporte(request, "estados_cuenta_lote", {"clientes": sorted(queryset.values_list("pk", flat=True))})
+
 admin.site.register(Ciudad)
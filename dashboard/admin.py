@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import PushSubscription, Notificacion
+from .models import PushSubscription, Notificacion, ReporteJob
 
 
 @admin.register(PushSubscription)
@@ -13,4 +13,12 @@ class PushSubscriptionAdmin(admin.ModelAdmin):
 class NotificacionAdmin(admin.ModelAdmin):
     list_display = ("user", "titulo", "leida", "creada_en", "leida_en")
     search_fields = ("user__username", "titulo", "mensaje", "url")
-    list_filter = ("leida", "creada_en", "leida_en")
\ No newline at end of file
+    list_filter = ("leida", "creada_en", "leida_en")
+
+
+@admin.register(ReporteJob)
+class ReporteJobAdmin(admin.ModelAdmin):
+    list_display = ("tipo", "estado", "solicitado_por", "tamano", "creado_en", "finalizado_en")
+    search_fields = ("tipo", "clave", "nombre_archivo", "solicitado_por__username")
+    list_filter = ("estado", "tipo", "creado_en")
+    readonly_fields = ("clave", "marca_datos", "creado_en", "iniciado_en", "finalizado_en")
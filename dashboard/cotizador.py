@@ -0,0 +1,216 @@
+"""Motor del cotizador inteligente.
+
+Las referencias internas (contratos activos por frecuencia y ciudad, con sus
+sumas de precio, pago técnico y costo químico de los últimos 90 días) se
+cargan con dos consultas agrupadas en un ``ModeloCotizacion``. ``cotizar``
+usa ese modelo sin tocar la base, así que una cotización suelta y el
+re-precio de toda la cartera cuestan lo mismo en consultas. El modelo se
+guarda en caché con la fecha y la marca de contratos y consumos.
+"""
+import hashlib
+from dataclasses import dataclass, field, replace
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from contratos.models import Contrato
+from finanzas.sincronizacion import marca_contratos
+from mantenimientos.models import UsoInsumo
+
+from .reportes import marca_de_modelos
+
+CERO = Decimal("0")
+CENTAVO = Decimal("0.01")
+DIAS_CONSUMO_QUIMICO = 90
+BASES_POR_FRECUENCIA = {
+    "quincenal": Decimal("45"), "1_semanal": Decimal("55"), "2_semanales": Decimal("80"),
+    "3_semanales": Decimal("120"), "personalizado": Decimal("80"),
+}
+
+
+@dataclass(frozen=True)
+class Referencia:
+    contratos: int = 0
+    precio: Decimal = CERO
+    tecnico: Decimal = CERO
+    quimicos: Decimal = CERO
+
+    def __add__(self, otra):
+        return Referencia(
+            self.contratos + otra.contratos, self.precio + otra.precio,
+            self.tecnico + otra.tecnico, self.quimicos + otra.quimicos,
+        )
+
+
+@dataclass(frozen=True)
+class ModeloCotizacion:
+    """Sumas de referencia por ``(frecuencia, ciudad_id)`` y por frecuencia.
+
+    ``factor_quimicos`` y ``factor_tecnico`` escalan los costos para simular
+    cambios de precio (1 = costos actuales).
+    """
+
+    por_ciudad: dict = field(default_factory=dict)
+    por_frecuencia: dict = field(default_factory=dict)
+    factor_quimicos: Decimal = Decimal("1")
+    factor_tecnico: Decimal = Decimal("1")
+
+    def referencia(self, frecuencia, ciudad_id=None):
+        if ciudad_id:
+            return self.por_ciudad.get((frecuencia, ciudad_id), Referencia())
+        return self.por_frecuencia.get(frecuencia, Referencia())
+
+    def con_variacion(self, quimicos=CERO, tecnico=CERO):
+        """Copia del modelo con los costos químico y técnico variados en ``quimicos``/``tecnico`` %."""
+        return replace(
+            self,
+            factor_quimicos=Decimal("1") + Decimal(quimicos) / 100,
+            factor_tecnico=Decimal("1") + Decimal(tecnico) / 100,
+        )
+
+
+def cargar_modelo_cotizacion(hoy=None):
+    hoy = hoy or timezone.localdate()
+    sumas = {}
+    contratos = (
+        Contrato.objects.filter(activo=True).values("frecuencia", "cliente__ciudad_ref_id")
+        .annotate(n=Count("pk"), precio=Sum("precio_mensual"), tecnico=Sum("valor_tecnico_mensual")).order_by()
+    )
+    for fila in contratos:
+        sumas[(fila["frecuencia"], fila["cliente__ciudad_ref_id"])] = Referencia(
+            fila["n"], fila["precio"] or CERO, fila["tecnico"] or CERO,
+        )
+    consumos = (
+        UsoInsumo.objects.filter(
+            mantenimiento__contrato__activo=True, mantenimiento__fecha__gte=hoy - timedelta(days=DIAS_CONSUMO_QUIMICO),
+        )
+        .values("mantenimiento__contrato__frecuencia", "mantenimiento__contrato__cliente__ciudad_ref_id")
+        .annotate(total=Sum("costo_total")).order_by()
+    )
+    for fila in consumos:
+        clave = (fila["mantenimiento__contrato__frecuencia"], fila["mantenimiento__contrato__cliente__ciudad_ref_id"])
+        if clave in sumas:
+            sumas[clave] = replace(sumas[clave], quimicos=fila["total"] or CERO)
+
+    por_frecuencia = {}
+    for (frecuencia, _ciudad), referencia in sumas.items():
+        por_frecuencia[frecuencia] = por_frecuencia.get(frecuencia, Referencia()) + referencia
+    return ModeloCotizacion(
+        por_ciudad={clave: ref for clave, ref in sumas.items() if clave[1] is not None},
+        por_frecuencia=por_frecuencia,
+    )
+
+
+def modelo_cotizacion(forzar=False):
+    """``cargar_modelo_cotizacion`` en caché mientras no cambien el día, los contratos ni los consumos."""
+    hoy = timezone.localdate()
+    marca = "|".join([
+        hoy.isoformat(), marca_contratos(), marca_de_modelos(("contratos.Contrato", "clientes.Cliente", "mantenimientos.UsoInsumo")),
+    ])
+    clave = "dashboard:cotizador:" + hashlib.sha256(marca.encode("utf-8")).hexdigest()
+    modelo = None if forzar else cache.get(clave)
+    if modelo is None:
+        modelo = cargar_modelo_cotizacion(hoy)
+        cache.set(clave, modelo, 60 * 60 * 24)
+    return modelo
+
+
+def cotizar(modelo, datos):
+    """Cotización para ``datos`` (ciudad, frecuencia, volumen, químicos, equipamiento, ajuste)."""
+    ciudad = datos.get("ciudad")
+    frecuencia = datos.get("frecuencia") or "1_semanal"
+    volumen = datos.get("volumen") or CERO
+    referencia = modelo.referencia(frecuencia, getattr(ciudad, "pk", ciudad))
+    n = referencia.contratos
+    if n:
+        prom_precio = referencia.precio / n
+        prom_tecnico = referencia.tecnico / n
+    else:
+        prom_precio = BASES_POR_FRECUENCIA.get(frecuencia, Decimal("55")); prom_tecnico = prom_precio*Decimal("0.35")
+    prom_tecnico = prom_tecnico * modelo.factor_tecnico
+    # Ajuste moderado por volumen respecto de una piscina residencial de 25 m3.
+    factor=Decimal("1")
+    if volumen>0:
+        factor=max(Decimal("0.85"),min(Decimal("1.65"),Decimal("0.75")+(volumen/Decimal("100"))))
+    base=(prom_precio*factor).quantize(CENTAVO)
+    tecnico_rec=(prom_tecnico*factor).quantize(CENTAVO)
+    tecnico_min=(tecnico_rec*Decimal("0.90")).quantize(CENTAVO)
+    tecnico_max=(tecnico_rec*Decimal("1.15")).quantize(CENTAVO)
+    # Estimación química basada en consumos históricos recientes de contratos comparables.
+    costo_q=(referencia.quimicos/Decimal(max(n,1))/Decimal("3")).quantize(CENTAVO) if datos.get("quimicos_incluidos") else CERO
+    if datos.get("quimicos_incluidos") and costo_q<=0:
+        costo_q=(base*Decimal("0.16")).quantize(CENTAVO)
+    costo_q=(costo_q*modelo.factor_quimicos).quantize(CENTAVO)
+    equipo=datos.get("equipamiento") or CERO; ajuste=datos.get("ajuste") or CERO
+    costo_directo=tecnico_rec+costo_q+equipo
+    minimo=max(base+equipo+ajuste,(costo_directo/Decimal("0.75"))+ajuste).quantize(CENTAVO)
+    recomendado=max(base+equipo+ajuste,(costo_directo/Decimal("0.65"))+ajuste).quantize(CENTAVO)
+    objetivo=max(recomendado,(costo_directo/Decimal("0.60"))+ajuste).quantize(CENTAVO)
+    utilidad=(recomendado-costo_directo).quantize(CENTAVO)
+    margen=((utilidad/recomendado)*100).quantize(CENTAVO) if recomendado else CERO
+    return {"contratos_similares":n,"promedio":prom_precio.quantize(CENTAVO),"costo_quimico":costo_q,"tecnico_min":tecnico_min,"tecnico_rec":tecnico_rec,"tecnico_max":tecnico_max,"precio_min":minimo,"precio_rec":recomendado,"precio_obj":objetivo,"utilidad":utilidad,"margen":margen}
+
+
+def cotizar_lote(lista_datos, modelo=None):
+    """Cotiza cada elemento de ``lista_datos`` con un solo modelo de referencia."""
+    modelo = modelo or modelo_cotizacion()
+    return [cotizar(modelo, datos) for datos in lista_datos]
+
+
+def datos_contratos(contratos=None):
+    """Datos de cotización de cada contrato activo (una consulta), con su precio actual."""
+    contratos = contratos if contratos is not None else Contrato.objects.filter(activo=True)
+    filas = contratos.annotate(
+        equipamiento_mensual=Sum("equipamientos__valor_mensual_adicional", filter=Q(equipamientos__activo=True)),
+    ).values(
+        "pk", "cliente__nombre", "cliente__ciudad_ref_id", "cliente__ciudad", "frecuencia", "piscina_volumen_m3",
+        "quimicos_proveedor", "precio_mensual", "equipamiento_mensual",
+    ).order_by("cliente__nombre", "pk")
+    return [
+        {
+            "contrato_id": fila["pk"],
+            "cliente": fila["cliente__nombre"],
+            "ciudad_nombre": fila["cliente__ciudad"],
+            "ciudad": fila["cliente__ciudad_ref_id"],
+            "frecuencia": fila["frecuencia"],
+            "volumen": fila["piscina_volumen_m3"],
+            "quimicos_incluidos": fila["quimicos_proveedor"] == "jvaqua",
+            "equipamiento": fila["equipamiento_mensual"] or CERO,
+            "precio_actual": fila["precio_mensual"],
+        }
+        for fila in filas
+    ]
+
+
+def simular_reprecio(variacion_quimicos=CERO, variacion_tecnico=CERO, contratos=None):
+    """Precio recomendado de cada contrato activo antes y después de variar los costos.
+
+    Devuelve las filas con la diferencia frente al precio actual y los totales
+    mensuales de la cartera.
+    """
+    modelo = modelo_cotizacion()
+    variado = modelo.con_variacion(variacion_quimicos, variacion_tecnico)
+    filas = []
+    for datos in datos_contratos(contratos):
+        actual = cotizar(modelo, datos)
+        nuevo = cotizar(variado, datos)
+        filas.append({
+            **datos,
+            "recomendado_actual": actual["precio_rec"],
+            "recomendado_nuevo": nuevo["precio_rec"],
+            "minimo_nuevo": nuevo["precio_min"],
+            "margen_nuevo": nuevo["margen"],
+            "diferencia": nuevo["precio_rec"] - datos["precio_actual"],
+            "bajo_minimo": datos["precio_actual"] < nuevo["precio_min"],
+        })
+    return {
+        "filas": filas,
+        "contratos": len(filas),
+        "bajo_minimo": sum(1 for f in filas if f["bajo_minimo"]),
+        "total_actual": sum((f["precio_actual"] for f in filas), CERO),
+        "total_recomendado": sum((f["recomendado_nuevo"] for f in filas), CERO),
+        "diferencia_total": sum((f["diferencia"] for f in filas), CERO),
+    }
@@ -0,0 +1,148 @@
+"""Exportaciones CSV y Excel por streaming.
+
+Las filas llegan como un iterable (normalmente ``filas_queryset``, que recorre
+el queryset con ``values_list(...).iterator(chunk_size)``) y nunca se
+materializan en listas:
+
+* CSV: ``StreamingHttpResponse`` que escribe línea por línea.
+* Excel: ``openpyxl`` en modo ``write_only``, que vuelca cada fila a disco; el
+  archivo terminado se sirve desde un temporal con ``FileResponse``.
+
+Así la memoria queda plana aunque se exporten varios años de movimientos.
+"""
+import csv
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+CHUNK_EXPORTACION = 2000
+FORMATOS_EXPORTACION = ("csv", "xlsx")
+CONTENT_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+FORMATO_MONEDA = "$ #,##0.00"
+FORMATO_FECHA = "DD/MM/YYYY"
+
+_RELLENO_TITULO = PatternFill("solid", fgColor="1F4E78")
+_RELLENO_ENCABEZADO = PatternFill("solid", fgColor="D9EAF7")
+
+
+def formato_exportacion(request, parametro="exportar"):
+    """``"csv"`` o ``"xlsx"`` si la petición pide exportar; ``None`` en otro caso."""
+    formato = (request.GET.get(parametro) or "").strip().lower()
+    return formato if formato in FORMATOS_EXPORTACION else None
+
+
+def filas_queryset(queryset, campos, transformar=None, chunk_size=CHUNK_EXPORTACION):
+    """Recorre ``queryset`` por bloques como tuplas de ``campos``, opcionalmente transformadas."""
+    filas = queryset.prefetch_related(None).values_list(*campos).iterator(chunk_size=chunk_size)
+    if transformar is None:
+        return filas
+    return (transformar(fila) for fila in filas)
+
+
+class _Eco:
+    # csv.writer escribe en cualquier objeto con write(); aquí solo devolvemos la línea.
+    def write(self, valor):
+        return valor
+
+
+def _hora_local(valor):
+    return timezone.localtime(valor) if timezone.is_aware(valor) else valor
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return _hora_local(valor).strftime("%d/%m/%Y %H:%M")
+    if isinstance(valor, date):
+        return valor.strftime("%d/%m/%Y")
+    return valor
+
+
+def respuesta_csv(encabezados, filas, nombre_archivo):
+    escritor = csv.writer(_Eco())
+
+    def lineas():
+        # BOM para que Excel abra el CSV en UTF-8 con tildes correctas.
+        yield "\ufeff" + escritor.writerow(encabezados)
+        for fila in filas:
+            yield escritor.writerow([_valor_csv(v) for v in fila])
+
+    response = StreamingHttpResponse(lineas(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
+
+def _celda(hoja, valor, fuente=None, relleno=None, formato=None):
+    celda = WriteOnlyCell(hoja, value=valor)
+    if fuente:
+        celda.font = fuente
+    if relleno:
+        celda.fill = relleno
+    if formato:
+        celda.number_format = formato
+    return celda
+
+
+def respuesta_excel(encabezados, filas, nombre_archivo, hoja="Datos", titulo=None, resumen=None, anchos=None, formatos=None, rellenos=None):
+    """Libro de una hoja en modo ``write_only``.
+
+    ``resumen`` son pares ``(etiqueta, valor)`` que van sobre la tabla;
+    ``formatos`` mapea índice de columna a ``number_format`` (moneda, fecha).
+    Las columnas de fecha sin formato explícito usan ``DD/MM/YYYY``.
+    ``rellenos`` mapea índice de columna a ``{valor: PatternFill}`` para
+    colorear la celda según su valor (por ejemplo ingreso/egreso).
+    """
+    libro = Workbook(write_only=True)
+    ws = libro.create_sheet(hoja)
+    for indice, ancho in enumerate(anchos or []):
+        ws.column_dimensions[get_column_letter(indice + 1)].width = ancho
+    negrita = Font(bold=True)
+
+    if titulo:
+        ws.append([_celda(ws, titulo, Font(color="FFFFFF", bold=True, size=12), _RELLENO_TITULO)])
+        ws.append([])
+    for etiqueta, valor in resumen or []:
+        ws.append([_celda(ws, etiqueta, negrita), _celda(ws, valor, formato=FORMATO_MONEDA if isinstance(valor, (Decimal, float)) else None)])
+    if resumen:
+        ws.append([])
+
+    encabezado = []
+    for texto in encabezados:
+        celda = _celda(ws, texto, negrita, _RELLENO_ENCABEZADO)
+        celda.alignment = Alignment(horizontal="center")
+        encabezado.append(celda)
+    ws.append(encabezado)
+
+    formatos = formatos or {}
+    rellenos = rellenos or {}
+    for fila in filas:
+        valores = []
+        for indice, valor in enumerate(fila):
+            formato = formatos.get(indice)
+            if formato is None and isinstance(valor, date):
+                formato = FORMATO_FECHA
+            if isinstance(valor, datetime):
+                valor = _hora_local(valor).replace(tzinfo=None)
+            relleno = rellenos[indice].get(valor) if indice in rellenos else None
+            valores.append(_celda(ws, valor, relleno=relleno, formato=formato) if formato or relleno else valor)
+        ws.append(valores)
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=True, filename=nombre_archivo, content_type=CONTENT_TYPE_XLSX)
+
+
+def exportar(formato, encabezados, filas, nombre_base, **opciones_excel):
+    """Respuesta de descarga en ``formato`` (``csv`` o ``xlsx``) para ``filas``."""
+    if formato == "csv":
+        return respuesta_csv(encabezados, filas, f"{nombre_base}.csv")
+    return respuesta_excel(encabezados, filas, f"{nombre_base}.xlsx", **opciones_excel)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.notificaciones import procesar_push_pendientes
+
+
+class Command(BaseCommand):
+    help = "Envía los push de las notificaciones en cola (push_pendiente)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limite", type=int, default=None, help="Máximo de notificaciones por ejecución.")
+
+    def handle(self, *args, **options):
+        procesadas = procesar_push_pendientes(limite=options["limite"])
+        self.stdout.write(self.style.SUCCESS(f"Push enviados: {procesadas}"))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.reportes import procesar_reportes_pendientes, purgar_reportes
+
+
+class Command(BaseCommand):
+    help = "Genera los reportes PDF/Excel encolados (ReporteJob) y guarda sus archivos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--continuo", action="store_true", help="Queda esperando nuevos reportes (modo worker).")
+        parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre revisiones en modo continuo.")
+        parser.add_argument("--limite", type=int, default=None, help="Máximo de reportes a procesar por pasada.")
+        parser.add_argument("--purgar-dias", type=int, default=None, help="Borra reportes terminados con más de N días.")
+
+    def handle(self, *args, **options):
+        if options["intervalo"] <= 0:
+            raise CommandError("--intervalo debe ser mayor que cero.")
+        if options["purgar_dias"] is not None:
+            if options["purgar_dias"] < 1:
+                raise CommandError("--purgar-dias debe ser al menos 1.")
+            borrados = purgar_reportes(options["purgar_dias"])
+            self.stdout.write(f"Reportes purgados: {borrados}")
+
+        if not options["continuo"]:
+            procesados = procesar_reportes_pendientes(limite=options["limite"])
+            self.stdout.write(self.style.SUCCESS(f"Reportes generados: {procesados}"))
+            return
+
+        self.stdout.write("Esperando reportes… (Ctrl+C para salir)")
+        try:
+            while True:
+                procesados = procesar_reportes_pendientes(limite=options["limite"])
+                if procesados:
+                    self.stdout.write(self.style.SUCCESS(f"Reportes generados: {procesados}"))
+                else:
+                    time.sleep(options["intervalo"])
+        except KeyboardInterrupt:
+            self.stdout.write("Worker de reportes detenido.")
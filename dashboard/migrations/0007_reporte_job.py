@@ -0,0 +1,42 @@
+# Generated by Django 5.2.11 on 2026-10-19 04:54
+
+import dashboard.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_notificacion_referencia_id_notificacion_tipo_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=60)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('clave', models.CharField(help_text='SHA-256 del tipo, los parámetros y la marca de datos', max_length=64)),
+                ('marca_datos', models.CharField(blank=True, default='', max_length=255)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Generando'), ('listo', 'Listo'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('archivo', models.FileField(blank=True, storage=dashboard.models.almacenamiento_reportes, upload_to='reportes/%Y/%m/')),
+                ('nombre_archivo', models.CharField(blank=True, default='', max_length=200)),
+                ('content_type', models.CharField(blank=True, default='', max_length=120)),
+                ('tamano', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_en', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reportes_solicitados', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['clave', 'estado'], name='dashboard_r_clave_a43422_idx'), models.Index(fields=['estado', 'creado_en'], name='dashboard_r_estado_462734_idx')],
+            },
+        ),
+    ]
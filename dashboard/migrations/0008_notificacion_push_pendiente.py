@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_reporte_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='push_pendiente',
+            field=models.BooleanField(db_index=True, default=False, help_text='Push por enviar desde la cola (manage.py enviar_push_pendientes).'),
+        ),
+    ]
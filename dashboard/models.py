@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -62,6 +64,11 @@ class Notificacion(models.Model):
     leida = models.BooleanField(default=False)
     creada_en = models.DateTimeField(auto_now_add=True)
     leida_en = models.DateTimeField(blank=True, null=True)
+    push_pendiente = models.BooleanField(
+        default=False,
+        db_index=True,
+        help_text="Push por enviar desde la cola (manage.py enviar_push_pendientes).",
+    )
 
     class Meta:
         ordering = ["-creada_en"]
@@ -103,4 +110,63 @@ class ActividadSistema(models.Model):
 
     def __str__(self):
         actor = self.user.username if self.user else "Sistema"
-        return f"{actor} | {self.titulo} | {self.creada_en:%Y-%m-%d %H:%M}"
\ No newline at end of file
+        return f"{actor} | {self.titulo} | {self.creada_en:%Y-%m-%d %H:%M}"
+
+def almacenamiento_reportes():
+    # Cloudinary guarda PDF y Excel como archivos "raw"; en local se usa MEDIA.
+    if getattr(settings, "CLOUDINARY_URL", ""):
+        from cloudinary_storage.storage import RawMediaCloudinaryStorage
+        return RawMediaCloudinaryStorage()
+    return default_storage
+
+
+class ReporteJob(models.Model):
+    ESTADO_PENDIENTE = "pendiente"
+    ESTADO_PROCESANDO = "procesando"
+    ESTADO_LISTO = "listo"
+    ESTADO_ERROR = "error"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_PROCESANDO, "Generando"),
+        (ESTADO_LISTO, "Listo"),
+        (ESTADO_ERROR, "Error"),
+    ]
+
+    tipo = models.CharField(max_length=60)
+    parametros = models.JSONField(default=dict, blank=True)
+    clave = models.CharField(
+        max_length=64,
+        help_text="SHA-256 del tipo, los parámetros y la marca de datos",
+    )
+    marca_datos = models.CharField(max_length=255, blank=True, default="")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    archivo = models.FileField(upload_to="reportes/%Y/%m/", storage=almacenamiento_reportes, blank=True)
+    nombre_archivo = models.CharField(max_length=200, blank=True, default="")
+    content_type = models.CharField(max_length=120, blank=True, default="")
+    tamano = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    intentos = models.PositiveSmallIntegerField(default=0)
+    solicitado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="reportes_solicitados",
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(blank=True, null=True)
+    finalizado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-creado_en"]
+        indexes = [
+            models.Index(fields=["clave", "estado"]),
+            models.Index(fields=["estado", "creado_en"]),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} | {self.get_estado_display()} | {self.creado_en:%Y-%m-%d %H:%M}"
+
+    @property
+    def terminado(self):
+        return self.estado in {self.ESTADO_LISTO, self.ESTADO_ERROR}
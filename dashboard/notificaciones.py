@@ -0,0 +1,52 @@
+"""Cola de push de ``Notificacion``.
+
+Los procesos que crean muchas notificaciones (por ejemplo los recordatorios
+de seguimiento del Asistente Técnico) las guardan con ``push_pendiente=True``
+en lugar de enviar el push en el mismo recorrido. ``procesar_push_pendientes``
+las toma por lotes con ``skip_locked`` y las marca antes de enviar, así dos
+procesos nunca envían el mismo push.
+"""
+import logging
+
+from django.db import transaction
+
+from .models import Notificacion
+
+logger = logging.getLogger(__name__)
+
+LOTE_PUSH = 100
+
+
+def _tomar_lote(limite):
+    with transaction.atomic():
+        ids = list(
+            Notificacion.objects.filter(push_pendiente=True).select_for_update(skip_locked=True)
+            .order_by("creada_en", "pk").values_list("pk", flat=True)[:limite]
+        )
+        Notificacion.objects.filter(pk__in=ids).update(push_pendiente=False)
+    return list(Notificacion.objects.filter(pk__in=ids).select_related("user").order_by("creada_en", "pk"))
+
+
+def procesar_push_pendientes(limite=None):
+    """Envía los push en cola por lotes. Devuelve cuántas notificaciones procesó."""
+    from .views import _send_push_to_user
+
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        tamano = LOTE_PUSH if limite is None else min(LOTE_PUSH, limite - procesadas)
+        lote = _tomar_lote(tamano)
+        if not lote:
+            break
+        for notificacion in lote:
+            try:
+                _send_push_to_user(
+                    user=notificacion.user,
+                    title=notificacion.titulo,
+                    body=notificacion.mensaje,
+                    url=notificacion.url or "/dashboard/notificaciones/",
+                    tag=f"notif-{notificacion.user_id}",
+                )
+            except Exception:
+                logger.exception("No se pudo enviar el push de la notificación %s", notificacion.pk)
+            procesadas += 1
+    return procesadas
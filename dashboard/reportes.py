@@ -0,0 +1,236 @@
+"""Cola de reportes PDF/Excel generados fuera de la petición.
+
+Cada vista de exportación registra aquí su generador con ``registrar_reporte``
+y, en lugar de construir el documento en la petición, llama a
+``responder_reporte``: se crea (o se reutiliza) un ``ReporteJob`` y el
+navegador espera en una página que consulta su estado. El proceso
+``python manage.py procesar_reportes --continuo`` toma los pendientes, ejecuta
+el generador y guarda el archivo en el almacenamiento de medios.
+
+Los archivos se reutilizan por su ``clave``: un SHA-256 del tipo, los
+parámetros y una marca de datos (cantidad, último id y última edición de los
+modelos que alimentan el reporte). Si nada cambió, descargar otra vez el mismo
+mes es inmediato. Como no todos los modelos guardan fecha de edición, un
+archivo solo se reutiliza durante ``REPORTES_CACHE_MINUTOS``.
+"""
+import hashlib
+import json
+import logging
+import re
+import tempfile
+from dataclasses import dataclass, field
+from datetime import timedelta
+from importlib import import_module
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db.models import Count, F, Max, Q
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .models import ReporteJob
+
+logger = logging.getLogger(__name__)
+
+# Módulos que registran generadores al importarse (el runner los carga).
+MODULOS_REPORTES = ("dashboard.views", "finanzas.views")
+MAX_INTENTOS = 3
+MINUTOS_PROCESO_ABANDONADO = 15
+
+REPORTES = {}
+
+
+@dataclass(frozen=True)
+class TipoReporte:
+    clave: str
+    titulo: str
+    generar: object
+    modelos: tuple = field(default_factory=tuple)
+    diario: bool = True
+
+
+def registrar_reporte(clave, titulo, modelos=(), diario=True):
+    """Registra ``generar(parametros) -> HttpResponse`` como reporte encolable.
+
+    ``modelos`` son las etiquetas ``app.Modelo`` que forman la marca de datos;
+    ``diario`` agrega la fecha del día para reportes que imprimen la fecha de
+    generación o dependen de ella (vencimientos, rangos por defecto).
+    """
+    def decorador(generar):
+        REPORTES[clave] = TipoReporte(clave, titulo, generar, tuple(modelos), diario)
+        return generar
+    return decorador
+
+
+def cargar_reportes():
+    for modulo in MODULOS_REPORTES:
+        import_module(modulo)
+    return REPORTES
+
+
+def _tipo(clave):
+    tipo = REPORTES.get(clave) or cargar_reportes().get(clave)
+    if tipo is None:
+        raise ValueError(f"Reporte desconocido: {clave}")
+    return tipo
+
+
+def marca_de_modelos(etiquetas):
+    """Huella barata del estado de ``etiquetas`` (``app.Modelo``): una consulta agregada por modelo.
+
+    Cambia al crear, borrar o (si el modelo tiene un campo ``auto_now``) editar filas.
+    """
+    partes = []
+    for etiqueta in etiquetas:
+        modelo = apps.get_model(etiqueta)
+        agregados = {"n": Count("pk"), "ultimo": Max("pk")}
+        editado = next((f.name for f in modelo._meta.concrete_fields if getattr(f, "auto_now", False)), None)
+        if editado:
+            agregados["editado"] = Max(editado)
+        fila = modelo._default_manager.aggregate(**agregados)
+        editado_en = fila.get("editado")
+        partes.append(f"{etiqueta}:{fila['n']}:{fila['ultimo'] or 0}:{editado_en.timestamp() if editado_en else ''}")
+    return "|".join(partes)
+
+
+def marca_de_datos(clave):
+    """Marca de datos del reporte: la de sus modelos, más la fecha si es ``diario``."""
+    tipo = _tipo(clave)
+    partes = [timezone.localdate().isoformat()] if tipo.diario else []
+    if tipo.modelos:
+        partes.append(marca_de_modelos(tipo.modelos))
+    return "|".join(partes)[:255]
+
+
+def clave_reporte(tipo, parametros, marca):
+    contenido = json.dumps({"tipo": tipo, "parametros": parametros, "marca": marca}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def encolar_reporte(tipo, parametros=None, *, usuario=None, forzar=False):
+    """Devuelve el ``ReporteJob`` para ``tipo`` y ``parametros``.
+
+    Reutiliza un archivo ya generado (o un job en curso) con la misma clave
+    dentro de la ventana de caché; si no hay, crea uno pendiente.
+    """
+    parametros = {k: v for k, v in (parametros or {}).items() if v not in (None, "")}
+    marca = marca_de_datos(tipo)
+    clave = clave_reporte(tipo, parametros, marca)
+    if not forzar:
+        limite = timezone.now() - timedelta(minutes=getattr(settings, "REPORTES_CACHE_MINUTOS", 60))
+        vigentes = ReporteJob.objects.filter(
+            clave=clave,
+            estado__in=[ReporteJob.ESTADO_LISTO, ReporteJob.ESTADO_PENDIENTE, ReporteJob.ESTADO_PROCESANDO],
+            creado_en__gte=limite,
+        )
+        # Primero los listos; entre iguales, el más reciente.
+        existente = sorted(vigentes, key=lambda j: (j.estado != ReporteJob.ESTADO_LISTO, -j.pk))[:1]
+        if existente:
+            return existente[0]
+    return ReporteJob.objects.create(
+        tipo=tipo, parametros=parametros, clave=clave, marca_datos=marca, solicitado_por=usuario,
+    )
+
+
+def _reclamar(pk, estado, iniciado_en=None):
+    # El UPDATE condicionado al estado leído evita que dos procesos tomen el mismo job.
+    tomado = ReporteJob.objects.filter(pk=pk, estado=estado, iniciado_en=iniciado_en).update(
+        estado=ReporteJob.ESTADO_PROCESANDO, iniciado_en=timezone.now(), intentos=F("intentos") + 1,
+    )
+    return ReporteJob.objects.get(pk=pk) if tomado else None
+
+
+def _tomar_siguiente():
+    """Marca como ``procesando`` el siguiente job disponible y lo devuelve (o ``None``).
+
+    También recupera los que quedaron en proceso por un worker caído.
+    """
+    abandonado = timezone.now() - timedelta(minutes=MINUTOS_PROCESO_ABANDONADO)
+    disponibles = ReporteJob.objects.filter(
+        Q(estado=ReporteJob.ESTADO_PENDIENTE)
+        | Q(estado=ReporteJob.ESTADO_PROCESANDO, iniciado_en__lt=abandonado, intentos__lt=MAX_INTENTOS)
+    ).order_by("creado_en", "id")
+    for pk, estado, iniciado_en in disponibles.values_list("pk", "estado", "iniciado_en")[:10]:
+        job = _reclamar(pk, estado, iniciado_en)
+        if job:
+            return job
+    return None
+
+
+def _nombre_archivo(response, job):
+    encontrado = re.search(r'filename="?([^";]+)"?', response.get("Content-Disposition", ""))
+    return encontrado.group(1) if encontrado else f"reporte_{job.pk}"
+
+
+def procesar_reporte(job):
+    """Ejecuta el generador del job y guarda el archivo. Devuelve el job actualizado."""
+    try:
+        response = _tipo(job.tipo).generar(job.parametros)
+        if response.status_code != 200:
+            raise ValueError(f"El generador respondió con estado {response.status_code}.")
+        nombre = _nombre_archivo(response, job)
+        if response.streaming:
+            # Exportaciones por streaming: se copian por bloques a un temporal.
+            with tempfile.TemporaryFile() as temporal:
+                for bloque in response.streaming_content:
+                    temporal.write(bloque)
+                job.tamano = temporal.tell()
+                temporal.seek(0)
+                job.archivo.save(f"{job.clave[:16]}_{nombre}", File(temporal), save=False)
+            # Sin response.close(): emitiría request_finished y cerraría la conexión del worker.
+        else:
+            job.tamano = len(response.content)
+            job.archivo.save(f"{job.clave[:16]}_{nombre}", ContentFile(response.content), save=False)
+        job.nombre_archivo = nombre
+        job.content_type = response.get("Content-Type", "application/octet-stream")
+        job.estado = ReporteJob.ESTADO_LISTO
+        job.error = ""
+    except Exception as exc:
+        logger.exception("No se pudo generar el reporte %s (%s)", job.pk, job.tipo)
+        job.estado = ReporteJob.ESTADO_ERROR
+        job.error = str(exc) or exc.__class__.__name__
+    job.finalizado_en = timezone.now()
+    job.save(update_fields=["archivo", "nombre_archivo", "content_type", "tamano", "estado", "error", "finalizado_en"])
+    return job
+
+
+def procesar_reportes_pendientes(limite=None):
+    """Procesa jobs pendientes hasta vaciar la cola (o ``limite``). Devuelve cuántos procesó."""
+    cargar_reportes()
+    procesados = 0
+    while limite is None or procesados < limite:
+        job = _tomar_siguiente()
+        if job is None:
+            break
+        procesar_reporte(job)
+        procesados += 1
+    return procesados
+
+
+def purgar_reportes(dias):
+    """Borra jobs terminados con más de ``dias`` días junto con sus archivos."""
+    viejos = ReporteJob.objects.filter(
+        estado__in=[ReporteJob.ESTADO_LISTO, ReporteJob.ESTADO_ERROR],
+        creado_en__lt=timezone.now() - timedelta(days=dias),
+    )
+    borrados = 0
+    for job in viejos.iterator():
+        if job.archivo:
+            job.archivo.delete(save=False)
+        job.delete()
+        borrados += 1
+    return borrados
+
+
+def responder_reporte(request, tipo, parametros=None):
+    """Encola el reporte y redirige a la descarga (si ya existe) o a la página de espera."""
+    job = encolar_reporte(tipo, parametros, usuario=request.user, forzar=request.GET.get("regenerar") == "1")
+    if job.estado == ReporteJob.ESTADO_PENDIENTE and getattr(settings, "REPORTES_EN_LINEA", False):
+        tomado = _reclamar(job.pk, ReporteJob.ESTADO_PENDIENTE)
+        if tomado:
+            job = procesar_reporte(tomado)
+    if job.estado == ReporteJob.ESTADO_LISTO:
+        return redirect("reporte_descargar", pk=job.pk)
+    return redirect("reporte_estado", pk=job.pk)
@@ -1,3 +1,192 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from openpyxl import load_workbook
+
+from clientes.models import Cliente
+from contratos.models import Contrato
+from finanzas.models import Egreso, Ingreso
+from inventario.models import Insumo, MovimientoInventario
+from mantenimientos.models import Mantenimiento
+
+from .cotizador import cotizar, cotizar_lote, modelo_cotizacion, simular_reprecio
+from .models import ReporteJob
+from .reportes import REPORTES, encolar_reporte, procesar_reportes_pendientes
+
+MEDIA_PRUEBAS = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_PRUEBAS, REPORTES_EN_LINEA=False)
+class ReporteJobTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_PRUEBAS, ignore_errors=True)
+
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", password="clave", is_staff=True)
+        Ingreso.objects.create(concepto="Mantenimiento enero", total=Decimal("120.00"), fecha=date(2026, 1, 15))
+        self.parametros = {"fecha_inicio": "2026-01-01", "fecha_fin": "2026-01-31"}
+
+    def test_runner_genera_y_reutiliza_el_archivo(self):
+        job = encolar_reporte("ganancias_pdf", self.parametros, usuario=self.admin)
+        self.assertEqual(job.estado, ReporteJob.ESTADO_PENDIENTE)
+        self.assertEqual(encolar_reporte("ganancias_pdf", self.parametros).pk, job.pk)
+
+        self.assertEqual(procesar_reportes_pendientes(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.estado, ReporteJob.ESTADO_LISTO)
+        self.assertEqual(job.nombre_archivo, "reporte_ganancias.pdf")
+        with job.archivo.open("rb") as archivo:
+            self.assertTrue(archivo.read().startswith(b"%PDF"))
+
+        with self.assertNumQueries(3):
+            repetido = encolar_reporte("ganancias_pdf", self.parametros)
+        self.assertEqual(repetido.pk, job.pk)
+
+    def test_cambio_en_los_datos_invalida_la_cache(self):
+        job = encolar_reporte("ganancias_pdf", self.parametros)
+        procesar_reportes_pendientes()
+        Ingreso.objects.create(concepto="Venta", total=Decimal("30.00"), fecha=date(2026, 1, 20))
+
+        nuevo = encolar_reporte("ganancias_pdf", self.parametros)
+        self.assertNotEqual(nuevo.pk, job.pk)
+        self.assertNotEqual(nuevo.clave, job.clave)
+
+    def test_error_del_generador_queda_registrado(self):
+        encolar_reporte("estado_cuenta_cliente", {"cliente": 999})
+        with self.assertLogs("dashboard.reportes", "ERROR"):
+            procesar_reportes_pendientes()
+        job = ReporteJob.objects.get()
+        self.assertEqual(job.estado, ReporteJob.ESTADO_ERROR)
+        self.assertTrue(job.error)
+
+    def test_exportar_encola_consulta_y_descarga(self):
+        self.client.force_login(self.admin)
+        url = reverse("exportar_ganancias_excel") + "?fecha_inicio=2026-01-01&fecha_fin=2026-01-31"
+        response = self.client.get(url)
+        job = ReporteJob.objects.get()
+        self.assertRedirects(response, reverse("reporte_estado", args=[job.pk]))
+        self.assertFalse(self.client.get(reverse("reporte_estado_json", args=[job.pk])).json()["terminado"])
+
+        procesar_reportes_pendientes()
+        estado = self.client.get(reverse("reporte_estado_json", args=[job.pk])).json()
+        self.assertEqual(estado["estado"], "listo")
+        descarga = self.client.get(estado["url_descarga"])
+        self.assertEqual(descarga["Content-Type"], "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        self.assertIn("reporte_ganancias.xlsx", descarga["Content-Disposition"])
+
+        # La segunda solicitud encuentra el archivo y va directo a la descarga.
+        self.assertRedirects(self.client.get(url), reverse("reporte_descargar", args=[job.pk]), fetch_redirect_response=False)
+
+    @override_settings(REPORTES_EN_LINEA=True)
+    def test_modo_en_linea_genera_en_la_peticion(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("inventario_general_pdf"))
+        job = ReporteJob.objects.get()
+        self.assertEqual(job.estado, ReporteJob.ESTADO_LISTO)
+        self.assertRedirects(response, reverse("reporte_descargar", args=[job.pk]), fetch_redirect_response=False)
+
+
+class ExportacionesTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", is_staff=True)
+        self.client.force_login(self.admin)
+
+    def test_excel_de_ganancias_en_modo_write_only(self):
+        Ingreso.objects.create(concepto="Mantenimiento", total=Decimal("150.00"), fecha=date(2026, 3, 2))
+        Egreso.objects.create(concepto="", costo_unitario=Decimal("40.00"), fecha=date(2026, 3, 5))
+        Ingreso.objects.create(concepto="Fuera de rango", total=Decimal("99.00"), fecha=date(2025, 12, 31))
+
+        response = REPORTES["ganancias_excel"].generar({"fecha_inicio": "2026-01-01"})
+        libro = load_workbook(io.BytesIO(b"".join(response.streaming_content)))
+        filas = list(libro["Ganancias"].iter_rows(values_only=True))
+
+        self.assertEqual(filas[0][0], "REPORTE DE GANANCIAS")
+        resumen = {fila[0]: fila[1] for fila in filas[2:7]}
+        self.assertEqual(resumen["Ganancia neta"], 110)
+        detalle = filas[filas.index(("Tipo", "Concepto", "Monto", "Fecha")) + 1:]
+        self.assertEqual([(f[0], f[1], f[2]) for f in detalle], [("Egreso", "Egreso", 40), ("Ingreso", "Mantenimiento", 150)])
+        celdas = list(libro["Ganancias"].iter_rows(min_row=filas.index(("Tipo", "Concepto", "Monto", "Fecha")) + 2, max_col=1))
+        self.assertEqual([fila[0].fill.fgColor.rgb for fila in celdas], ["00FDE9E7", "00E2F0D9"])
+
+    def test_busqueda_del_historial_igual_en_pantalla_y_exportacion(self):
+        con_contrato = Cliente.objects.create(nombre="Hotel Sol", telefono="0999", direccion="Centro", ciudad="Quito")
+        contrato = Contrato.objects.create(
+            cliente=con_contrato, tipo="semanal", frecuencia="2_semanales", precio_mensual=Decimal("100"), fecha_inicio=date(2026, 1, 1),
+        )
+        otro = Cliente.objects.create(nombre="Casa Luna", telefono="0998", direccion="Norte", ciudad="Quito")
+        por_contrato = Mantenimiento.objects.create(cliente=con_contrato, contrato=contrato, fecha=date(2026, 3, 2))
+        semanal = Contrato.objects.create(
+            cliente=otro, tipo="semanal", frecuencia="1_semanal", precio_mensual=Decimal("80"), fecha_inicio=date(2025, 1, 1),
+        )
+        por_fecha = Mantenimiento.objects.create(cliente=otro, contrato=semanal, fecha=date(2025, 11, 20))
+
+        url = reverse("mantenimiento_historial")
+        for q, esperado in (("2 visitas", por_contrato), ("2025-11-20", por_fecha)):
+            with self.subTest(q=q):
+                pantalla = self.client.get(url, {"q": q}).context["page_obj"].object_list
+                self.assertEqual(list(pantalla), [esperado])
+                lineas = b"".join(self.client.get(url, {"q": q, "exportar": "csv"}).streaming_content).decode("utf-8-sig").splitlines()
+                self.assertEqual(len(lineas), 2)
+                self.assertIn(esperado.cliente.nombre, lineas[1])
+        operativo = self.client.get(reverse("admin_operativo"), {"q": "2 visitas", "fecha_seleccionada": "2026-03-02"})
+        self.assertEqual(operativo.context["dia_list"], [por_contrato])
+
+    def test_csv_de_movimientos_de_inventario_respeta_filtros(self):
+        cloro = Insumo.objects.create(nombre="Cloro", stock=Decimal("10.000"), costo=Decimal("2"))
+        filtro = Insumo.objects.create(nombre="Filtro", stock=Decimal("1.000"), costo=Decimal("30"))
+        MovimientoInventario.objects.create(insumo=cloro, tipo="compra", cantidad=Decimal("10"), stock_resultante=Decimal("10"), total_costo=Decimal("20"))
+        MovimientoInventario.objects.create(insumo=filtro, tipo="compra", cantidad=Decimal("1"), stock_resultante=Decimal("1"), total_costo=Decimal("30"))
+
+        response = self.client.get(reverse("inventario_historial"), {"insumo": cloro.pk, "exportar": "csv"})
+        lineas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertIn(",Cloro,Compra,10.000,kg,", lineas[1])
+
+
+class CotizadorTests(TestCase):
+    def setUp(self):
+        for nombre, precio, tecnico in (("Ana", "100.00", "60.00"), ("Beto", "120.00", "70.00")):
+            cliente = Cliente.objects.create(nombre=nombre, telefono="0999", direccion="Centro", ciudad="Quito")
+            Contrato.objects.create(
+                cliente=cliente, tipo="semanal", frecuencia="1_semanal", fecha_inicio=date(2026, 1, 1),
+                precio_mensual=Decimal(precio), valor_tecnico_mensual=Decimal(tecnico),
+            )
+        self.quito = Cliente.objects.first().ciudad_ref
+
+    def test_modelo_en_cache_y_lote_sin_consultas(self):
+        modelo = modelo_cotizacion()
+        with self.assertNumQueries(4):
+            self.assertEqual(modelo_cotizacion(), modelo)
+        datos = {"ciudad": self.quito, "frecuencia": "1_semanal", "volumen": Decimal("25"), "quimicos_incluidos": True}
+        with self.assertNumQueries(0):
+            resultados = cotizar_lote([datos] * 1000, modelo)
+        self.assertEqual(resultados[0], resultados[-1])
+        self.assertEqual(resultados[0]["contratos_similares"], 2)
+        self.assertEqual(resultados[0]["costo_quimico"], Decimal("17.60"))
+        self.assertEqual(resultados[0]["precio_rec"], Decimal("127.08"))
+        # Sin contratos comparables se usa la base por frecuencia.
+        self.assertEqual(cotizar(modelo, {"frecuencia": "quincenal"})["promedio"], Decimal("45.00"))
+
+    def test_simulacion_de_reprecio_por_contrato(self):
+        simulacion = simular_reprecio(variacion_quimicos=Decimal("50"))
+        ana = next(f for f in simulacion["filas"] if f["cliente"] == "Ana")
+        self.assertEqual(ana["recomendado_actual"], Decimal("127.08"))
+        self.assertEqual(ana["recomendado_nuevo"], Decimal("140.62"))
+        self.assertEqual(ana["diferencia"], Decimal("40.62"))
+        self.assertTrue(ana["bajo_minimo"])
+        self.assertEqual(simulacion["total_actual"], Decimal("220.00"))
+
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        response = self.client.get(reverse("cotizador_reprecio"), {"quimicos": "50", "exportar": "csv"})
+        lineas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lineas), 3)
+        self.assertIn(",Ana,Quito,1 visita semanal,100.00,127.08,140.62,", lineas[1])
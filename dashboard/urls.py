@@ -34,6 +34,7 @@ from .views import (
     dashboard_view,
     calculadora_quimicos_view,
     cotizador_inteligente_admin_view,
+    cotizador_reprecio_view,
     mi_cuenta_trabajador_view,
 
     # Clientes y contratos
@@ -126,6 +127,11 @@ from .views import (
     exportar_ganancias_excel,
     exportar_ganancias_pdf,
 
+    # Reportes en segundo plano
+    reporte_estado_view,
+    reporte_estado_json_view,
+    reporte_descargar_view,
+
     # Recurrentes
     movimientos_recurrentes_view,
     movimientos_recurrentes_procesar_view,
@@ -259,6 +265,7 @@ urlpatterns = [
         name="inicio",
     ),
     path("herramientas/cotizador-inteligente/", cotizador_inteligente_admin_view, name="cotizador_inteligente_admin"),
+    path("herramientas/cotizador-inteligente/reprecio/", cotizador_reprecio_view, name="cotizador_reprecio"),
     path(
         "herramientas/calculadora-quimicos/",
         calculadora_quimicos_view,
@@ -493,6 +500,9 @@ urlpatterns = [
         exportar_ganancias_pdf,
         name="exportar_ganancias_pdf",
     ),
+    path("reportes/<int:pk>/", reporte_estado_view, name="reporte_estado"),
+    path("reportes/<int:pk>/estado/", reporte_estado_json_view, name="reporte_estado_json"),
+    path("reportes/<int:pk>/descargar/", reporte_descargar_view, name="reporte_descargar"),
 
     # ======================
     # Ingresos manuales
@@ -21,9 +21,11 @@ from django.core.paginator import Paginator
 from django.db import transaction, models
 from django.db.models import Sum, Count, Q
 from django.db.models import F
-from django.http import HttpResponse, JsonResponse
+from django.db.models.functions import Cast
+from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.templatetags.static import static
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.dateparse import parse_date, parse_time
 from django.utils.http import url_has_allowed_host_and_scheme
@@ -50,6 +52,8 @@ from finanzas.models import (
     LotePagoTrabajador,
     AnticipoTrabajador,
 )
+from finanzas.recurrentes import generar_movimientos_recurrentes
+from finanzas.rentabilidad import ranking_rentabilidad, serie_rentabilidad
 from clientes.models import Cliente, Ciudad
 from contratos.models import Contrato, CotizacionMantenimiento, EquipamientoContrato
 from ordenes_trabajo.models import OrdenTrabajo
@@ -76,6 +80,10 @@ try:
 except Exception:
     ActividadSistema = None
 
+from .models import ReporteJob
+from .cotizador import cotizar, modelo_cotizacion, simular_reprecio
+from .reportes import cargar_reportes, registrar_reporte, responder_reporte
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -137,28 +145,8 @@ def _telefono_whatsapp_ecuador(telefono):
 
 
 # -------------------
-# Helpers de fechas recurrentes
+# Helpers de fechas
 # -------------------
-def _sumar_un_mes(fecha_base):
-    nuevo_mes = fecha_base.month + 1
-    nuevo_anio = fecha_base.year
-
-    if nuevo_mes > 12:
-        nuevo_mes = 1
-        nuevo_anio += 1
-
-    ultimo_dia = monthrange(nuevo_anio, nuevo_mes)[1]
-    nuevo_dia = min(fecha_base.day, ultimo_dia)
-
-    return date(nuevo_anio, nuevo_mes, nuevo_dia)
-
-
-def _siguiente_fecha_recurrente(fecha_actual, frecuencia):
-    if frecuencia == "semanal":
-        return fecha_actual + timedelta(days=7)
-    return _sumar_un_mes(fecha_actual)
-
-
 def _inicio_fin_mes(anio, mes):
     primer_dia = date(anio, mes, 1)
     ultimo_dia = date(anio, mes, monthrange(anio, mes)[1])
@@ -949,70 +937,19 @@ def _kpis_analitica_pro(hoy):
 # Automatización de movimientos recurrentes
 # -------------------
 def procesar_movimientos_recurrentes():
-    hoy = date.today()
-
-    movimientos = MovimientoRecurrente.objects.filter(
-        activo=True,
-        proxima_fecha__lte=hoy
-    ).order_by("proxima_fecha", "id")
-
-    total_ingresos = 0
-    total_egresos = 0
-    movimientos_procesados = 0
-
-    for mov in movimientos:
-        generado_este_movimiento = 0
-
-        while mov.activo and mov.proxima_fecha <= hoy:
-            fecha_mov = mov.proxima_fecha
-
-            if mov.tipo == "ingreso":
-                Ingreso.objects.create(
-                    concepto=mov.concepto,
-                    total=mov.monto,
-                    fecha=fecha_mov
-                )
-
-                total_ingresos += 1
-                generado_este_movimiento += 1
-
-                _notificar_admins(
-                    titulo="💰 Ingreso recurrente generado",
-                    mensaje=f"Se generó el ingreso recurrente '{mov.concepto}' por ${mov.monto} (fecha {fecha_mov}).",
-                    url="/dashboard/finanzas/flujo/",
-                    enviar_push=True,
-                )
-
-            elif mov.tipo == "egreso":
-                _crear_egreso_manual(
-                    concepto=mov.concepto,
-                    categoria="Recurrente",
-                    total=mov.monto,
-                    fecha=fecha_mov,
-                )
-
-                total_egresos += 1
-                generado_este_movimiento += 1
-
-                _notificar_admins(
-                    titulo="💸 Pago recurrente generado",
-                    mensaje=f"Se registró el egreso recurrente '{mov.concepto}' por ${mov.monto} (fecha {fecha_mov}).",
-                    url="/dashboard/finanzas/flujo/",
-                    enviar_push=True,
-                )
-
-            mov.proxima_fecha = _siguiente_fecha_recurrente(fecha_mov, mov.frecuencia)
-            mov.save(update_fields=["proxima_fecha"])
-
-        if generado_este_movimiento > 0:
-            movimientos_procesados += 1
-
-    return {
-        "movimientos_procesados": movimientos_procesados,
-        "ingresos_generados": total_ingresos,
-        "egresos_generados": total_egresos,
-        "total_generados": total_ingresos + total_egresos,
-    }
+    resultado = generar_movimientos_recurrentes()
+    if resultado["total_generados"] > 0:
+        # Un solo aviso por administrador, aunque se pongan al día muchos periodos.
+        _notificar_admins(
+            titulo="🔁 Movimientos recurrentes generados",
+            mensaje=(
+                f"Se generaron {resultado['ingresos_generados']} ingresos (${resultado['monto_ingresos']:.2f}) "
+                f"y {resultado['egresos_generados']} egresos (${resultado['monto_egresos']:.2f}) recurrentes."
+            ),
+            url="/dashboard/finanzas/flujo/",
+            enviar_push=True,
+        )
+    return resultado
 
 
 # -------------------
@@ -1334,16 +1271,6 @@ def _actualizar_alertas_inventario_contratos(user):
         return 0
 
 
-def _actualizar_seguimientos_asistente(user):
-    """Genera recordatorios de seguimiento vencidos del Asistente Técnico."""
-    try:
-        from asistente_tecnico.services import generar_recordatorios_seguimiento
-        return generar_recordatorios_seguimiento(user=user, crear_notificacion=_crear_notificacion)
-    except Exception:
-        logger.exception("No se pudieron actualizar los seguimientos del Asistente Técnico.")
-        return 0
-
-
 def _registrar_actividad(user, titulo, descripcion, url=""):
     if ActividadSistema is None:
         return None
@@ -1395,36 +1322,31 @@ def _notificar_admins(titulo, mensaje, url="/dashboard/notificaciones/", enviar_
 # ==========================================================
 # Helpers operativo admin
 # ==========================================================
-def _mantenimiento_match_busqueda(mantenimiento, q: str) -> bool:
-    if not q:
-        return True
-
-    q = q.strip().lower()
-    if not q:
-        return True
+def _buscar_mantenimientos(qs, q: str):
+    """Búsqueda libre del historial, el operativo y sus exportaciones (en SQL).
 
-    bloques = [
-        str(getattr(mantenimiento, "cliente", "") or ""),
-        str(getattr(mantenimiento, "contrato", "") or ""),
-        str(getattr(mantenimiento, "estado", "") or ""),
-        str(getattr(mantenimiento, "fecha", "") or ""),
-        str(getattr(mantenimiento, "observaciones", "") or ""),
-    ]
-
-    try:
-        for trabajador in mantenimiento.trabajadores.all():
-            bloques.append(str(getattr(getattr(trabajador, "user", None), "username", "") or ""))
-    except Exception:
-        pass
-
-    texto = " ".join(bloques).lower()
-    return q in texto
-
-
-def _filtrar_mantenimientos_por_busqueda(items, q: str):
+    Coincide con el cliente, el contrato (cliente y frecuencia, como se
+    muestra), el estado, la fecha ``AAAA-MM-DD``, las observaciones y el
+    usuario de los técnicos asignados.
+    """
+    q = (q or "").strip()
     if not q:
-        return list(items)
-    return [m for m in items if _mantenimiento_match_busqueda(m, q)]
+        return qs
+
+    texto = q.lower()
+    frecuencias = [codigo for codigo, nombre in Contrato.FRECUENCIA_CHOICES if codigo != "personalizado" and texto in nombre.lower()]
+    tipos = [codigo for codigo, nombre in (("semanal", "Semanal"), ("quincenal", "Cada 15 días"), ("mensual", "Mensual"), ("variable", "Variable")) if texto in nombre.lower()]
+    return qs.annotate(fecha_busqueda=Cast("fecha", models.CharField())).filter(
+        Q(cliente__nombre__icontains=q)
+        | Q(contrato__cliente__nombre__icontains=q)
+        | Q(contrato__frecuencia__in=frecuencias)
+        | Q(contrato__frecuencia="personalizado", contrato__frecuencia_personalizada__icontains=q)
+        | Q(contrato__frecuencia="", contrato__tipo__in=tipos)
+        | Q(estado__icontains=q)
+        | Q(fecha_busqueda__icontains=q)
+        | Q(observaciones__icontains=q)
+        | Q(trabajadores__user__username__icontains=q)
+    ).distinct()
 
 
 def _resumen_trabajadores_desde_listas(dia_list, atrasados, proximos):
@@ -1804,7 +1726,6 @@ def inicio_view(request):
     if es_trabajador(request.user):
         ctx["es_admin"] = False
         notificar_trabajadores_mantenimientos_hoy()
-        _actualizar_seguimientos_asistente(request.user)
         ctx.update(_inicio_trabajador_contexto(request.user))
         return render(request, "dashboard/home_trabajador.html", ctx)
 
@@ -1989,9 +1910,24 @@ def trabajador_detalle_view(request, pk):
 def trabajador_expediente_pdf_view(request, pk):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
-    trabajador = get_object_or_404(Trabajador.objects.select_related("user"), pk=pk)
+    get_object_or_404(Trabajador, pk=pk)
     desde, hasta = _rango_trabajador_request(request)
     seccion = (request.GET.get("seccion") or "completo").strip().lower()
+    return responder_reporte(request, "expediente_trabajador", {
+        "trabajador": pk, "desde": desde.isoformat() if desde else None,
+        "hasta": hasta.isoformat() if hasta else None, "seccion": seccion,
+    })
+
+
+@registrar_reporte(
+    "expediente_trabajador", "Expediente del trabajador",
+    modelos=("mantenimientos.Mantenimiento", "mantenimientos.UsoInsumo", "ordenes_trabajo.OrdenTrabajo", "finanzas.PagoTrabajador", "inventario.InventarioTrabajador"),
+)
+def _reporte_expediente_trabajador(parametros):
+    trabajador = get_object_or_404(Trabajador.objects.select_related("user"), pk=parametros["trabajador"])
+    desde = parse_date(parametros.get("desde") or "")
+    hasta = parse_date(parametros.get("hasta") or "")
+    seccion = parametros.get("seccion") or "completo"
     ctx = _trabajador_expediente_contexto(trabajador, desde, hasta)
     from reportlab.lib import colors
     from reportlab.lib.enums import TA_CENTER
@@ -2375,7 +2311,6 @@ def dashboard_view(request):
             ).order_by("proxima_fecha", "id")[:10]
         )
 
-        actualizar_facturas_vencidas()
         total_facturas_pendientes = Factura.objects.filter(estado=Factura.ESTADO_PENDIENTE).count()
         total_facturas_vencidas = Factura.objects.filter(estado=Factura.ESTADO_VENCIDA).count()
         total_facturas_pagadas = Factura.objects.filter(estado=Factura.ESTADO_PAGADA).count()
@@ -2648,37 +2583,17 @@ def dashboard_view(request):
 
         total_trabajadores_activos = Trabajador.objects.filter(activo=True).count()
 
-        # Rentabilidad operativa base por contrato: ingreso mensual - técnico - químicos del mes.
-        consumos_contrato = {
-            fila["mantenimiento__contrato_id"]: (fila["total"] or Decimal("0.00"))
-            for fila in UsoInsumo.objects.filter(
-                mantenimiento__contrato_id__isnull=False,
-                mantenimiento__fecha__gte=primer_dia_mes_actual,
-                mantenimiento__fecha__lte=ultimo_dia_mes_actual,
-            ).values("mantenimiento__contrato_id").annotate(total=Sum("costo_total"))
-        }
-        rentabilidad_contratos = []
-        ingreso_contratos_proyectado = Decimal("0.00")
-        nomina_contratos_proyectada = Decimal("0.00")
-        quimicos_mes_total = Decimal("0.00")
-        for contrato in contratos_activos_qs:
-            ingreso = Decimal(contrato.precio_mensual or 0)
-            tecnico = Decimal(contrato.valor_tecnico_mensual or 0)
-            quimicos = Decimal(consumos_contrato.get(contrato.id, Decimal("0.00")) or 0)
-            margen = ingreso - tecnico - quimicos
-            ingreso_contratos_proyectado += ingreso
-            nomina_contratos_proyectada += tecnico
-            quimicos_mes_total += quimicos
-            rentabilidad_contratos.append({
-                "contrato": contrato,
-                "ingreso": ingreso,
-                "tecnico": tecnico,
-                "quimicos": quimicos,
-                "margen": margen,
-                "margen_pct": round((margen / ingreso) * 100, 1) if ingreso else 0,
-            })
-        rentabilidad_contratos.sort(key=lambda x: x["margen"], reverse=True)
-        top_rentabilidad_contratos = rentabilidad_contratos[:5]
+        # Margen operativo base: ingreso mensual - técnico de los contratos activos - químicos del mes.
+        base_contratos = contratos_activos_qs.aggregate(ingreso=Sum("precio_mensual"), tecnico=Sum("valor_tecnico_mensual"))
+        ingreso_contratos_proyectado = base_contratos["ingreso"] or Decimal("0.00")
+        nomina_contratos_proyectada = base_contratos["tecnico"] or Decimal("0.00")
+        quimicos_mes_total = UsoInsumo.objects.filter(
+            mantenimiento__contrato__activo=True,
+            mantenimiento__fecha__gte=primer_dia_mes_actual,
+            mantenimiento__fecha__lte=ultimo_dia_mes_actual,
+        ).aggregate(total=Sum("costo_total"))["total"] or Decimal("0.00")
+        # Ranking por contrato desde la tabla de rentabilidad mensual (facturado - técnico - químicos).
+        top_rentabilidad_contratos, menor_rentabilidad_contratos = ranking_rentabilidad(hoy.year, hoy.month)
         margen_operativo_base = ingreso_contratos_proyectado - nomina_contratos_proyectada - quimicos_mes_total
 
         # Asistente Técnico: seguimiento independiente del resto de módulos.
@@ -2881,6 +2796,7 @@ def dashboard_view(request):
             "quimicos_mes_total": quimicos_mes_total,
             "margen_operativo_base": margen_operativo_base,
             "top_rentabilidad_contratos": top_rentabilidad_contratos,
+            "menor_rentabilidad_contratos": menor_rentabilidad_contratos,
             "asistente_total_mes": asistente_total_mes,
             "asistente_exitosos_mes": asistente_exitosos_mes,
             "asistente_fallidos_mes": asistente_fallidos_mes,
@@ -3141,7 +3057,6 @@ def notificaciones_view(request):
 @require_GET
 def notificaciones_json_view(request):
     if es_trabajador(request.user):
-        _actualizar_seguimientos_asistente(request.user)
         _actualizar_alertas_inventario_contratos(request.user)
     if es_admin(request.user):
         _actualizar_alertas_inventario_contratos(request.user)
@@ -3287,6 +3202,32 @@ def actividad_historial_view(request):
 # -------------------
 # Historial mantenimientos
 # -------------------
+def _exportar_mantenimientos(formato, mantenimientos):
+    """Exporta el historial ya filtrado (con la misma búsqueda que la pantalla)."""
+    # Técnicos asignados en una sola consulta agregada, no una por mantenimiento.
+    tecnicos = defaultdict(list)
+    for mantenimiento_id, username in (
+        Mantenimiento.trabajadores.through.objects.filter(mantenimiento__in=mantenimientos.order_by().values("pk"))
+        .order_by("trabajador__user__username").values_list("mantenimiento_id", "trabajador__user__username")
+        .iterator(chunk_size=CHUNK_EXPORTACION)
+    ):
+        tecnicos[mantenimiento_id].append(username)
+    estados = dict(Mantenimiento.ESTADO_CHOICES)
+
+    def fila(v):
+        pk, fecha, cliente, ciudad, estado, automatico, observaciones = v
+        return (fecha, cliente, ciudad or "", estados.get(estado, estado), ", ".join(tecnicos.get(pk, [])), "Sí" if automatico else "No", observaciones)
+
+    return exportar(
+        formato,
+        ["Fecha", "Cliente", "Ciudad", "Estado", "Técnicos", "Automático", "Observaciones"],
+        filas_queryset(mantenimientos, ("pk", "fecha", "cliente__nombre", "cliente__ciudad", "estado", "automatico", "observaciones"), fila),
+        f"mantenimientos_{date.today():%Y%m%d}",
+        hoja="Mantenimientos",
+        anchos=[12, 32, 18, 12, 28, 12, 50],
+    )
+
+
 @login_required
 def mantenimiento_historial_view(request):
     if not es_admin(request.user):
@@ -3340,12 +3281,12 @@ def mantenimiento_historial_view(request):
     if fecha_hasta:
         qs = qs.filter(fecha__lte=fecha_hasta)
 
-    qs = qs.distinct()
+    qs = _buscar_mantenimientos(qs.distinct(), q)
+    formato = formato_exportacion(request)
+    if formato:
+        return _exportar_mantenimientos(formato, qs)
     items = list(qs)
 
-    if q:
-        items = _filtrar_mantenimientos_por_busqueda(items, q)
-
     total_historial = len(items)
     total_realizados_historial = len([m for m in items if getattr(m, "estado", "") == "realizado"])
     total_pendientes_historial = len([m for m in items if getattr(m, "estado", "") == "pendiente"])
@@ -3435,6 +3376,7 @@ def admin_operativo_view(request):
         .prefetch_related("trabajadores")
         .order_by("fecha", "estado", "id")
     )
+    base_qs = _buscar_mantenimientos(base_qs, q)
 
     if fecha_seleccionada:
         dia_list = list(
@@ -3524,11 +3466,6 @@ def admin_operativo_view(request):
         proximos = list(qs_proximos)
         etiqueta_periodo = "Operativo de hoy"
 
-    if q:
-        dia_list = _filtrar_mantenimientos_por_busqueda(dia_list, q)
-        atrasados = _filtrar_mantenimientos_por_busqueda(atrasados, q)
-        proximos = _filtrar_mantenimientos_por_busqueda(proximos, q)
-
     resumen_trabajadores = _resumen_trabajadores_desde_listas(dia_list, atrasados, proximos)
 
     sin_asignar_dia = _sin_asignar_count(dia_list)
@@ -3559,9 +3496,6 @@ def admin_operativo_view(request):
         base_qs.filter(fecha__range=(inicio_agenda, fin_agenda))
     )
 
-    if q:
-        agenda_items = _filtrar_mantenimientos_por_busqueda(agenda_items, q)
-
     agenda_semanal = _build_agenda_semanal_mantenimientos(
         fecha_base=fecha_base_agenda,
         items=agenda_items,
@@ -3847,6 +3781,7 @@ def mantenimiento_detalle_view(request, pk):
                                 "El trabajador seleccionado no está asignado a este mantenimiento."
                             )
 
+                productos = []
                 for index, insumo_id in enumerate(ids_insumo):
                     insumo_id = (insumo_id or "").strip()
                     if not insumo_id:
@@ -3860,34 +3795,41 @@ def mantenimiento_detalle_view(request, pk):
                         activo=True,
                         puede_mantenimiento=True,
                     )
-
                     cantidad_base = convertir_a_base(insumo, cantidad_ingresada, unidad)
-                    contrato_consumo = mantenimiento.contrato
-                    if contrato_consumo.quimicos_proveedor == "cliente":
-                        origen_inventario = "cliente"
+                    productos.append((insumo, cantidad_ingresada, unidad, cantidad_base))
+
+                # Todos los productos de la visita se descuentan en un solo
+                # lote: un bloqueo ordenado y un único registro de movimientos.
+                contrato_consumo = mantenimiento.contrato
+                if contrato_consumo.quimicos_proveedor == "cliente":
+                    origen_inventario = "cliente"
+                elif contrato_consumo.quimicos_almacenamiento == "contrato":
+                    origen_inventario = "contrato"
+                else:
+                    origen_inventario = "trabajador"
+
+                movimientos = [None] * len(productos)
+                if productos and origen_inventario != "cliente":
+                    movimientos = registrar_movimientos_lote(
+                        [
+                            {
+                                "tipo": "consumo_contrato" if origen_inventario == "contrato" else "mantenimiento",
+                                "insumo": insumo,
+                                "cantidad_base": cantidad_base,
+                                "trabajador": trabajador_consumo,
+                                "contrato": contrato_consumo if origen_inventario == "contrato" else None,
+                                "mantenimiento": mantenimiento,
+                            }
+                            for insumo, _, _, cantidad_base in productos
+                        ],
+                        usuario=request.user,
+                    )
+
+                for (insumo, cantidad_ingresada, unidad, cantidad_base), movimiento in zip(productos, movimientos):
+                    if movimiento is None:
                         costo_unitario = Decimal("0.0000")
                         costo_total = Decimal("0.00")
-                    elif contrato_consumo.quimicos_almacenamiento == "contrato":
-                        origen_inventario = "contrato"
-                        movimiento = consumir_contrato(
-                            contrato=contrato_consumo,
-                            insumo=insumo,
-                            trabajador=trabajador_consumo,
-                            cantidad_base=cantidad_base,
-                            mantenimiento=mantenimiento,
-                            usuario=request.user,
-                        )
-                        costo_unitario = movimiento.costo_unitario
-                        costo_total = movimiento.total_costo
                     else:
-                        origen_inventario = "trabajador"
-                        movimiento = consumir_trabajador(
-                            insumo=insumo,
-                            trabajador=trabajador_consumo,
-                            cantidad_base=cantidad_base,
-                            mantenimiento=mantenimiento,
-                            usuario=request.user,
-                        )
                         costo_unitario = movimiento.costo_unitario
                         costo_total = movimiento.total_costo
 
@@ -4716,22 +4658,6 @@ def generar_facturas_automaticas(anio=None, mes=None):
     }
 
 
-def actualizar_facturas_vencidas():
-    hoy = timezone.localdate()
-    facturas = Factura.objects.filter(
-        estado=Factura.ESTADO_PENDIENTE,
-        fecha_vencimiento__lt=hoy,
-    )
-
-    total = 0
-    for factura in facturas:
-        factura.estado = Factura.ESTADO_VENCIDA
-        factura.save(update_fields=["estado", "actualizada_en"])
-        total += 1
-
-    return total
-
-
 # -------------------
 # Facturación automática - vistas
 # -------------------
@@ -4741,8 +4667,6 @@ def factura_list_view(request):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
 
-    actualizar_facturas_vencidas()
-
     estado = (request.GET.get("estado", "") or "").strip().lower()
     periodo = (request.GET.get("periodo", "") or "").strip()
 
@@ -4795,8 +4719,6 @@ def factura_detalle_view(request, pk):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
 
-    actualizar_facturas_vencidas()
-
     factura = get_object_or_404(
         Factura.objects.select_related("cliente", "contrato", "ingreso_generado").prefetch_related("items"),
         pk=pk
@@ -4969,7 +4891,6 @@ def flujo_mensual_view(request):
     total_ingresos_hoy_automaticos = total_ingresos_hoy - total_ingresos_hoy_manuales
     total_egresos_hoy_automaticos = total_egresos_hoy - total_egresos_hoy_manuales
 
-    actualizar_facturas_vencidas()
     facturas_mes = Factura.objects.filter(
         periodo_anio=anio,
         periodo_mes=mes,
@@ -5655,8 +5576,6 @@ def offline_view(request):
 @require_GET
 @login_required
 def unread_count_view(request):
-    if es_trabajador(request.user):
-        _actualizar_seguimientos_asistente(request.user)
     if es_admin(request.user):
         try:
             from finanzas.alertas_financieras import generar_alertas_financieras
@@ -5685,14 +5604,17 @@ from inventario.models import (
 from inventario.services import (
     convertir_a_base, entregar_a_trabajador, devolver_de_trabajador,
     consumir_trabajador, consumir_contrato, reponer_contrato, ajustar_inventario_contrato, revertir_consumo, decimal_positivo,
+    registrar_movimientos_lote,
+)
+from inventario import analytics as inventario_analytics
+from inventario.kardex import (
+    iterar_kardex as kardex_iterar, movimientos_rango as kardex_movimientos_rango,
+    saldo_al as kardex_saldo_al, saldo_antes_de as kardex_saldo_antes_de,
 )
 
 
 def _inventario_valorizado():
-    total = Decimal("0.00")
-    for insumo in Insumo.objects.filter(activo=True):
-        total += Decimal(insumo.stock or 0) * Decimal(insumo.costo or 0)
-    return total
+    return inventario_analytics.valor_bodega()
 
 
 def _cantidad_texto(insumo, cantidad):
@@ -5714,20 +5636,8 @@ def inventario_view(request):
         .order_by("trabajador__user__username", "insumo__nombre")
     )
 
-    total_insumos = len(insumos)
-    bajo_stock = sum(1 for i in insumos if i.bajo_stock)
-    sin_stock = sum(1 for i in insumos if i.sin_stock)
-    stock_total_kg = sum((Decimal(i.stock) for i in insumos if i.unidad_base == "kg"), Decimal("0.000"))
-
     hoy = timezone.localdate()
-    primer_dia_mes = hoy.replace(day=1)
-    ventas_mes = VentaInsumo.objects.filter(fecha__gte=primer_dia_mes)
-    total_ventas_mes = ventas_mes.aggregate(total=Sum("total")).get("total") or Decimal("0")
-    ganancia_mes = ventas_mes.aggregate(total=Sum("ganancia")).get("total") or Decimal("0")
-    total_compras_mes = CompraInsumo.objects.filter(fecha__gte=primer_dia_mes).aggregate(total=Sum("total")).get("total") or Decimal("0")
-    consumo_mes = MovimientoInventario.objects.filter(tipo__in=["mantenimiento", "consumo_contrato"], fecha__gte=primer_dia_mes)
-    costo_consumo_mes = consumo_mes.aggregate(total=Sum("total_costo")).get("total") or Decimal("0")
-    cantidad_consumo_mes = consumo_mes.aggregate(total=Sum("cantidad")).get("total") or Decimal("0")
+    resumen = inventario_analytics.resumen_inventario(hoy.replace(day=1))
     solicitudes_pendientes = SolicitudReposicion.objects.filter(estado="pendiente").select_related("trabajador__user", "insumo").order_by("-creada_en")
     inventarios_contratos = list(
         InventarioContrato.objects.filter(contrato__activo=True)
@@ -5752,12 +5662,8 @@ def inventario_view(request):
     por_trabajador = defaultdict(list)
     for inv in inventarios_trabajadores:
         por_trabajador[inv.trabajador].append(inv)
-    valor_asignado = Decimal("0.00")
-    productos_asignados = 0
     for trabajador, stocks in por_trabajador.items():
-        valorizado = sum((Decimal(x.stock) * Decimal(x.insumo.costo or 0) for x in stocks), Decimal("0.00"))
-        valor_asignado += valorizado
-        productos_asignados += len(stocks)
+        valorizado = resumen["por_trabajador"].get(trabajador.pk, {}).get("valor", Decimal("0.00"))
         resumen_trabajadores.append({"trabajador": trabajador, "stocks": stocks, "valor": valorizado})
 
     return render(request, "dashboard/inventario.html", {
@@ -5765,21 +5671,24 @@ def inventario_view(request):
         "trabajadores": trabajadores,
         "inventarios_trabajadores": inventarios_trabajadores,
         "resumen_trabajadores": resumen_trabajadores,
-        "total_insumos": total_insumos,
-        "bajo_stock": bajo_stock,
-        "sin_stock": sin_stock,
-        "stock_total_kg": stock_total_kg,
-        "valor_inventario": _inventario_valorizado(),
-        "valor_asignado": valor_asignado,
-        "productos_asignados": productos_asignados,
+        "total_insumos": resumen["totales"]["productos"],
+        "bajo_stock": resumen["totales"]["bajo_stock"],
+        "sin_stock": resumen["totales"]["sin_stock"],
+        "stock_total_kg": resumen["totales"]["stock_kg"],
+        "valor_inventario": resumen["totales"]["valor"],
+        "valor_asignado": resumen["trabajadores"]["valor"],
+        "productos_asignados": resumen["trabajadores"]["productos"],
+        "valor_contratos": resumen["contratos"]["valor"],
+        "valor_inventario_total": resumen["valor_total"],
+        "resumen_categorias": resumen["categorias"],
         "resumen_contratos_inventario": resumen_contratos_inventario,
         "contratos_inventario_count": len(resumen_contratos_inventario),
         "contratos_inventario_critico": sum(1 for x in resumen_contratos_inventario if x["criticos"]),
-        "total_ventas_mes": total_ventas_mes,
-        "ganancia_mes": ganancia_mes,
-        "total_compras_mes": total_compras_mes,
-        "costo_consumo_mes": costo_consumo_mes,
-        "cantidad_consumo_mes": cantidad_consumo_mes,
+        "total_ventas_mes": resumen["mes"]["total_ventas"],
+        "ganancia_mes": resumen["mes"]["ganancia"],
+        "total_compras_mes": resumen["mes"]["total_compras"],
+        "costo_consumo_mes": resumen["mes"]["costo_consumo"],
+        "cantidad_consumo_mes": resumen["mes"]["cantidad_consumo"],
         "solicitudes_pendientes": solicitudes_pendientes[:8],
         "solicitudes_pendientes_count": solicitudes_pendientes.count(),
         "movimientos_recientes": movimientos_recientes,
@@ -6106,7 +6015,14 @@ def inventario_producto_detalle_view(request, pk):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
     insumo = get_object_or_404(Insumo.objects.prefetch_related("presentaciones"), pk=pk)
-    movimientos = list(MovimientoInventario.objects.filter(insumo=insumo).select_related("trabajador__user", "mantenimiento__cliente", "usuario").order_by("-creado_en")[:100])
+    kardex_desde, kardex_hasta = _kardex_rango_request(request, dias_defecto=90)
+    paginator = Paginator(kardex_movimientos_rango(insumo, kardex_desde, kardex_hasta), 50)
+    kardex_page = paginator.get_page(request.GET.get("kardex_page") or paginator.num_pages)
+    movimientos = list(kardex_page.object_list)
+    kardex_saldo_inicial = kardex_saldo_antes_de(insumo, kardex_desde, movimientos[0]) if movimientos else kardex_saldo_al(insumo, kardex_hasta)
+    for movimiento, saldo in kardex_iterar(movimientos, kardex_saldo_inicial):
+        movimiento.saldo_kardex = saldo
+    kardex_qp = request.GET.copy(); kardex_qp.pop("kardex_page", None)
     stocks = list(InventarioTrabajador.objects.filter(insumo=insumo, stock__gt=0).select_related("trabajador__user").order_by("trabajador__user__username"))
     hoy = timezone.localdate(); inicio = hoy.replace(day=1)
     consumo = MovimientoInventario.objects.filter(insumo=insumo, tipo="mantenimiento", fecha__gte=inicio).aggregate(c=Sum("cantidad"), costo=Sum("total_costo"))
@@ -6132,6 +6048,8 @@ def inventario_producto_detalle_view(request, pk):
         "asignado_total": asignado_total, "disponible_bodega": disponible_bodega, "stock_empresa": stock_empresa,
         "valor_stock": valor_bodega, "valor_empresa": valor_empresa,
         "margen_unitario": margen_unitario, "margen_porcentaje": margen_porcentaje, "es_admin": True,
+        "kardex_page": kardex_page, "kardex_desde": kardex_desde, "kardex_hasta": kardex_hasta,
+        "kardex_saldo_inicial": kardex_saldo_inicial, "kardex_querystring": kardex_qp.urlencode(),
     })
 
 
@@ -6370,6 +6288,11 @@ def solicitud_reposicion_atender_view(request, pk):
 @login_required
 def inventario_productos_criticos_pdf_view(request):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    return responder_reporte(request, "inventario_criticos")
+
+
+@registrar_reporte("inventario_criticos", "Productos críticos", modelos=("inventario.Insumo", "inventario.MovimientoInventario"))
+def _reporte_inventario_criticos(parametros):
     filas = [["Producto", "Categoría", "Stock", "Mínimo", "Estado"]]
     for i in Insumo.objects.filter(activo=True).order_by("nombre"):
         if i.stock <= i.stock_minimo:
@@ -6380,6 +6303,11 @@ def inventario_productos_criticos_pdf_view(request):
 @login_required
 def inventario_consumo_trabajadores_pdf_view(request):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    return responder_reporte(request, "inventario_consumo_trabajadores")
+
+
+@registrar_reporte("inventario_consumo_trabajadores", "Consumo por trabajador", modelos=("inventario.MovimientoInventario",))
+def _reporte_inventario_consumo_trabajadores(parametros):
     filas = [["Trabajador", "Producto", "Consumo", "Costo"]]
     qs = MovimientoInventario.objects.filter(tipo="mantenimiento").values("trabajador__user__first_name", "trabajador__user__last_name", "trabajador__user__username", "insumo__nombre", "insumo__unidad_base").annotate(cantidad=Sum("cantidad"), costo=Sum("total_costo")).order_by("trabajador__user__username", "insumo__nombre")
     for x in qs:
@@ -6392,6 +6320,11 @@ def inventario_consumo_trabajadores_pdf_view(request):
 @login_required
 def inventario_consumo_contratos_pdf_view(request):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    return responder_reporte(request, "inventario_consumo_contratos")
+
+
+@registrar_reporte("inventario_consumo_contratos", "Consumo por contrato", modelos=("inventario.MovimientoInventario",))
+def _reporte_inventario_consumo_contratos(parametros):
     filas = [["Cliente / contrato", "Producto", "Consumo", "Costo"]]
     qs = MovimientoInventario.objects.filter(tipo="mantenimiento", mantenimiento__isnull=False).values("mantenimiento__cliente__nombre", "insumo__nombre", "insumo__unidad_base").annotate(cantidad=Sum("cantidad"), costo=Sum("total_costo")).order_by("mantenimiento__cliente__nombre", "insumo__nombre")
     for x in qs:
@@ -6400,6 +6333,27 @@ def inventario_consumo_contratos_pdf_view(request):
     return _pdf_inventario_response("Consumo por contrato JVAQUA", filas, "consumo_por_contrato.pdf")
 
 
+def _exportar_movimientos_inventario(formato, movimientos):
+    tipos = dict(MovimientoInventario.TIPO_CHOICES)
+
+    def fila(v):
+        creado_en, producto, unidad, tipo, cantidad, anterior, resultante, trabajador, cliente, costo, usuario, observacion = v
+        return (creado_en, producto, tipos.get(tipo, tipo), cantidad, "kg" if unidad == "kg" else "L", anterior, resultante, trabajador or "", cliente or "", costo, usuario or "", observacion)
+
+    return exportar(
+        formato,
+        ["Registrado", "Producto", "Tipo", "Cantidad", "Unidad", "Stock anterior", "Stock resultante", "Trabajador", "Cliente", "Costo", "Usuario", "Observación"],
+        filas_queryset(movimientos, (
+            "creado_en", "insumo__nombre", "insumo__unidad_base", "tipo", "cantidad", "stock_anterior", "stock_resultante",
+            "trabajador__user__username", "mantenimiento__cliente__nombre", "total_costo", "usuario__username", "observacion",
+        ), fila),
+        f"movimientos_inventario_{timezone.localdate():%Y%m%d}",
+        hoja="Movimientos",
+        anchos=[18, 30, 24, 12, 8, 14, 14, 18, 28, 12, 16, 40],
+        formatos={0: "DD/MM/YYYY HH:MM", 9: FORMATO_MONEDA},
+    )
+
+
 @login_required
 def inventario_historial_view(request):
     if not es_admin(request.user):
@@ -6418,6 +6372,9 @@ def inventario_historial_view(request):
     if fecha_hasta_str and parse_date(fecha_hasta_str): qs = qs.filter(fecha__lte=parse_date(fecha_hasta_str))
     if q: qs = qs.filter(models.Q(insumo__nombre__icontains=q) | models.Q(observacion__icontains=q) | models.Q(trabajador__user__username__icontains=q))
     qs = qs.order_by("-creado_en", "-id")
+    formato = formato_exportacion(request)
+    if formato:
+        return _exportar_movimientos_inventario(formato, qs)
     paginator = Paginator(qs, 40)
     page_obj = paginator.get_page(request.GET.get("page"))
     qp = request.GET.copy(); qp.pop("page", None)
@@ -6465,6 +6422,11 @@ def _pdf_inventario_response(titulo, filas, nombre_archivo, resumen=None):
 @login_required
 def inventario_general_pdf_view(request):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    return responder_reporte(request, "inventario_general")
+
+
+@registrar_reporte("inventario_general", "Inventario general", modelos=("inventario.Insumo", "inventario.MovimientoInventario"))
+def _reporte_inventario_general(parametros):
     filas = [["Producto", "Categoría", "Stock", "Mínimo", "Costo/base", "Valor"]]
     for i in Insumo.objects.filter(activo=True).order_by("nombre"):
         filas.append([i.nombre, i.get_categoria_display(), _cantidad_texto(i, i.stock), _cantidad_texto(i, i.stock_minimo), f"${i.costo:,.4f}", f"${(Decimal(i.stock)*Decimal(i.costo or 0)):,.2f}"])
@@ -6474,6 +6436,13 @@ def inventario_general_pdf_view(request):
 @login_required
 def inventario_trabajador_pdf_view(request, trabajador_id):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    get_object_or_404(Trabajador, pk=trabajador_id)
+    return responder_reporte(request, "inventario_trabajador", {"trabajador": trabajador_id})
+
+
+@registrar_reporte("inventario_trabajador", "Inventario del trabajador", modelos=("inventario.InventarioTrabajador", "inventario.Insumo"))
+def _reporte_inventario_trabajador(parametros):
+    trabajador_id = parametros["trabajador"]
     trabajador = get_object_or_404(Trabajador, pk=trabajador_id)
     filas = [["Producto", "Stock asignado", "Costo/base", "Valor"]]
     for x in InventarioTrabajador.objects.filter(trabajador=trabajador).select_related("insumo").order_by("insumo__nombre"):
@@ -6481,19 +6450,69 @@ def inventario_trabajador_pdf_view(request, trabajador_id):
     return _pdf_inventario_response(f"Inventario de {trabajador}", filas, f"inventario_trabajador_{trabajador_id}.pdf")
 
 
+KARDEX_FILAS_POR_PDF = 1500
+
+
+def _kardex_rango_request(request, dias_defecto):
+    hoy = timezone.localdate()
+    hasta = parse_date((request.GET.get("hasta") or "").strip()) or hoy
+    desde = parse_date((request.GET.get("desde") or "").strip()) or (hasta - timedelta(days=dias_defecto))
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    return desde, hasta
+
+
 @login_required
 def inventario_kardex_pdf_view(request, insumo_id):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    get_object_or_404(Insumo, pk=insumo_id)
+    desde, hasta = _kardex_rango_request(request, dias_defecto=365)
+    return responder_reporte(request, "inventario_kardex", {
+        "insumo": insumo_id, "desde": desde.isoformat(), "hasta": hasta.isoformat(), "parte": request.GET.get("parte"),
+    })
+
+
+@registrar_reporte("inventario_kardex", "Kardex de producto", modelos=("inventario.MovimientoInventario", "inventario.SaldoInventarioCheckpoint"))
+def _reporte_inventario_kardex(parametros):
+    """Kardex de un rango de fechas, en partes de tamaño fijo.
+
+    El saldo inicial sale del cierre mensual más cercano y las filas se leen
+    por bloques, así la memoria no crece con el historial del producto.
+    """
+    insumo_id = parametros["insumo"]
     insumo = get_object_or_404(Insumo, pk=insumo_id)
-    filas = [["Fecha", "Movimiento", "Cantidad", "Trabajador", "Mantenimiento", "Observación"]]
-    for m in MovimientoInventario.objects.filter(insumo=insumo).select_related("trabajador__user", "mantenimiento__cliente").order_by("-creado_en"):
-        filas.append([m.fecha.strftime("%d/%m/%Y"), m.get_tipo_display(), _cantidad_texto(insumo, m.cantidad), str(m.trabajador or "—"), str(m.mantenimiento or "—"), m.observacion or "—"])
-    return _pdf_inventario_response(f"Kardex · {insumo.nombre}", filas, f"kardex_{insumo_id}.pdf", f"Stock general actual: {_cantidad_texto(insumo, insumo.stock)}")
+    desde, hasta = parse_date(parametros["desde"]), parse_date(parametros["hasta"])
+    movimientos = kardex_movimientos_rango(insumo, desde, hasta)
+    total = movimientos.count()
+    partes = max((total + KARDEX_FILAS_POR_PDF - 1) // KARDEX_FILAS_POR_PDF, 1)
+    try:
+        parte = min(max(int(parametros.get("parte") or 1), 1), partes)
+    except ValueError:
+        parte = 1
+    inicio = (parte - 1) * KARDEX_FILAS_POR_PDF
+    bloque = movimientos[inicio:inicio + KARDEX_FILAS_POR_PDF]
+    primero = bloque.first()
+    saldo_inicial = kardex_saldo_antes_de(insumo, desde, primero) if primero else kardex_saldo_al(insumo, hasta)
+
+    filas = [["Fecha", "Movimiento", "Cantidad", "Saldo", "Trabajador", "Mantenimiento", "Observación"]]
+    for m, saldo in kardex_iterar(bloque, saldo_inicial):
+        filas.append([m.fecha.strftime("%d/%m/%Y"), m.get_tipo_display(), _cantidad_texto(insumo, m.cantidad), _cantidad_texto(insumo, saldo), str(m.trabajador or "—"), str(m.mantenimiento or "—"), m.observacion or "—"])
+    resumen = (
+        f"Rango: {desde:%d/%m/%Y} – {hasta:%d/%m/%Y} · Parte {parte} de {partes} · "
+        f"Saldo inicial: {_cantidad_texto(insumo, saldo_inicial)} · Stock general actual: {_cantidad_texto(insumo, insumo.stock)}"
+    )
+    nombre = f"kardex_{insumo_id}_{desde:%Y%m%d}_{hasta:%Y%m%d}" + (f"_parte{parte}" if partes > 1 else "") + ".pdf"
+    return _pdf_inventario_response(f"Kardex · {insumo.nombre}", filas, nombre, resumen)
 
 
 @login_required
 def inventario_movimientos_pdf_view(request):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    return responder_reporte(request, "inventario_movimientos")
+
+
+@registrar_reporte("inventario_movimientos", "Movimientos de inventario", modelos=("inventario.MovimientoInventario",))
+def _reporte_inventario_movimientos(parametros):
     filas = [["Fecha", "Producto", "Tipo", "Cantidad", "Trabajador", "Costo"]]
     for m in MovimientoInventario.objects.select_related("insumo", "trabajador__user").order_by("-creado_en")[:1000]:
         filas.append([m.fecha.strftime("%d/%m/%Y"), m.insumo.nombre, m.get_tipo_display(), _cantidad_texto(m.insumo, m.cantidad), str(m.trabajador or "—"), f"${m.total_costo:,.2f}"])
@@ -6503,6 +6522,11 @@ def inventario_movimientos_pdf_view(request):
 @login_required
 def inventario_ventas_pdf_view(request):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    return responder_reporte(request, "inventario_ventas")
+
+
+@registrar_reporte("inventario_ventas", "Ventas de insumos", modelos=("inventario.VentaInsumo",))
+def _reporte_inventario_ventas(parametros):
     filas = [["Fecha", "Producto", "Cantidad", "Venta", "Costo", "Ganancia"]]
     total = Decimal("0.00"); ganancia = Decimal("0.00")
     for v in VentaInsumo.objects.select_related("insumo").order_by("-creado_en")[:1000]:
@@ -6514,6 +6538,11 @@ def inventario_ventas_pdf_view(request):
 @login_required
 def inventario_compras_pdf_view(request):
     if not es_admin(request.user): return render(request, "dashboard/no_autorizado.html", status=403)
+    return responder_reporte(request, "inventario_compras")
+
+
+@registrar_reporte("inventario_compras", "Compras de inventario", modelos=("inventario.CompraInsumo",))
+def _reporte_inventario_compras(parametros):
     filas = [["Fecha", "Producto", "Cantidad", "Costo/base", "Total", "Proveedor", "Lote / vencimiento"]]
     total = Decimal("0.00")
     for c in CompraInsumo.objects.select_related("insumo").order_by("-creado_en")[:1000]:
@@ -6530,8 +6559,10 @@ def inventario_compras_pdf_view(request):
 # ================================
 import io
 
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from django.db.models.functions import Coalesce, NullIf
+
+from .exportaciones import CHUNK_EXPORTACION, FORMATO_MONEDA, exportar, filas_queryset, formato_exportacion, respuesta_excel
+from openpyxl.styles import PatternFill
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
@@ -6621,7 +6652,7 @@ def _obtener_serie_mensual_ganancias(fecha_inicio=None, fecha_fin=None):
     }
 
 
-def _obtener_datos_reporte_ganancias(fecha_inicio=None, fecha_fin=None):
+def _querysets_reporte_ganancias(fecha_inicio=None, fecha_fin=None):
     ingresos = Ingreso.objects.all().order_by("-fecha", "-id")
     egresos = (
         Egreso.objects.all()
@@ -6637,6 +6668,26 @@ def _obtener_datos_reporte_ganancias(fecha_inicio=None, fecha_fin=None):
         ingresos = ingresos.filter(fecha__lte=fecha_fin)
         egresos = egresos.filter(fecha__lte=fecha_fin)
 
+    return ingresos, egresos
+
+
+def _movimientos_ganancias_qs(ingresos, egresos):
+    """Ingresos y egresos como una sola consulta ``UNION ALL`` de tuplas (tipo, concepto, monto, fecha)."""
+    texto = models.CharField()
+    ingresos = ingresos.annotate(
+        tipo_mov=models.Value("Ingreso", output_field=texto),
+        concepto_mov=Coalesce(NullIf("concepto", models.Value("")), models.Value("-"), output_field=texto),
+    ).values_list("tipo_mov", "concepto_mov", "total", "fecha")
+    egresos = egresos.annotate(
+        tipo_mov=models.Value("Egreso", output_field=texto),
+        concepto_mov=Coalesce("insumo__nombre", NullIf("concepto", models.Value("")), models.Value("Egreso"), output_field=texto),
+    ).values_list("tipo_mov", "concepto_mov", "total", "fecha")
+    return ingresos.order_by().union(egresos.order_by(), all=True).order_by("-fecha", "-tipo_mov")
+
+
+def _obtener_datos_reporte_ganancias(fecha_inicio=None, fecha_fin=None):
+    ingresos, egresos = _querysets_reporte_ganancias(fecha_inicio, fecha_fin)
+
     total_ingresos = ingresos.aggregate(total=Sum("total"))["total"] or Decimal("0")
     total_egresos = egresos.aggregate(total=Sum("total"))["total"] or Decimal("0")
     ganancia = total_ingresos - total_egresos
@@ -6718,88 +6769,37 @@ def exportar_ganancias_excel(request):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
 
-    fecha_inicio = request.GET.get("fecha_inicio") or None
-    fecha_fin = request.GET.get("fecha_fin") or None
-
-    data = _obtener_datos_reporte_ganancias(
-        fecha_inicio=fecha_inicio,
-        fecha_fin=fecha_fin,
-    )
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Ganancias"
-
-    fill_titulo = PatternFill("solid", fgColor="1F4E78")
-    fill_encabezado = PatternFill("solid", fgColor="D9EAF7")
-    fill_ingreso = PatternFill("solid", fgColor="E2F0D9")
-    fill_egreso = PatternFill("solid", fgColor="FDE9E7")
-
-    font_blanco = Font(color="FFFFFF", bold=True, size=12)
-    font_negrita = Font(bold=True)
-
-    ws.merge_cells("A1:D1")
-    ws["A1"] = "REPORTE DE GANANCIAS"
-    ws["A1"].fill = fill_titulo
-    ws["A1"].font = font_blanco
-    ws["A1"].alignment = Alignment(horizontal="center", vertical="center")
-
-    ws["A3"] = "Fecha inicio"
-    ws["B3"] = data["fecha_inicio"] or "Todas"
-    ws["C3"] = "Fecha fin"
-    ws["D3"] = data["fecha_fin"] or "Todas"
-
-    ws["A5"] = "Total ingresos"
-    ws["B5"] = float(data["total_ingresos"])
-    ws["C5"] = "Total egresos"
-    ws["D5"] = float(data["total_egresos"])
-
-    ws["A6"] = "Ganancia neta"
-    ws["B6"] = float(data["ganancia"])
-
-    for cell in ("A5", "C5", "A6"):
-        ws[cell].font = font_negrita
-
-    encabezados = ["Tipo", "Concepto", "Monto", "Fecha"]
-    fila_inicio_tabla = 8
-
-    for col, encabezado in enumerate(encabezados, start=1):
-        cell = ws.cell(row=fila_inicio_tabla, column=col, value=encabezado)
-        cell.fill = fill_encabezado
-        cell.font = font_negrita
-        cell.alignment = Alignment(horizontal="center")
-
-    fila = fila_inicio_tabla + 1
-    for mov in data["movimientos"]:
-        ws.cell(row=fila, column=1, value=mov["tipo"])
-        ws.cell(row=fila, column=2, value=mov["concepto"])
-        ws.cell(row=fila, column=3, value=float(mov["monto"]))
-        ws.cell(row=fila, column=4, value=mov["fecha"].strftime("%d/%m/%Y") if mov["fecha"] else "")
-
-        if mov["tipo"] == "Ingreso":
-            ws.cell(row=fila, column=1).fill = fill_ingreso
-        else:
-            ws.cell(row=fila, column=1).fill = fill_egreso
-
-        fila += 1
+    return responder_reporte(request, "ganancias_excel", {
+        "fecha_inicio": request.GET.get("fecha_inicio") or None,
+        "fecha_fin": request.GET.get("fecha_fin") or None,
+    })
 
-    for row in ws.iter_rows(min_row=5, max_row=fila, min_col=2, max_col=3):
-        for cell in row:
-            if isinstance(cell.value, (int, float)):
-                cell.number_format = '$ #,##0.00'
 
-    ws.column_dimensions["A"].width = 15
-    ws.column_dimensions["B"].width = 45
-    ws.column_dimensions["C"].width = 18
-    ws.column_dimensions["D"].width = 18
+@registrar_reporte("ganancias_excel", "Reporte de ganancias (Excel)", modelos=("finanzas.Ingreso", "finanzas.Egreso"), diario=False)
+def _reporte_ganancias_excel(parametros):
+    fecha_inicio = parametros.get("fecha_inicio")
+    fecha_fin = parametros.get("fecha_fin")
+    ingresos, egresos = _querysets_reporte_ganancias(fecha_inicio, fecha_fin)
+    total_ingresos = ingresos.aggregate(total=Sum("total"))["total"] or Decimal("0")
+    total_egresos = egresos.aggregate(total=Sum("total"))["total"] or Decimal("0")
 
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return respuesta_excel(
+        ["Tipo", "Concepto", "Monto", "Fecha"],
+        _movimientos_ganancias_qs(ingresos, egresos).iterator(chunk_size=CHUNK_EXPORTACION),
+        "reporte_ganancias.xlsx",
+        hoja="Ganancias",
+        titulo="REPORTE DE GANANCIAS",
+        resumen=[
+            ("Fecha inicio", fecha_inicio or "Todas"),
+            ("Fecha fin", fecha_fin or "Todas"),
+            ("Total ingresos", total_ingresos),
+            ("Total egresos", total_egresos),
+            ("Ganancia neta", total_ingresos - total_egresos),
+        ],
+        anchos=[15, 45, 18, 18],
+        formatos={2: FORMATO_MONEDA},
+        rellenos={0: {"Ingreso": PatternFill("solid", fgColor="E2F0D9"), "Egreso": PatternFill("solid", fgColor="FDE9E7")}},
     )
-    response["Content-Disposition"] = 'attachment; filename="reporte_ganancias.xlsx"'
-
-    wb.save(response)
-    return response
 
 
 @login_required
@@ -6807,8 +6807,16 @@ def exportar_ganancias_pdf(request):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
 
-    fecha_inicio = request.GET.get("fecha_inicio") or None
-    fecha_fin = request.GET.get("fecha_fin") or None
+    return responder_reporte(request, "ganancias_pdf", {
+        "fecha_inicio": request.GET.get("fecha_inicio") or None,
+        "fecha_fin": request.GET.get("fecha_fin") or None,
+    })
+
+
+@registrar_reporte("ganancias_pdf", "Reporte de ganancias (PDF)", modelos=("finanzas.Ingreso", "finanzas.Egreso"), diario=False)
+def _reporte_ganancias_pdf(parametros):
+    fecha_inicio = parametros.get("fecha_inicio")
+    fecha_fin = parametros.get("fecha_fin")
 
     data = _obtener_datos_reporte_ganancias(
         fecha_inicio=fecha_inicio,
@@ -6897,6 +6905,59 @@ def exportar_ganancias_pdf(request):
     return response
 
 
+# ================================
+# REPORTES EN SEGUNDO PLANO
+# ================================
+
+def _puede_ver_reporte(user, job):
+    return es_admin(user) or (job.solicitado_por_id is not None and job.solicitado_por_id == user.id)
+
+
+def _reporte_estado_datos(job):
+    return {
+        "id": job.pk,
+        "estado": job.estado,
+        "estado_label": job.get_estado_display(),
+        "terminado": job.terminado,
+        "error": job.error,
+        "nombre_archivo": job.nombre_archivo,
+        "url_descarga": reverse("reporte_descargar", args=[job.pk]) if job.estado == ReporteJob.ESTADO_LISTO else "",
+    }
+
+
+@login_required
+def reporte_estado_view(request, pk):
+    job = get_object_or_404(ReporteJob, pk=pk)
+    if not _puede_ver_reporte(request.user, job):
+        return render(request, "dashboard/no_autorizado.html", status=403)
+    tipo = cargar_reportes().get(job.tipo)
+    return render(request, "dashboard/reporte_estado.html", {
+        "job": job,
+        "titulo": tipo.titulo if tipo else job.tipo,
+        "estado_json": json.dumps(_reporte_estado_datos(job)),
+        "es_admin": es_admin(request.user),
+    })
+
+
+@login_required
+@require_GET
+def reporte_estado_json_view(request, pk):
+    job = get_object_or_404(ReporteJob, pk=pk)
+    if not _puede_ver_reporte(request.user, job):
+        return JsonResponse({"error": "No autorizado"}, status=403)
+    return JsonResponse(_reporte_estado_datos(job))
+
+
+@login_required
+def reporte_descargar_view(request, pk):
+    job = get_object_or_404(ReporteJob, pk=pk)
+    if not _puede_ver_reporte(request.user, job):
+        return render(request, "dashboard/no_autorizado.html", status=403)
+    if job.estado != ReporteJob.ESTADO_LISTO or not job.archivo:
+        return redirect("reporte_estado", pk=job.pk)
+    return FileResponse(job.archivo.open("rb"), as_attachment=True, filename=job.nombre_archivo, content_type=job.content_type or None)
+
+
 @login_required
 def calculadora_quimicos_view(request):
     # Compatibilidad con accesos antiguos: la calculadora evolucionó al Asistente Técnico.
@@ -7358,12 +7419,23 @@ def _generar_pdf_clientes_contratos(clientes, titulo, nombre_archivo, subtitulo=
     return response
 
 
+MODELOS_REPORTE_CLIENTES = ("clientes.Cliente", "contratos.Contrato", "contratos.EquipamientoContrato")
+
+
 @login_required
 def clientes_contratos_pdf_view(request):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
-    ciudad_id = (request.GET.get("ciudad") or "").strip()
-    estado_pdf = (request.GET.get("estado") or "activos").strip().lower()
+    return responder_reporte(request, "clientes_contratos", {
+        "ciudad": (request.GET.get("ciudad") or "").strip(),
+        "estado": (request.GET.get("estado") or "activos").strip().lower(),
+    })
+
+
+@registrar_reporte("clientes_contratos", "Registro general de clientes y contratos", modelos=MODELOS_REPORTE_CLIENTES)
+def _reporte_clientes_contratos(parametros):
+    ciudad_id = str(parametros.get("ciudad") or "")
+    estado_pdf = parametros.get("estado") or "activos"
     contratos_pdf_qs = Contrato.objects.select_related("tecnico_designado__user", "ciudad_ref").prefetch_related("equipamientos").order_by("-activo", "fecha_inicio", "id")
     if estado_pdf == "activos":
         contratos_pdf_qs = contratos_pdf_qs.filter(activo=True)
@@ -7391,6 +7463,13 @@ def clientes_contratos_pdf_view(request):
 def cliente_contratos_pdf_view(request, pk):
     if not es_admin(request.user):
         return render(request, "dashboard/no_autorizado.html", status=403)
+    get_object_or_404(Cliente, pk=pk)
+    return responder_reporte(request, "cliente_contratos", {"cliente": pk})
+
+
+@registrar_reporte("cliente_contratos", "Ficha de cliente y contratos", modelos=MODELOS_REPORTE_CLIENTES)
+def _reporte_cliente_contratos(parametros):
+    pk = parametros["cliente"]
     qs = Cliente.objects.filter(pk=pk).select_related("ciudad_ref").prefetch_related(
         models.Prefetch(
             "contratos",
@@ -8192,6 +8271,13 @@ def contrato_detalle_view(request, pk):
     inventario_critico_contrato = sum(1 for x in inventario_contrato if x.estado_stock in {"critico", "agotado"})
     proxima_reposicion_dias = min((x.dias_hasta_minimo for x in inventario_contrato if x.dias_hasta_minimo is not None), default=None)
     insumos_inventario = Insumo.objects.filter(activo=True, puede_mantenimiento=True).order_by("nombre")
+    rentabilidad = serie_rentabilidad(contrato, hoy)
+    grafico_rentabilidad = json.dumps({
+        "labels": [fila.periodo_label for fila in rentabilidad],
+        "ingreso": [float(fila.ingreso_facturado) for fila in rentabilidad],
+        "costos": [float(fila.costo_tecnico + fila.costo_quimicos) for fila in rentabilidad],
+        "margen": [float(fila.margen) for fila in rentabilidad],
+    })
 
     return render(
         request,
@@ -8199,6 +8285,9 @@ def contrato_detalle_view(request, pk):
         {
             "contrato": contrato,
             "mantenimientos_recientes": mantenimientos_recientes,
+            "rentabilidad_12_meses": rentabilidad,
+            "margen_12_meses": sum((fila.margen for fila in rentabilidad), Decimal("0.00")),
+            "grafico_rentabilidad": grafico_rentabilidad if any(fila.pk for fila in rentabilidad) else None,
             "facturas": facturas,
             "total_mantenimientos": total_mantenimientos,
             "total_realizados": total_realizados,
@@ -8438,43 +8527,7 @@ def _dec_cotizador(valor, defecto="0"):
 
 
 def _calcular_cotizacion_mantenimiento(datos):
-    ciudad = datos.get("ciudad")
-    frecuencia = datos.get("frecuencia") or "1_semanal"
-    volumen = datos.get("volumen") or Decimal("0")
-    similares = Contrato.objects.filter(activo=True, frecuencia=frecuencia)
-    if ciudad:
-        similares = similares.filter(cliente__ciudad_ref=ciudad)
-    vals = list(similares.values_list("precio_mensual", "valor_tecnico_mensual"))
-    n = len(vals)
-    if vals:
-        prom_precio = sum((x[0] or Decimal("0") for x in vals), Decimal("0")) / n
-        prom_tecnico = sum((x[1] or Decimal("0") for x in vals), Decimal("0")) / n
-    else:
-        bases={"quincenal":Decimal("45"),"1_semanal":Decimal("55"),"2_semanales":Decimal("80"),"3_semanales":Decimal("120"),"personalizado":Decimal("80")}
-        prom_precio=bases.get(frecuencia,Decimal("55")); prom_tecnico=prom_precio*Decimal("0.35")
-    # Ajuste moderado por volumen respecto de una piscina residencial de 25 m3.
-    factor=Decimal("1")
-    if volumen>0:
-        factor=max(Decimal("0.85"),min(Decimal("1.65"),Decimal("0.75")+(volumen/Decimal("100"))))
-    base=(prom_precio*factor).quantize(Decimal("0.01"))
-    tecnico_rec=(prom_tecnico*factor).quantize(Decimal("0.01"))
-    tecnico_min=(tecnico_rec*Decimal("0.90")).quantize(Decimal("0.01"))
-    tecnico_max=(tecnico_rec*Decimal("1.15")).quantize(Decimal("0.01"))
-    # Estimación química basada en consumos históricos recientes de contratos comparables.
-    desde=timezone.localdate()-timedelta(days=90)
-    usos=UsoInsumo.objects.filter(mantenimiento__contrato__in=similares,mantenimiento__fecha__gte=desde)
-    total_q=usos.aggregate(t=Sum("costo_total"))["t"] or Decimal("0")
-    costo_q=(total_q/Decimal(max(n,1))/Decimal("3")).quantize(Decimal("0.01")) if datos.get("quimicos_incluidos") else Decimal("0")
-    if datos.get("quimicos_incluidos") and costo_q<=0:
-        costo_q=(base*Decimal("0.16")).quantize(Decimal("0.01"))
-    equipo=datos.get("equipamiento") or Decimal("0"); ajuste=datos.get("ajuste") or Decimal("0")
-    costo_directo=tecnico_rec+costo_q+equipo
-    minimo=max(base+equipo+ajuste,(costo_directo/Decimal("0.75"))+ajuste).quantize(Decimal("0.01"))
-    recomendado=max(base+equipo+ajuste,(costo_directo/Decimal("0.65"))+ajuste).quantize(Decimal("0.01"))
-    objetivo=max(recomendado,(costo_directo/Decimal("0.60"))+ajuste).quantize(Decimal("0.01"))
-    utilidad=(recomendado-costo_directo).quantize(Decimal("0.01"))
-    margen=((utilidad/recomendado)*100).quantize(Decimal("0.01")) if recomendado else Decimal("0")
-    return {"contratos_similares":n,"promedio":prom_precio.quantize(Decimal("0.01")),"costo_quimico":costo_q,"tecnico_min":tecnico_min,"tecnico_rec":tecnico_rec,"tecnico_max":tecnico_max,"precio_min":minimo,"precio_rec":recomendado,"precio_obj":objetivo,"utilidad":utilidad,"margen":margen}
+    return cotizar(modelo_cotizacion(), datos)
 
 @login_required
 def cotizador_inteligente_admin_view(request):
@@ -8495,3 +8548,22 @@ def cotizador_inteligente_admin_view(request):
             messages.success(request,f"Cotización #{guardada.pk} guardada correctamente.")
     recientes=CotizacionMantenimiento.objects.select_related("ciudad").order_by("-creada_en")[:8]
     return render(request,"dashboard/cotizador_inteligente_admin.html",{"ciudades":ciudades,"frecuencias":Contrato.FRECUENCIA_CHOICES,"datos":datos,"resultado":resultado,"guardada":guardada,"recientes":recientes})
+
+
+@login_required
+def cotizador_reprecio_view(request):
+    """Simula el re-precio de todos los contratos activos ante un cambio de costos."""
+    if not es_admin(request.user):
+        return render(request,"dashboard/no_autorizado.html",status=403)
+    variacion_quimicos=_dec_cotizador(request.GET.get("quimicos"))
+    variacion_tecnico=_dec_cotizador(request.GET.get("tecnico"))
+    simulacion=simular_reprecio(variacion_quimicos, variacion_tecnico)
+    frecuencias=dict(Contrato.FRECUENCIA_CHOICES)
+    for fila in simulacion["filas"]:
+        fila["frecuencia_nombre"]=frecuencias.get(fila["frecuencia"], fila["frecuencia"] or "—")
+    formato=formato_exportacion(request)
+    if formato:
+        encabezados=["Contrato","Cliente","Ciudad","Frecuencia","Precio actual","Recomendado actual","Recomendado nuevo","Mínimo nuevo","Diferencia","Margen nuevo %"]
+        filas=((f["contrato_id"],f["cliente"],f["ciudad_nombre"],f["frecuencia_nombre"],f["precio_actual"],f["recomendado_actual"],f["recomendado_nuevo"],f["minimo_nuevo"],f["diferencia"],f["margen_nuevo"]) for f in simulacion["filas"])
+        return exportar(formato,encabezados,filas,f"reprecio_{timezone.localdate():%Y%m%d}",hoja="Re-precio",titulo="Simulación de re-precio",resumen=[("Variación químicos %",variacion_quimicos),("Variación pago técnico %",variacion_tecnico),("Total actual",simulacion["total_actual"]),("Total recomendado",simulacion["total_recomendado"])],formatos={i:FORMATO_MONEDA for i in range(4,9)})
+    return render(request,"dashboard/cotizador_reprecio.html",{"simulacion":simulacion,"variacion_quimicos":variacion_quimicos,"variacion_tecnico":variacion_tecnico})
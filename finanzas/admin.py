@@ -78,3 +78,43 @@ class AnticipoTrabajadorAdmin(admin.ModelAdmin):
     list_filter = ("descontado", "periodo_anio", "periodo_mes", "fecha")
     search_fields = ("trabajador__user__username", "trabajador__user__first_name", "trabajador__user__last_name")
     readonly_fields = ("egreso", "creado_en")
+
+
+from .models import ContratoSyncPendiente
+
+
+@admin.register(ContratoSyncPendiente)
+class ContratoSyncPendienteAdmin(admin.ModelAdmin):
+    list_display = ("contrato", "estado", "solicitudes", "solicitado_en", "sincronizado_en", "intentos")
+    list_filter = ("estado",)
+    search_fields = ("contrato__cliente__nombre", "error")
+    readonly_fields = ("contrato", "solicitudes", "solicitado_en", "iniciado_en", "sincronizado_en", "intentos", "error", "resultado")
+    list_select_related = ("contrato__cliente",)
+    actions = ("reintentar",)
+
+    @admin.action(description="Volver a sincronizar")
+    def reintentar(self, request, queryset):
+        actualizadas = queryset.update(estado=ContratoSyncPendiente.ESTADO_PENDIENTE, intentos=0, error="")
+        self.message_user(request, f"{actualizadas} contrato(s) en cola para sincronizar.")
+
+
+from .models import SnapshotCartera
+
+
+@admin.register(SnapshotCartera)
+class SnapshotCarteraAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "por_cobrar", "vencido", "mas_30", "cobrado_dia", "facturas_abiertas", "clientes_con_saldo")
+    date_hierarchy = "fecha"
+    readonly_fields = [f.name for f in SnapshotCartera._meta.fields]
+
+
+from .models import RentabilidadContratoMensual
+
+
+@admin.register(RentabilidadContratoMensual)
+class RentabilidadContratoMensualAdmin(admin.ModelAdmin):
+    list_display = ("contrato", "anio", "mes", "ingreso_facturado", "ingreso_cobrado", "costo_tecnico", "costo_quimicos", "margen")
+    list_filter = ("anio", "mes")
+    search_fields = ("contrato__cliente__nombre",)
+    list_select_related = ("contrato__cliente",)
+    readonly_fields = [f.name for f in RentabilidadContratoMensual._meta.fields]
@@ -4,7 +4,7 @@ import logging
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db.models import Q, Sum
 from django.utils import timezone
 
 from dashboard.models import Notificacion
@@ -68,6 +68,23 @@ def _crear_para_admins(*, tipo, referencia_id, titulo, mensaje, url, enviar_push
             logger.exception("No fue posible enviar las alertas financieras push.")
 
 
+def notificar_facturas_vencidas(ids, *, hoy=None, enviar_push=True):
+    """Un aviso por administrador con el resumen de facturas que vencieron en la corrida del día."""
+    if not ids:
+        return
+    hoy = hoy or timezone.localdate()
+    # Solo vencen facturas sin pagos, así que el saldo es su total.
+    saldo = Factura.objects.filter(pk__in=ids).aggregate(saldo=Sum("total"))["saldo"] or 0
+    _crear_para_admins(
+        tipo="facturas_vencidas",
+        referencia_id=int(hoy.strftime("%Y%m%d")),
+        titulo="🔴 Facturas vencidas",
+        mensaje=f"{len(ids)} factura(s) pasaron a vencidas hoy, por ${saldo:.2f} pendientes.",
+        url="/dashboard/finanzas/cartera/?estado=vencida",
+        enviar_push=enviar_push,
+    )
+
+
 def generar_alertas_financieras(*, enviar_push=True):
     """Crea alertas financieras pendientes y elimina las que ya fueron resueltas."""
     hoy = timezone.localdate()
@@ -1,10 +1,12 @@
 from decimal import Decimal
 
 from django.db import transaction
+from django.db.models import Case, CharField, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from contratos.models import Contrato
-from .models import Factura, FacturaItem
+from .models import Factura, FacturaItem, PagoFactura
 
 
 MESES = (
@@ -14,6 +16,96 @@ MESES = (
 )
 
 
+DINERO = DecimalField(max_digits=12, decimal_places=2)
+TRAMOS_ANTIGUEDAD = ("por_vencer", "dias_1_7", "dias_8_15", "dias_16_30", "mas_30")
+
+
+def tramo_antiguedad(dias_vencida):
+    """Tramo de ``TRAMOS_ANTIGUEDAD`` para una factura con ``dias_vencida`` días de atraso."""
+    if dias_vencida <= 0:
+        return "por_vencer"
+    if dias_vencida <= 7:
+        return "dias_1_7"
+    if dias_vencida <= 15:
+        return "dias_8_15"
+    if dias_vencida <= 30:
+        return "dias_16_30"
+    return "mas_30"
+
+
+def anotar_saldos(facturas, hoy=None):
+    """Anota ``cobrado``, ``saldo_pendiente`` y ``estado_actual`` calculados en SQL.
+
+    Repite las reglas de ``Factura.monto_pagado``, ``saldo`` y
+    ``estado_visual`` (incluida la compatibilidad con facturas antiguas
+    pagadas sin registros de pago) para poder sumar, filtrar y exportar sin
+    una consulta por factura.
+    """
+    hoy = hoy or timezone.localdate()
+    pagos = (
+        PagoFactura.objects.filter(factura=OuterRef("pk"), activo=True)
+        .order_by().values("factura").annotate(total=Sum("monto")).values("total")
+    )
+    return facturas.annotate(
+        cobrado_pagos=Coalesce(Subquery(pagos, output_field=DINERO), Value(Decimal("0.00")), output_field=DINERO),
+    ).annotate(
+        cobrado=Case(
+            When(cobrado_pagos=0, ingreso_generado__isnull=False, estado=Factura.ESTADO_PAGADA, then=F("total")),
+            default=F("cobrado_pagos"),
+            output_field=DINERO,
+        ),
+    ).annotate(
+        saldo_pendiente=Case(
+            When(estado=Factura.ESTADO_ANULADA, then=Value(Decimal("0.00"))),
+            When(total__gt=F("cobrado"), then=F("total") - F("cobrado")),
+            default=Value(Decimal("0.00")),
+            output_field=DINERO,
+        ),
+        estado_actual=Case(
+            When(~Q(estado__in=[Factura.ESTADO_PAGADA, Factura.ESTADO_ANULADA]) & Q(fecha_vencimiento__lt=hoy), then=Value(Factura.ESTADO_VENCIDA)),
+            default=F("estado"),
+            output_field=CharField(),
+        ),
+    )
+
+
+def totales_facturas(facturas, hoy=None):
+    """Facturado, cobrado, pendiente y vencido de ``facturas`` en una sola consulta.
+
+    Las anuladas no suman, igual que en los listados.
+    """
+    cero = Value(Decimal("0.00"))
+    # Los alias llevan prefijo para no chocar con las anotaciones de anotar_saldos.
+    totales = anotar_saldos(facturas.exclude(estado=Factura.ESTADO_ANULADA), hoy).aggregate(
+        total_facturado=Coalesce(Sum("total"), cero, output_field=DINERO),
+        total_cobrado=Coalesce(Sum("cobrado"), cero, output_field=DINERO),
+        total_pendiente=Coalesce(Sum("saldo_pendiente"), cero, output_field=DINERO),
+        total_vencido=Coalesce(Sum("saldo_pendiente", filter=Q(estado_actual=Factura.ESTADO_VENCIDA)), cero, output_field=DINERO),
+    )
+    return {clave.removeprefix("total_"): Decimal(valor).quantize(Decimal("0.01")) for clave, valor in totales.items()}
+
+
+@transaction.atomic
+def marcar_facturas_vencidas(hoy=None):
+    """Pasa a ``vencida`` las facturas pendientes sin pagos cuyo vencimiento ya pasó.
+
+    Las que tienen pagos activos quedan fuera (``sincronizar_estado`` las
+    considera parciales). Bloquea las candidatas, las cambia con un único
+    UPDATE y devuelve sus ids para notificar.
+    """
+    hoy = hoy or timezone.localdate()
+    pagos_activos = PagoFactura.objects.filter(factura=OuterRef("pk"), activo=True)
+    candidatas = Factura.objects.filter(
+        estado=Factura.ESTADO_PENDIENTE, fecha_vencimiento__lt=hoy,
+    ).filter(~Exists(pagos_activos))
+    ids = list(candidatas.select_for_update().order_by("pk").values_list("pk", flat=True))
+    if ids:
+        Factura.objects.filter(pk__in=ids, estado=Factura.ESTADO_PENDIENTE).update(
+            estado=Factura.ESTADO_VENCIDA, actualizada_en=timezone.now(),
+        )
+    return ids
+
+
 def fecha_vencimiento_contrato(contrato, anio, mes, cuota_numero=1):
     calendario = contrato.calendario_cobros(anio, mes)
     indice = min(max(int(cuota_numero or 1), 1), len(calendario)) - 1
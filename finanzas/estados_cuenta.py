@@ -0,0 +1,97 @@
+"""Estados de cuenta de clientes por lote.
+
+``datos_estados_cuenta`` lee clientes y facturas (con lo cobrado anotado en
+SQL) en dos consultas y arma, por cliente, las filas y el resumen ya
+formateados. Renderizar el PDF es lo costoso y no necesita la base, así que
+``generar_estados_cuenta`` lo reparte en un pool de procesos y va agregando
+cada documento a un zip.
+"""
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.utils import timezone
+from django.utils.text import slugify
+
+from clientes.models import Cliente
+from .cuentas_por_cobrar import anotar_saldos
+from .models import Factura
+from .pdf import estado_cuenta_pdf
+
+CERO = Decimal("0")
+
+
+def clientes_con_facturas():
+    return list(Factura.objects.order_by().values_list("cliente_id", flat=True).distinct())
+
+
+def datos_estados_cuenta(cliente_ids=None):
+    """Filas y resumen del estado de cuenta de cada cliente, en el orden de ``cliente_ids``.
+
+    Sin ``cliente_ids`` se toman todos los clientes con facturas.
+    """
+    if cliente_ids is None:
+        cliente_ids = clientes_con_facturas()
+    cliente_ids = [int(pk) for pk in cliente_ids]
+    clientes = Cliente.objects.in_bulk(cliente_ids)
+    hoy = timezone.localdate()
+    facturas = {pk: [] for pk in clientes}
+    consulta = anotar_saldos(Factura.objects.filter(cliente_id__in=clientes), hoy).order_by("cliente_id", "-periodo_anio", "-periodo_mes")
+    for factura in consulta:
+        facturas[factura.cliente_id].append(factura)
+
+    estados = []
+    for pk in cliente_ids:
+        cliente = clientes.get(pk)
+        if cliente is None:
+            continue
+        lista = facturas[pk]
+        filas = [(f.numero, f.periodo_label, f.fecha_vencimiento.strftime("%d/%m/%Y"), f"${f.total:.2f}", f"${f.cobrado:.2f}", f"${f.saldo_pendiente:.2f}", f.estado_actual.title()) for f in lista]
+        activas = [f for f in lista if f.estado != Factura.ESTADO_ANULADA]
+        resumen = [
+            ("Cliente", cliente.nombre),
+            ("Teléfono", cliente.telefono or "—"),
+            ("Total facturado", f"${sum((f.total for f in activas), CERO):.2f}"),
+            ("Total cobrado", f"${sum((f.cobrado for f in activas), CERO):.2f}"),
+            ("Saldo pendiente", f"${sum((f.saldo_pendiente for f in activas), CERO):.2f}"),
+        ]
+        estados.append({
+            "cliente_id": pk,
+            "nombre_archivo": f"estado-cuenta-{slugify(cliente.nombre)}.pdf",
+            "filas": filas,
+            "resumen": resumen,
+        })
+    return estados
+
+
+def generar_estados_cuenta(destino, cliente_ids=None, *, procesos=None):
+    """Escribe en ``destino`` (ruta o archivo) un zip con un PDF por cliente.
+
+    ``procesos`` limita el pool (por defecto, los CPU disponibles); con uno
+    solo se renderiza en este proceso. Devuelve cantidad, tiempo y ritmo.
+    """
+    inicio = time.perf_counter()
+    estados = datos_estados_cuenta(cliente_ids)
+    procesos = min(procesos or os.cpu_count() or 1, len(estados))
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED) as archivo_zip:
+        if procesos > 1:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                documentos = pool.map(estado_cuenta_pdf, estados, chunksize=max(1, len(estados) // (procesos * 4)))
+                _agregar(archivo_zip, estados, documentos)
+        else:
+            _agregar(archivo_zip, estados, map(estado_cuenta_pdf, estados))
+    segundos = time.perf_counter() - inicio
+    return {
+        "estados": len(estados),
+        "procesos": max(procesos, 1),
+        "segundos": segundos,
+        "por_segundo": len(estados) / segundos if segundos else 0,
+    }
+
+
+def _agregar(archivo_zip, estados, documentos):
+    # El id evita que dos clientes con el mismo nombre se pisen dentro del zip.
+    for estado, (nombre, contenido) in zip(estados, documentos):
+        archivo_zip.writestr(f"{estado['cliente_id']:05d}-{nombre}", contenido)
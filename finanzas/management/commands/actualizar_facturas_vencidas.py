@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from finanzas.alertas_financieras import notificar_facturas_vencidas
+from finanzas.cuentas_por_cobrar import marcar_facturas_vencidas
+
+
+class Command(BaseCommand):
+    help = "Marca como vencidas las cuentas por cobrar pendientes cuya fecha de vencimiento ya pasó (tarea diaria)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fecha", help="Fecha de corte AAAA-MM-DD (por defecto, hoy).")
+        parser.add_argument("--sin-notificar", action="store_true", help="No avisa a los administradores.")
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        if options["fecha"]:
+            hoy = parse_date(options["fecha"])
+            if hoy is None:
+                raise CommandError("La fecha debe tener el formato AAAA-MM-DD.")
+        ids = marcar_facturas_vencidas(hoy)
+        if not options["sin_notificar"]:
+            notificar_facturas_vencidas(ids, hoy=hoy)
+        self.stdout.write(self.style.SUCCESS(f"Facturas marcadas como vencidas: {len(ids)}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from finanzas.rentabilidad import actualizar_rentabilidad, reconstruir_rentabilidad
+
+
+class Command(BaseCommand):
+    help = "Actualiza la rentabilidad mensual por contrato con los periodos modificados, o la reconstruye completa."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reconstruir", action="store_true", help="Borra la tabla y recalcula toda la historia.")
+
+    def handle(self, *args, **options):
+        resultado = reconstruir_rentabilidad() if options["reconstruir"] else actualizar_rentabilidad()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rentabilidad por contrato: {resultado['filas']} filas en {resultado['periodos']} periodos."
+        ))
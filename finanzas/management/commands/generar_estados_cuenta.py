@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from finanzas.estados_cuenta import generar_estados_cuenta
+
+
+class Command(BaseCommand):
+    help = "Genera en un zip el estado de cuenta PDF de cada cliente con facturas (cierre de mes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", help="Ids de clientes separados por coma (por defecto, todos los que tienen facturas).")
+        parser.add_argument("--salida", help="Ruta del zip (por defecto, estados-cuenta-AAAAMMDD.zip).")
+        parser.add_argument("--procesos", type=int, default=None, help="Procesos para renderizar (por defecto, uno por CPU).")
+
+    def handle(self, *args, **options):
+        cliente_ids = None
+        if options["clientes"]:
+            try:
+                cliente_ids = [int(pk) for pk in options["clientes"].split(",") if pk.strip()]
+            except ValueError:
+                raise CommandError("--clientes debe ser una lista de ids separados por coma.")
+        if options["procesos"] is not None and options["procesos"] < 1:
+            raise CommandError("--procesos debe ser mayor que cero.")
+        salida = options["salida"] or f"estados-cuenta-{timezone.localdate():%Y%m%d}.zip"
+        resultado = generar_estados_cuenta(salida, cliente_ids, procesos=options["procesos"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Estados de cuenta: {resultado['estados']} en {resultado['segundos']:.2f} s "
+            f"({resultado['por_segundo']:.1f}/s con {resultado['procesos']} procesos) -> {salida}"
+        ))
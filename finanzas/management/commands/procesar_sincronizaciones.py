@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finanzas.sincronizacion import procesar_sincronizaciones
+
+
+class Command(BaseCommand):
+    help = "Sincroniza cartera y nómina de los contratos guardados (cola ContratoSyncPendiente)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--continuo", action="store_true", help="Queda esperando nuevos contratos (modo worker).")
+        parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos entre revisiones en modo continuo.")
+        parser.add_argument("--limite", type=int, default=None, help="Máximo de contratos a sincronizar por pasada.")
+
+    def handle(self, *args, **options):
+        if options["intervalo"] <= 0:
+            raise CommandError("--intervalo debe ser mayor que cero.")
+
+        if not options["continuo"]:
+            procesadas = procesar_sincronizaciones(limite=options["limite"])
+            self.stdout.write(self.style.SUCCESS(f"Contratos sincronizados: {procesadas}"))
+            return
+
+        self.stdout.write("Esperando contratos por sincronizar… (Ctrl+C para salir)")
+        try:
+            while True:
+                procesadas = procesar_sincronizaciones(limite=options["limite"])
+                if procesadas:
+                    self.stdout.write(self.style.SUCCESS(f"Contratos sincronizados: {procesadas}"))
+                else:
+                    time.sleep(options["intervalo"])
+        except KeyboardInterrupt:
+            self.stdout.write("Worker de sincronización detenido.")
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from finanzas.historico_cartera import guardar_snapshots_cartera
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda los snapshots de cartera de ayer y hoy (tarea nocturna: cierra el día que terminó) "
+        "o reconstruye días anteriores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Reconstruye desde esta fecha AAAA-MM-DD hasta hoy.")
+        parser.add_argument("--dias", type=int, help="Reconstruye los últimos N días, incluido hoy.")
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        # La tarea corre pasada la medianoche: el día que hay que cerrar es el de ayer.
+        desde = hoy - timedelta(days=1)
+        if options["desde"]:
+            desde = parse_date(options["desde"])
+            if desde is None:
+                raise CommandError("La fecha debe tener el formato AAAA-MM-DD.")
+        elif options["dias"]:
+            if options["dias"] < 1:
+                raise CommandError("--dias debe ser mayor que cero.")
+            desde = hoy - timedelta(days=options["dias"] - 1)
+        guardados = guardar_snapshots_cartera(desde, hoy)
+        self.stdout.write(self.style.SUCCESS(f"Snapshots de cartera guardados: {guardados}"))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0013_ubicacion_por_contrato'),
+        ('finanzas', '0014_alter_facturaitem_options_alter_ingreso_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContratoSyncPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('listo', 'Sincronizado'), ('error', 'Error')], default='pendiente', max_length=12)),
+                ('solicitudes', models.PositiveIntegerField(default=1, help_text='Guardados acumulados desde la última sincronización.')),
+                ('solicitado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('sincronizado_en', models.DateTimeField(blank=True, null=True)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('resultado', models.JSONField(blank=True, default=dict)),
+                ('contrato', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sincronizacion_finanzas', to='contratos.contrato')),
+            ],
+            options={
+                'verbose_name': 'Sincronización de contrato',
+                'verbose_name_plural': 'Sincronizaciones de contratos',
+                'ordering': ['solicitado_en', 'id'],
+                'indexes': [models.Index(fields=['estado', 'solicitado_en'], name='finanzas_co_estado_42fb89_idx')],
+            },
+        ),
+    ]
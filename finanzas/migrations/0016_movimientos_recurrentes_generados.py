@@ -0,0 +1,38 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0004_ciudad_estructurada'),
+        ('contratos', '0013_ubicacion_por_contrato'),
+        ('finanzas', '0015_contrato_sync_pendiente'),
+        ('inventario', '0012_indice_insumo_activo_categoria'),
+        ('mantenimientos', '0013_usoinsumo_origen_inventario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='egreso',
+            name='recurrente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='egresos_generados', to='finanzas.movimientorecurrente'),
+        ),
+        migrations.AddField(
+            model_name='ingreso',
+            name='recurrente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingresos_generados', to='finanzas.movimientorecurrente'),
+        ),
+        migrations.AddConstraint(
+            model_name='egreso',
+            constraint=models.UniqueConstraint(fields=('recurrente', 'fecha'), name='unique_egreso_recurrente_fecha'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingreso',
+            constraint=models.UniqueConstraint(fields=('recurrente', 'fecha'), name='unique_ingreso_recurrente_fecha'),
+        ),
+    ]
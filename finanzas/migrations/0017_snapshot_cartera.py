@@ -0,0 +1,38 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0016_movimientos_recurrentes_generados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotCartera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('por_cobrar', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vencido', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('por_vencer', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('dias_1_7', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('dias_8_15', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('dias_16_30', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('mas_30', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cobrado_dia', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('facturas_abiertas', models.PositiveIntegerField(default=0)),
+                ('clientes_con_saldo', models.PositiveIntegerField(default=0)),
+                ('por_ciudad', models.JSONField(blank=True, default=dict, help_text='Por cobrar y vencido por ciudad del cliente.')),
+                ('por_segmento', models.JSONField(blank=True, default=dict, help_text='Por cobrar y vencido por tipo de contrato.')),
+                ('generado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Snapshot de cartera',
+                'verbose_name_plural': 'Snapshots de cartera',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.11 on 2026-10-19 05:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0013_ubicacion_por_contrato'),
+        ('finanzas', '0017_snapshot_cartera'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RentabilidadContratoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('anio', models.PositiveIntegerField()),
+                ('mes', models.PositiveIntegerField()),
+                ('ingreso_facturado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ingreso_cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('costo_tecnico', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('costo_quimicos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('margen', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('actualizado_en', models.DateTimeField(auto_now=True, db_index=True)),
+                ('contrato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rentabilidad_mensual', to='contratos.contrato')),
+            ],
+            options={
+                'verbose_name': 'Rentabilidad mensual de contrato',
+                'verbose_name_plural': 'Rentabilidad mensual de contratos',
+                'ordering': ['-anio', '-mes', '-margen'],
+                'indexes': [models.Index(fields=['anio', 'mes', 'margen'], name='rentabilidad_periodo_margen')],
+                'constraints': [models.UniqueConstraint(fields=('contrato', 'anio', 'mes'), name='unique_rentabilidad_contrato_periodo')],
+            },
+        ),
+    ]
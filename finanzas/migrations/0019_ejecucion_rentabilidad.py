@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-19 06:36
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def marcar_ultima_actualizacion(apps, schema_editor):
+    # Hasta ahora la marca salía de la fila más reciente; se conserva ese punto de partida.
+    Rentabilidad = apps.get_model("finanzas", "RentabilidadContratoMensual")
+    Ejecucion = apps.get_model("finanzas", "EjecucionRentabilidad")
+    ultima = Rentabilidad.objects.aggregate(v=Max("actualizado_en"))["v"]
+    if ultima is not None:
+        Ejecucion.objects.create(pk=1, iniciada_en=ultima)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0018_rentabilidad_contrato_mensual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionRentabilidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iniciada_en', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Ejecución de rentabilidad',
+                'verbose_name_plural': 'Ejecuciones de rentabilidad',
+            },
+        ),
+        migrations.RunPython(marcar_ultima_actualizacion, migrations.RunPython.noop),
+    ]
@@ -138,6 +138,13 @@ class Egreso(MovimientoFinancieroMixin):
     proveedor = models.CharField(max_length=150, blank=True, default="")
     ciudad_proyecto = models.CharField(max_length=120, blank=True, default="")
     aprobado = models.BooleanField(default=True, db_index=True)
+    recurrente = models.ForeignKey(
+        "MovimientoRecurrente",
+        on_delete=models.SET_NULL,
+        related_name="egresos_generados",
+        null=True,
+        blank=True,
+    )
 
     @property
     def es_manual(self):
@@ -157,6 +164,7 @@ class Egreso(MovimientoFinancieroMixin):
         verbose_name = "Egreso"
         verbose_name_plural = "Egresos"
         ordering = ["-fecha", "-id"]
+        constraints = [models.UniqueConstraint(fields=["recurrente", "fecha"], name="unique_egreso_recurrente_fecha")]
 
 
 class Ingreso(MovimientoFinancieroMixin):
@@ -167,6 +175,13 @@ class Ingreso(MovimientoFinancieroMixin):
     fecha = models.DateField(default=date.today, db_index=True)
     fecha_cobro = models.DateField(null=True, blank=True)
     ciudad = models.CharField(max_length=120, blank=True, default="")
+    recurrente = models.ForeignKey(
+        "MovimientoRecurrente",
+        on_delete=models.SET_NULL,
+        related_name="ingresos_generados",
+        null=True,
+        blank=True,
+    )
 
     def save(self, *args, **kwargs):
         if self._state.adding and self.estado == self.ESTADO_PAGADO and not self.monto_pagado:
@@ -183,6 +198,7 @@ class Ingreso(MovimientoFinancieroMixin):
         verbose_name = "Ingreso"
         verbose_name_plural = "Ingresos"
         ordering = ["-fecha", "-id"]
+        constraints = [models.UniqueConstraint(fields=["recurrente", "fecha"], name="unique_ingreso_recurrente_fecha")]
 
 
 class MovimientoRecurrente(models.Model):
@@ -670,3 +686,129 @@ class PagoTrabajador(models.Model):
         if self.activo:
             self.activo = False
             self.save(update_fields=["activo", "actualizado_en"])
+
+
+class ContratoSyncPendiente(models.Model):
+    """Sincronización pendiente de cartera y nómina para un contrato guardado.
+
+    Hay una fila por contrato: varios guardados seguidos solo actualizan
+    ``solicitado_en`` y ``solicitudes``, y el worker sincroniza una sola vez con
+    el estado más reciente del contrato.
+    """
+
+    ESTADO_PENDIENTE = "pendiente"
+    ESTADO_PROCESANDO = "procesando"
+    ESTADO_LISTO = "listo"
+    ESTADO_ERROR = "error"
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_PROCESANDO, "Procesando"),
+        (ESTADO_LISTO, "Sincronizado"),
+        (ESTADO_ERROR, "Error"),
+    ]
+
+    contrato = models.OneToOneField(Contrato, on_delete=models.CASCADE, related_name="sincronizacion_finanzas")
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    solicitudes = models.PositiveIntegerField(default=1, help_text="Guardados acumulados desde la última sincronización.")
+    solicitado_en = models.DateTimeField(default=timezone.now)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    sincronizado_en = models.DateTimeField(null=True, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    resultado = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        ordering = ["solicitado_en", "id"]
+        indexes = [models.Index(fields=["estado", "solicitado_en"])]
+        verbose_name = "Sincronización de contrato"
+        verbose_name_plural = "Sincronizaciones de contratos"
+
+    def __str__(self):
+        return f"{self.contrato} | {self.get_estado_display()}"
+
+
+class SnapshotCartera(models.Model):
+    """Foto diaria de las cuentas por cobrar: saldos por antigüedad, ciudad y tipo de contrato.
+
+    Se guarda una fila por día (tarea nocturna o reconstrucción hacia atrás), de
+    modo que las tendencias se grafican leyendo filas y no recalculando facturas.
+    """
+
+    fecha = models.DateField(unique=True)
+    por_cobrar = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vencido = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    por_vencer = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    dias_1_7 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    dias_8_15 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    dias_16_30 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    mas_30 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cobrado_dia = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    facturas_abiertas = models.PositiveIntegerField(default=0)
+    clientes_con_saldo = models.PositiveIntegerField(default=0)
+    por_ciudad = models.JSONField(default=dict, blank=True, help_text="Por cobrar y vencido por ciudad del cliente.")
+    por_segmento = models.JSONField(default=dict, blank=True, help_text="Por cobrar y vencido por tipo de contrato.")
+    generado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-fecha"]
+        verbose_name = "Snapshot de cartera"
+        verbose_name_plural = "Snapshots de cartera"
+
+    def __str__(self):
+        return f"Cartera {self.fecha:%d/%m/%Y} | ${self.por_cobrar}"
+
+
+class RentabilidadContratoMensual(models.Model):
+    """Ingreso, costo técnico, químicos y margen de un contrato en un mes.
+
+    Tabla de hechos alimentada por ``finanzas.rentabilidad`` a partir de
+    facturas, ingresos cobrados, obligaciones del técnico y consumos de
+    insumos; los rankings y gráficos de margen la leen directamente.
+    """
+
+    contrato = models.ForeignKey(Contrato, on_delete=models.CASCADE, related_name="rentabilidad_mensual")
+    anio = models.PositiveIntegerField()
+    mes = models.PositiveIntegerField()
+    ingreso_facturado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ingreso_cobrado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    costo_tecnico = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    costo_quimicos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    margen = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        ordering = ["-anio", "-mes", "-margen"]
+        verbose_name = "Rentabilidad mensual de contrato"
+        verbose_name_plural = "Rentabilidad mensual de contratos"
+        constraints = [models.UniqueConstraint(fields=["contrato", "anio", "mes"], name="unique_rentabilidad_contrato_periodo")]
+        indexes = [models.Index(fields=["anio", "mes", "margen"], name="rentabilidad_periodo_margen")]
+
+    def __str__(self):
+        return f"{self.contrato} | {self.mes:02d}/{self.anio} | ${self.margen}"
+
+    @property
+    def periodo_label(self):
+        return f"{self.mes:02d}/{self.anio}"
+
+    @property
+    def margen_pct(self):
+        if not self.ingreso_facturado:
+            return 0
+        return round((self.margen / self.ingreso_facturado) * 100, 1)
+
+
+class EjecucionRentabilidad(models.Model):
+    """Inicio de la última actualización de ``RentabilidadContratoMensual`` (una sola fila).
+
+    La actualización incremental busca los movimientos guardados desde esta
+    marca; no se deduce de las filas porque las señales también las recalculan.
+    """
+
+    iniciada_en = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Ejecución de rentabilidad"
+        verbose_name_plural = "Ejecuciones de rentabilidad"
+
+    def __str__(self):
+        return f"Rentabilidad actualizada desde {self.iniciada_en:%d/%m/%Y %H:%M}"
@@ -0,0 +1,325 @@
+"""Motor de nómina por fecha de pago.
+
+``planificar_nomina`` calcula, sin escribir, todas las obligaciones cuyo pago
+cae en el mes elegido, las compara con las existentes y reparte los anticipos
+pendientes del periodo. ``generar_nomina`` aplica ese plan con
+``bulk_create``/``bulk_update``. El número de consultas no depende de cuántos
+contratos o trabajadores haya.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import DecimalField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from contratos.models import Contrato
+from .models import AnticipoTrabajador, Factura, LotePagoTrabajador, ObligacionTrabajador, PagoTrabajador
+
+CERO = Decimal("0.00")
+DINERO = DecimalField(max_digits=12, decimal_places=2)
+
+
+def meses_servicio_candidatos(anio_pago, mes_pago, meses_atras=12):
+    """Meses de inicio de servicio que podrían producir un pago en el mes elegido.
+
+    La nómina se consulta y genera por fecha programada de pago. Como el pago puede
+    ocurrir después del cierre del servicio o después del cobro del cliente, revisamos
+    el mes seleccionado y meses anteriores.
+    """
+    base = anio_pago * 12 + (mes_pago - 1)
+    for desplazamiento in range(-meses_atras, 1):
+        indice = base + desplazamiento
+        yield indice // 12, indice % 12 + 1
+
+
+def _filtro_periodos(periodos):
+    return reduce(or_, (Q(periodo_anio=anio, periodo_mes=mes) for anio, mes in periodos))
+
+
+def vencimientos_facturas(contrato_ids, periodos):
+    """Último vencimiento no anulado por ``(contrato_id, anio, mes)`` en una consulta."""
+    filas = (
+        Factura.objects.filter(_filtro_periodos(periodos), contrato_id__in=contrato_ids)
+        .exclude(estado=Factura.ESTADO_ANULADA)
+        .values("contrato_id", "periodo_anio", "periodo_mes")
+        .annotate(vence=Max("fecha_vencimiento"))
+        .order_by()
+    )
+    return {(f["contrato_id"], f["periodo_anio"], f["periodo_mes"]): f["vence"] for f in filas}
+
+
+def fecha_pago_programada(contrato, anio, mes, vencimientos=None):
+    """Calcula la fecha de nómina según la regla configurada para el trabajador.
+
+    ``vencimientos`` es el resultado de ``vencimientos_facturas``; sin él se
+    consulta la factura del periodo.
+    """
+    trabajador = contrato.tecnico_designado
+    periodo_inicio, periodo_fin = contrato.periodo_servicio(anio, mes)
+    if trabajador and trabajador.programacion_pago_nomina == "fin_periodo":
+        return periodo_fin + timedelta(days=trabajador.dias_despues_fin_periodo or 0)
+    if trabajador and trabajador.programacion_pago_nomina == "dia_fijo" and trabajador.dia_pago_nomina:
+        return date(anio, mes, min(trabajador.dia_pago_nomina, monthrange(anio, mes)[1]))
+    if trabajador and trabajador.programacion_pago_nomina == "rango" and trabajador.dia_pago_hasta:
+        return date(anio, mes, min(trabajador.dia_pago_hasta, monthrange(anio, mes)[1]))
+    if vencimientos is None:
+        vencimientos = vencimientos_facturas([contrato.pk], [(anio, mes)])
+    vence = vencimientos.get((contrato.pk, anio, mes))
+    if vence:
+        return vence
+
+    # Si todavía no se generaron las cuentas por cobrar, usamos directamente
+    # la programación comercial del contrato. En contratos con dos cuotas se
+    # toma el último vencimiento, porque la nómina es consolidada.
+    calendario = contrato.calendario_cobros(anio, mes)
+    fechas = [item.get("fecha_vencimiento") for item in calendario if item.get("fecha_vencimiento")]
+    if fechas:
+        return max(fechas)
+
+    return date(anio, mes, 1) + timedelta(days=5)
+
+
+def _obligaciones_relacionadas(contrato_ids, periodos, anio, mes):
+    """Obligaciones de los contratos y periodos candidatos, más las ya programadas en el mes.
+
+    Cada una trae ``pagado`` (pagos activos) anotado.
+    """
+    pagos = (
+        PagoTrabajador.objects.filter(obligacion=OuterRef("pk"), activo=True)
+        .order_by().values("obligacion").annotate(total=Sum("monto")).values("total")
+    )
+    return ObligacionTrabajador.objects.filter(
+        Q(_filtro_periodos(periodos), contrato_id__in=contrato_ids)
+        | Q(fecha_pago_programada__year=anio, fecha_pago_programada__month=mes)
+    ).annotate(
+        pagado=Coalesce(Subquery(pagos, output_field=DINERO), Value(CERO), output_field=DINERO),
+    ).order_by()
+
+
+def _saldo(obligacion):
+    if obligacion.estado == ObligacionTrabajador.ESTADO_ANULADO:
+        return CERO
+    return max(obligacion.valor_acordado - obligacion.pagado, CERO)
+
+
+def planificar_nomina(anio, mes, *, bloquear=False):
+    """Plan de la nómina con fecha de pago en ``anio``/``mes``, sin escribir en la base.
+
+    Devuelve un diccionario con las obligaciones ``nuevas`` (sin guardar), las
+    ``actualizadas`` (objeto y campos), los ``descuentos`` de anticipos y un
+    resumen ``por_trabajador``. Con ``bloquear`` los anticipos se leen con
+    ``select_for_update`` para aplicarlos dentro de una transacción.
+    """
+    contratos = list(Contrato.objects.filter(activo=True).select_related("tecnico_designado__user").order_by("pk"))
+    periodos = list(meses_servicio_candidatos(anio, mes))
+    contrato_ids = [c.pk for c in contratos]
+    vencimientos = vencimientos_facturas(contrato_ids, periodos)
+    existentes = {}
+    en_mes = {}
+    for obligacion in _obligaciones_relacionadas(contrato_ids, periodos, anio, mes):
+        existentes[(obligacion.contrato_id, obligacion.periodo_anio, obligacion.periodo_mes)] = obligacion
+        en_mes[obligacion.pk] = obligacion
+
+    nuevas = []
+    actualizadas = []
+    coincidentes = 0
+    sin_configurar = 0
+    for contrato in contratos:
+        if not contrato.tecnico_designado_id or not contrato.valor_tecnico_mensual or contrato.valor_tecnico_mensual <= 0:
+            sin_configurar += 1
+            continue
+        for periodo_anio, periodo_mes in periodos:
+            fecha_programada = fecha_pago_programada(contrato, periodo_anio, periodo_mes, vencimientos)
+            if (fecha_programada.year, fecha_programada.month) != (anio, mes):
+                continue
+            periodo_inicio, periodo_fin = contrato.periodo_servicio(periodo_anio, periodo_mes)
+            if contrato.fecha_inicio and periodo_fin <= contrato.fecha_inicio:
+                continue
+
+            obligacion = existentes.get((contrato.pk, periodo_anio, periodo_mes))
+            if obligacion is None:
+                nueva = ObligacionTrabajador(
+                    contrato=contrato, trabajador=contrato.tecnico_designado,
+                    periodo_anio=periodo_anio, periodo_mes=periodo_mes,
+                    valor_acordado=contrato.valor_tecnico_mensual,
+                    periodo_servicio_inicio=periodo_inicio, periodo_servicio_fin=periodo_fin,
+                    fecha_pago_programada=fecha_programada,
+                )
+                nueva.pagado = CERO
+                nuevas.append(nueva)
+                continue
+
+            coincidentes += 1
+            campos = []
+            # Con pagos registrados la obligación queda tal como se pactó.
+            if obligacion.pagado <= 0:
+                if obligacion.trabajador_id != contrato.tecnico_designado_id:
+                    obligacion.trabajador = contrato.tecnico_designado
+                    campos.append("trabajador")
+                if obligacion.valor_acordado != contrato.valor_tecnico_mensual:
+                    obligacion.valor_acordado = contrato.valor_tecnico_mensual
+                    campos.append("valor_acordado")
+                if obligacion.fecha_pago_programada != fecha_programada:
+                    obligacion.fecha_pago_programada = fecha_programada
+                    campos.append("fecha_pago_programada")
+            # Las fechas históricas se completan si faltan, pero nunca se reemplazan.
+            if not obligacion.periodo_servicio_inicio:
+                obligacion.periodo_servicio_inicio = periodo_inicio
+                campos.append("periodo_servicio_inicio")
+            if not obligacion.periodo_servicio_fin:
+                obligacion.periodo_servicio_fin = periodo_fin
+                campos.append("periodo_servicio_fin")
+            if campos:
+                actualizadas.append((obligacion, campos))
+
+    # Obligaciones del mes ya con los cambios del plan aplicados en memoria.
+    por_trabajador_mes = {}
+    for obligacion in list(en_mes.values()) + nuevas:
+        fecha = obligacion.fecha_pago_programada
+        if (fecha.year, fecha.month) == (anio, mes) and obligacion.estado != ObligacionTrabajador.ESTADO_ANULADO:
+            por_trabajador_mes.setdefault(obligacion.trabajador_id, []).append(obligacion)
+    for lista in por_trabajador_mes.values():
+        lista.sort(key=lambda o: (o.fecha_pago_programada, o.pk is None, o.pk or 0))
+
+    # Los anticipos pendientes del periodo se descuentan de la nómina sin crear
+    # un segundo egreso: se reutiliza el egreso generado al registrar el anticipo.
+    anticipos = AnticipoTrabajador.objects.filter(
+        periodo_anio=anio, periodo_mes=mes, descontado=False,
+    ).select_related("trabajador__user")
+    if bloquear:
+        anticipos = anticipos.select_for_update(of=("self",))
+    aplicado_por_obligacion = {}
+    descuentos = []
+    for anticipo in anticipos:
+        restante = anticipo.saldo_pendiente
+        aplicaciones = []
+        for obligacion in por_trabajador_mes.get(anticipo.trabajador_id, []):
+            if restante <= 0:
+                break
+            disponible = _saldo(obligacion) - aplicado_por_obligacion.get(id(obligacion), CERO)
+            aplicado = min(restante, disponible)
+            if aplicado <= 0:
+                continue
+            aplicaciones.append((obligacion, aplicado))
+            aplicado_por_obligacion[id(obligacion)] = aplicado_por_obligacion.get(id(obligacion), CERO) + aplicado
+            restante -= aplicado
+        if aplicaciones:
+            descuentos.append({
+                "anticipo": anticipo,
+                "monto": sum((monto for _, monto in aplicaciones), CERO),
+                "aplicaciones": aplicaciones,
+            })
+
+    resumen = {}
+    for obligacion in nuevas:
+        fila = resumen.setdefault(obligacion.trabajador_id, {
+            "trabajador": obligacion.trabajador, "nuevas": 0, "valor_nuevo": CERO, "anticipos": CERO,
+        })
+        fila["nuevas"] += 1
+        fila["valor_nuevo"] += obligacion.valor_acordado
+    for descuento in descuentos:
+        anticipo = descuento["anticipo"]
+        fila = resumen.setdefault(anticipo.trabajador_id, {
+            "trabajador": anticipo.trabajador, "nuevas": 0, "valor_nuevo": CERO, "anticipos": CERO,
+        })
+        fila["anticipos"] += descuento["monto"]
+
+    return {
+        "anio": anio,
+        "mes": mes,
+        "contratos_activos": len(contratos),
+        "sin_configurar": sin_configurar,
+        "nuevas": nuevas,
+        "actualizadas": actualizadas,
+        "existentes": coincidentes,
+        "descuentos": descuentos,
+        "valor_nuevo": sum((o.valor_acordado for o in nuevas), CERO),
+        "valor_descontado": sum((d["monto"] for d in descuentos), CERO),
+        "por_trabajador": sorted(resumen.values(), key=lambda f: str(f["trabajador"])),
+    }
+
+
+@transaction.atomic
+def generar_nomina(anio, mes):
+    """Aplica ``planificar_nomina`` con operaciones masivas y devuelve los conteos."""
+    plan = planificar_nomina(anio, mes, bloquear=True)
+    ahora = timezone.now()
+    hoy = timezone.localdate()
+
+    ObligacionTrabajador.objects.bulk_create(plan["nuevas"])
+    if plan["actualizadas"]:
+        campos = {"actualizada_en"}
+        for obligacion, cambios in plan["actualizadas"]:
+            obligacion.actualizada_en = ahora
+            campos.update(cambios)
+        ObligacionTrabajador.objects.bulk_update([o for o, _ in plan["actualizadas"]], sorted(campos))
+
+    lotes = []
+    pagos = []
+    estados = {}
+    anticipos = []
+    for descuento in plan["descuentos"]:
+        anticipo = descuento["anticipo"]
+        lote = LotePagoTrabajador(
+            trabajador_id=anticipo.trabajador_id,
+            periodo_anio=anio,
+            periodo_mes=mes,
+            monto=descuento["monto"],
+            fecha=anticipo.fecha,
+            metodo_pago="transferencia",
+            referencia=f"ANT-{anticipo.pk}",
+            observaciones=f"Descuento automático del anticipo #{anticipo.pk}",
+            # El egreso del anticipo solo puede quedar ligado a su primer descuento.
+            egreso_id=anticipo.egreso_id if anticipo.monto_descontado <= 0 else None,
+            creado_por_id=anticipo.creado_por_id,
+        )
+        lotes.append(lote)
+        for obligacion, monto in descuento["aplicaciones"]:
+            pagos.append(PagoTrabajador(
+                lote=lote,
+                obligacion=obligacion,
+                monto=monto,
+                fecha=anticipo.fecha,
+                metodo_pago="transferencia",
+                referencia=f"ANT-{anticipo.pk}",
+                observaciones=f"Anticipo #{anticipo.pk} descontado de la nómina",
+                creado_por_id=anticipo.creado_por_id,
+            ))
+            obligacion.pagado += monto
+            estados[id(obligacion)] = obligacion
+        anticipo.monto_descontado += descuento["monto"]
+        anticipo.descontado = anticipo.monto_descontado >= anticipo.monto
+        anticipo.fecha_descuento = hoy if anticipo.descontado else None
+        anticipos.append(anticipo)
+
+    if lotes:
+        LotePagoTrabajador.objects.bulk_create(lotes)
+        PagoTrabajador.objects.bulk_create(pagos)
+        # Mismas reglas que ObligacionTrabajador.sincronizar_estado.
+        cambiadas = []
+        for obligacion in estados.values():
+            nuevo = (
+                ObligacionTrabajador.ESTADO_PAGADO if obligacion.pagado >= obligacion.valor_acordado
+                else ObligacionTrabajador.ESTADO_PARCIAL if obligacion.pagado > 0
+                else ObligacionTrabajador.ESTADO_PENDIENTE
+            )
+            if nuevo != obligacion.estado:
+                obligacion.estado = nuevo
+                obligacion.actualizada_en = ahora
+                cambiadas.append(obligacion)
+        ObligacionTrabajador.objects.bulk_update(cambiadas, ["estado", "actualizada_en"])
+        AnticipoTrabajador.objects.bulk_update(anticipos, ["monto_descontado", "descontado", "fecha_descuento"])
+
+    return {
+        "creadas": len(plan["nuevas"]),
+        "existentes": plan["existentes"],
+        "actualizadas": len(plan["actualizadas"]),
+        "sin_configurar": plan["sin_configurar"],
+        "anticipos_aplicados": len(plan["descuentos"]),
+        "valor_descontado": plan["valor_descontado"],
+    }
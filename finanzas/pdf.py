@@ -0,0 +1,36 @@
+"""Documentos PDF tabulares de finanzas (recibos, comprobantes, estados de cuenta).
+
+Solo depende de reportlab: no importa modelos ni toca la base, así que sus
+funciones pueden ejecutarse en procesos hijos (``estados_cuenta``).
+"""
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+ENCABEZADOS_ESTADO_CUENTA = ["Factura", "Periodo", "Vence", "Total", "Cobrado", "Saldo", "Estado"]
+
+
+def construir_pdf(destino, titulo, subtitulo, filas, encabezados, resumen=None):
+    """Escribe en ``destino`` (archivo o respuesta) un título, el ``resumen`` clave/valor y la tabla."""
+    doc = SimpleDocTemplate(destino, pagesize=A4, rightMargin=14*mm, leftMargin=14*mm, topMargin=14*mm, bottomMargin=14*mm)
+    estilos = getSampleStyleSheet()
+    elementos = [Paragraph(titulo, ParagraphStyle("TituloJVA", parent=estilos["Title"], alignment=TA_CENTER, fontSize=17)), Paragraph(subtitulo, ParagraphStyle("SubJVA", parent=estilos["Normal"], alignment=TA_CENTER, textColor=colors.HexColor("#5b6472"))), Spacer(1, 7*mm)]
+    if resumen:
+        datos = [[Paragraph(str(k), estilos["BodyText"]), Paragraph(str(v), estilos["BodyText"])] for k,v in resumen]
+        tabla = Table(datos, colWidths=[70*mm, 80*mm]); tabla.setStyle(TableStyle([("BACKGROUND",(0,0),(0,-1),colors.HexColor("#eef4fb")),("GRID",(0,0),(-1,-1),0.25,colors.HexColor("#cbd5e1")),("PADDING",(0,0),(-1,-1),6)])); elementos += [tabla, Spacer(1, 6*mm)]
+    data = [[Paragraph(str(x), estilos["BodyText"]) for x in encabezados]] + [[Paragraph(str(x), estilos["BodyText"]) for x in fila] for fila in filas]
+    tabla = Table(data, repeatRows=1)
+    tabla.setStyle(TableStyle([("BACKGROUND",(0,0),(-1,0),colors.HexColor("#123b66")),("TEXTCOLOR",(0,0),(-1,0),colors.white),("GRID",(0,0),(-1,-1),0.25,colors.HexColor("#cbd5e1")),("VALIGN",(0,0),(-1,-1),"TOP"),("PADDING",(0,0),(-1,-1),5)]))
+    elementos.append(tabla); doc.build(elementos)
+
+
+def estado_cuenta_pdf(estado):
+    """``(nombre_archivo, bytes)`` del estado de cuenta preparado por ``datos_estados_cuenta``."""
+    contenido = BytesIO()
+    construir_pdf(contenido, "JVAQUA · Estado de cuenta", "Historial financiero del cliente", estado["filas"], ENCABEZADOS_ESTADO_CUENTA, estado["resumen"])
+    return estado["nombre_archivo"], contenido.getvalue()
@@ -0,0 +1,240 @@
+"""Proyección de flujo de caja a 12 meses.
+
+Reúne en un arreglo diario todo lo que se espera cobrar y pagar desde hoy:
+
+* saldos de cuentas por cobrar y de obligaciones con trabajadores ya generadas;
+* cuotas y nómina futuras de contratos activos que todavía no se generaron
+  (``calendario_cobros`` y ``fecha_pago_programada``, sin escribir nada);
+* ingresos y egresos recurrentes, y egresos/ingresos pendientes de pago.
+
+Cada fuente se lee con una consulta y se suma directamente en la posición del
+día, así que el costo no depende de cuántos meses o documentos haya. El
+resultado se guarda en caché por día y por una marca de los datos, de modo que
+las visitas siguientes no consultan nada más que la marca.
+"""
+import hashlib
+from calendar import monthrange
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, Max, Q, Sum
+from django.utils import timezone
+
+from contratos.models import Contrato
+from dashboard.reportes import marca_de_modelos
+from .cuentas_por_cobrar import anotar_saldos
+from .models import Egreso, Factura, Ingreso, MovimientoRecurrente, ObligacionTrabajador
+from .nomina import fecha_pago_programada, vencimientos_facturas
+from .recurrentes import siguiente_fecha
+from .sincronizacion import marca_contratos
+
+CERO = Decimal("0.00")
+MESES_PROYECCION = 12
+MODELOS_PROYECCION = (
+    "finanzas.Factura", "finanzas.PagoFactura", "finanzas.ObligacionTrabajador",
+    "finanzas.PagoTrabajador", "finanzas.Ingreso", "finanzas.Egreso", "finanzas.MovimientoRecurrente",
+)
+FUENTES = {
+    "cartera": ("entrada", "Cuentas por cobrar"),
+    "contratos": ("entrada", "Cuotas futuras de contratos"),
+    "ingresos_recurrentes": ("entrada", "Ingresos recurrentes"),
+    "ingresos_pendientes": ("entrada", "Ingresos pendientes"),
+    "nomina": ("salida", "Nómina generada"),
+    "nomina_futura": ("salida", "Nómina futura de contratos"),
+    "egresos_recurrentes": ("salida", "Egresos recurrentes"),
+    "egresos_pendientes": ("salida", "Egresos por pagar"),
+}
+
+
+def _mover_mes(anio, mes, desplazamiento):
+    indice = anio * 12 + (mes - 1) + desplazamiento
+    return indice // 12, indice % 12 + 1
+
+
+class _Flujo:
+    """Arreglo diario de entradas y salidas entre ``desde`` y ``hasta``."""
+
+    def __init__(self, desde, hasta):
+        self.desde = desde
+        self.hasta = hasta
+        self.dias = (hasta - desde).days + 1
+        self.entradas = [CERO] * self.dias
+        self.salidas = [CERO] * self.dias
+        self.por_fuente = dict.fromkeys(FUENTES, CERO)
+        self.vencido = {"por_cobrar": CERO, "por_pagar": CERO}
+
+    def sumar(self, fuente, fecha, valor):
+        if not valor or valor <= 0:
+            return
+        sentido = FUENTES[fuente][0]
+        if fecha < self.desde:
+            # Lo atrasado no se reparte en la curva: se informa aparte.
+            self.vencido["por_cobrar" if sentido == "entrada" else "por_pagar"] += valor
+            return
+        if fecha > self.hasta:
+            return
+        destino = self.entradas if sentido == "entrada" else self.salidas
+        destino[(fecha - self.desde).days] += valor
+        self.por_fuente[fuente] += valor
+
+
+def _periodos_horizonte(desde, hasta):
+    # Un mes antes del inicio: las cuotas con desfase o cobro al cierre caen dentro.
+    anio, mes = _mover_mes(desde.year, desde.month, -1)
+    while date(anio, mes, 1) <= hasta:
+        yield anio, mes
+        anio, mes = _mover_mes(anio, mes, 1)
+
+
+def _cartera(flujo):
+    pendientes = anotar_saldos(
+        Factura.objects.exclude(estado__in=[Factura.ESTADO_ANULADA, Factura.ESTADO_PAGADA]), flujo.desde,
+    ).filter(saldo_pendiente__gt=0).values_list("fecha_vencimiento", "saldo_pendiente")
+    for fecha, saldo in pendientes:
+        flujo.sumar("cartera", fecha, saldo)
+
+
+def _nomina(flujo):
+    pagado = Sum("pagos__monto", filter=Q(pagos__activo=True))
+    obligaciones = (
+        ObligacionTrabajador.objects.exclude(estado__in=[ObligacionTrabajador.ESTADO_ANULADO, ObligacionTrabajador.ESTADO_PAGADO])
+        .values("pk", "fecha_pago_programada", "valor_acordado").annotate(pagado=pagado).order_by()
+    )
+    for fila in obligaciones:
+        flujo.sumar("nomina", fila["fecha_pago_programada"], fila["valor_acordado"] - (fila["pagado"] or CERO))
+
+
+def _contratos(flujo):
+    """Cuotas y nómina de periodos que aún no tienen factura u obligación."""
+    contratos = list(
+        Contrato.objects.filter(activo=True, precio_mensual__gt=0).select_related("tecnico_designado")
+    )
+    periodos = list(_periodos_horizonte(flujo.desde, flujo.hasta))
+    ids = [c.pk for c in contratos]
+    # Las anuladas también cuentan: un periodo anulado no se vuelve a facturar.
+    facturadas = set(
+        Factura.objects.filter(contrato_id__in=ids, periodo_anio__gte=periodos[0][0])
+        .values_list("contrato_id", "periodo_anio", "periodo_mes", "cuota_numero")
+    )
+    con_obligacion = set(
+        ObligacionTrabajador.objects.filter(contrato_id__in=ids, periodo_anio__gte=periodos[0][0])
+        .values_list("contrato_id", "periodo_anio", "periodo_mes")
+    )
+    vencimientos = vencimientos_facturas(ids, periodos) if ids else {}
+    for contrato in contratos:
+        for anio, mes in periodos:
+            if contrato.periodo_servicio(anio, mes)[1] <= contrato.fecha_inicio:
+                continue
+            # Una cuota ya vencida que nunca se facturó no es un cobro esperado.
+            for cuota in contrato.calendario_cobros(anio, mes):
+                if cuota["fecha_vencimiento"] >= flujo.desde and (contrato.pk, anio, mes, cuota["cuota_numero"]) not in facturadas:
+                    flujo.sumar("contratos", cuota["fecha_vencimiento"], cuota["valor"])
+            if (
+                contrato.tecnico_designado_id and contrato.valor_tecnico_mensual > 0
+                and (contrato.pk, anio, mes) not in con_obligacion
+            ):
+                fecha = fecha_pago_programada(contrato, anio, mes, vencimientos)
+                if fecha >= flujo.desde:
+                    flujo.sumar("nomina_futura", fecha, contrato.valor_tecnico_mensual)
+
+
+def _recurrentes(flujo):
+    for movimiento in MovimientoRecurrente.objects.filter(activo=True, proxima_fecha__lte=flujo.hasta):
+        fuente = "ingresos_recurrentes" if movimiento.tipo == "ingreso" else "egresos_recurrentes"
+        # Los periodos atrasados se generan al procesar recurrentes; aquí cuentan desde hoy.
+        fecha = movimiento.proxima_fecha
+        while fecha < flujo.desde:
+            fecha = siguiente_fecha(fecha, movimiento.frecuencia)
+        while fecha <= flujo.hasta:
+            flujo.sumar(fuente, fecha, movimiento.monto)
+            fecha = siguiente_fecha(fecha, movimiento.frecuencia)
+
+
+def _movimientos_pendientes(flujo):
+    estados = [Egreso.ESTADO_PENDIENTE, Egreso.ESTADO_PARCIAL, Egreso.ESTADO_VENCIDO]
+    for modelo, fuente in ((Ingreso, "ingresos_pendientes"), (Egreso, "egresos_pendientes")):
+        filas = modelo.objects.filter(estado__in=estados, total__gt=F("monto_pagado")).values_list(
+            "fecha_vencimiento", "fecha", "total", "monto_pagado",
+        )
+        for vence, fecha, total, pagado in filas:
+            flujo.sumar(fuente, vence or fecha, total - pagado)
+
+
+def _saldo_caja():
+    cobrado = Ingreso.objects.exclude(estado=Ingreso.ESTADO_ANULADO).aggregate(t=Sum("monto_pagado"))["t"] or CERO
+    pagado = Egreso.objects.exclude(estado=Egreso.ESTADO_ANULADO).aggregate(t=Sum("monto_pagado"))["t"] or CERO
+    return cobrado - pagado
+
+
+def calcular_proyeccion(hoy=None, meses=MESES_PROYECCION):
+    """Proyección diaria y mensual desde ``hoy`` hasta el cierre del mes ``meses``."""
+    hoy = hoy or timezone.localdate()
+    anio_fin, mes_fin = _mover_mes(hoy.year, hoy.month, meses - 1)
+    flujo = _Flujo(hoy, date(anio_fin, mes_fin, monthrange(anio_fin, mes_fin)[1]))
+    _cartera(flujo)
+    _nomina(flujo)
+    _contratos(flujo)
+    _recurrentes(flujo)
+    _movimientos_pendientes(flujo)
+
+    saldo_inicial = _saldo_caja()
+    saldo = saldo_inicial
+    dias = []
+    meses_resumen = {}
+    for indice in range(flujo.dias):
+        fecha = flujo.desde + timedelta(days=indice)
+        entradas, salidas = flujo.entradas[indice], flujo.salidas[indice]
+        saldo += entradas - salidas
+        dias.append({"fecha": fecha, "entradas": entradas, "salidas": salidas, "saldo": saldo})
+        mes = meses_resumen.setdefault((fecha.year, fecha.month), {
+            "anio": fecha.year, "mes": fecha.month, "entradas": CERO, "salidas": CERO, "saldo_minimo": saldo,
+        })
+        mes["entradas"] += entradas
+        mes["salidas"] += salidas
+        mes["neto"] = mes["entradas"] - mes["salidas"]
+        mes["saldo_final"] = saldo
+        mes["saldo_minimo"] = min(mes["saldo_minimo"], saldo)
+
+    return {
+        "generado_en": timezone.now(),
+        "desde": flujo.desde,
+        "hasta": flujo.hasta,
+        "saldo_inicial": saldo_inicial,
+        "saldo_final": saldo,
+        "saldo_minimo": min((d["saldo"] for d in dias), default=saldo_inicial),
+        "dias": dias,
+        "meses": list(meses_resumen.values()),
+        "fuentes": [
+            {"clave": clave, "sentido": sentido, "nombre": nombre, "total": flujo.por_fuente[clave]}
+            for clave, (sentido, nombre) in FUENTES.items()
+        ],
+        "vencido": flujo.vencido,
+    }
+
+
+def marca_proyeccion(hoy=None):
+    """Fecha del día más la huella de los datos que alimentan la proyección."""
+    hoy = hoy or timezone.localdate()
+    recurrentes = MovimientoRecurrente.objects.filter(activo=True).aggregate(
+        total=Sum("monto"), proxima=Max("proxima_fecha"),
+    )
+    return "|".join([
+        hoy.isoformat(),
+        marca_de_modelos(MODELOS_PROYECCION),
+        marca_contratos(),
+        f"recurrentes:{recurrentes['total'] or 0}:{recurrentes['proxima'] or ''}",
+    ])
+
+
+def proyeccion_flujo(hoy=None, forzar=False):
+    """``calcular_proyeccion`` en caché mientras no cambien el día ni los datos."""
+    hoy = hoy or timezone.localdate()
+    clave = "finanzas:proyeccion:" + hashlib.sha256(marca_proyeccion(hoy).encode("utf-8")).hexdigest()
+    if not forzar:
+        guardada = cache.get(clave)
+        if guardada is not None:
+            return guardada
+    proyeccion = calcular_proyeccion(hoy)
+    cache.set(clave, proyeccion, 60 * 60 * 24)
+    return proyeccion
@@ -0,0 +1,109 @@
+"""Generación por lotes de ingresos y egresos recurrentes.
+
+Cada ``MovimientoRecurrente`` vencido produce una fila por fecha atrasada
+(``proxima_fecha`` hasta hoy). Todas se calculan en memoria y se insertan con
+``bulk_create``; la restricción única ``(recurrente, fecha)`` evita duplicados
+aunque ``proxima_fecha`` se retroceda a mano o dos procesos coincidan.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Egreso, Ingreso, MovimientoRecurrente
+
+LOTE_INSERCION = 500
+
+
+def siguiente_fecha(fecha, frecuencia):
+    if frecuencia == "semanal":
+        return fecha + timedelta(days=7)
+    anio, mes = (fecha.year + 1, 1) if fecha.month == 12 else (fecha.year, fecha.month + 1)
+    return date(anio, mes, min(fecha.day, monthrange(anio, mes)[1]))
+
+
+def fechas_pendientes(movimiento, hoy):
+    """Fechas atrasadas de ``movimiento`` hasta ``hoy`` y la próxima fecha resultante."""
+    fechas = []
+    fecha = movimiento.proxima_fecha
+    while fecha <= hoy:
+        fechas.append(fecha)
+        fecha = siguiente_fecha(fecha, movimiento.frecuencia)
+    return fechas, fecha
+
+
+def _ya_generadas(modelo, movimientos):
+    """Pares ``(recurrente_id, fecha)`` que ya existen desde la fecha más antigua pendiente."""
+    if not movimientos:
+        return set()
+    return set(
+        modelo.objects.filter(recurrente__in=movimientos, fecha__gte=min(m.proxima_fecha for m in movimientos))
+        .values_list("recurrente_id", "fecha")
+    )
+
+
+def _normalizado(movimiento):
+    movimiento._normalizar_estado_pago()
+    return movimiento
+
+
+@transaction.atomic
+def generar_movimientos_recurrentes(hoy=None):
+    """Genera todos los movimientos recurrentes atrasados y adelanta ``proxima_fecha``.
+
+    Devuelve los conteos y montos generados por tipo.
+    """
+    hoy = hoy or timezone.localdate()
+    movimientos = list(
+        MovimientoRecurrente.objects.select_for_update()
+        .filter(activo=True, proxima_fecha__lte=hoy)
+        .order_by("proxima_fecha", "id")
+    )
+    resultado = {
+        "movimientos_procesados": 0,
+        "ingresos_generados": 0,
+        "egresos_generados": 0,
+        "total_generados": 0,
+        "monto_ingresos": Decimal("0.00"),
+        "monto_egresos": Decimal("0.00"),
+    }
+    if not movimientos:
+        return resultado
+
+    ingresos_previos = _ya_generadas(Ingreso, [m for m in movimientos if m.tipo == "ingreso"])
+    egresos_previos = _ya_generadas(Egreso, [m for m in movimientos if m.tipo == "egreso"])
+    ingresos = []
+    egresos = []
+    for movimiento in movimientos:
+        fechas, movimiento.proxima_fecha = fechas_pendientes(movimiento, hoy)
+        generados = 0
+        # bulk_create no pasa por save(): se fijan los valores que este calcularía
+        # para un movimiento pagado (estado, monto_pagado, fecha_cobro, total).
+        for fecha in fechas:
+            if movimiento.tipo == "ingreso" and (movimiento.pk, fecha) not in ingresos_previos:
+                ingresos.append(_normalizado(Ingreso(
+                    recurrente=movimiento, concepto=movimiento.concepto, total=movimiento.monto,
+                    estado=Ingreso.ESTADO_PAGADO, monto_pagado=movimiento.monto, fecha=fecha, fecha_cobro=fecha,
+                )))
+                resultado["monto_ingresos"] += movimiento.monto
+                generados += 1
+            elif movimiento.tipo == "egreso" and (movimiento.pk, fecha) not in egresos_previos:
+                egresos.append(_normalizado(Egreso(
+                    recurrente=movimiento, concepto=movimiento.concepto, categoria="Recurrente",
+                    cantidad=1, costo_unitario=movimiento.monto, total=movimiento.monto,
+                    estado=Egreso.ESTADO_PAGADO, monto_pagado=movimiento.monto, fecha=fecha,
+                )))
+                resultado["monto_egresos"] += movimiento.monto
+                generados += 1
+        resultado["movimientos_procesados"] += int(generados > 0)
+
+    Ingreso.objects.bulk_create(ingresos, batch_size=LOTE_INSERCION, ignore_conflicts=True)
+    Egreso.objects.bulk_create(egresos, batch_size=LOTE_INSERCION, ignore_conflicts=True)
+    MovimientoRecurrente.objects.bulk_update(movimientos, ["proxima_fecha"], batch_size=LOTE_INSERCION)
+
+    resultado["ingresos_generados"] = len(ingresos)
+    resultado["egresos_generados"] = len(egresos)
+    resultado["total_generados"] = len(ingresos) + len(egresos)
+    return resultado
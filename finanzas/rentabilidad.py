@@ -0,0 +1,226 @@
+"""Rentabilidad mensual por contrato (``RentabilidadContratoMensual``).
+
+Cada fila resume un ``(contrato, anio, mes)``:
+
+* ingreso facturado: facturas del periodo, sin anuladas;
+* ingreso cobrado: ``Ingreso`` del contrato cobrados en el mes (los pagos de
+  facturas crean o actualizan su ingreso, así que ya están incluidos);
+* costo técnico: obligaciones del trabajador del periodo, sin anuladas;
+* químicos: ``UsoInsumo`` de los mantenimientos del contrato en el mes.
+
+``recalcular_rentabilidad`` calcula un conjunto de periodos con cuatro
+consultas agrupadas. ``actualizar_rentabilidad`` solo recalcula los periodos
+tocados desde el inicio de la actualización anterior (``EjecucionRentabilidad``,
+comparado con los ``auto_now`` de facturas, pagos, ingresos y obligaciones)
+más el mes actual y el anterior, porque los consumos de insumos no guardan
+fecha de modificación. Lo que no deja rastro de ``auto_now`` (una factura,
+ingreso u obligación borrada, o movida a otro contrato o mes) lo recalculan
+las señales en el periodo de donde salió.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from mantenimientos.models import UsoInsumo
+
+from .models import EjecucionRentabilidad, Factura, Ingreso, ObligacionTrabajador, PagoFactura, RentabilidadContratoMensual
+
+CERO = Decimal("0.00")
+CAMPOS_RENTABILIDAD = ("ingreso_facturado", "ingreso_cobrado", "costo_tecnico", "costo_quimicos", "margen")
+# Margen para transacciones que empezaron antes de la actualización anterior y terminaron durante ella.
+HOLGURA_ACTUALIZACION = timedelta(minutes=5)
+# Campos que ubican cada movimiento en un ``(contrato, anio, mes)``.
+CAMPOS_PERIODO = {
+    Factura: ("contrato_id", "periodo_anio", "periodo_mes"),
+    Ingreso: ("contrato_id", "fecha"),
+    ObligacionTrabajador: ("contrato_id", "periodo_anio", "periodo_mes"),
+}
+
+
+def _mes_anterior(anio, mes, meses=1):
+    indice = anio * 12 + (mes - 1) - meses
+    return indice // 12, indice % 12 + 1
+
+
+def _filtro_periodos(periodos, anio, mes):
+    return reduce(or_, (Q(**{anio: a, mes: m}) for a, m in periodos))
+
+
+def _filtro_fechas(periodos, campo):
+    return reduce(or_, (
+        Q(**{f"{campo}__range": (date(a, m, 1), date(a, m, calendar.monthrange(a, m)[1]))})
+        for a, m in periodos
+    ))
+
+
+def calcular_rentabilidad(periodos=None, contrato_ids=None):
+    """Valores por ``(contrato_id, anio, mes)`` sin guardar.
+
+    Sin ``periodos`` se calcula toda la historia; ``contrato_ids`` limita los
+    contratos.
+    """
+    facturas = Factura.objects.exclude(estado=Factura.ESTADO_ANULADA)
+    ingresos = Ingreso.objects.exclude(estado=Ingreso.ESTADO_ANULADO).filter(contrato__isnull=False)
+    obligaciones = ObligacionTrabajador.objects.exclude(estado=ObligacionTrabajador.ESTADO_ANULADO)
+    consumos = UsoInsumo.objects.filter(mantenimiento__contrato__isnull=False)
+    if periodos:
+        facturas = facturas.filter(_filtro_periodos(periodos, "periodo_anio", "periodo_mes"))
+        ingresos = ingresos.filter(_filtro_fechas(periodos, "fecha"))
+        obligaciones = obligaciones.filter(_filtro_periodos(periodos, "periodo_anio", "periodo_mes"))
+        consumos = consumos.filter(_filtro_fechas(periodos, "mantenimiento__fecha"))
+    if contrato_ids is not None:
+        facturas = facturas.filter(contrato_id__in=contrato_ids)
+        ingresos = ingresos.filter(contrato_id__in=contrato_ids)
+        obligaciones = obligaciones.filter(contrato_id__in=contrato_ids)
+        consumos = consumos.filter(mantenimiento__contrato_id__in=contrato_ids)
+
+    valores = defaultdict(lambda: dict.fromkeys(CAMPOS_RENTABILIDAD, CERO))
+    fuentes = (
+        (facturas, ("contrato_id", "periodo_anio", "periodo_mes"), "total", "ingreso_facturado"),
+        (ingresos, ("contrato_id", "fecha__year", "fecha__month"), "monto_pagado", "ingreso_cobrado"),
+        (obligaciones, ("contrato_id", "periodo_anio", "periodo_mes"), "valor_acordado", "costo_tecnico"),
+        (consumos, ("mantenimiento__contrato_id", "mantenimiento__fecha__year", "mantenimiento__fecha__month"), "costo_total", "costo_quimicos"),
+    )
+    for consulta, clave, monto, campo in fuentes:
+        for *periodo, total in consulta.values(*clave).annotate(total=Sum(monto)).order_by().values_list(*clave, "total"):
+            valores[tuple(periodo)][campo] += total or CERO
+    for fila in valores.values():
+        fila["margen"] = fila["ingreso_facturado"] - fila["costo_tecnico"] - fila["costo_quimicos"]
+    return {clave: fila for clave, fila in valores.items() if any(fila.values())}
+
+
+def _guardar(valores):
+    filas = [
+        RentabilidadContratoMensual(contrato_id=contrato_id, anio=anio, mes=mes, **campos)
+        for (contrato_id, anio, mes), campos in valores.items()
+    ]
+    RentabilidadContratoMensual.objects.bulk_create(
+        filas, batch_size=500, update_conflicts=True, unique_fields=["contrato", "anio", "mes"],
+        update_fields=[*CAMPOS_RENTABILIDAD, "actualizado_en"],
+    )
+    return len(filas)
+
+
+def recalcular_rentabilidad(periodos, contrato_ids=None):
+    """Recalcula y guarda los ``periodos`` indicados; borra las filas que quedaron en cero.
+
+    Devuelve cuántas filas quedaron guardadas.
+    """
+    periodos = sorted(set(periodos))
+    if not periodos:
+        return 0
+    valores = calcular_rentabilidad(periodos, contrato_ids)
+    existentes = RentabilidadContratoMensual.objects.filter(_filtro_periodos(periodos, "anio", "mes"))
+    if contrato_ids is not None:
+        existentes = existentes.filter(contrato_id__in=contrato_ids)
+    with transaction.atomic():
+        sobrantes = [
+            pk for pk, *clave in existentes.values_list("pk", "contrato_id", "anio", "mes")
+            if tuple(clave) not in valores
+        ]
+        if sobrantes:
+            RentabilidadContratoMensual.objects.filter(pk__in=sobrantes).delete()
+        return _guardar(valores)
+
+
+def periodos_modificados(desde):
+    """``{(anio, mes): {contrato_id, ...}}`` con movimientos guardados después de ``desde``."""
+    tocados = defaultdict(set)
+    fuentes = (
+        Factura.objects.filter(actualizada_en__gt=desde).values_list("contrato_id", "periodo_anio", "periodo_mes"),
+        Ingreso.objects.filter(actualizado_en__gt=desde, contrato__isnull=False).values_list("contrato_id", "fecha__year", "fecha__month"),
+        PagoFactura.objects.filter(actualizado_en__gt=desde).values_list("factura__contrato_id", "fecha__year", "fecha__month"),
+        ObligacionTrabajador.objects.filter(actualizada_en__gt=desde).values_list("contrato_id", "periodo_anio", "periodo_mes"),
+    )
+    for consulta in fuentes:
+        for contrato_id, anio, mes in consulta.order_by().distinct():
+            tocados[(anio, mes)].add(contrato_id)
+    return tocados
+
+
+def periodo_rentabilidad(obj):
+    """``(contrato_id, anio, mes)`` en el que suma ``obj`` (factura, ingreso u obligación), o ``None``."""
+    if isinstance(obj, Ingreso):
+        return (obj.contrato_id, obj.fecha.year, obj.fecha.month) if obj.contrato_id and obj.fecha else None
+    return (obj.contrato_id, obj.periodo_anio, obj.periodo_mes) if obj.contrato_id else None
+
+
+def recalcular_periodos_contrato(claves):
+    """Recalcula los ``(contrato_id, anio, mes)`` indicados. Devuelve cuántas filas guardó."""
+    por_contrato = defaultdict(set)
+    for contrato_id, anio, mes in claves:
+        por_contrato[contrato_id].add((anio, mes))
+    return sum(recalcular_rentabilidad(periodos, [contrato_id]) for contrato_id, periodos in por_contrato.items())
+
+
+def actualizar_rentabilidad(hoy=None):
+    """Actualización incremental; sin filas previas hace la reconstrucción completa.
+
+    Devuelve ``{"periodos": n, "filas": n, "completa": bool}``.
+    """
+    hoy = hoy or timezone.localdate()
+    anterior = EjecucionRentabilidad.objects.filter(pk=1).values_list("iniciada_en", flat=True).first()
+    if anterior is None:
+        return {**reconstruir_rentabilidad(), "completa": True}
+
+    inicio = timezone.now()
+    tocados = periodos_modificados(anterior - HOLGURA_ACTUALIZACION)
+    recientes = {(hoy.year, hoy.month), _mes_anterior(hoy.year, hoy.month)}
+    filas = recalcular_rentabilidad(recientes)
+    por_contratos = defaultdict(set)
+    for periodo, contratos in tocados.items():
+        if periodo not in recientes:
+            por_contratos[frozenset(contratos)].add(periodo)
+    for contratos, periodos in por_contratos.items():
+        filas += recalcular_rentabilidad(periodos, contratos)
+    _marcar_ejecucion(inicio)
+    return {"periodos": len(recientes | set(tocados)), "filas": filas, "completa": False}
+
+
+def _marcar_ejecucion(inicio):
+    EjecucionRentabilidad.objects.update_or_create(pk=1, defaults={"iniciada_en": inicio})
+
+
+def reconstruir_rentabilidad():
+    """Borra la tabla y la vuelve a calcular con toda la historia."""
+    inicio = timezone.now()
+    valores = calcular_rentabilidad()
+    with transaction.atomic():
+        RentabilidadContratoMensual.objects.all().delete()
+        filas = _guardar(valores)
+        _marcar_ejecucion(inicio)
+    return {"periodos": len({clave[1:] for clave in valores}), "filas": filas}
+
+
+def ranking_rentabilidad(anio, mes, cantidad=5, contratos=None):
+    """Contratos activos con mayor y menor margen del periodo: ``(mejores, peores)``."""
+    filas = RentabilidadContratoMensual.objects.filter(anio=anio, mes=mes, contrato__activo=True)
+    if contratos is not None:
+        filas = filas.filter(contrato__in=contratos)
+    filas = filas.select_related("contrato__cliente")
+    return list(filas.order_by("-margen", "pk")[:cantidad]), list(filas.order_by("margen", "pk")[:cantidad])
+
+
+def serie_rentabilidad(contrato, hasta=None, meses=12):
+    """Los últimos ``meses`` del contrato en orden cronológico (una consulta), con ceros si falta un mes."""
+    hasta = hasta or timezone.localdate()
+    periodos = [_mes_anterior(hasta.year, hasta.month, n) for n in range(meses - 1, -1, -1)]
+    (anio_ini, mes_ini), (anio_fin, mes_fin) = periodos[0], periodos[-1]
+    guardadas = {
+        (fila.anio, fila.mes): fila
+        for fila in RentabilidadContratoMensual.objects.filter(contrato=contrato).filter(
+            Q(anio__gt=anio_ini) | Q(anio=anio_ini, mes__gte=mes_ini),
+            Q(anio__lt=anio_fin) | Q(anio=anio_fin, mes__lte=mes_fin),
+        )
+    }
+    return [
+        guardadas.get((anio, mes)) or RentabilidadContratoMensual(contrato=contrato, anio=anio, mes=mes)
+        for anio, mes in periodos
+    ]
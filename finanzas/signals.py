@@ -1,14 +1,49 @@
+from django.conf import settings
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 
 from contratos.models import Contrato
-from .sincronizacion import sincronizar_contrato_activo, sincronizar_contrato_desactivado
+from .models import Factura, Ingreso, ObligacionTrabajador
+from .rentabilidad import CAMPOS_PERIODO, periodo_rentabilidad, recalcular_periodos_contrato
+from .sincronizacion import encolar_sincronizacion, procesar_sincronizaciones
 
 
 @receiver(post_save, sender=Contrato, dispatch_uid="finanzas_sincronizar_contrato_desactivado")
-def contrato_guardado_sincronizar_finanzas(sender, instance, **kwargs):
-    if not instance.activo:
-        transaction.on_commit(lambda: sincronizar_contrato_desactivado(instance))
-    else:
-        transaction.on_commit(lambda: sincronizar_contrato_activo(instance))
+def contrato_guardado_sincronizar_finanzas(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    encolar_sincronizacion(instance.pk)
+    if getattr(settings, "SINCRONIZACION_CONTRATOS_EN_LINEA", False):
+        transaction.on_commit(lambda: procesar_sincronizaciones(contrato_ids=[instance.pk]))
+
+
+# La actualización incremental de rentabilidad encuentra los periodos por los
+# ``auto_now`` de cada fila; un borrado o un cambio de contrato o de mes no deja
+# rastro en el periodo de donde salió, así que ese periodo se recalcula aquí.
+# El periodo con el que se cargó cada fila queda en la instancia (sin consultas).
+@receiver(post_init, sender=Factura, dispatch_uid="finanzas_rentabilidad_factura_cargada")
+@receiver(post_init, sender=Ingreso, dispatch_uid="finanzas_rentabilidad_ingreso_cargado")
+@receiver(post_init, sender=ObligacionTrabajador, dispatch_uid="finanzas_rentabilidad_obligacion_cargada")
+def recordar_periodo_rentabilidad(sender, instance, **kwargs):
+    if instance.pk is not None and all(campo in instance.__dict__ for campo in CAMPOS_PERIODO[sender]):
+        instance._periodo_rentabilidad_anterior = periodo_rentabilidad(instance)
+
+
+@receiver(post_save, sender=Factura, dispatch_uid="finanzas_rentabilidad_factura_movida")
+@receiver(post_save, sender=Ingreso, dispatch_uid="finanzas_rentabilidad_ingreso_movido")
+@receiver(post_save, sender=ObligacionTrabajador, dispatch_uid="finanzas_rentabilidad_obligacion_movida")
+def movimiento_rentabilidad_guardado(sender, instance, raw=False, **kwargs):
+    anterior = getattr(instance, "_periodo_rentabilidad_anterior", None)
+    instance._periodo_rentabilidad_anterior = actual = periodo_rentabilidad(instance)
+    if not raw and anterior and anterior != actual:
+        transaction.on_commit(lambda: recalcular_periodos_contrato([anterior]))
+
+
+@receiver(post_delete, sender=Factura, dispatch_uid="finanzas_rentabilidad_factura_eliminada")
+@receiver(post_delete, sender=Ingreso, dispatch_uid="finanzas_rentabilidad_ingreso_eliminado")
+@receiver(post_delete, sender=ObligacionTrabajador, dispatch_uid="finanzas_rentabilidad_obligacion_eliminada")
+def movimiento_rentabilidad_eliminado(sender, instance, **kwargs):
+    periodo = periodo_rentabilidad(instance)
+    if periodo:
+        transaction.on_commit(lambda: recalcular_periodos_contrato([periodo]))
@@ -1,7 +1,20 @@
-"""Reglas centrales de sincronización entre contratos, cartera y nómina."""
-from django.db import transaction
+"""Reglas centrales de sincronización entre contratos, cartera y nómina.
 
-from .models import Factura, ObligacionTrabajador
+Guardar un contrato no sincroniza en la misma petición: la señal solo deja una
+fila en ``ContratoSyncPendiente`` (``encolar_sincronizacion``) y el worker
+``python manage.py procesar_sincronizaciones --continuo`` las procesa por
+lotes. Varios guardados del mismo contrato antes de que el worker pase se
+resuelven con una sola sincronización.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from contratos.models import Contrato
+from .models import ContratoSyncPendiente, Factura, ObligacionTrabajador
 from .cuentas_por_cobrar import fecha_vencimiento_contrato
 
 
@@ -113,3 +126,101 @@ def sincronizar_contrato_activo(contrato):
         if cambios:
             cambios.append("actualizada_en"); obligacion.save(update_fields=cambios); resultado["obligaciones_actualizadas"] += 1
     return resultado
+
+
+logger = logging.getLogger(__name__)
+
+LOTE_SINCRONIZACION = 50
+MAX_INTENTOS = 3
+MINUTOS_PROCESO_ABANDONADO = 15
+
+
+def encolar_sincronizacion(contrato_id):
+    """Marca el contrato como pendiente de sincronizar, acumulando guardados repetidos."""
+    ahora = timezone.now()
+    actualizadas = ContratoSyncPendiente.objects.filter(contrato_id=contrato_id).update(
+        estado=ContratoSyncPendiente.ESTADO_PENDIENTE,
+        solicitado_en=ahora,
+        solicitudes=F("solicitudes") + 1,
+        intentos=0,
+    )
+    if actualizadas:
+        return
+    try:
+        with transaction.atomic():
+            ContratoSyncPendiente.objects.create(contrato_id=contrato_id, solicitado_en=ahora)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT.
+        encolar_sincronizacion(contrato_id)
+
+
+def marca_contratos():
+    """Huella de los contratos para cachés: cada guardado actualiza ``solicitado_en``.
+
+    ``Contrato`` no guarda fecha de edición; la cola de sincronización sí.
+    """
+    ultimo = ContratoSyncPendiente.objects.aggregate(ultimo=Max("solicitado_en"))["ultimo"]
+    return f"contratos:{ultimo.timestamp() if ultimo else ''}"
+
+
+def _tomar_lote(limite, contrato_ids=None):
+    """Pasa a ``procesando`` hasta ``limite`` filas disponibles y las devuelve.
+
+    También recupera las que quedaron en proceso por un worker caído.
+    """
+    ahora = timezone.now()
+    abandonado = ahora - timedelta(minutes=MINUTOS_PROCESO_ABANDONADO)
+    disponibles = ContratoSyncPendiente.objects.filter(
+        Q(estado=ContratoSyncPendiente.ESTADO_PENDIENTE)
+        | Q(estado=ContratoSyncPendiente.ESTADO_PROCESANDO, iniciado_en__lt=abandonado, intentos__lt=MAX_INTENTOS)
+    )
+    if contrato_ids is not None:
+        disponibles = disponibles.filter(contrato_id__in=contrato_ids)
+    with transaction.atomic():
+        # skip_locked: dos workers nunca toman la misma fila.
+        ids = list(
+            disponibles.select_for_update(skip_locked=True)
+            .order_by("solicitado_en", "id").values_list("pk", flat=True)[:limite]
+        )
+        ContratoSyncPendiente.objects.filter(pk__in=ids).update(
+            estado=ContratoSyncPendiente.ESTADO_PROCESANDO, iniciado_en=ahora, intentos=F("intentos") + 1,
+        )
+    return list(ContratoSyncPendiente.objects.filter(pk__in=ids).order_by("solicitado_en", "id"))
+
+
+def _cerrar(fila, **valores):
+    # Si el contrato se volvió a guardar mientras se procesaba, la fila ya está
+    # pendiente otra vez con otro solicitado_en y no se toca.
+    return ContratoSyncPendiente.objects.filter(
+        pk=fila.pk, estado=ContratoSyncPendiente.ESTADO_PROCESANDO, solicitado_en=fila.solicitado_en,
+    ).update(**valores)
+
+
+def procesar_sincronizaciones(limite=None, contrato_ids=None):
+    """Sincroniza contratos pendientes por lotes. Devuelve cuántos procesó."""
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        tamano = LOTE_SINCRONIZACION if limite is None else min(LOTE_SINCRONIZACION, limite - procesadas)
+        lote = _tomar_lote(tamano, contrato_ids)
+        if not lote:
+            break
+        contratos = Contrato.objects.select_related("cliente", "tecnico_designado").in_bulk([f.contrato_id for f in lote])
+        for fila in lote:
+            contrato = contratos.get(fila.contrato_id)
+            try:
+                if contrato is None:
+                    resultado = {}
+                elif contrato.activo:
+                    resultado = sincronizar_contrato_activo(contrato)
+                else:
+                    resultado = sincronizar_contrato_desactivado(contrato)
+            except Exception as exc:
+                logger.exception("No se pudo sincronizar el contrato %s", fila.contrato_id)
+                _cerrar(fila, estado=ContratoSyncPendiente.ESTADO_ERROR, error=str(exc) or exc.__class__.__name__)
+            else:
+                _cerrar(
+                    fila, estado=ContratoSyncPendiente.ESTADO_LISTO, sincronizado_en=timezone.now(),
+                    solicitudes=0, error="", resultado=resultado,
+                )
+            procesadas += 1
+    return procesadas
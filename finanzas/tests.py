@@ -1,3 +1,511 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from contratos.models import Contrato
+from inventario.models import Insumo
+from mantenimientos.models import Mantenimiento, UsoInsumo
+from trabajadores.models import Trabajador
+
+from dashboard.models import ReporteJob
+from dashboard.reportes import procesar_reportes_pendientes
+
+from .cuentas_por_cobrar import anotar_saldos, marcar_facturas_vencidas, totales_facturas
+from .models import AnticipoTrabajador, ContratoSyncPendiente, Egreso, Factura, Ingreso, LotePagoTrabajador, MovimientoRecurrente, ObligacionTrabajador, PagoFactura, PagoTrabajador, RentabilidadContratoMensual, SnapshotCartera
+from .historico_cartera import guardar_snapshots_cartera, reconstruir_cartera
+from .estados_cuenta import datos_estados_cuenta, generar_estados_cuenta
+from .nomina import generar_nomina, planificar_nomina
+from .proyeccion import calcular_proyeccion, proyeccion_flujo
+from .recurrentes import generar_movimientos_recurrentes
+from .rentabilidad import actualizar_rentabilidad, ranking_rentabilidad, reconstruir_rentabilidad, serie_rentabilidad
+from .sincronizacion import procesar_sincronizaciones, sincronizar_contrato_desactivado
+
+
+def _contrato(nombre="Cliente"):
+    cliente = Cliente.objects.create(nombre=nombre, telefono="0999", direccion="Centro", ciudad="Quito")
+    return Contrato.objects.create(cliente=cliente, tipo="semanal", precio_mensual=Decimal("100"), fecha_inicio=date(2026, 1, 1))
+
+
+def _factura(contrato, mes, total="100.00", vence=None, **extra):
+    return Factura.objects.create(
+        cliente=contrato.cliente, contrato=contrato, periodo_anio=2026, periodo_mes=mes,
+        fecha_vencimiento=vence or timezone.localdate() + timedelta(days=10), subtotal=Decimal(total), total=Decimal(total), **extra,
+    )
+
+
+class SaldosFacturasTests(TestCase):
+    def setUp(self):
+        self.contrato = _contrato()
+        Factura.objects.all().delete()
+        self.parcial = _factura(self.contrato, 1)
+        PagoFactura.objects.create(factura=self.parcial, monto=Decimal("40.00"))
+        self.vencida = _factura(self.contrato, 2, vence=timezone.localdate() - timedelta(days=3))
+        ingreso = Ingreso.objects.create(concepto="Pago anterior", total=Decimal("100.00"))
+        self.antigua = _factura(self.contrato, 3, estado=Factura.ESTADO_PAGADA, ingreso_generado=ingreso)
+        self.anulada = _factura(self.contrato, 4, estado=Factura.ESTADO_ANULADA)
+
+    def test_anotaciones_coinciden_con_las_propiedades(self):
+        for factura in anotar_saldos(Factura.objects.all()):
+            self.assertEqual(factura.cobrado, factura.monto_pagado, factura.numero)
+            self.assertEqual(factura.saldo_pendiente, factura.saldo, factura.numero)
+            self.assertEqual(factura.estado_actual, factura.estado_visual, factura.numero)
+
+    def test_totales_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            totales = totales_facturas(Factura.objects.all())
+        self.assertEqual(totales, {
+            "facturado": Decimal("300.00"), "cobrado": Decimal("140.00"),
+            "pendiente": Decimal("160.00"), "vencido": Decimal("100.00"),
+        })
+
+    def test_lista_pagina_sin_cargar_todas_las_facturas(self):
+        admin = User.objects.create_user("admin", is_staff=True)
+        self.client.force_login(admin)
+        for mes in range(5, 12):
+            _factura(self.contrato, mes)
+        response = self.client.get(reverse("finanzas_facturas"))
+        self.assertEqual(response.context["total_registros"], 11)
+        self.assertEqual(response.context["total_facturado"], Decimal("1000.00"))
+        self.assertEqual(response.context["total_vencido"], Decimal("100.00"))
+
+    def test_exportar_cartera_en_csv(self):
+        admin = User.objects.create_user("admin", is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse("finanzas_cartera"), {"estado": "vencida", "exportar": "csv"})
+        self.assertTrue(response.streaming)
+        lineas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(lineas[0].split(",")[:2], ["Factura", "Cliente"])
+        self.assertEqual(len(lineas), 2)
+        self.assertIn(self.vencida.numero, lineas[1])
+        self.assertTrue(lineas[1].endswith("100.00,Vencida"))
+
+
+class FacturasVencidasTests(TestCase):
+    def test_marca_solo_pendientes_sin_pagos_en_un_update(self):
+        contrato = _contrato()
+        Factura.objects.all().delete()
+        ayer = timezone.localdate() - timedelta(days=1)
+        vencida = _factura(contrato, 1, vence=ayer)
+        con_abono = _factura(contrato, 2, vence=ayer)
+        PagoFactura.objects.create(factura=con_abono, monto=Decimal("10.00"))
+        al_dia = _factura(contrato, 3)
+        anulada = _factura(contrato, 4, vence=ayer, estado=Factura.ESTADO_ANULADA)
+        # Como quedaban antes de la corrida diaria.
+        Factura.objects.exclude(pk=anulada.pk).update(estado=Factura.ESTADO_PENDIENTE)
+
+        with self.assertNumQueries(4):  # savepoint, SELECT ... FOR UPDATE, UPDATE, release
+            ids = marcar_facturas_vencidas()
+
+        self.assertEqual(ids, [vencida.pk])
+        estados = dict(Factura.objects.values_list("pk", "estado"))
+        self.assertEqual(estados[vencida.pk], Factura.ESTADO_VENCIDA)
+        self.assertEqual(estados[con_abono.pk], Factura.ESTADO_PENDIENTE)
+        self.assertEqual(estados[al_dia.pk], Factura.ESTADO_PENDIENTE)
+        self.assertEqual(estados[anulada.pk], Factura.ESTADO_ANULADA)
+        self.assertEqual(marcar_facturas_vencidas(), [])
+
+
+class NominaTests(TestCase):
+    def setUp(self):
+        self.ana = Trabajador.objects.create(user=User.objects.create(username="ana"), telefono="0999")
+        self.luis = Trabajador.objects.create(user=User.objects.create(username="luis"), telefono="0998")
+        self.c1 = self._contrato_tecnico("Uno", self.ana)
+        self.c2 = self._contrato_tecnico("Dos", self.ana)
+        self.c3 = self._contrato_tecnico("Tres", self.luis)
+        _contrato("Sin técnico")
+        # El periodo de febrero del contrato Tres se cobra en marzo.
+        _factura(self.c3, 2, vence=date(2026, 3, 5))
+
+    def _contrato_tecnico(self, nombre, trabajador, valor="100.00"):
+        contrato = _contrato(nombre)
+        contrato.tecnico_designado = trabajador
+        contrato.valor_tecnico_mensual = Decimal(valor)
+        contrato.save()
+        return contrato
+
+    def test_vista_previa_no_escribe(self):
+        AnticipoTrabajador.objects.create(trabajador=self.ana, monto=Decimal("150.00"), periodo_anio=2026, periodo_mes=3)
+        plan = planificar_nomina(2026, 3)
+        self.assertEqual(len(plan["nuevas"]), 4)
+        self.assertEqual(plan["sin_configurar"], 1)
+        self.assertEqual(plan["valor_nuevo"], Decimal("400.00"))
+        self.assertEqual(plan["valor_descontado"], Decimal("150.00"))
+        self.assertFalse(ObligacionTrabajador.objects.exists())
+
+    def test_genera_y_descuenta_anticipos_una_sola_vez(self):
+        anticipo = AnticipoTrabajador.objects.create(trabajador=self.ana, monto=Decimal("150.00"), periodo_anio=2026, periodo_mes=3)
+        resultado = generar_nomina(2026, 3)
+        self.assertEqual((resultado["creadas"], resultado["anticipos_aplicados"]), (4, 1))
+        self.assertEqual(
+            set(ObligacionTrabajador.objects.filter(contrato=self.c3).values_list("periodo_mes", flat=True)), {2, 3},
+        )
+
+        anticipo.refresh_from_db()
+        self.assertTrue(anticipo.descontado)
+        self.assertEqual(anticipo.monto_descontado, Decimal("150.00"))
+        self.assertEqual(LotePagoTrabajador.objects.get().monto, Decimal("150.00"))
+        estados = sorted(ObligacionTrabajador.objects.filter(trabajador=self.ana).values_list("estado", flat=True))
+        self.assertEqual(estados, [ObligacionTrabajador.ESTADO_PAGADO, ObligacionTrabajador.ESTADO_PARCIAL])
+        for obligacion in ObligacionTrabajador.objects.filter(trabajador=self.ana):
+            self.assertEqual(obligacion.saldo, obligacion.valor_acordado - obligacion.monto_pagado)
+
+        repetido = generar_nomina(2026, 3)
+        self.assertEqual((repetido["creadas"], repetido["existentes"], repetido["anticipos_aplicados"]), (0, 4, 0))
+        self.assertEqual(PagoTrabajador.objects.count(), 2)
+
+    def test_consultas_no_crecen_con_los_contratos(self):
+        with CaptureQueriesContext(connection) as pocos:
+            generar_nomina(2026, 3)
+        ObligacionTrabajador.objects.all().delete()
+        for n in range(10):
+            self._contrato_tecnico(f"Extra {n}", self.luis)
+        with CaptureQueriesContext(connection) as muchos:
+            generar_nomina(2026, 3)
+        self.assertEqual(ObligacionTrabajador.objects.count(), 14)
+        self.assertEqual(len(muchos), len(pocos))
+
+
+class SincronizacionContratosTests(TestCase):
+    def test_guardados_repetidos_se_sincronizan_una_vez(self):
+        contrato = _contrato()
+        factura = _factura(contrato, 5)
+        ContratoSyncPendiente.objects.update(estado=ContratoSyncPendiente.ESTADO_LISTO, solicitudes=0)
+
+        contrato.activo = False
+        for _ in range(3):
+            contrato.save()
+        fila = ContratoSyncPendiente.objects.get(contrato=contrato)
+        self.assertEqual((fila.estado, fila.solicitudes), (ContratoSyncPendiente.ESTADO_PENDIENTE, 3))
+        self.assertTrue(Factura.objects.filter(pk=factura.pk).exists())
+
+        with mock.patch("finanzas.sincronizacion.sincronizar_contrato_desactivado", wraps=sincronizar_contrato_desactivado) as sincronizar:
+            self.assertEqual(procesar_sincronizaciones(), 1)
+        sincronizar.assert_called_once()
+        self.assertFalse(Factura.objects.filter(pk=factura.pk).exists())
+        fila.refresh_from_db()
+        self.assertEqual(fila.estado, ContratoSyncPendiente.ESTADO_LISTO)
+        self.assertEqual(fila.resultado["facturas_eliminadas"], 1)
+        self.assertEqual(procesar_sincronizaciones(), 0)
+
+    def test_error_queda_registrado(self):
+        contrato = _contrato()
+        with mock.patch("finanzas.sincronizacion.sincronizar_contrato_activo", side_effect=ValueError("Calendario inválido")):
+            with self.assertLogs("finanzas.sincronizacion", "ERROR"):
+                procesar_sincronizaciones()
+        fila = ContratoSyncPendiente.objects.get(contrato=contrato)
+        self.assertEqual((fila.estado, fila.error), (ContratoSyncPendiente.ESTADO_ERROR, "Calendario inválido"))
+
+
+class MovimientosRecurrentesTests(TestCase):
+    def setUp(self):
+        self.arriendo = MovimientoRecurrente.objects.create(
+            tipo="egreso", concepto="Arriendo bodega", monto=Decimal("300.00"), frecuencia="mensual", proxima_fecha=date(2026, 1, 31),
+        )
+        self.soporte = MovimientoRecurrente.objects.create(
+            tipo="ingreso", concepto="Soporte", monto=Decimal("20.00"), frecuencia="semanal", proxima_fecha=date(2026, 3, 1),
+        )
+
+    def test_pone_al_dia_en_lote_y_es_idempotente(self):
+        with self.assertNumQueries(8):
+            resultado = generar_movimientos_recurrentes(hoy=date(2026, 3, 31))
+
+        self.assertEqual((resultado["egresos_generados"], resultado["ingresos_generados"]), (3, 5))
+        self.assertEqual(resultado["monto_egresos"], Decimal("900.00"))
+        self.assertEqual(
+            list(Egreso.objects.order_by("fecha").values_list("fecha", flat=True)),
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 28)],
+        )
+        egreso = Egreso.objects.first()
+        self.assertEqual((egreso.total, egreso.estado, egreso.monto_pagado), (Decimal("300.00"), Egreso.ESTADO_PAGADO, Decimal("300.00")))
+        ingreso = Ingreso.objects.order_by("fecha").first()
+        self.assertEqual(
+            (ingreso.estado, ingreso.monto_pagado, ingreso.saldo, ingreso.fecha_cobro),
+            (Ingreso.ESTADO_PAGADO, Decimal("20.00"), Decimal("0.00"), date(2026, 3, 1)),
+        )
+        self.arriendo.refresh_from_db()
+        self.assertEqual(self.arriendo.proxima_fecha, date(2026, 4, 28))
+
+        self.assertEqual(generar_movimientos_recurrentes(hoy=date(2026, 3, 31))["total_generados"], 0)
+        # Aunque se retroceda la próxima fecha, no se duplican periodos ya generados.
+        MovimientoRecurrente.objects.filter(pk=self.soporte.pk).update(proxima_fecha=date(2026, 3, 1))
+        self.assertEqual(generar_movimientos_recurrentes(hoy=date(2026, 4, 5))["ingresos_generados"], 1)
+        self.assertEqual(Ingreso.objects.filter(recurrente=self.soporte).count(), 6)
+
+
+class ProyeccionFlujoTests(TestCase):
+    hoy = date(2026, 3, 10)
+
+    def setUp(self):
+        self.contrato = _contrato()
+        _factura(self.contrato, 3, vence=date(2026, 3, 20))
+        Ingreso.objects.create(concepto="Caja inicial", total=Decimal("1000.00"), monto_pagado=Decimal("1000.00"), fecha=date(2026, 3, 1))
+        MovimientoRecurrente.objects.create(
+            tipo="egreso", concepto="Arriendo bodega", monto=Decimal("300.00"), frecuencia="mensual", proxima_fecha=date(2026, 3, 31),
+        )
+
+    def test_combina_cartera_contratos_y_recurrentes(self):
+        proyeccion = calcular_proyeccion(self.hoy)
+        fuentes = {f["clave"]: f["total"] for f in proyeccion["fuentes"]}
+        self.assertEqual(proyeccion["hasta"], date(2027, 2, 28))
+        self.assertEqual(proyeccion["saldo_inicial"], Decimal("1000.00"))
+        self.assertEqual(fuentes["cartera"], Decimal("100.00"))
+        # Marzo ya está facturado; abril a febrero salen del calendario del contrato.
+        self.assertEqual(fuentes["contratos"], Decimal("1100.00"))
+        self.assertEqual(fuentes["egresos_recurrentes"], Decimal("3600.00"))
+        self.assertEqual(proyeccion["saldo_final"], Decimal("-1400.00"))
+        self.assertEqual(len(proyeccion["dias"]), (date(2027, 2, 28) - self.hoy).days + 1)
+        marzo = proyeccion["meses"][0]
+        self.assertEqual((marzo["entradas"], marzo["salidas"], marzo["saldo_final"]), (Decimal("100.00"), Decimal("300.00"), Decimal("800.00")))
+
+    def test_consultas_no_crecen_con_los_contratos(self):
+        with CaptureQueriesContext(connection) as pocos:
+            calcular_proyeccion(self.hoy)
+        for n in range(10):
+            _contrato(f"Extra {n}")
+        with CaptureQueriesContext(connection) as muchos:
+            proyeccion = calcular_proyeccion(self.hoy)
+        self.assertEqual(len(muchos), len(pocos))
+        self.assertEqual({f["clave"]: f["total"] for f in proyeccion["fuentes"]}["contratos"], Decimal("12100.00"))
+
+    def test_cache_se_invalida_con_nuevos_datos(self):
+        primera = proyeccion_flujo(self.hoy, forzar=True)
+        with mock.patch("finanzas.proyeccion.calcular_proyeccion") as calcular:
+            self.assertEqual(proyeccion_flujo(self.hoy)["generado_en"], primera["generado_en"])
+        calcular.assert_not_called()
+
+        Egreso.objects.create(
+            concepto="Bomba", categoria="Equipos", cantidad=1, costo_unitario=Decimal("50.00"), total=Decimal("50.00"),
+            estado=Egreso.ESTADO_PENDIENTE, fecha=self.hoy, fecha_vencimiento=date(2026, 4, 15),
+        )
+        segunda = proyeccion_flujo(self.hoy)
+        self.assertEqual(segunda["saldo_final"], primera["saldo_final"] - Decimal("50.00"))
+
+    def test_vista_muestra_curva(self):
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        response = self.client.get(reverse("finanzas_proyeccion"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "graficoProyeccion")
+        self.assertEqual(len(response.context["meses_proyeccion"]), 12)
+
+
+class EstadosCuentaTests(TestCase):
+    def setUp(self):
+        self.contratos = [_contrato(nombre) for nombre in ("Ana", "Beto", "Ana")]
+        for contrato in self.contratos:
+            _factura(contrato, 4, total="80.00")
+            pagada = _factura(contrato, 5, total="120.00")
+            PagoFactura.objects.create(factura=pagada, monto=Decimal("50.00"), fecha=timezone.localdate(), metodo_pago="efectivo")
+
+    def test_datos_en_dos_consultas_coinciden_con_las_facturas(self):
+        ids = [c.cliente_id for c in self.contratos]
+        with self.assertNumQueries(2):
+            estados = datos_estados_cuenta(ids)
+        self.assertEqual([e["cliente_id"] for e in estados], ids)
+        factura = Factura.objects.get(cliente_id=ids[0], periodo_mes=5)
+        self.assertEqual(estados[0]["filas"][0][3:6], (f"${factura.total:.2f}", f"${factura.monto_pagado:.2f}", f"${factura.saldo:.2f}"))
+        self.assertEqual(dict(estados[0]["resumen"])["Saldo pendiente"], "$150.00")
+
+    def test_zip_con_un_pdf_por_cliente_en_paralelo(self):
+        destino = BytesIO()
+        resultado = generar_estados_cuenta(destino, procesos=2)
+        self.assertEqual((resultado["estados"], resultado["procesos"]), (3, 2))
+        with zipfile.ZipFile(destino) as archivo_zip:
+            nombres = archivo_zip.namelist()
+            self.assertEqual(len(nombres), 3)
+            self.assertEqual(len({n for n in nombres if n.endswith("estado-cuenta-ana.pdf")}), 2)
+            self.assertTrue(all(archivo_zip.read(n).startswith(b"%PDF") for n in nombres))
+
+    def test_accion_admin_encola_el_lote(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media, REPORTES_EN_LINEA=False):
+            self._generar_desde_admin()
+
+    def _generar_desde_admin(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "clave"))
+        ids = [c.cliente_id for c in self.contratos[:2]]
+        response = self.client.post(
+            reverse("admin:clientes_cliente_changelist"), {"action": "generar_estados_cuenta", "_selected_action": ids},
+        )
+        job = ReporteJob.objects.get(tipo="estados_cuenta_lote")
+        self.assertRedirects(response, reverse("reporte_estado", args=[job.pk]), fetch_redirect_response=False)
+        self.assertEqual(job.parametros, {"clientes": sorted(ids)})
+
+        procesar_reportes_pendientes()
+        job.refresh_from_db()
+        self.assertEqual(job.estado, ReporteJob.ESTADO_LISTO)
+        with job.archivo.open("rb") as contenido, zipfile.ZipFile(contenido) as archivo_zip:
+            self.assertEqual(len(archivo_zip.namelist()), 2)
+
+
+class SnapshotCarteraTests(TestCase):
+    def setUp(self):
+        self.contrato = _contrato()
+
+    def test_reconstruye_antiguedad_dia_por_dia(self):
+        enero = _factura(self.contrato, 1, total="100.00", vence=date(2026, 1, 10), fecha_emision=date(2026, 1, 1))
+        _factura(self.contrato, 2, total="50.00", vence=date(2026, 2, 15), fecha_emision=date(2026, 1, 15))
+        PagoFactura.objects.create(factura=enero, monto=Decimal("40.00"), fecha=date(2026, 1, 20), metodo_pago="efectivo")
+
+        with self.assertNumQueries(3):
+            dias = {s.fecha.day: s for s in reconstruir_cartera(date(2026, 1, 1), date(2026, 1, 31))}
+        self.assertEqual(len(dias), 31)
+        self.assertEqual((dias[5].por_vencer, dias[5].facturas_abiertas), (Decimal("100.00"), 1))
+        self.assertEqual((dias[15].dias_1_7, dias[15].por_vencer, dias[15].vencido), (Decimal("100.00"), Decimal("50.00"), Decimal("100.00")))
+        self.assertEqual((dias[20].dias_8_15, dias[20].cobrado_dia, dias[20].por_cobrar), (Decimal("60.00"), Decimal("40.00"), Decimal("110.00")))
+        self.assertEqual(dias[31].dias_16_30, Decimal("60.00"))
+        self.assertEqual(dias[31].por_ciudad, {"Quito": {"por_cobrar": "110.00", "vencido": "60.00"}})
+        self.assertEqual(dias[31].por_segmento, {"semanal": {"por_cobrar": "110.00", "vencido": "60.00"}})
+
+    def test_dia_actual_coincide_con_la_cartera_en_vivo(self):
+        hoy = timezone.localdate()
+        vieja = _factura(self.contrato, 1, total="90.00", vence=hoy - timedelta(days=40), fecha_emision=hoy - timedelta(days=50))
+        _factura(self.contrato, 2, total="70.00", vence=hoy + timedelta(days=5), fecha_emision=hoy - timedelta(days=3))
+        PagoFactura.objects.create(factura=vieja, monto=Decimal("30.00"), fecha=hoy - timedelta(days=10), metodo_pago="efectivo")
+
+        self.assertEqual(guardar_snapshots_cartera(hoy - timedelta(days=59)), 60)
+        self.assertEqual(guardar_snapshots_cartera(), 1)
+        self.assertEqual(SnapshotCartera.objects.count(), 60)
+        actual = SnapshotCartera.objects.get(fecha=hoy)
+        en_vivo = totales_facturas(Factura.objects.all(), hoy)
+        self.assertEqual((actual.por_cobrar, actual.vencido), (en_vivo["pendiente"], en_vivo["vencido"]))
+        self.assertEqual(actual.mas_30, Decimal("60.00"))
+        self.assertEqual(SnapshotCartera.objects.get(fecha=hoy - timedelta(days=55)).por_cobrar, Decimal("0.00"))
+
+    def test_tarea_nocturna_cierra_el_dia_anterior(self):
+        factura = _factura(self.contrato, 1, total="100.00", vence=date(2026, 3, 20), fecha_emision=date(2026, 3, 1))
+        PagoFactura.objects.create(factura=factura, monto=Decimal("40.00"), fecha=date(2026, 3, 10), metodo_pago="efectivo")
+        pasada_medianoche = timezone.make_aware(datetime(2026, 3, 11, 0, 15))
+        with mock.patch("django.utils.timezone.now", return_value=pasada_medianoche):
+            call_command("snapshot_cartera", stdout=StringIO())
+        cerrado = SnapshotCartera.objects.get(fecha=date(2026, 3, 10))
+        self.assertEqual((cerrado.cobrado_dia, cerrado.por_cobrar), (Decimal("40.00"), Decimal("60.00")))
+        self.assertEqual(SnapshotCartera.objects.get(fecha=date(2026, 3, 11)).cobrado_dia, Decimal("0.00"))
+
+
+class RentabilidadContratoTests(TestCase):
+    def setUp(self):
+        self.tecnico = Trabajador.objects.create(user=User.objects.create(username="ana"), telefono="0999")
+        self.contrato = _contrato("Uno")
+        self.otro = _contrato("Dos")
+        self.insumo = Insumo.objects.create(nombre="Cloro", stock=Decimal("10.000"), costo=Decimal("2"))
+        Factura.objects.all().delete()
+        ObligacionTrabajador.objects.all().delete()
+
+    def _periodo(self, contrato, mes, total, tecnico, quimicos, anio=2026):
+        factura = Factura.objects.create(
+            cliente=contrato.cliente, contrato=contrato, periodo_anio=anio, periodo_mes=mes,
+            fecha_vencimiento=date(anio, mes, 10), subtotal=Decimal(total), total=Decimal(total),
+        )
+        ObligacionTrabajador.objects.create(
+            trabajador=self.tecnico, contrato=contrato, periodo_anio=anio, periodo_mes=mes,
+            valor_acordado=Decimal(tecnico), fecha_pago_programada=date(anio, mes, 10),
+        )
+        mantenimiento = Mantenimiento.objects.create(cliente=contrato.cliente, contrato=contrato, fecha=date(anio, mes, 5))
+        UsoInsumo.objects.bulk_create([UsoInsumo(mantenimiento=mantenimiento, insumo=self.insumo, cantidad=Decimal("1"), costo_total=Decimal(quimicos))])
+        return factura
+
+    def test_reconstruye_y_ordena_por_margen(self):
+        factura = self._periodo(self.contrato, 3, "100.00", "40.00", "10.00")
+        self._periodo(self.otro, 3, "80.00", "60.00", "5.00")
+        PagoFactura.objects.create(factura=factura, monto=Decimal("70.00"), fecha=date(2026, 4, 2), metodo_pago="efectivo")
+
+        self.assertEqual(reconstruir_rentabilidad()["filas"], 3)
+        marzo = RentabilidadContratoMensual.objects.get(contrato=self.contrato, anio=2026, mes=3)
+        self.assertEqual((marzo.ingreso_facturado, marzo.costo_tecnico, marzo.costo_quimicos, marzo.margen), (Decimal("100.00"), Decimal("40.00"), Decimal("10.00"), Decimal("50.00")))
+        self.assertEqual(marzo.margen_pct, Decimal("50.0"))
+        abril = RentabilidadContratoMensual.objects.get(contrato=self.contrato, anio=2026, mes=4)
+        self.assertEqual((abril.ingreso_cobrado, abril.margen), (Decimal("70.00"), Decimal("0.00")))
+
+        with self.assertNumQueries(2):
+            mejores, peores = ranking_rentabilidad(2026, 3)
+            self.assertEqual([f.contrato.cliente.nombre for f in mejores], ["Uno", "Dos"])
+            self.assertEqual([f.contrato.cliente.nombre for f in peores], ["Dos", "Uno"])
+        with self.assertNumQueries(1):
+            serie = serie_rentabilidad(self.contrato, date(2026, 6, 30))
+        self.assertEqual([f.periodo_label for f in serie][-4:], ["03/2026", "04/2026", "05/2026", "06/2026"])
+        self.assertEqual([f.margen for f in serie][-4:], [Decimal("50.00"), Decimal("0.00"), 0, 0])
+
+    def test_actualizacion_incremental_solo_toca_periodos_modificados(self):
+        enero = self._periodo(self.contrato, 1, "100.00", "40.00", "10.00")
+        self._periodo(self.otro, 1, "80.00", "30.00", "0.00")
+        ayer = timezone.now() - timedelta(days=1)
+        Factura.objects.update(actualizada_en=ayer)
+        ObligacionTrabajador.objects.update(actualizada_en=ayer)
+        hoy = date(2026, 6, 15)
+        self.assertTrue(actualizar_rentabilidad(hoy)["completa"])
+        otro_antes = RentabilidadContratoMensual.objects.get(contrato=self.otro, mes=1).actualizado_en
+
+        Factura.objects.filter(pk=enero.pk).update(actualizada_en=timezone.now() + timedelta(hours=1))
+        Factura.objects.filter(pk=enero.pk).update(total=Decimal("120.00"))
+        resultado = actualizar_rentabilidad(hoy)
+        self.assertFalse(resultado["completa"])
+        self.assertEqual(RentabilidadContratoMensual.objects.get(contrato=self.contrato, mes=1).margen, Decimal("70.00"))
+        self.assertEqual(RentabilidadContratoMensual.objects.get(contrato=self.otro, mes=1).actualizado_en, otro_antes)
+
+        Factura.objects.filter(pk=enero.pk).update(estado=Factura.ESTADO_ANULADA, actualizada_en=timezone.now() + timedelta(hours=2))
+        ObligacionTrabajador.objects.filter(contrato=self.contrato).update(estado=ObligacionTrabajador.ESTADO_ANULADO, actualizada_en=timezone.now() + timedelta(hours=2))
+        UsoInsumo.objects.filter(mantenimiento__contrato=self.contrato).delete()
+        actualizar_rentabilidad(hoy)
+        self.assertFalse(RentabilidadContratoMensual.objects.filter(contrato=self.contrato).exists())
+
+    def test_borrar_o_mover_recalcula_el_periodo_de_origen(self):
+        enero = self._periodo(self.contrato, 1, "100.00", "40.00", "10.00")
+        reconstruir_rentabilidad()
+
+        enero.periodo_mes = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            enero.save()
+        self.assertEqual(RentabilidadContratoMensual.objects.get(contrato=self.contrato, mes=1).margen, Decimal("-50.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ObligacionTrabajador.objects.filter(contrato=self.contrato, periodo_mes=1).delete()
+        self.assertEqual(RentabilidadContratoMensual.objects.get(contrato=self.contrato, mes=1).margen, Decimal("-10.00"))
+
+    def test_recalculo_por_senales_no_adelanta_la_marca_incremental(self):
+        hace_un_anio = self._periodo(self.contrato, 1, "100.00", "40.00", "10.00", anio=2025)
+        self._periodo(self.contrato, 3, "80.00", "30.00", "0.00")
+        inicio = timezone.now()
+        with mock.patch("django.utils.timezone.now", return_value=inicio):
+            actualizar_rentabilidad(date(2026, 6, 15))
+
+        with mock.patch("django.utils.timezone.now", return_value=inicio + timedelta(minutes=20)):
+            hace_un_anio.subtotal = hace_un_anio.total = Decimal("200.00")
+            hace_un_anio.save()
+        with mock.patch("django.utils.timezone.now", return_value=inicio + timedelta(minutes=30)):
+            with self.captureOnCommitCallbacks(execute=True):
+                ObligacionTrabajador.objects.filter(contrato=self.contrato, periodo_mes=3).delete()
+        with mock.patch("django.utils.timezone.now", return_value=inicio + timedelta(minutes=60)):
+            actualizar_rentabilidad(date(2026, 6, 15))
+        fila = RentabilidadContratoMensual.objects.get(contrato=self.contrato, anio=2025, mes=1)
+        self.assertEqual((fila.ingreso_facturado, fila.margen), (Decimal("200.00"), Decimal("150.00")))
+
+    def test_guardar_sin_mover_el_periodo_no_consulta_de_mas(self):
+        self._periodo(self.contrato, 1, "100.00", "40.00", "10.00")
+        obligacion = ObligacionTrabajador.objects.get(contrato=self.contrato)
+        obligacion.valor_acordado = Decimal("45.00")
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as callbacks:
+            obligacion.save(update_fields=["valor_acordado"])
+        self.assertEqual(callbacks, [])
+
+    def test_detalle_del_contrato_grafica_doce_meses(self):
+        self._periodo(self.contrato, timezone.localdate().month, "100.00", "40.00", "10.00", anio=timezone.localdate().year)
+        reconstruir_rentabilidad()
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        response = self.client.get(f"/dashboard/contratos/{self.contrato.pk}/")
+        self.assertEqual(len(response.context["rentabilidad_12_meses"]), 12)
+        self.assertEqual(response.context["margen_12_meses"], Decimal("50.00"))
+        self.assertContains(response, "graficoRentabilidad")
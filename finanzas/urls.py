@@ -5,6 +5,7 @@ from . import views
 urlpatterns = [
     path("cartera/", views.cartera_centro, name="finanzas_cartera"),
     path("calendario/", views.calendario_financiero, name="finanzas_calendario"),
+    path("proyeccion/", views.proyeccion_flujo_caja, name="finanzas_proyeccion"),
     path("clientes/<int:cliente_pk>/estado-cuenta.pdf", views.cliente_estado_cuenta_pdf, name="finanzas_cliente_estado_cuenta_pdf"),
     path("nomina/", views.nomina_lista, name="finanzas_nomina"),
     path("nomina/generar/", views.nomina_generar, name="finanzas_nomina_generar"),
@@ -1,3 +1,5 @@
+import json
+import tempfile
 from calendar import monthrange
 from calendar import monthrange
 from datetime import date, timedelta
@@ -9,7 +11,7 @@ from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import Q, Sum
 from django.shortcuts import get_object_or_404, redirect, render
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.urls import reverse
@@ -19,8 +21,15 @@ from .forms import EgresoForm, IngresoForm, PagoFacturaForm, PagoTrabajadorForm,
 from .models import Egreso, Factura, Ingreso, PagoFactura, ObligacionTrabajador, PagoTrabajador, LotePagoTrabajador, AnticipoTrabajador
 from clientes.models import Cliente
 from contratos.models import Contrato
+from dashboard.exportaciones import FORMATO_MONEDA, exportar, filas_queryset, formato_exportacion
+from dashboard.reportes import registrar_reporte, responder_reporte
 
-from .cuentas_por_cobrar import MESES, generar_facturas_periodo, previsualizar_facturas_periodo
+from .nomina import fecha_pago_programada, generar_nomina, planificar_nomina
+from .proyeccion import proyeccion_flujo
+from .estados_cuenta import datos_estados_cuenta, generar_estados_cuenta
+from .pdf import construir_pdf, estado_cuenta_pdf
+from .historico_cartera import serie_cartera
+from .cuentas_por_cobrar import MESES, TRAMOS_ANTIGUEDAD, anotar_saldos, generar_facturas_periodo, previsualizar_facturas_periodo, totales_facturas, tramo_antiguedad
 
 from .servicios_financieros import obtener_resumen_financiero
 from .alertas_financieras import generar_alertas_financieras
@@ -50,22 +59,6 @@ def _rango_mes(anio, mes):
     return date(anio, mes, 1), date(anio, mes, monthrange(anio, mes)[1])
 
 
-def _desplazar_mes(anio, mes, desplazamiento):
-    indice = (anio * 12 + (mes - 1)) + desplazamiento
-    return indice // 12, indice % 12 + 1
-
-
-def _meses_servicio_candidatos_para_pago(anio_pago, mes_pago, meses_atras=12):
-    """Meses de inicio de servicio que podrían producir un pago en el mes elegido.
-
-    La nómina se consulta y genera por fecha programada de pago. Como el pago puede
-    ocurrir después del cierre del servicio o después del cobro del cliente, revisamos
-    el mes seleccionado y meses anteriores.
-    """
-    for desplazamiento in range(-meses_atras, 1):
-        yield _desplazar_mes(anio_pago, mes_pago, desplazamiento)
-
-
 def _sum(qs, field):
     return qs.aggregate(valor=Sum(field))["valor"] or Decimal("0.00")
 
@@ -280,6 +273,32 @@ def movimiento_eliminar(request, tipo, pk):
     return render(request, "finanzas/eliminar.html", {"obj": obj, "tipo": tipo, "es_admin": True})
 
 
+CAMPOS_EXPORTACION_FACTURAS = (
+    "numero", "cliente__nombre", "cliente__telefono", "cliente__ciudad", "periodo_mes", "periodo_anio",
+    "cuota_numero", "total_cuotas", "fecha_emision", "fecha_vencimiento", "total", "cobrado", "saldo_pendiente", "estado_actual",
+)
+
+
+def _exportar_facturas(formato, facturas_qs, nombre_base):
+    etiquetas = dict(Factura.ESTADO_CHOICES)
+
+    def fila(valores):
+        numero, cliente, telefono, ciudad, mes, anio, cuota, cuotas, emision, vence, total, cobrado, saldo, estado = valores
+        periodo = f"{mes:02d}/{anio}" + (f" · cuota {cuota}/{cuotas}" if cuotas and cuotas > 1 else "")
+        total, cobrado, saldo = (Decimal(x or 0).quantize(Decimal("0.01")) for x in (total, cobrado, saldo))
+        return (numero, cliente, telefono, ciudad or "", periodo, emision, vence, total, cobrado, saldo, etiquetas.get(estado, estado))
+
+    return exportar(
+        formato,
+        ["Factura", "Cliente", "Teléfono", "Ciudad", "Periodo", "Emisión", "Vence", "Total", "Cobrado", "Saldo", "Estado"],
+        filas_queryset(anotar_saldos(facturas_qs), CAMPOS_EXPORTACION_FACTURAS, fila),
+        nombre_base,
+        hoja="Facturas",
+        anchos=[16, 32, 14, 16, 18, 12, 12, 12, 12, 12, 12],
+        formatos={7: FORMATO_MONEDA, 8: FORMATO_MONEDA, 9: FORMATO_MONEDA},
+    )
+
+
 @login_required
 def facturas_lista(request):
     if not _es_admin(request.user):
@@ -332,14 +351,14 @@ def facturas_lista(request):
             | Q(cliente__ciudad__icontains=q)
         )
 
-    facturas = list(facturas_qs)
-    activas = [f for f in facturas if f.estado != Factura.ESTADO_ANULADA]
-    total_facturado = sum((f.total for f in activas), Decimal("0.00"))
-    total_cobrado = sum((f.monto_pagado for f in activas), Decimal("0.00"))
-    total_pendiente = sum((f.saldo for f in activas), Decimal("0.00"))
-    total_vencido = sum((f.saldo for f in activas if f.estado_visual == Factura.ESTADO_VENCIDA), Decimal("0.00"))
+    formato = formato_exportacion(request)
+    if formato:
+        return _exportar_facturas(formato, facturas_qs, f"facturas_{hoy:%Y%m%d}")
+
+    totales = totales_facturas(facturas_qs, hoy)
 
-    paginator = Paginator(facturas, 25)
+    # Solo la página visible carga pagos para monto_pagado/saldo por fila.
+    paginator = Paginator(facturas_qs, 25)
     page_obj = paginator.get_page(request.GET.get("page"))
     params = request.GET.copy()
     params.pop("page", None)
@@ -354,10 +373,10 @@ def facturas_lista(request):
         "mes_generacion": hoy.month,
         "estados": Factura.ESTADO_CHOICES,
         "querystring": params.urlencode(),
-        "total_facturado": total_facturado,
-        "total_cobrado": total_cobrado,
-        "total_pendiente": total_pendiente,
-        "total_vencido": total_vencido,
+        "total_facturado": totales["facturado"],
+        "total_cobrado": totales["cobrado"],
+        "total_pendiente": totales["pendiente"],
+        "total_vencido": totales["vencido"],
         "meses": MESES,
         "total_registros": paginator.count,
         "es_admin": True,
@@ -515,6 +534,10 @@ def cartera_centro(request):
         qs = qs.filter(estado=Factura.ESTADO_ANULADA)
     qs = qs.order_by("-periodo_anio", "-periodo_mes", "fecha_vencimiento", "cliente__nombre", "-id")
 
+    formato = formato_exportacion(request)
+    if formato:
+        return _exportar_facturas(formato, qs, f"cartera_{hoy:%Y%m%d}")
+
     facturas_totales = list(qs)
     activas = [f for f in facturas_totales if f.estado != Factura.ESTADO_ANULADA]
     total_por_cobrar = sum((f.saldo for f in activas), Decimal("0.00"))
@@ -522,26 +545,29 @@ def cartera_centro(request):
     cobrado_mes = PagoFactura.objects.filter(activo=True, fecha__year=hoy.year, fecha__month=hoy.month).aggregate(t=Sum("monto"))["t"] or Decimal("0.00")
     proximas = sum(1 for f in activas if f.saldo > 0 and hoy <= f.fecha_vencimiento <= hoy + timedelta(days=7))
 
-    antiguedad = {"por_vencer": Decimal("0.00"), "dias_1_7": Decimal("0.00"), "dias_8_15": Decimal("0.00"), "dias_16_30": Decimal("0.00"), "mas_30": Decimal("0.00")}
+    antiguedad = dict.fromkeys(TRAMOS_ANTIGUEDAD, Decimal("0.00"))
     for factura in activas:
         if factura.saldo <= 0: continue
-        dias = (hoy - factura.fecha_vencimiento).days
-        if dias <= 0: antiguedad["por_vencer"] += factura.saldo
-        elif dias <= 7: antiguedad["dias_1_7"] += factura.saldo
-        elif dias <= 15: antiguedad["dias_8_15"] += factura.saldo
-        elif dias <= 30: antiguedad["dias_16_30"] += factura.saldo
-        else: antiguedad["mas_30"] += factura.saldo
+        antiguedad[tramo_antiguedad((hoy - factura.fecha_vencimiento).days)] += factura.saldo
 
     paginator = Paginator(facturas_totales, por_pagina)
     page_obj = paginator.get_page(request.GET.get("page"))
     params = request.GET.copy(); params.pop("page", None)
     ciudades = Cliente.objects.exclude(ciudad="").values_list("ciudad", flat=True).distinct().order_by("ciudad")
+    historico = serie_cartera(365, hoy)
+    grafico_historico = json.dumps({
+        "labels": [s["fecha"].strftime("%d/%m/%Y") for s in historico],
+        "por_cobrar": [float(s["por_cobrar"]) for s in historico],
+        "vencido": [float(s["vencido"]) for s in historico],
+        "mas_30": [float(s["mas_30"]) for s in historico],
+    })
 
     return render(request, "finanzas/cartera.html", {
         "page_obj": page_obj, "total_registros": paginator.count, "total_por_cobrar": total_por_cobrar,
         "vencido": vencido, "cobrado_mes": cobrado_mes, "proximas": proximas, "antiguedad": antiguedad,
         "q": q, "estado": estado, "ciudad": ciudad, "anio_filtro": anio or "", "mes_filtro": mes or "",
         "por_pagina": por_pagina, "ciudades": ciudades, "meses": MESES, "querystring": params.urlencode(), "es_admin": True,
+        "grafico_historico": grafico_historico if historico else None,
     })
 
 
@@ -569,38 +595,6 @@ def nomina_lista(request):
     lotes = LotePagoTrabajador.objects.filter(periodo_anio=anio, periodo_mes=mes, activo=True).select_related("trabajador__user").order_by("-fecha", "-id")[:25]
     return render(request,"finanzas/nomina_lista.html",{"obligaciones":obligaciones,"resumen":list(resumen.values()),"total":total,"pagado":pagado,"pendiente":pendiente,"anio":anio,"mes":mes,"meses":MESES,"trabajadores":Trabajador.objects.filter(activo=True).select_related("user"),"trabajador_id":trabajador,"estado":estado,"estados":ObligacionTrabajador.ESTADO_CHOICES,"lotes":lotes,"es_admin":True})
 
-def _fecha_pago_programada_contrato(contrato, anio, mes):
-    """Calcula la fecha de nómina según la regla configurada para el trabajador."""
-    trabajador = contrato.tecnico_designado
-    periodo_inicio, periodo_fin = contrato.periodo_servicio(anio, mes)
-    if trabajador and trabajador.programacion_pago_nomina == "fin_periodo":
-        return periodo_fin + timedelta(days=trabajador.dias_despues_fin_periodo or 0)
-    if trabajador and trabajador.programacion_pago_nomina == "dia_fijo" and trabajador.dia_pago_nomina:
-        return date(anio, mes, min(trabajador.dia_pago_nomina, monthrange(anio, mes)[1]))
-    if trabajador and trabajador.programacion_pago_nomina == "rango" and trabajador.dia_pago_hasta:
-        return date(anio, mes, min(trabajador.dia_pago_hasta, monthrange(anio, mes)[1]))
-    factura = (
-        Factura.objects
-        .filter(contrato=contrato, periodo_anio=anio, periodo_mes=mes)
-        .exclude(estado=Factura.ESTADO_ANULADA)
-        .only("fecha_vencimiento")
-        .order_by("-fecha_vencimiento", "-id")
-        .first()
-    )
-    if factura and factura.fecha_vencimiento:
-        return factura.fecha_vencimiento
-
-    # Si todavía no se generaron las cuentas por cobrar, usamos directamente
-    # la programación comercial del contrato. En contratos con dos cuotas se
-    # toma el último vencimiento, porque la nómina es consolidada.
-    calendario = contrato.calendario_cobros(anio, mes)
-    fechas = [item.get("fecha_vencimiento") for item in calendario if item.get("fecha_vencimiento")]
-    if fechas:
-        return max(fechas)
-
-    return date(anio, mes, 1) + timedelta(days=5)
-
-
 @login_required
 def nomina_generar(request):
     if not _es_admin(request.user):
@@ -618,142 +612,22 @@ def nomina_generar(request):
         messages.error(request, "Mes de pago inválido. Selecciona correctamente el mes y el año.")
         return redirect("finanzas_nomina")
 
-    creadas = 0
-    omitidas = 0
-    sin_configurar = 0
-    contratos = list(Contrato.objects.filter(activo=True).select_related("tecnico_designado"))
-
-    for contrato in contratos:
-        if (
-            not contrato.tecnico_designado_id
-            or not contrato.valor_tecnico_mensual
-            or contrato.valor_tecnico_mensual <= 0
-        ):
-            sin_configurar += 1
-            continue
-
-        coincidencias = []
-        for periodo_anio, periodo_mes in _meses_servicio_candidatos_para_pago(anio, mes):
-            fecha_programada = _fecha_pago_programada_contrato(contrato, periodo_anio, periodo_mes)
-            if fecha_programada.year == anio and fecha_programada.month == mes:
-                periodo_inicio, periodo_fin = contrato.periodo_servicio(periodo_anio, periodo_mes)
-                if contrato.fecha_inicio and periodo_fin <= contrato.fecha_inicio:
-                    continue
-                coincidencias.append((
-                    periodo_anio,
-                    periodo_mes,
-                    periodo_inicio,
-                    periodo_fin,
-                    fecha_programada,
-                ))
-
-        if not coincidencias:
-            # El contrato está configurado, pero no tiene ningún pago programado
-            # dentro del mes seleccionado. No se considera un error.
-            continue
-
-        for periodo_anio, periodo_mes, periodo_inicio, periodo_fin, fecha_programada in coincidencias:
-            obligacion, created = ObligacionTrabajador.objects.get_or_create(
-                contrato=contrato,
-                periodo_anio=periodo_anio,
-                periodo_mes=periodo_mes,
-                defaults={
-                    "trabajador": contrato.tecnico_designado,
-                    "valor_acordado": contrato.valor_tecnico_mensual,
-                    "periodo_servicio_inicio": periodo_inicio,
-                    "periodo_servicio_fin": periodo_fin,
-                    "fecha_pago_programada": fecha_programada,
-                },
-            )
+    accion = (request.POST.get("accion") or "generar").strip().lower()
+    if accion == "previsualizar":
+        return render(request, "finanzas/nomina_vista_previa.html", {
+            "plan": planificar_nomina(anio, mes), "anio": anio, "mes": mes, "es_admin": True,
+        })
 
-            campos_actualizados = []
-            if not created and not obligacion.pagos.filter(activo=True).exists():
-                if obligacion.trabajador_id != contrato.tecnico_designado_id:
-                    obligacion.trabajador = contrato.tecnico_designado
-                    campos_actualizados.append("trabajador")
-                if obligacion.valor_acordado != contrato.valor_tecnico_mensual:
-                    obligacion.valor_acordado = contrato.valor_tecnico_mensual
-                    campos_actualizados.append("valor_acordado")
-                if obligacion.fecha_pago_programada != fecha_programada:
-                    obligacion.fecha_pago_programada = fecha_programada
-                    campos_actualizados.append("fecha_pago_programada")
-
-            # Las fechas históricas se completan si faltan, pero nunca se reemplazan.
-            if not obligacion.periodo_servicio_inicio:
-                obligacion.periodo_servicio_inicio = periodo_inicio
-                campos_actualizados.append("periodo_servicio_inicio")
-            if not obligacion.periodo_servicio_fin:
-                obligacion.periodo_servicio_fin = periodo_fin
-                campos_actualizados.append("periodo_servicio_fin")
-
-            if campos_actualizados:
-                obligacion.save(update_fields=list(dict.fromkeys(campos_actualizados)) + ["actualizada_en"])
-
-            creadas += int(created)
-            omitidas += int(not created)
-
-    # Los anticipos pendientes del periodo se descuentan automáticamente de la nómina
-    # sin crear un segundo egreso: se reutiliza el egreso generado al registrar el anticipo.
-    anticipos_aplicados = 0
-    for anticipo in AnticipoTrabajador.objects.filter(
-        periodo_anio=anio, periodo_mes=mes, descontado=False
-    ).select_related("trabajador", "egreso"):
-        obligaciones_trabajador = list(
-            ObligacionTrabajador.objects.filter(
-                trabajador=anticipo.trabajador,
-                fecha_pago_programada__year=anio,
-                fecha_pago_programada__month=mes,
-            )
-            .exclude(estado=ObligacionTrabajador.ESTADO_ANULADO)
-            .prefetch_related("pagos")
-            .order_by("fecha_pago_programada", "id")
-        )
-        restante = anticipo.saldo_pendiente
-        if not obligaciones_trabajador or restante <= 0:
-            continue
-        monto_aplicar = min(restante, sum((o.saldo for o in obligaciones_trabajador), Decimal("0.00")))
-        if monto_aplicar <= 0:
-            continue
-        with transaction.atomic():
-            lote = LotePagoTrabajador.objects.create(
-                trabajador=anticipo.trabajador,
-                periodo_anio=anio,
-                periodo_mes=mes,
-                monto=monto_aplicar,
-                fecha=anticipo.fecha,
-                metodo_pago="transferencia",
-                referencia=f"ANT-{anticipo.pk}",
-                observaciones=f"Descuento automático del anticipo #{anticipo.pk}",
-                egreso=anticipo.egreso,
-                creado_por=anticipo.creado_por,
-            )
-            for obligacion in obligaciones_trabajador:
-                if restante <= 0:
-                    break
-                aplicado = min(restante, obligacion.saldo)
-                if aplicado <= 0:
-                    continue
-                PagoTrabajador.objects.create(
-                    lote=lote,
-                    obligacion=obligacion,
-                    monto=aplicado,
-                    fecha=anticipo.fecha,
-                    metodo_pago="transferencia",
-                    referencia=f"ANT-{anticipo.pk}",
-                    observaciones=f"Anticipo #{anticipo.pk} descontado de la nómina",
-                    creado_por=anticipo.creado_por,
-                )
-                restante -= aplicado
-            aplicado_total = monto_aplicar - restante
-            if aplicado_total > 0:
-                anticipo.monto_descontado += aplicado_total
-                anticipo.descontado = anticipo.monto_descontado >= anticipo.monto
-                anticipo.fecha_descuento = timezone.localdate() if anticipo.descontado else None
-                anticipo.save(update_fields=["monto_descontado", "descontado", "fecha_descuento"])
-                anticipos_aplicados += 1
-    messages.success(request,f"Nómina por fecha de pago generada: {creadas} obligaciones nuevas, {omitidas} ya existentes, {sin_configurar} contratos sin técnico o valor configurado y {anticipos_aplicados} anticipos descontados.")
+    resultado = generar_nomina(anio, mes)
+    messages.success(
+        request,
+        f"Nómina por fecha de pago generada: {resultado['creadas']} obligaciones nuevas, "
+        f"{resultado['existentes']} ya existentes, {resultado['sin_configurar']} contratos sin técnico o valor "
+        f"configurado y {resultado['anticipos_aplicados']} anticipos descontados.",
+    )
     return redirect(f"/dashboard/finanzas/nomina/?anio={anio}&mes={mes}")
 
+
 def _nombre_trabajador(trabajador):
     nombre = trabajador.user.get_full_name().strip()
     return nombre or trabajador.user.username
@@ -833,7 +707,7 @@ def trabajador_configuracion_pago(request, trabajador_pk):
                         days=trabajador.dias_despues_fin_periodo or 0
                     )
                 else:
-                    nueva_fecha = _fecha_pago_programada_contrato(
+                    nueva_fecha = fecha_pago_programada(
                         obligacion.contrato,
                         obligacion.periodo_anio,
                         obligacion.periodo_mes,
@@ -1121,27 +995,34 @@ def nomina_pago_anular(request,pk,pago_pk):
 def _pdf_response(nombre_archivo, titulo, subtitulo, filas, encabezados, resumen=None):
     response = HttpResponse(content_type="application/pdf")
     response["Content-Disposition"] = f'attachment; filename="{nombre_archivo}"'
-    doc = SimpleDocTemplate(response, pagesize=A4, rightMargin=14*mm, leftMargin=14*mm, topMargin=14*mm, bottomMargin=14*mm)
-    estilos = getSampleStyleSheet()
-    elementos = [Paragraph(titulo, ParagraphStyle("TituloJVA", parent=estilos["Title"], alignment=TA_CENTER, fontSize=17)), Paragraph(subtitulo, ParagraphStyle("SubJVA", parent=estilos["Normal"], alignment=TA_CENTER, textColor=colors.HexColor("#5b6472"))), Spacer(1, 7*mm)]
-    if resumen:
-        datos = [[Paragraph(str(k), estilos["BodyText"]), Paragraph(str(v), estilos["BodyText"])] for k,v in resumen]
-        tabla = Table(datos, colWidths=[70*mm, 80*mm]); tabla.setStyle(TableStyle([("BACKGROUND",(0,0),(0,-1),colors.HexColor("#eef4fb")),("GRID",(0,0),(-1,-1),0.25,colors.HexColor("#cbd5e1")),("PADDING",(0,0),(-1,-1),6)])); elementos += [tabla, Spacer(1, 6*mm)]
-    data = [[Paragraph(str(x), estilos["BodyText"]) for x in encabezados]] + [[Paragraph(str(x), estilos["BodyText"]) for x in fila] for fila in filas]
-    tabla = Table(data, repeatRows=1)
-    tabla.setStyle(TableStyle([("BACKGROUND",(0,0),(-1,0),colors.HexColor("#123b66")),("TEXTCOLOR",(0,0),(-1,0),colors.white),("GRID",(0,0),(-1,-1),0.25,colors.HexColor("#cbd5e1")),("VALIGN",(0,0),(-1,-1),"TOP"),("PADDING",(0,0),(-1,-1),5)]))
-    elementos.append(tabla); doc.build(elementos); return response
+    construir_pdf(response, titulo, subtitulo, filas, encabezados, resumen)
+    return response
 
 
 @login_required
 def cliente_estado_cuenta_pdf(request, cliente_pk):
     if not _es_admin(request.user): return _denegado(request)
-    cliente = get_object_or_404(Cliente, pk=cliente_pk)
-    facturas = list(Factura.objects.filter(cliente=cliente).prefetch_related("pagos").order_by("-periodo_anio", "-periodo_mes"))
-    filas = [(f.numero, f.periodo_label, f.fecha_vencimiento.strftime("%d/%m/%Y"), f"${f.total:.2f}", f"${f.monto_pagado:.2f}", f"${f.saldo:.2f}", f.estado_visual.title()) for f in facturas]
-    activas=[f for f in facturas if f.estado != Factura.ESTADO_ANULADA]
-    resumen=[("Cliente", cliente.nombre),("Teléfono", cliente.telefono or "—"),("Total facturado", f"${sum((f.total for f in activas), Decimal('0')):.2f}"),("Total cobrado", f"${sum((f.monto_pagado for f in activas), Decimal('0')):.2f}"),("Saldo pendiente", f"${sum((f.saldo for f in activas), Decimal('0')):.2f}")]
-    return _pdf_response(f"estado-cuenta-{slugify(cliente.nombre)}.pdf", "JVAQUA · Estado de cuenta", "Historial financiero del cliente", filas, ["Factura","Periodo","Vence","Total","Cobrado","Saldo","Estado"], resumen)
+    get_object_or_404(Cliente, pk=cliente_pk)
+    return responder_reporte(request, "estado_cuenta_cliente", {"cliente": cliente_pk})
+
+
+@registrar_reporte("estado_cuenta_cliente", "Estado de cuenta del cliente", modelos=("finanzas.Factura", "finanzas.PagoFactura"))
+def _reporte_estado_cuenta_cliente(parametros):
+    estados = datos_estados_cuenta([parametros["cliente"]])
+    if not estados:
+        raise Http404("Cliente no encontrado.")
+    nombre, contenido = estado_cuenta_pdf(estados[0])
+    response = HttpResponse(contenido, content_type="application/pdf")
+    response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    return response
+
+
+@registrar_reporte("estados_cuenta_lote", "Estados de cuenta por lote", modelos=("finanzas.Factura", "finanzas.PagoFactura", "clientes.Cliente"))
+def _reporte_estados_cuenta_lote(parametros):
+    archivo = tempfile.TemporaryFile()
+    generar_estados_cuenta(archivo, parametros.get("clientes"))
+    archivo.seek(0)
+    return FileResponse(archivo, as_attachment=True, filename=f"estados-cuenta-{timezone.localdate():%Y%m%d}.zip", content_type="application/zip")
 
 
 @login_required
@@ -1179,3 +1060,24 @@ def calendario_financiero(request):
     for e in Egreso.objects.filter(fecha__range=(inicio,fin)).exclude(estado=Egreso.ESTADO_ANULADO): eventos.append({"fecha":e.fecha,"tipo":"Egreso realizado","detalle":e.concepto,"valor":e.monto_pagado,"estado":"pagado"})
     eventos.sort(key=lambda x:(x["fecha"],x["tipo"],x["detalle"]))
     return render(request,"finanzas/calendario.html",{"eventos":eventos,"anio":anio,"mes":mes,"meses":MESES,"es_admin":True})
+
+
+@login_required
+def proyeccion_flujo_caja(request):
+    if not _es_admin(request.user):
+        return _denegado(request)
+    proyeccion = proyeccion_flujo(forzar=request.GET.get("recalcular") == "1")
+    nombres_mes = dict(MESES)
+    meses = [dict(m, nombre=f"{nombres_mes[m['mes']]} {m['anio']}") for m in proyeccion["meses"]]
+    grafico = json.dumps({
+        "labels": [d["fecha"].strftime("%d/%m/%Y") for d in proyeccion["dias"]],
+        "saldo": [float(d["saldo"]) for d in proyeccion["dias"]],
+        "entradas": [float(d["entradas"]) for d in proyeccion["dias"]],
+        "salidas": [float(d["salidas"]) for d in proyeccion["dias"]],
+    })
+    return render(request, "finanzas/proyeccion.html", {
+        "proyeccion": proyeccion,
+        "meses_proyeccion": meses,
+        "grafico_proyeccion": grafico,
+        "es_admin": True,
+    })
@@ -10,6 +10,7 @@ from .models import (
     PresentacionInsumo,
     VentaInsumo,
     SolicitudReposicion,
+    SaldoInventarioCheckpoint,
 )
 
 
@@ -57,6 +58,13 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
     search_fields = ("insumo__nombre", "trabajador__user__username", "observacion")
 
 
+@admin.register(SaldoInventarioCheckpoint)
+class SaldoInventarioCheckpointAdmin(admin.ModelAdmin):
+    list_display = ("insumo", "fecha", "saldo", "movimientos", "generado_en")
+    list_filter = ("fecha", "insumo__categoria")
+    search_fields = ("insumo__nombre",)
+
+
 admin.site.register(CompraInsumo)
 admin.site.register(VentaInsumo)
 admin.site.register(EntradaStock)
@@ -0,0 +1,140 @@
+"""Indicadores agregados del inventario calculados en la base de datos.
+
+Cada función resuelve sus totales con una sola consulta (agregada en la base,
+salvo el stock estimado de los contratos, que depende de la fecha), de modo
+que la portada de Inventario cuesta un número fijo de consultas sin importar
+cuántos productos, trabajadores o contratos existan.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    CompraInsumo, Insumo, InventarioContrato, InventarioTrabajador, MovimientoInventario, VentaInsumo, estimar_stock_contrato,
+)
+
+CERO_DINERO = Decimal("0.00")
+CERO_STOCK = Decimal("0.000")
+
+
+def _valor(stock="stock", costo="costo"):
+    return Coalesce(
+        Sum(ExpressionWrapper(F(stock) * F(costo), output_field=DecimalField(max_digits=20, decimal_places=4))),
+        Decimal("0"),
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
+
+
+def _dinero(valor):
+    return Decimal(valor or 0).quantize(CERO_DINERO)
+
+
+def valor_bodega():
+    """Valor del stock general de los productos activos."""
+    return _dinero(Insumo.objects.filter(activo=True).aggregate(valor=_valor())["valor"])
+
+
+def resumen_por_categoria():
+    """Productos, valor, bajo stock y sin stock por categoría, y su total general.
+
+    Devuelve ``(categorias, totales)``; los totales se suman sobre las
+    categorías, así que ambos salen de la misma consulta.
+    """
+    etiquetas = dict(Insumo.CATEGORIA_CHOICES)
+    filas = (
+        Insumo.objects.filter(activo=True)
+        .values("categoria")
+        .annotate(
+            productos=Count("id"),
+            valor=_valor(),
+            bajo_stock=Count("id", filter=Q(stock__lte=F("stock_minimo"))),
+            sin_stock=Count("id", filter=Q(stock__lte=0)),
+            stock_kg=Coalesce(Sum("stock", filter=Q(unidad_base="kg")), CERO_STOCK),
+        )
+        .order_by("categoria")
+    )
+    categorias = []
+    totales = {"productos": 0, "valor": CERO_DINERO, "bajo_stock": 0, "sin_stock": 0, "stock_kg": CERO_STOCK}
+    for fila in filas:
+        fila["nombre"] = etiquetas.get(fila["categoria"], fila["categoria"])
+        fila["valor"] = _dinero(fila["valor"])
+        categorias.append(fila)
+        for clave in totales:
+            totales[clave] += fila[clave]
+    return categorias, totales
+
+
+def resumen_trabajadores():
+    """Valor y productos asignados por trabajador: ``({trabajador_id: {...}}, totales)``."""
+    filas = (
+        InventarioTrabajador.objects.filter(stock__gt=0)
+        .values("trabajador_id")
+        .annotate(productos=Count("id"), valor=_valor(costo="insumo__costo"))
+        .order_by()
+    )
+    por_trabajador = {}
+    totales = {"productos": 0, "valor": CERO_DINERO}
+    for fila in filas:
+        fila["valor"] = _dinero(fila["valor"])
+        por_trabajador[fila["trabajador_id"]] = fila
+        totales["productos"] += fila["productos"]
+        totales["valor"] += fila["valor"]
+    return por_trabajador, totales
+
+
+def resumen_contratos(hoy=None):
+    """Valor del stock estimado en sitio para contratos activos, con productos en mínimo.
+
+    Usa ``stock_estimado`` (el stock menos el consumo diario desde la última
+    referencia), igual que las tarjetas por contrato; como depende de la fecha
+    se suma en Python sobre una sola consulta de valores.
+    """
+    hoy = hoy or timezone.localdate()
+    filas = InventarioContrato.objects.filter(contrato__activo=True).values_list(
+        "contrato_id", "stock", "stock_minimo", "consumo_diario_estimado", "fecha_referencia_estimacion", "insumo__costo",
+    )
+    contratos, productos, en_minimo, valor = set(), 0, 0, Decimal("0")
+    for contrato_id, stock, minimo, consumo, referencia, costo in filas:
+        estimado = estimar_stock_contrato(stock, consumo, referencia, hoy)
+        contratos.add(contrato_id)
+        productos += 1
+        en_minimo += estimado <= Decimal(minimo or 0)
+        valor += estimado * Decimal(costo or 0)
+    return {"contratos": len(contratos), "productos": productos, "en_minimo": en_minimo, "valor": valor}
+
+
+def resumen_mes(desde):
+    """Ventas, compras y consumos desde ``desde`` (normalmente el primer día del mes)."""
+    ventas = VentaInsumo.objects.filter(fecha__gte=desde).aggregate(
+        total=Coalesce(Sum("total"), CERO_DINERO), ganancia=Coalesce(Sum("ganancia"), CERO_DINERO),
+    )
+    compras = CompraInsumo.objects.filter(fecha__gte=desde).aggregate(total=Coalesce(Sum("total"), CERO_DINERO))
+    consumo = MovimientoInventario.objects.filter(
+        tipo__in=["mantenimiento", "consumo_contrato"], fecha__gte=desde,
+    ).aggregate(costo=Coalesce(Sum("total_costo"), CERO_DINERO), cantidad=Coalesce(Sum("cantidad"), CERO_STOCK))
+    return {
+        "total_ventas": ventas["total"],
+        "ganancia": ventas["ganancia"],
+        "total_compras": compras["total"],
+        "costo_consumo": consumo["costo"],
+        "cantidad_consumo": consumo["cantidad"],
+    }
+
+
+def resumen_inventario(desde):
+    """Todos los totales de la portada de Inventario (seis consultas en total)."""
+    categorias, totales = resumen_por_categoria()
+    por_trabajador, totales_trabajadores = resumen_trabajadores()
+    contratos = resumen_contratos()
+    contratos["valor"] = _dinero(contratos["valor"])
+    return {
+        "categorias": categorias,
+        "totales": totales,
+        "por_trabajador": por_trabajador,
+        "trabajadores": totales_trabajadores,
+        "contratos": contratos,
+        "mes": resumen_mes(desde),
+        "valor_total": totales["valor"] + totales_trabajadores["valor"] + contratos["valor"],
+    }
@@ -0,0 +1,212 @@
+"""Kardex general de insumos con cierres mensuales.
+
+El saldo del Kardex se reconstruye desde el libro de movimientos: cada
+``MovimientoInventario`` aporta ``stock_resultante - stock_anterior`` al stock
+general (las entregas, consumos de trabajador y de contrato aportan cero o su
+efecto real sobre bodega). El saldo de apertura de cada insumo es el
+``stock_anterior`` de su primer movimiento.
+
+Los cierres (``SaldoInventarioCheckpoint``) guardan el saldo al último día de
+cada mes, de modo que un rango del Kardex parte del cierre más cercano y solo
+suma los movimientos posteriores.
+"""
+from calendar import monthrange
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Insumo, MovimientoInventario, SaldoInventarioCheckpoint
+
+CERO = Decimal("0.000")
+DELTA_GENERAL = F("stock_resultante") - F("stock_anterior")
+
+
+def _fin_de_mes(fecha):
+    return date(fecha.year, fecha.month, monthrange(fecha.year, fecha.month)[1])
+
+
+def _ultimo_cierre_cerrado(hoy=None):
+    hoy = hoy or timezone.localdate()
+    return hoy.replace(day=1) - timedelta(days=1)
+
+
+def _aperturas(insumo_ids):
+    primero = MovimientoInventario.objects.filter(insumo=OuterRef("pk")).order_by("creado_en", "id")
+    return dict(
+        Insumo.objects.filter(pk__in=insumo_ids)
+        .annotate(apertura=Subquery(primero.values("stock_anterior")[:1]))
+        .values_list("pk", "apertura")
+    )
+
+
+@transaction.atomic
+def generar_checkpoints(hasta=None, insumos=None):
+    """Genera los cierres mensuales pendientes hasta ``hasta`` (por defecto, el mes anterior).
+
+    Es incremental: cada insumo continúa desde su último cierre y solo lee los
+    movimientos posteriores, agrupados por mes en una sola consulta. Devuelve la
+    cantidad de cierres creados.
+    """
+    hasta = _fin_de_mes(hasta) if hasta else _ultimo_cierre_cerrado()
+    insumos_qs = Insumo.objects.all()
+    if insumos is not None:
+        insumos_qs = insumos_qs.filter(pk__in=[getattr(x, "pk", x) for x in insumos])
+    insumo_ids = list(insumos_qs.values_list("pk", flat=True))
+    if not insumo_ids:
+        return 0
+
+    ultimos = {}
+    for cierre in SaldoInventarioCheckpoint.objects.filter(insumo_id__in=insumo_ids).order_by("insumo_id", "fecha"):
+        ultimos[cierre.insumo_id] = cierre
+    aperturas = _aperturas([pk for pk in insumo_ids if pk not in ultimos])
+
+    filtro = Q()
+    for pk in insumo_ids:
+        cierre = ultimos.get(pk)
+        if cierre:
+            filtro |= Q(insumo_id=pk, fecha__gt=cierre.fecha)
+        elif aperturas.get(pk) is not None:
+            filtro |= Q(insumo_id=pk)
+    if not filtro:
+        return 0
+
+    por_mes = (
+        MovimientoInventario.objects.filter(filtro, fecha__lte=hasta)
+        .annotate(mes=TruncMonth("fecha"))
+        .values("insumo_id", "mes")
+        .annotate(delta=Sum(DELTA_GENERAL), cantidad=Count("id"))
+        .order_by("insumo_id", "mes")
+    )
+
+    nuevos = []
+    estado = {
+        pk: (
+            (Decimal(ultimos[pk].saldo), ultimos[pk].movimientos, ultimos[pk].fecha)
+            if pk in ultimos else (Decimal(aperturas.get(pk) or 0), 0, None)
+        )
+        for pk in insumo_ids
+    }
+    for fila in por_mes:
+        saldo, acumulados, _ = estado[fila["insumo_id"]]
+        saldo += Decimal(fila["delta"] or 0)
+        acumulados += fila["cantidad"]
+        fecha = _fin_de_mes(fila["mes"])
+        estado[fila["insumo_id"]] = (saldo, acumulados, fecha)
+        nuevos.append(SaldoInventarioCheckpoint(
+            insumo_id=fila["insumo_id"], fecha=fecha, saldo=saldo, movimientos=acumulados,
+        ))
+    SaldoInventarioCheckpoint.objects.bulk_create(nuevos, ignore_conflicts=True)
+    return len(nuevos)
+
+
+def saldo_al(insumo, fecha):
+    """Saldo general del Kardex al cierre del día ``fecha``.
+
+    Usa el cierre mensual más cercano anterior y suma solo los movimientos
+    desde ese cierre, por lo que el costo no depende del tamaño del historial.
+    """
+    insumo_id = getattr(insumo, "pk", insumo)
+    cierre = (
+        SaldoInventarioCheckpoint.objects.filter(insumo_id=insumo_id, fecha__lte=fecha)
+        .order_by("-fecha").first()
+    )
+    movimientos = MovimientoInventario.objects.filter(insumo_id=insumo_id, fecha__lte=fecha)
+    if cierre:
+        base = Decimal(cierre.saldo)
+        movimientos = movimientos.filter(fecha__gt=cierre.fecha)
+    else:
+        base = Decimal(_aperturas([insumo_id]).get(insumo_id) or 0)
+    return base + Decimal(movimientos.aggregate(delta=Sum(DELTA_GENERAL))["delta"] or 0)
+
+
+def movimientos_rango(insumo, desde, hasta):
+    return (
+        MovimientoInventario.objects.filter(insumo=insumo, fecha__gte=desde, fecha__lte=hasta)
+        .select_related("trabajador__user", "mantenimiento__cliente", "usuario")
+        .order_by("creado_en", "id")
+    )
+
+
+def saldo_antes_de(insumo, desde, movimiento):
+    """Saldo del Kardex inmediatamente antes de ``movimiento`` dentro del rango que inicia en ``desde``."""
+    previos = MovimientoInventario.objects.filter(insumo=insumo, fecha__gte=desde).filter(
+        Q(creado_en__lt=movimiento.creado_en) | Q(creado_en=movimiento.creado_en, id__lt=movimiento.id)
+    )
+    delta = previos.aggregate(delta=Sum(DELTA_GENERAL))["delta"] or 0
+    return saldo_al(insumo, desde - timedelta(days=1)) + Decimal(delta)
+
+
+def iterar_kardex(movimientos, saldo_inicial, chunk_size=500):
+    """Recorre ``movimientos`` en bloques y devuelve ``(movimiento, saldo)`` sin cargar el rango completo."""
+    saldo = Decimal(saldo_inicial)
+    if hasattr(movimientos, "iterator"):
+        movimientos = movimientos.iterator(chunk_size=chunk_size)
+    for movimiento in movimientos:
+        saldo += Decimal(movimiento.stock_resultante) - Decimal(movimiento.stock_anterior)
+        yield movimiento, saldo
+
+
+def verificar_kardex(insumos=None, chunk_size=2000):
+    """Reproduce el libro de movimientos y detecta descuadres.
+
+    Devuelve una lista de diccionarios, uno por insumo con descuadre, con el
+    saldo reconstruido, el stock registrado en ``Insumo``, la diferencia, los
+    saltos de continuidad (movimientos cuyo ``stock_anterior`` no coincide con
+    el saldo previo) y los cierres mensuales que no coinciden con la
+    reconstrucción.
+    """
+    insumos_qs = Insumo.objects.all()
+    if insumos is not None:
+        insumos_qs = insumos_qs.filter(pk__in=[getattr(x, "pk", x) for x in insumos])
+    stocks = dict(insumos_qs.values_list("pk", "stock"))
+    cierres = {}
+    for insumo_id, fecha, saldo in SaldoInventarioCheckpoint.objects.filter(
+        insumo_id__in=stocks
+    ).values_list("insumo_id", "fecha", "saldo"):
+        cierres.setdefault(insumo_id, {})[fecha] = Decimal(saldo)
+
+    estado = {}
+
+    def cerrar_meses(insumo_id, datos, hasta_mes):
+        # Compara cada cierre guardado que quedó atrás con el saldo reconstruido.
+        for fecha in sorted(f for f in cierres.get(insumo_id, {}) if f not in datos["cierres_revisados"] and f < hasta_mes):
+            datos["cierres_revisados"].add(fecha)
+            if cierres[insumo_id][fecha] != datos["saldo"]:
+                datos["cierres_erroneos"].append(fecha)
+
+    filas = (
+        MovimientoInventario.objects.filter(insumo_id__in=stocks)
+        .order_by("insumo_id", "creado_en", "id")
+        .values_list("insumo_id", "fecha", "stock_anterior", "stock_resultante")
+        .iterator(chunk_size=chunk_size)
+    )
+    for insumo_id, fecha, anterior, resultante in filas:
+        datos = estado.get(insumo_id)
+        if datos is None:
+            datos = estado[insumo_id] = {
+                "saldo": Decimal(anterior), "saltos": 0, "cierres_revisados": set(), "cierres_erroneos": [],
+            }
+        cerrar_meses(insumo_id, datos, fecha.replace(day=1))
+        if Decimal(anterior) != datos["saldo"]:
+            datos["saltos"] += 1
+        datos["saldo"] += Decimal(resultante) - Decimal(anterior)
+
+    descuadres = []
+    for insumo_id, stock in stocks.items():
+        datos = estado.get(insumo_id) or {"saldo": CERO, "saltos": 0, "cierres_revisados": set(), "cierres_erroneos": []}
+        cerrar_meses(insumo_id, datos, date.max)
+        diferencia = Decimal(stock) - datos["saldo"]
+        if diferencia or datos["saltos"] or datos["cierres_erroneos"]:
+            descuadres.append({
+                "insumo_id": insumo_id,
+                "saldo_kardex": datos["saldo"],
+                "stock": Decimal(stock),
+                "diferencia": diferencia,
+                "saltos": datos["saltos"],
+                "cierres_erroneos": datos["cierres_erroneos"],
+            })
+    return descuadres
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventario.kardex import generar_checkpoints, verificar_kardex
+from inventario.models import Insumo
+
+
+class Command(BaseCommand):
+    help = "Genera los cierres mensuales del Kardex y, opcionalmente, verifica descuadres contra el stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hasta", help="Fecha AAAA-MM-DD; se cierra hasta el fin de ese mes. Por defecto, el mes anterior.")
+        parser.add_argument("--verificar", action="store_true", help="Reproduce el Kardex y reporta descuadres.")
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options["hasta"]:
+            hasta = parse_date(options["hasta"])
+            if not hasta:
+                raise CommandError("La fecha --hasta debe tener formato AAAA-MM-DD.")
+        creados = generar_checkpoints(hasta=hasta)
+        self.stdout.write(self.style.SUCCESS(f"Cierres mensuales creados: {creados}"))
+
+        if not options["verificar"]:
+            return
+        descuadres = verificar_kardex()
+        nombres = dict(Insumo.objects.filter(pk__in=[d["insumo_id"] for d in descuadres]).values_list("pk", "nombre"))
+        for d in descuadres:
+            detalle = f"{nombres.get(d['insumo_id'], d['insumo_id'])}: Kardex {d['saldo_kardex']} · stock {d['stock']} · diferencia {d['diferencia']}"
+            if d["saltos"]:
+                detalle += f" · saltos {d['saltos']}"
+            if d["cierres_erroneos"]:
+                detalle += " · cierres a revisar " + ", ".join(f"{f:%m/%Y}" for f in d["cierres_erroneos"])
+            self.stderr.write(detalle)
+        if descuadres:
+            self.stdout.write(self.style.WARNING(f"Productos con descuadre: {len(descuadres)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Kardex cuadrado con el stock de todos los productos."))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.11 on 2026-10-19 04:46
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratos', '0013_ubicacion_por_contrato'),
+        ('inventario', '0010_inventario_por_contrato'),
+        ('mantenimientos', '0013_usoinsumo_origen_inventario'),
+        ('trabajadores', '0005_ciudades_trabajador'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoInventarioCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Último día del mes cerrado.')),
+                ('saldo', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=12)),
+                ('movimientos', models.PositiveIntegerField(default=0, help_text='Movimientos acumulados hasta el cierre.')),
+                ('generado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Cierre mensual de Kardex',
+                'verbose_name_plural': 'Cierres mensuales de Kardex',
+                'ordering': ['insumo__nombre', '-fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['insumo', 'fecha'], name='inv_mov_insumo_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='saldoinventariocheckpoint',
+            name='insumo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints_saldo', to='inventario.insumo'),
+        ),
+        migrations.AddConstraint(
+            model_name='saldoinventariocheckpoint',
+            constraint=models.UniqueConstraint(fields=('insumo', 'fecha'), name='uniq_checkpoint_saldo_insumo_fecha'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_kardex_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='insumo',
+            index=models.Index(fields=['activo', 'categoria'], name='inv_insumo_activo_cat_idx'),
+        ),
+    ]
@@ -63,6 +63,9 @@ class Insumo(models.Model):
         verbose_name = "Insumo"
         verbose_name_plural = "Insumos"
         ordering = ["nombre"]
+        indexes = [
+            models.Index(fields=["activo", "categoria"], name="inv_insumo_activo_cat_idx"),
+        ]
 
 
 class PresentacionInsumo(models.Model):
@@ -99,6 +102,13 @@ class InventarioTrabajador(models.Model):
         ordering = ["trabajador__user__username", "insumo__nombre"]
 
 
+def estimar_stock_contrato(stock, consumo_diario, fecha_referencia, hoy):
+    """Stock en sitio descontando el consumo diario estimado desde ``fecha_referencia``."""
+    dias = max((hoy - fecha_referencia).days, 0)
+    estimado = Decimal(stock or 0) - (Decimal(consumo_diario or 0) * Decimal(dias))
+    return max(estimado, Decimal("0.000"))
+
+
 class InventarioContrato(models.Model):
     contrato = models.ForeignKey(
         "contratos.Contrato",
@@ -122,9 +132,9 @@ class InventarioContrato(models.Model):
     @property
     def stock_estimado(self):
         from django.utils import timezone
-        dias = max((timezone.localdate() - self.fecha_referencia_estimacion).days, 0)
-        estimado = Decimal(self.stock or 0) - (Decimal(self.consumo_diario_estimado or 0) * Decimal(dias))
-        return max(estimado, Decimal("0.000"))
+        return estimar_stock_contrato(
+            self.stock, self.consumo_diario_estimado, self.fecha_referencia_estimacion, timezone.localdate(),
+        )
 
     @property
     def dias_hasta_minimo(self):
@@ -256,6 +266,34 @@ class MovimientoInventario(models.Model):
         verbose_name = "Movimiento de inventario"
         verbose_name_plural = "Movimientos de inventario"
         ordering = ["-creado_en", "-id"]
+        indexes = [
+            models.Index(fields=["insumo", "fecha"], name="inv_mov_insumo_fecha_idx"),
+        ]
+
+
+class SaldoInventarioCheckpoint(models.Model):
+    """Saldo del Kardex general de un insumo al cierre de un mes.
+
+    Permite que cualquier rango del Kardex parta del cierre más cercano en
+    lugar de recorrer todo el historial desde el primer movimiento.
+    """
+
+    insumo = models.ForeignKey(Insumo, on_delete=models.CASCADE, related_name="checkpoints_saldo")
+    fecha = models.DateField(help_text="Último día del mes cerrado.")
+    saldo = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.000"))
+    movimientos = models.PositiveIntegerField(default=0, help_text="Movimientos acumulados hasta el cierre.")
+    generado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.insumo.nombre} · {self.fecha:%m/%Y}: {self.saldo} {self.insumo.unidad_corta}"
+
+    class Meta:
+        verbose_name = "Cierre mensual de Kardex"
+        verbose_name_plural = "Cierres mensuales de Kardex"
+        ordering = ["insumo__nombre", "-fecha"]
+        constraints = [
+            models.UniqueConstraint(fields=["insumo", "fecha"], name="uniq_checkpoint_saldo_insumo_fecha")
+        ]
 
 
 class SolicitudReposicion(models.Model):
@@ -254,3 +254,220 @@ def ajustar_inventario_contrato(*, contrato, insumo, nueva_existencia, usuario=N
         costo_unitario=insumo.costo or 0, total_costo=_costo_total(insumo, abs(diferencia)),
         usuario=usuario, observacion=observacion or "Verificación física del inventario en sitio",
     )
+
+
+# ---------------------------------------------------------------------------
+# Movimientos en lote
+# ---------------------------------------------------------------------------
+# Efecto de cada tipo sobre (stock general, stock del trabajador, stock del
+# contrato). Los signos se aplican sobre la cantidad en unidad base.
+EFECTOS_MOVIMIENTO_LOTE = {
+    "entrega": (-1, 1, 0),
+    "devolucion": (1, -1, 0),
+    "mantenimiento": (0, -1, 0),
+    "reposicion_contrato": (-1, 0, 1),
+    "consumo_contrato": (0, 0, -1),
+}
+
+
+def _pk(valor):
+    return getattr(valor, "pk", valor)
+
+
+def _normalizar_linea_lote(linea):
+    tipo = linea.get("tipo")
+    if tipo not in EFECTOS_MOVIMIENTO_LOTE:
+        raise ValueError(f"Tipo de movimiento no soportado en lote: {tipo}.")
+    _, efecto_trabajador, efecto_contrato = EFECTOS_MOVIMIENTO_LOTE[tipo]
+    if not linea.get("insumo"):
+        raise ValueError("Cada línea debe indicar el producto.")
+    if efecto_trabajador and not linea.get("trabajador"):
+        raise ValueError("Selecciona el trabajador del movimiento.")
+    if efecto_contrato and not linea.get("contrato"):
+        raise ValueError("Selecciona el contrato del movimiento.")
+    if tipo == "mantenimiento" and not linea.get("mantenimiento"):
+        raise ValueError("El consumo en mantenimiento requiere el mantenimiento.")
+    return {
+        **linea,
+        "cantidad_base": decimal_positivo(linea.get("cantidad_base")).quantize(Q3, rounding=ROUND_HALF_UP),
+    }
+
+
+def _observacion_lote(linea):
+    if linea.get("observacion"):
+        return linea["observacion"]
+    tipo = linea["tipo"]
+    if tipo == "entrega":
+        return f"Entrega a {linea['trabajador']}"
+    if tipo == "devolucion":
+        return f"Devolución de {linea['trabajador']}"
+    if tipo == "mantenimiento":
+        return f"Consumo en mantenimiento #{_pk(linea['mantenimiento'])}"
+    if tipo == "reposicion_contrato":
+        return f"Reposición al contrato #{_pk(linea['contrato'])}"
+    return f"Consumo del inventario del contrato #{_pk(linea['contrato'])}"
+
+
+def _bloquear_por_pares(modelo, campo, pares):
+    """Bloquea en una sola consulta, y en orden de pk, las filas de los pares (campo, insumo)."""
+    from functools import reduce
+    from operator import or_
+
+    from django.db.models import Q
+
+    if not pares:
+        return {}
+    filtro = reduce(or_, (Q(**{f"{campo}_id": dueno, "insumo_id": insumo}) for dueno, insumo in pares))
+    filas = modelo.objects.select_for_update().filter(filtro).order_by("pk")
+    return {(getattr(fila, f"{campo}_id"), fila.insumo_id): fila for fila in filas}
+
+
+def _update_por_pk(modelo, deltas, **extra):
+    """Aplica los deltas de stock de una tabla en un único UPDATE con F()."""
+    from django.db.models import Case, DecimalField, F, Value, When
+
+    if not deltas:
+        return
+    salida = DecimalField(max_digits=12, decimal_places=3)
+    incremento = Case(
+        *[When(pk=pk, then=Value(delta, output_field=salida)) for pk, delta in deltas.items() if delta],
+        default=Value(Decimal("0.000"), output_field=salida),
+        output_field=salida,
+    )
+    modelo.objects.filter(pk__in=list(deltas)).update(stock=F("stock") + incremento, **extra)
+
+
+@transaction.atomic
+def registrar_movimientos_lote(lineas, *, usuario=None):
+    """Registra varios movimientos de inventario en una sola transacción.
+
+    Cada línea es un diccionario con ``tipo`` (ver ``EFECTOS_MOVIMIENTO_LOTE``),
+    ``insumo``, ``cantidad_base`` y, según el tipo, ``trabajador``, ``contrato``,
+    ``mantenimiento`` y ``observacion``. Todas las filas afectadas se bloquean
+    siempre en el mismo orden (insumos, inventarios de trabajadores e
+    inventarios de contratos, cada grupo por pk) para evitar interbloqueos entre
+    entregas concurrentes. Si alguna línea no tiene stock suficiente no se
+    aplica ninguna. Devuelve los ``MovimientoInventario`` creados, en el mismo
+    orden de las líneas.
+    """
+    from django.utils import timezone
+
+    from .models import Insumo
+
+    lineas = [_normalizar_linea_lote(linea) for linea in lineas]
+    if not lineas:
+        return []
+
+    # Las filas de destino que aún no existen se crean vacías antes de bloquear.
+    pares_entrega = {(_pk(l["trabajador"]), _pk(l["insumo"])) for l in lineas if l["tipo"] == "entrega"}
+    pares_reposicion = {(_pk(l["contrato"]), _pk(l["insumo"])) for l in lineas if l["tipo"] == "reposicion_contrato"}
+    if pares_entrega:
+        InventarioTrabajador.objects.bulk_create(
+            [InventarioTrabajador(trabajador_id=t, insumo_id=i) for t, i in pares_entrega],
+            ignore_conflicts=True,
+        )
+    if pares_reposicion:
+        InventarioContrato.objects.bulk_create(
+            [InventarioContrato(contrato_id=c, insumo_id=i) for c, i in pares_reposicion],
+            ignore_conflicts=True,
+        )
+
+    insumos = {
+        insumo.pk: insumo
+        for insumo in Insumo.objects.select_for_update().filter(
+            pk__in={_pk(l["insumo"]) for l in lineas}
+        ).order_by("pk")
+    }
+    inv_trabajadores = _bloquear_por_pares(
+        InventarioTrabajador,
+        "trabajador",
+        {(_pk(l["trabajador"]), _pk(l["insumo"])) for l in lineas if EFECTOS_MOVIMIENTO_LOTE[l["tipo"]][1]},
+    )
+    inv_contratos = _bloquear_por_pares(
+        InventarioContrato,
+        "contrato",
+        {(_pk(l["contrato"]), _pk(l["insumo"])) for l in lineas if EFECTOS_MOVIMIENTO_LOTE[l["tipo"]][2]},
+    )
+
+    hoy = timezone.localdate()
+    general = {pk: Decimal(insumo.stock) for pk, insumo in insumos.items()}
+    trabajador = {clave: Decimal(inv.stock) for clave, inv in inv_trabajadores.items()}
+    contrato = {}
+    for clave, inv in inv_contratos.items():
+        # Igual que _materializar_estimado_contrato, pero sin guardar todavía.
+        dias = max((hoy - (inv.fecha_referencia_estimacion or hoy)).days, 0)
+        consumido = Decimal(inv.consumo_diario_estimado or 0) * Decimal(dias)
+        contrato[clave] = max(Decimal(inv.stock or 0) - consumido, Decimal("0.000")).quantize(Q3)
+
+    movimientos = []
+    for linea in lineas:
+        insumo_id = _pk(linea["insumo"])
+        insumo = insumos.get(insumo_id)
+        if insumo is None:
+            raise ValueError("El producto seleccionado no existe.")
+        cantidad = linea["cantidad_base"]
+        efecto_general, efecto_trabajador, efecto_contrato = EFECTOS_MOVIMIENTO_LOTE[linea["tipo"]]
+        datos = {}
+
+        general_antes = general[insumo_id]
+        if efecto_general:
+            if efecto_general < 0 and general_antes < cantidad:
+                raise ValueError(f"Stock general insuficiente de {insumo.nombre}. Disponible: {general_antes} {insumo.unidad_corta}.")
+            general[insumo_id] = general_antes + efecto_general * cantidad
+
+        if efecto_trabajador:
+            clave = (_pk(linea["trabajador"]), insumo_id)
+            if clave not in trabajador:
+                raise ValueError(f"{linea['trabajador']} no tiene {insumo.nombre} asignado.")
+            antes = trabajador[clave]
+            if efecto_trabajador < 0 and antes < cantidad:
+                raise ValueError(f"Stock insuficiente del trabajador en {insumo.nombre}. Disponible: {antes} {insumo.unidad_corta}.")
+            trabajador[clave] = antes + efecto_trabajador * cantidad
+            datos.update(
+                stock_trabajador_anterior=antes,
+                stock_trabajador_resultante=trabajador[clave],
+            )
+
+        if efecto_contrato:
+            clave = (_pk(linea["contrato"]), insumo_id)
+            if clave not in contrato:
+                raise ValueError(f"El contrato #{clave[0]} no tiene inventario en sitio de {insumo.nombre}.")
+            antes = contrato[clave]
+            if efecto_contrato < 0 and antes < cantidad:
+                raise ValueError(f"Stock del contrato insuficiente en {insumo.nombre}. Disponible estimado: {antes} {insumo.unidad_corta}.")
+            contrato[clave] = (antes + efecto_contrato * cantidad).quantize(Q3)
+            datos.update(
+                stock_contrato_anterior=antes,
+                stock_contrato_resultante=contrato[clave],
+            )
+
+        movimientos.append(MovimientoInventario(
+            insumo=insumo, tipo=linea["tipo"], cantidad=cantidad,
+            stock_anterior=general_antes, stock_resultante=general[insumo_id],
+            trabajador_id=_pk(linea.get("trabajador")),
+            contrato_id=_pk(linea.get("contrato")),
+            mantenimiento_id=_pk(linea.get("mantenimiento")),
+            costo_unitario=insumo.costo or 0, total_costo=_costo_total(insumo, cantidad),
+            usuario=usuario, observacion=_observacion_lote(linea),
+            **datos,
+        ))
+
+    ahora = timezone.now()
+    _update_por_pk(Insumo, {
+        pk: general[pk] - Decimal(insumo.stock)
+        for pk, insumo in insumos.items()
+        if general[pk] != Decimal(insumo.stock)
+    })
+    _update_por_pk(
+        InventarioTrabajador,
+        {inv.pk: trabajador[clave] - Decimal(inv.stock) for clave, inv in inv_trabajadores.items()},
+        actualizado_en=ahora,
+    )
+    # La estimación de consumo del contrato queda materializada a la fecha de hoy.
+    _update_por_pk(
+        InventarioContrato,
+        {inv.pk: contrato[clave] - Decimal(inv.stock) for clave, inv in inv_contratos.items()},
+        fecha_referencia_estimacion=hoy, actualizado_en=ahora,
+    )
+
+    return MovimientoInventario.objects.bulk_create(movimientos)
@@ -1,3 +1,217 @@
-from django.test import TestCase
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from clientes.models import Cliente
+from contratos.models import Contrato
+from trabajadores.models import Trabajador
+
+from .analytics import resumen_inventario
+from .kardex import generar_checkpoints, saldo_al, verificar_kardex
+from .models import Insumo, InventarioContrato, InventarioTrabajador, MovimientoInventario, SaldoInventarioCheckpoint
+from .services import registrar_movimientos_lote
+
+
+def _insumo(nombre, stock="100.000", costo="2.0000"):
+    return Insumo.objects.create(nombre=nombre, stock=Decimal(stock), costo=Decimal(costo))
+
+
+def _trabajador(username):
+    return Trabajador.objects.create(user=User.objects.create(username=username), telefono="0999999999")
+
+
+class MovimientosLoteTests(TestCase):
+    def setUp(self):
+        self.cloro = _insumo("Cloro granulado")
+        self.sulfato = _insumo("Sulfato de aluminio", stock="10.000")
+        self.trabajador = _trabajador("tecnico")
+
+    def test_entrega_varios_productos_en_un_lote(self):
+        movimientos = registrar_movimientos_lote([
+            {"tipo": "entrega", "insumo": self.cloro, "trabajador": self.trabajador, "cantidad_base": "4"},
+            {"tipo": "entrega", "insumo": self.sulfato, "trabajador": self.trabajador, "cantidad_base": "2.5"},
+            {"tipo": "entrega", "insumo": self.cloro, "trabajador": self.trabajador, "cantidad_base": "1"},
+        ])
+
+        self.cloro.refresh_from_db()
+        self.sulfato.refresh_from_db()
+        self.assertEqual(self.cloro.stock, Decimal("95.000"))
+        self.assertEqual(self.sulfato.stock, Decimal("7.500"))
+        inv = InventarioTrabajador.objects.get(trabajador=self.trabajador, insumo=self.cloro)
+        self.assertEqual(inv.stock, Decimal("5.000"))
+        self.assertEqual(len(movimientos), 3)
+        self.assertEqual(movimientos[2].stock_anterior, Decimal("96.000"))
+        self.assertEqual(movimientos[2].stock_trabajador_resultante, Decimal("5.000"))
+        self.assertEqual(movimientos[0].total_costo, Decimal("8.00"))
+
+    def test_stock_insuficiente_no_aplica_ninguna_linea(self):
+        with self.assertRaises(ValueError):
+            registrar_movimientos_lote([
+                {"tipo": "entrega", "insumo": self.cloro, "trabajador": self.trabajador, "cantidad_base": "4"},
+                {"tipo": "entrega", "insumo": self.sulfato, "trabajador": self.trabajador, "cantidad_base": "11"},
+            ])
+
+        self.cloro.refresh_from_db()
+        self.assertEqual(self.cloro.stock, Decimal("100.000"))
+        self.assertFalse(MovimientoInventario.objects.exists())
+        self.assertFalse(InventarioTrabajador.objects.exists())
+
+    def test_consumo_sin_asignacion_del_trabajador_es_error_legible(self):
+        with self.assertRaisesMessage(ValueError, "no tiene Cloro granulado asignado"):
+            registrar_movimientos_lote([
+                {"tipo": "devolucion", "insumo": self.cloro, "trabajador": self.trabajador, "cantidad_base": "1"},
+            ])
+
+    def test_reposicion_y_consumo_de_contrato(self):
+        cliente = Cliente.objects.create(nombre="Cliente", telefono="0999", direccion="Centro")
+        contrato = Contrato.objects.create(
+            cliente=cliente, tipo="semanal", precio_mensual=Decimal("100"), fecha_inicio=date(2026, 1, 1),
+            quimicos_almacenamiento="contrato",
+        )
+        registrar_movimientos_lote([
+            {"tipo": "reposicion_contrato", "insumo": self.cloro, "contrato": contrato, "cantidad_base": "6"},
+            {"tipo": "consumo_contrato", "insumo": self.cloro, "contrato": contrato, "cantidad_base": "2"},
+        ])
+
+        inv = InventarioContrato.objects.get(contrato=contrato, insumo=self.cloro)
+        self.assertEqual(inv.stock, Decimal("4.000"))
+        self.cloro.refresh_from_db()
+        self.assertEqual(self.cloro.stock, Decimal("94.000"))
+
+
+class KardexCheckpointTests(TestCase):
+    def setUp(self):
+        self.insumo = _insumo("Tricloro", stock="0.000")
+        saldo = Decimal("0.000")
+        for fecha, delta in [
+            (date(2026, 1, 10), Decimal("20")),
+            (date(2026, 1, 25), Decimal("-5")),
+            (date(2026, 2, 3), Decimal("-3")),
+            (date(2026, 3, 15), Decimal("10")),
+        ]:
+            movimiento = MovimientoInventario.objects.create(
+                insumo=self.insumo, tipo="ajuste", cantidad=abs(delta),
+                stock_anterior=saldo, stock_resultante=saldo + delta,
+            )
+            MovimientoInventario.objects.filter(pk=movimiento.pk).update(fecha=fecha)
+            saldo += delta
+        Insumo.objects.filter(pk=self.insumo.pk).update(stock=saldo)
+
+    def test_cierres_mensuales_incrementales(self):
+        self.assertEqual(generar_checkpoints(hasta=date(2026, 2, 1)), 2)
+        self.assertEqual(generar_checkpoints(hasta=date(2026, 3, 31)), 1)
+        cierres = dict(SaldoInventarioCheckpoint.objects.values_list("fecha", "saldo"))
+        self.assertEqual(cierres, {
+            date(2026, 1, 31): Decimal("15.000"),
+            date(2026, 2, 28): Decimal("12.000"),
+            date(2026, 3, 31): Decimal("22.000"),
+        })
+
+    def test_saldo_al_parte_del_cierre_mas_cercano(self):
+        generar_checkpoints(hasta=date(2026, 1, 31))
+        self.assertEqual(saldo_al(self.insumo, date(2026, 1, 20)), Decimal("20.000"))
+        self.assertEqual(saldo_al(self.insumo, date(2026, 2, 10)), Decimal("12.000"))
+        self.assertEqual(saldo_al(self.insumo, date(2026, 12, 31)), Decimal("22.000"))
+
+    def test_verificador_detecta_descuadre_con_stock(self):
+        generar_checkpoints(hasta=date(2026, 3, 31))
+        self.assertEqual(verificar_kardex(), [])
+
+        Insumo.objects.filter(pk=self.insumo.pk).update(stock=Decimal("25.000"))
+        SaldoInventarioCheckpoint.objects.filter(fecha=date(2026, 2, 28)).update(saldo=Decimal("11.000"))
+        descuadre, = verificar_kardex()
+        self.assertEqual(descuadre["diferencia"], Decimal("3.000"))
+        self.assertEqual(descuadre["cierres_erroneos"], [date(2026, 2, 28)])
+
+
+class InventarioAnalyticsTests(TestCase):
+    def test_resumen_en_consultas_constantes(self):
+        _insumo("Cloro", stock="10.000", costo="2.0000")
+        Insumo.objects.create(nombre="Filtro", categoria="repuestos", stock=Decimal("0.000"), costo=Decimal("30"))
+        tricloro = _insumo("Tricloro", stock="3.000", costo="5.0000")
+        InventarioTrabajador.objects.create(trabajador=_trabajador("tecnico"), insumo=tricloro, stock=Decimal("2.000"))
+
+        with self.assertNumQueries(6):
+            resumen = resumen_inventario(date(2026, 1, 1))
+
+        self.assertEqual(resumen["totales"]["productos"], 3)
+        self.assertEqual(resumen["totales"]["valor"], Decimal("35.00"))
+        self.assertEqual(resumen["totales"]["bajo_stock"], 2)
+        self.assertEqual(resumen["totales"]["sin_stock"], 1)
+        self.assertEqual(resumen["trabajadores"]["valor"], Decimal("10.00"))
+        self.assertEqual(resumen["valor_total"], Decimal("45.00"))
+        self.assertEqual([c["categoria"] for c in resumen["categorias"]], ["quimicos", "repuestos"])
+
+    def test_contratos_valorados_con_el_stock_estimado(self):
+        cloro = _insumo("Cloro", stock="10.000", costo="2.0000")
+        cliente = Cliente.objects.create(nombre="Casa Sol", telefono="0999", direccion="Centro", ciudad="Quito")
+        contrato = Contrato.objects.create(cliente=cliente, tipo="semanal", precio_mensual=Decimal("100"), fecha_inicio=date(2026, 1, 1))
+        fila = InventarioContrato.objects.create(
+            contrato=contrato, insumo=cloro, stock=Decimal("10.000"), stock_minimo=Decimal("4.000"), consumo_diario_estimado=Decimal("1.000"),
+        )
+        InventarioContrato.objects.filter(pk=fila.pk).update(fecha_referencia_estimacion=timezone.localdate() - timedelta(days=7))
+        fila.refresh_from_db()
+
+        contratos = resumen_inventario(date(2026, 1, 1))["contratos"]
+        self.assertEqual(fila.stock_estimado, Decimal("3.000"))
+        self.assertEqual((contratos["contratos"], contratos["en_minimo"], contratos["valor"]), (1, 1, Decimal("6.00")))
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class MovimientosLoteConcurrenciaTests(TransactionTestCase):
+    """Entregas y devoluciones cruzadas en paralelo no deben interbloquearse ni perder stock."""
+
+    HILOS = 8
+    RONDAS = 10
+
+    def test_lotes_concurrentes_con_orden_cruzado(self):
+        insumos = [_insumo(f"Producto {n}", stock="1000.000") for n in range(4)]
+        trabajadores = [_trabajador(f"tecnico{n}") for n in range(self.HILOS)]
+        errores = []
+
+        def trabajar(indice):
+            trabajador = trabajadores[indice]
+            # Cada hilo recorre los productos en un orden distinto.
+            orden = insumos[indice % len(insumos):] + insumos[:indice % len(insumos)]
+            if indice % 2:
+                orden.reverse()
+            try:
+                for _ in range(self.RONDAS):
+                    registrar_movimientos_lote([
+                        {"tipo": "entrega", "insumo": insumo, "trabajador": trabajador, "cantidad_base": "2"}
+                        for insumo in orden
+                    ])
+                    registrar_movimientos_lote([
+                        {"tipo": "devolucion", "insumo": insumo, "trabajador": trabajador, "cantidad_base": "1"}
+                        for insumo in reversed(orden)
+                    ])
+            except Exception as exc:  # pragma: no cover - se reporta abajo
+                errores.append(exc)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajar, args=(n,)) for n in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        entregado = Decimal(self.HILOS * self.RONDAS)
+        for insumo in insumos:
+            insumo.refresh_from_db()
+            self.assertEqual(insumo.stock, Decimal("1000.000") - entregado)
+            en_trabajadores = sum(
+                InventarioTrabajador.objects.filter(insumo=insumo).values_list("stock", flat=True),
+                Decimal("0"),
+            )
+            self.assertEqual(en_trabajadores, entregado)
+        self.assertEqual(
+            MovimientoInventario.objects.count(),
+            self.HILOS * self.RONDAS * len(insumos) * 2,
+        )